@@ -4,11 +4,11 @@ from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Tuple
 
 import pandas as pd
-import yfinance as yf
 
-
-def _chunked(items: List[str], size: int) -> List[List[str]]:
-    return [items[i : i + size] for i in range(0, len(items), size)]
+try:
+    from .ohlcv_cache import OhlcvCache, OhlcvProvider, YFinanceProvider, merge_tail, overlap_matches, slice_window
+except ImportError:  # pragma: no cover - direct script invocation fallback
+    from backend.rvci.ohlcv_cache import OhlcvCache, OhlcvProvider, YFinanceProvider, merge_tail, overlap_matches, slice_window
 
 
 def default_window(days: int = 420) -> Tuple[datetime, datetime]:
@@ -22,49 +22,78 @@ def fetch_ohlcv(
     start: datetime,
     end: datetime,
     batch_size: int = 200,
+    provider: OhlcvProvider | None = None,
+    cache: OhlcvCache | None = None,
 ) -> Tuple[Dict[str, pd.DataFrame], List[str], List[str]]:
+    """Daily OHLCV per symbol for [start, end].
+
+    Without a cache every symbol is fetched for the whole window. With a cache,
+    symbols whose history already covers ``start`` only request the bars from
+    the bar before their last cached one on, and the tail is merged into the
+    cache. The newest cached bar may have been partial, so the fresh copy simply
+    overwrites it; the bar before it is the finalized overlap. If the tail
+    request returns nothing, the cached history is served and counted in
+    ``cache.stats["fallback"]``. If the finalized overlap bar differs from the
+    cached one (the provider re-adjusted its history), the symbol's cache is
+    discarded and the whole window is fetched again (``cache.stats["refetch"]``).
+    """
+    provider = provider or YFinanceProvider(batch_size=batch_size)
+    if cache is None:
+        return provider.fetch(symbols, start, end)
+
     prices: Dict[str, pd.DataFrame] = {}
     missing: List[str] = []
     errors: List[str] = []
-
-    for batch in _chunked(symbols, batch_size):
-        try:
-            data = yf.download(
-                batch,
-                start=start,
-                end=end,
-                group_by="ticker",
-                auto_adjust=False,
-                threads=True,
-                progress=False,
-            )
-        except Exception as exc:
-            errors.append(f"batch_error:{exc}")
-            missing.extend(batch)
+    cached: Dict[str, pd.DataFrame] = {}
+    groups: Dict[datetime, List[str]] = {}
+    refetch: List[str] = []
+    for symbol in symbols:
+        frame = cache.load(symbol) if cache.covers(symbol, start) else None
+        if frame is None:
+            groups.setdefault(start, []).append(symbol)
             continue
-
-        if data is None or data.empty:
-            missing.extend(batch)
+        cached[symbol] = frame
+        if frame.index.max().to_pydatetime().replace(tzinfo=start.tzinfo) >= end:
+            prices[symbol] = slice_window(frame, start, end)
+            cache.stats["up_to_date"] += 1
             continue
+        tail_start = frame.index[max(0, len(frame.index) - 2)].to_pydatetime().replace(tzinfo=start.tzinfo)
+        groups.setdefault(tail_start, []).append(symbol)
 
-        if isinstance(data.columns, pd.MultiIndex):
-            for symbol in batch:
-                if symbol not in data.columns.levels[0]:
-                    missing.append(symbol)
-                    continue
-                frame = data[symbol].dropna(how="all")
-                if frame.empty:
+    for group_start, group_symbols in sorted(groups.items()):
+        fresh, _, group_errors = provider.fetch(group_symbols, group_start, end)
+        errors.extend(group_errors)
+        for symbol in group_symbols:
+            history = cached.get(symbol)
+            bars = fresh.get(symbol)
+            if bars is None or bars.empty:
+                if history is None:
                     missing.append(symbol)
                     continue
-                prices[symbol] = frame
-        else:
-            symbol = batch[0]
-            frame = data.dropna(how="all")
-            if frame.empty:
+                cache.stats["fallback"] += 1
+                prices[symbol] = slice_window(history, start, end)
+                continue
+            if history is not None and not overlap_matches(history.iloc[:-1], bars):
+                cache.discard(symbol)
+                refetch.append(symbol)
+                continue
+            cache.stats["tail" if history is not None else "full"] += 1
+            merged = cache.store(symbol, merge_tail(history, bars), requested_from=start.date())
+            prices[symbol] = slice_window(merged, start, end)
+
+    if refetch:
+        fresh, _, refetch_errors = provider.fetch(refetch, start, end)
+        errors.extend(refetch_errors)
+        for symbol in refetch:
+            bars = fresh.get(symbol)
+            if bars is None or bars.empty:
                 missing.append(symbol)
-            else:
-                prices[symbol] = frame
+                continue
+            cache.stats["refetch"] += 1
+            stored = cache.store(symbol, bars, requested_from=start.date())
+            prices[symbol] = slice_window(stored, start, end)
 
+    cache.flush()
     return prices, missing, errors
 
 
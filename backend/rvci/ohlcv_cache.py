@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Protocol, Tuple
+
+import numpy as np
+import pandas as pd
+
+INDEX_FILE = "index.json"
+INDEX_SCHEMA = "rvci_ohlcv_cache_index_v1"
+PRICE_COLUMNS = ("Open", "High", "Low", "Close", "Adj Close")
+OVERLAP_RTOL = 1e-4
+
+FetchResult = Tuple[Dict[str, pd.DataFrame], List[str], List[str]]
+
+
+class OhlcvProvider(Protocol):
+    name: str
+
+    def fetch(self, symbols: List[str], start: datetime, end: datetime) -> FetchResult:
+        """Daily bars per symbol in [start, end), plus missing symbols and error strings."""
+
+
+def _chunked(items: List[str], size: int) -> List[List[str]]:
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def _as_date(value: datetime | date | pd.Timestamp) -> date:
+    if isinstance(value, pd.Timestamp):
+        return value.date()
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _normalize_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    frame = frame.copy()
+    index = pd.to_datetime(frame.index)
+    if getattr(index, "tz", None) is not None:
+        index = index.tz_localize(None)
+    frame.index = index.normalize()
+    frame.index.name = "Date"
+    return frame[~frame.index.duplicated(keep="last")].sort_index()
+
+
+def slice_window(frame: pd.DataFrame, start: datetime, end: datetime) -> pd.DataFrame:
+    lo = pd.Timestamp(_as_date(start))
+    hi = pd.Timestamp(_as_date(end))
+    return frame.loc[(frame.index >= lo) & (frame.index <= hi)]
+
+
+class YFinanceProvider:
+    name = "yfinance"
+
+    def __init__(self, batch_size: int = 200) -> None:
+        self.batch_size = batch_size
+
+    def fetch(self, symbols: List[str], start: datetime, end: datetime) -> FetchResult:
+        import yfinance as yf
+
+        prices: Dict[str, pd.DataFrame] = {}
+        missing: List[str] = []
+        errors: List[str] = []
+
+        for batch in _chunked(symbols, self.batch_size):
+            try:
+                data = yf.download(
+                    batch,
+                    start=start,
+                    end=end,
+                    group_by="ticker",
+                    auto_adjust=False,
+                    threads=True,
+                    progress=False,
+                )
+            except Exception as exc:
+                errors.append(f"batch_error:{exc}")
+                missing.extend(batch)
+                continue
+
+            if data is None or data.empty:
+                missing.extend(batch)
+                continue
+
+            if isinstance(data.columns, pd.MultiIndex):
+                for symbol in batch:
+                    if symbol not in data.columns.levels[0]:
+                        missing.append(symbol)
+                        continue
+                    frame = data[symbol].dropna(how="all")
+                    if frame.empty:
+                        missing.append(symbol)
+                        continue
+                    prices[symbol] = frame
+            else:
+                symbol = batch[0]
+                frame = data.dropna(how="all")
+                if frame.empty:
+                    missing.append(symbol)
+                else:
+                    prices[symbol] = frame
+
+        return prices, missing, errors
+
+
+class FileProvider:
+    """Provider backed by ``<root>/<SYMBOL>.csv`` (or ``.parquet``) files; for tests and offline runs."""
+
+    name = "file"
+
+    def __init__(self, root: Path | str) -> None:
+        self.root = Path(root)
+        self.calls: List[Tuple[Tuple[str, ...], date, date]] = []
+
+    def _read(self, symbol: str) -> pd.DataFrame | None:
+        parquet = self.root / f"{symbol}.parquet"
+        csv = self.root / f"{symbol}.csv"
+        if parquet.exists():
+            return pd.read_parquet(parquet)
+        if csv.exists():
+            return pd.read_csv(csv, index_col=0, parse_dates=True)
+        return None
+
+    def fetch(self, symbols: List[str], start: datetime, end: datetime) -> FetchResult:
+        self.calls.append((tuple(symbols), _as_date(start), _as_date(end)))
+        prices: Dict[str, pd.DataFrame] = {}
+        missing: List[str] = []
+        for symbol in symbols:
+            frame = self._read(symbol)
+            if frame is None:
+                missing.append(symbol)
+                continue
+            frame = _normalize_frame(frame)
+            # Same half-open [start, end) range as yf.download.
+            frame = frame.loc[(frame.index >= pd.Timestamp(_as_date(start))) & (frame.index < pd.Timestamp(_as_date(end)))]
+            if frame.empty:
+                missing.append(symbol)
+            else:
+                prices[symbol] = frame
+        return prices, missing, []
+
+
+def _symbol_file(symbol: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", symbol) + ".parquet"
+
+
+class OhlcvCache:
+    """Per-symbol parquet history plus an index of the earliest date requested per symbol.
+
+    ``requested_from`` lets a symbol that listed inside the window count as fully
+    covered even though its first bar is later than the window start.
+    """
+
+    def __init__(self, root: Path | str, keep_days: int = 800) -> None:
+        self.root = Path(root)
+        self.keep_days = keep_days
+        self._index: Dict[str, dict] | None = None
+        self.stats: Dict[str, int] = {"full": 0, "tail": 0, "up_to_date": 0, "fallback": 0, "refetch": 0}
+
+    @property
+    def index(self) -> Dict[str, dict]:
+        if self._index is None:
+            try:
+                payload = json.loads((self.root / INDEX_FILE).read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError):
+                payload = {}
+            self._index = dict(payload.get("symbols") or {}) if payload.get("schema") == INDEX_SCHEMA else {}
+        return self._index
+
+    def load(self, symbol: str) -> pd.DataFrame | None:
+        if symbol not in self.index:
+            return None
+        try:
+            frame = pd.read_parquet(self.root / _symbol_file(symbol))
+        except (OSError, ValueError):
+            return None
+        return frame if not frame.empty else None
+
+    def covers(self, symbol: str, start: datetime) -> bool:
+        requested_from = (self.index.get(symbol) or {}).get("requested_from")
+        return bool(requested_from) and date.fromisoformat(requested_from) <= _as_date(start)
+
+    def store(self, symbol: str, frame: pd.DataFrame, requested_from: date) -> pd.DataFrame:
+        frame = _normalize_frame(frame)
+        cutoff = pd.Timestamp(frame.index.max().date() - timedelta(days=self.keep_days))
+        frame = frame.loc[frame.index >= cutoff]
+        self.root.mkdir(parents=True, exist_ok=True)
+        dest = self.root / _symbol_file(symbol)
+        tmp = dest.with_name(f".{dest.name}.{os.getpid()}.tmp")
+        frame.to_parquet(tmp)
+        os.replace(tmp, dest)
+        previous = (self.index.get(symbol) or {}).get("requested_from")
+        if previous and date.fromisoformat(previous) < requested_from:
+            requested_from = date.fromisoformat(previous)
+        requested_from = max(requested_from, cutoff.date())
+        self.index[symbol] = {"requested_from": requested_from.isoformat(), "last_date": frame.index.max().date().isoformat()}
+        return frame
+
+    def discard(self, symbol: str) -> None:
+        """Forget a symbol's history so the next store starts from a fresh full-window fetch."""
+        self.index.pop(symbol, None)
+        (self.root / _symbol_file(symbol)).unlink(missing_ok=True)
+
+    def flush(self) -> None:
+        if self._index is None:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        dest = self.root / INDEX_FILE
+        tmp = dest.with_name(f".{INDEX_FILE}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"schema": INDEX_SCHEMA, "symbols": dict(sorted(self._index.items()))}, indent=2) + "\n", encoding="utf-8")
+        os.replace(tmp, dest)
+
+
+def overlap_matches(cached: pd.DataFrame, fresh: pd.DataFrame, rtol: float = OVERLAP_RTOL) -> bool:
+    """True when the price columns of bars present in both frames agree within ``rtol``.
+
+    A split or dividend re-adjusts the provider's whole history, so a mismatch on
+    a re-fetched finalized bar means the cached bars no longer line up with new ones.
+    Callers pass cached history without its newest bar, which may have been partial.
+    """
+    cached = _normalize_frame(cached)
+    fresh = _normalize_frame(fresh)
+    common = cached.index.intersection(fresh.index)
+    columns = [column for column in PRICE_COLUMNS if column in cached.columns and column in fresh.columns]
+    if common.empty or not columns:
+        return True
+    old = cached.loc[common, columns].to_numpy(dtype=float)
+    new = fresh.loc[common, columns].to_numpy(dtype=float)
+    return bool(np.allclose(old, new, rtol=rtol, atol=0.0, equal_nan=True))
+
+
+def merge_tail(cached: pd.DataFrame | None, fresh: pd.DataFrame | None) -> pd.DataFrame | None:
+    """Cached history with freshly fetched bars on top (fresh rows win on the same date)."""
+    frames = [_normalize_frame(frame) for frame in (cached, fresh) if frame is not None and not frame.empty]
+    if not frames:
+        return None
+    merged = pd.concat(frames)
+    return merged[~merged.index.duplicated(keep="last")].sort_index()
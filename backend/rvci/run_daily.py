@@ -36,6 +36,7 @@ import pandas_market_calendars as mcal
 
 try:
     from .data_fetcher import default_window, fetch_ohlcv
+    from .ohlcv_cache import OhlcvCache
     from .exporter import (
         build_envelope,
         write_health,
@@ -54,6 +55,7 @@ except ImportError:  # pragma: no cover - direct script invocation fallback
     ROOT = Path(__file__).resolve().parents[2]
     sys.path.insert(0, str(ROOT))
     from backend.rvci.data_fetcher import default_window, fetch_ohlcv
+    from backend.rvci.ohlcv_cache import OhlcvCache
     from backend.rvci.exporter import (
         build_envelope,
         write_health,
@@ -204,7 +206,13 @@ def main() -> int:
 
     fetch_symbols = sorted(set(tier_a + tier_b + ["SPY", "^VIX"]))
     start, end = default_window()
-    prices, missing, errors = fetch_ohlcv(fetch_symbols, start, end)
+    # Local per-symbol history: only the missing tail is requested upstream. RVCI_OHLCV_CACHE=0 disables it.
+    cache = None
+    if os.getenv("RVCI_OHLCV_CACHE", "1").strip() != "0":
+        cache = OhlcvCache(os.getenv("RVCI_OHLCV_CACHE_DIR") or root / "mirrors" / "rvci" / "ohlcv_cache")
+    prices, missing, errors = fetch_ohlcv(fetch_symbols, start, end, cache=cache)
+    if cache is not None and cache.stats["fallback"]:
+        warnings.append("PRICE_CACHE_FALLBACK")
 
     spy_df = prices.pop("SPY", None)
     vix_df = prices.pop("^VIX", None)
@@ -329,6 +337,7 @@ def main() -> int:
             },
             "errors": errors,
             "anomalies": anomalies,
+            "priceCache": {"enabled": cache is not None, **(cache.stats if cache is not None else {})},
         },
         ok=meta_status != "ERROR",
         warnings=warnings,
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Benchmark compute-global-daily's DuckDB pass: in-memory vs cold and warm persistent catalog.
+
+A warm run joins the catalog's cached metadata instead of decoding --metadata-parquet, and
+pays for archiving the session; the report checks that every mode produced identical scores.
+"""
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Iterable
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument("--as-of", required=True)
+    p.add_argument("--candidate-root", required=True, help="Candidate root with local/date=<as-of> bucket files")
+    p.add_argument("--metadata-parquet", default="")
+    p.add_argument("--runs", type=int, default=3, help="Repetitions for the in-memory and warm catalog modes")
+    p.add_argument("--output", default="", help="Report path (default: <candidate-root>/global/date=<as-of>/catalog_benchmark.json)")
+    return p.parse_args(list(argv) if argv is not None else None)
+
+
+def load_global_module() -> Any:
+    path = REPO_ROOT / "scripts" / "breakout-v12" / "compute-global-daily.py"
+    spec = importlib.util.spec_from_file_location("breakout_v12_compute_global_daily", path)
+    if spec is None or spec.loader is None:
+        raise SystemExit(f"FATAL: cannot load {path}")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = parse_args(argv)
+    as_of = str(args.as_of)[:10]
+    candidate_root = Path(args.candidate_root).resolve()
+    module = load_global_module()
+    local_files, _ = module.local_bucket_files(candidate_root / "local" / f"date={as_of}")
+    if not local_files:
+        raise SystemExit(f"FATAL: no local bucket files for {as_of} under {candidate_root}")
+
+    with tempfile.TemporaryDirectory(prefix="breakout_catalog_bench_") as tmp:
+        tmp_root = Path(tmp)
+        catalog_db = tmp_root / "catalog.duckdb"
+
+        def timed(mode: str, index: int, catalog: str) -> dict[str, Any]:
+            ns = module.parse_args(
+                [
+                    f"--as-of={as_of}",
+                    f"--candidate-root={candidate_root}",
+                    f"--metadata-parquet={args.metadata_parquet}",
+                    f"--duckdb-temp-dir={tmp_root / 'spill'}",
+                    f"--catalog-db={catalog}",
+                ]
+            )
+            scores_path = tmp_root / f"{mode}_{index}" / "scores.parquet"
+            started = time.perf_counter()
+            counts = module.run_duckdb(ns, local_files, scores_path)
+            wall = time.perf_counter() - started
+            return {"mode": mode, "run": index, "wall_sec": round(wall, 4), "rows": counts["rows"], "metadata_refreshed": (counts.get("catalog") or {}).get("metadata_refreshed"), "scores_sha256": module.file_sha256(scores_path)}
+
+        runs = [timed("memory", i, "") for i in range(max(1, int(args.runs)))]
+        runs.append(timed("catalog_cold", 0, str(catalog_db)))
+        runs += [timed("catalog_warm", i, str(catalog_db)) for i in range(max(1, int(args.runs)))]
+        catalog_bytes = catalog_db.stat().st_size
+
+    summary = {}
+    for mode in ("memory", "catalog_cold", "catalog_warm"):
+        walls = [run["wall_sec"] for run in runs if run["mode"] == mode]
+        summary[mode] = {"runs": len(walls), "median_wall_sec": round(statistics.median(walls), 4), "min_wall_sec": min(walls)}
+    report = {
+        "schema": "breakout_v12_global_catalog_benchmark_v1",
+        "generated_at": module.utc_now_iso(),
+        "as_of": as_of,
+        "candidate_root": str(candidate_root),
+        "metadata_parquet": args.metadata_parquet or None,
+        "local_files": len(local_files),
+        "catalog_bytes": catalog_bytes,
+        "scores_identical": len({run["scores_sha256"] for run in runs}) == 1,
+        "summary": summary,
+        "runs": runs,
+    }
+    output = Path(args.output) if args.output else candidate_root / "global" / f"date={as_of}" / "catalog_benchmark.json"
+    module.atomic_write_json(output, report)
+    print(json.dumps({"ok": True, "report": str(output), "summary": summary, "scores_identical": report["scores_identical"]}, sort_keys=True))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
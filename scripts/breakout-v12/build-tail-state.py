@@ -7,6 +7,7 @@ import json
 import os
 import shutil
 import resource
+import sys
 import time
 import uuid
 from datetime import date
@@ -15,18 +16,43 @@ from typing import Iterable, Any
 
 import polars as pl
 
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.breakout_compute.lib.asset_buckets import BucketIndex  # noqa: E402
+
 
 REQUIRED_OUTPUT_COLS = ["asset_id", "date", "asset_class", "open_raw", "high_raw", "low_raw", "close_raw", "volume_raw"]
+TAIL_SCHEMA: dict[str, pl.DataType] = {
+    "asset_id": pl.Utf8,
+    "date": pl.Date,
+    "asset_class": pl.Utf8,
+    "open_raw": pl.Float64,
+    "high_raw": pl.Float64,
+    "low_raw": pl.Float64,
+    "close_raw": pl.Float64,
+    "volume_raw": pl.Float64,
+}
+LINEAGE_KEEP = 400
 
 
 def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
-    p = argparse.ArgumentParser(description="Build initial Breakout V12 rolling tail-state. Manual/backfill job, not nightly.")
-    p.add_argument("--history-root", required=True, help="Snapshot bars root or parquet directory/file")
+    p = argparse.ArgumentParser(
+        description="Build initial Breakout V12 rolling tail-state (manual backfill), or roll an existing one forward by one daily delta."
+    )
+    p.add_argument("--history-root", default="", help="Snapshot bars root or parquet directory/file (backfill mode)")
+    p.add_argument(
+        "--roll-forward-delta-root",
+        default="",
+        help="prepare-daily-delta.py output root; appends date=<as-of> to the tail-state under --output-root in place",
+    )
     p.add_argument("--output-root", required=True, help="Output root containing state/tail-bars")
     p.add_argument("--scope-file", default="", help="Optional JSON list/dict of canonical asset ids to include")
     p.add_argument("--as-of", default=date.today().isoformat())
     p.add_argument("--tail-bars", type=int, default=300)
     p.add_argument("--bucket-count", type=int, default=128)
+    p.add_argument("--bucket-index", default="", help="asset_id -> bucket parquet index (default: <output-root>/state/bucket_index.parquet)")
     p.add_argument("--max-assets", type=int, default=0)
     p.add_argument("--batch-files", type=int, default=int(os.environ.get("RV_BREAKOUT_TAIL_BOOTSTRAP_BATCH_FILES", "4096") or "4096"))
     p.add_argument("--batch-bytes-mb", type=int, default=int(os.environ.get("RV_BREAKOUT_TAIL_BOOTSTRAP_BATCH_BYTES_MB", "128") or "128"))
@@ -49,11 +75,6 @@ def rss_mb() -> float:
     return round(value / 1024, 3)
 
 
-def stable_bucket(asset_id: Any, bucket_count: int) -> int:
-    h = hashlib.sha256(str(asset_id or "").encode("utf-8")).digest()
-    return int.from_bytes(h[:8], "big") % int(bucket_count)
-
-
 def atomic_write_json(path: Path, payload: dict[str, Any]) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
     tmp = path.parent / f".{path.name}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
@@ -144,14 +165,176 @@ def expr(cols: set[str], candidates: list[str], alias: str, dtype: pl.DataType)
     return pl.lit(None, dtype=dtype).alias(alias)
 
 
+def lineage_hash(previous_hash: str | None, as_of: str, source_sha256: str, bucket_entries: list[dict[str, Any]]) -> str:
+    h = hashlib.sha256()
+    for part in [previous_hash or "", as_of, source_sha256]:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    for entry in sorted(bucket_entries, key=lambda item: int(item["bucket"])):
+        h.update(f"{int(entry['bucket']):03d}:{entry['sha256']}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def append_lineage(previous: dict[str, Any] | None, link: dict[str, Any]) -> list[dict[str, Any]]:
+    chain = list((previous or {}).get("lineage_chain") or [])
+    chain.append(link)
+    return chain[-LINEAGE_KEEP:]
+
+
+def read_tail_bucket(path: Path) -> pl.DataFrame:
+    if not path.exists():
+        return pl.DataFrame(schema=TAIL_SCHEMA)
+    return pl.read_parquet(path).select(REQUIRED_OUTPUT_COLS).cast(TAIL_SCHEMA)
+
+
+def read_delta_bucket(path: Path) -> pl.DataFrame:
+    df = pl.read_parquet(path).select(REQUIRED_OUTPUT_COLS)
+    if df.schema["date"] != pl.Date:
+        df = df.with_columns(pl.col("date").cast(pl.Utf8).str.slice(0, 10).str.strptime(pl.Date, strict=False))
+    return (
+        df.cast({name: dtype for name, dtype in TAIL_SCHEMA.items() if name != "date"})
+        .with_columns(pl.col("asset_class").str.to_lowercase().fill_null("unknown"))
+        .filter(pl.col("asset_id").is_not_null() & pl.col("date").is_not_null())
+    )
+
+
+def roll_forward(args: argparse.Namespace, started: float) -> int:
+    """Append one prepare-daily-delta date to the tail-state and trim per asset.
+
+    Only buckets with delta rows are read and rewritten, so the cost follows
+    the daily delta rather than the full history. This is a manual repair path
+    (e.g. re-syncing a last-good tail after a skipped promotion): the nightly
+    pipeline already rolls the tail inside compute-local-daily.py.
+
+    A state backfilled with --scope-file/--max-assets only gains rows for the
+    assets it already holds (plus the scope filter when one is passed here).
+    """
+    as_of = str(args.as_of)[:10]
+    output_root = Path(args.output_root).expanduser().resolve()
+    state_root = output_root / "state" / "tail-bars"
+    manifest_path = output_root / "state" / "state_manifest.json"
+    delta_manifest_path = Path(args.roll_forward_delta_root).expanduser().resolve() / f"date={as_of}" / "daily_delta_manifest.json"
+    if not manifest_path.exists():
+        raise SystemExit(f"FATAL: tail-state manifest missing (run the backfill first): {manifest_path}")
+    if not delta_manifest_path.exists():
+        raise SystemExit(f"FATAL: daily delta manifest missing: {delta_manifest_path}")
+    previous = json.loads(manifest_path.read_text(encoding="utf-8"))
+    delta_manifest = json.loads(delta_manifest_path.read_text(encoding="utf-8"))
+    bucket_count = int(previous.get("bucket_count") or 0)
+    if bucket_count != int(args.bucket_count) or int(delta_manifest.get("bucket_count") or 0) != bucket_count:
+        raise SystemExit(
+            f"FATAL: bucket-count mismatch: state={bucket_count} delta={delta_manifest.get('bucket_count')} args={args.bucket_count}"
+        )
+    if int(args.tail_bars) != int(previous.get("tail_bars") or 0):
+        raise SystemExit(
+            f"FATAL: tail-bars {args.tail_bars} differs from the stored tail of {previous.get('tail_bars')} bars (re-run the backfill)"
+        )
+    if as_of < str(previous.get("as_of") or ""):
+        raise SystemExit(f"FATAL: roll-forward as-of {as_of} is before tail-state as-of {previous.get('as_of')}")
+
+    scope_ids = load_scope_ids(args.scope_file)
+    scoped = (previous.get("counts") or {}).get("scope_assets") is not None
+    existing_only = int(args.max_assets or 0) > 0 or int(previous.get("max_assets") or 0) > 0 or (scoped and scope_ids is None)
+
+    entries = {int(entry["bucket"]): dict(entry) for entry in previous.get("buckets") or []}
+    written: list[int] = []
+    unchanged: list[int] = []
+    delta_rows = 0
+    for delta_entry in sorted(delta_manifest.get("buckets") or [], key=lambda item: int(item["bucket"])):
+        if not int(delta_entry.get("rows") or 0):
+            continue
+        bucket_id = int(delta_entry["bucket"])
+        delta = read_delta_bucket(Path(delta_entry["path"]))
+        if scope_ids is not None:
+            delta = delta.filter(pl.col("asset_id").is_in(sorted(scope_ids)))
+        out_path = state_root / f"bucket={bucket_id:03d}.parquet"
+        tail = read_tail_bucket(out_path)
+        if existing_only:
+            delta = delta.join(tail.select("asset_id").unique(), on="asset_id", how="semi")
+        delta_rows += int(delta.height)
+        if delta.is_empty():
+            unchanged.append(bucket_id)
+            continue
+        out_df = (
+            pl.concat([tail, delta], how="vertical")
+            .unique(["asset_id", "date"], keep="last")
+            .sort(["asset_id", "date"])
+            .group_by("asset_id", maintain_order=True)
+            .tail(int(args.tail_bars))
+            .select(REQUIRED_OUTPUT_COLS)
+        )
+        if out_df.equals(tail):
+            unchanged.append(bucket_id)
+            continue
+        write_parquet_atomic(out_df, out_path, compression=args.compression, compression_level=int(args.compression_level))
+        entries[bucket_id] = {
+            **entries.get(bucket_id, {}),
+            "bucket": bucket_id,
+            "path": str(out_path),
+            "rows": int(out_df.height),
+            "assets": int(out_df.select("asset_id").unique().height) if out_df.height else 0,
+            "sha256": file_sha256(out_path),
+            "as_of": as_of,
+        }
+        written.append(bucket_id)
+        if rss_mb() > float(args.hard_rss_fail_mb):
+            raise SystemExit(f"FATAL: hard RSS budget exceeded during roll-forward: rss_mb={rss_mb()} limit_mb={args.hard_rss_fail_mb}")
+
+    bucket_entries = [entries[bucket_id] for bucket_id in sorted(entries)]
+    delta_sha256 = file_sha256(delta_manifest_path)
+    previous_hash = (previous.get("lineage") or {}).get("hash")
+    link = {
+        "as_of": as_of,
+        "mode": "roll_forward",
+        "source": str(delta_manifest_path),
+        "source_sha256": delta_sha256,
+        "previous_hash": previous_hash,
+        "hash": lineage_hash(previous_hash, as_of, delta_sha256, bucket_entries),
+        "buckets_written": written,
+    }
+    manifest = {
+        **previous,
+        "generated_at": utc_now_iso(),
+        "mode": "daily_roll_forward",
+        "as_of": as_of,
+        "counts": {
+            **(previous.get("counts") or {}),
+            "rows": sum(int(entry["rows"]) for entry in bucket_entries),
+            "assets": sum(int(entry["assets"]) for entry in bucket_entries),
+            "buckets": len(bucket_entries),
+        },
+        "buckets": bucket_entries,
+        "roll_forward": {
+            "delta_manifest": str(delta_manifest_path),
+            "delta_rows": delta_rows,
+            "scope_assets": len(scope_ids) if scope_ids is not None else None,
+            "existing_assets_only": existing_only,
+            "buckets_written": len(written),
+            "buckets_unchanged": len(unchanged),
+            "buckets_untouched": bucket_count - len(written) - len(unchanged),
+        },
+        "lineage": link,
+        "lineage_chain": append_lineage(previous, link),
+        "wall_sec": round(time.time() - started, 3),
+    }
+    atomic_write_json(manifest_path, manifest)
+    print(json.dumps({"ok": True, "manifest": str(manifest_path), "counts": manifest["counts"], "roll_forward": manifest["roll_forward"]}, sort_keys=True))
+    return 0
+
+
 def main(argv: Iterable[str] | None = None) -> int:
     args = parse_args(argv)
     started = time.time()
+    if args.roll_forward_delta_root:
+        return roll_forward(args, started)
+    if not args.history_root:
+        raise SystemExit("FATAL: --history-root is required unless --roll-forward-delta-root is set")
     history_root = Path(args.history_root).expanduser().resolve()
     output_root = Path(args.output_root).expanduser().resolve()
     state_root = output_root / "state" / "tail-bars"
     parts_root = output_root / "state" / ".tail-parts"
     manifest_path = output_root / "state" / "state_manifest.json"
+    bucket_index_path = Path(args.bucket_index).expanduser().resolve() if args.bucket_index else output_root / "state" / "bucket_index.parquet"
     if not history_root.exists():
         raise SystemExit(f"FATAL: history-root not found: {history_root}")
     if int(args.bucket_count) <= 0:
@@ -170,6 +353,7 @@ def main(argv: Iterable[str] | None = None) -> int:
     if not files:
         raise SystemExit(f"FATAL: no parquet files under history-root: {history_root}")
     scope_ids = load_scope_ids(args.scope_file)
+    bucket_index = BucketIndex.load(bucket_index_path, int(args.bucket_count))
     if parts_root.exists():
         shutil.rmtree(parts_root)
     parts_root.mkdir(parents=True, exist_ok=True)
@@ -212,11 +396,6 @@ def main(argv: Iterable[str] | None = None) -> int:
             .filter(pl.col("asset_id").is_not_null())
             .filter(pl.col("date").is_not_null())
             .filter(pl.col("date") <= pl.lit(str(args.as_of)[:10]).str.strptime(pl.Date))
-            .with_columns(
-                pl.col("asset_id")
-                .map_elements(lambda value: stable_bucket(value, int(args.bucket_count)), return_dtype=pl.Int64)
-                .alias("_bucket")
-            )
         )
         if scope_ids is not None:
             lf = lf.filter(pl.col("asset_id").is_in(sorted(scope_ids)))
@@ -231,7 +410,8 @@ def main(argv: Iterable[str] | None = None) -> int:
                 selected_assets.add(str(asset_id))
             batch_df = batch_df.filter(pl.col("asset_id").is_in(sorted(selected_assets)))
         batch_df = (
-            batch_df.sort(["_bucket", "asset_id", "date"])
+            bucket_index.assign(batch_df)
+            .sort(["_bucket", "asset_id", "date"])
             .group_by(["_bucket", "asset_id"], maintain_order=True)
             .tail(int(args.tail_bars))
         )
@@ -295,6 +475,7 @@ def main(argv: Iterable[str] | None = None) -> int:
         "history_root": str(history_root),
         "tail_bars": int(args.tail_bars),
         "bucket_count": int(args.bucket_count),
+        "max_assets": max_assets,
         "batch_files": int(args.batch_files),
         "batch_bytes_mb": int(args.batch_bytes_mb),
         "counts": {
@@ -307,8 +488,22 @@ def main(argv: Iterable[str] | None = None) -> int:
             "part_files": sum(part_counts.values()),
         },
         "buckets": bucket_entries,
+        "bucket_index": {"path": str(bucket_index_path), **bucket_index.stats()},
         "wall_sec": round(time.time() - started, 3),
     }
+    history_sha256 = hashlib.sha256("\n".join(str(p) for p in files).encode("utf-8")).hexdigest()
+    link = {
+        "as_of": str(args.as_of)[:10],
+        "mode": "backfill",
+        "source": str(history_root),
+        "source_sha256": history_sha256,
+        "previous_hash": None,
+        "hash": lineage_hash(None, str(args.as_of)[:10], history_sha256, bucket_entries),
+        "buckets_written": [int(entry["bucket"]) for entry in bucket_entries],
+    }
+    manifest["lineage"] = link
+    manifest["lineage_chain"] = [link]
+    bucket_index.save(bucket_index_path)
     atomic_write_json(manifest_path, manifest)
     shutil.rmtree(parts_root, ignore_errors=True)
     print(json.dumps({"ok": True, "manifest": str(manifest_path), "counts": manifest["counts"]}, sort_keys=True))
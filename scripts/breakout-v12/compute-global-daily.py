@@ -30,6 +30,7 @@ from scripts.breakout_compute.lib.breakout_math import (  # noqa: E402
 
 
 SCORE_VERSION = "breakout_scoring_v12_incremental_v1"
+CATALOG_SESSION = "catalog_as_of"
 STATUS_EXPLANATION = {
     "UNELIGIBLE": "Asset is excluded from scoring because liquidity or history checks failed.",
     "DATA_INSUFFICIENT": "Feature calculation could not produce enough usable bars.",
@@ -51,6 +52,12 @@ def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
     p.add_argument("--duckdb-temp-dir", default="")
     p.add_argument("--duckdb-memory-limit", default=os.environ.get("RV_BREAKOUT_DUCKDB_MEMORY_LIMIT", "2GB"))
     p.add_argument("--duckdb-threads", type=int, default=int(os.environ.get("DUCKDB_THREADS", "2") or "2"))
+    p.add_argument(
+        "--catalog-db",
+        default="",
+        help="Opt-in persistent DuckDB catalog: scoring joins its cached metadata copy; scored sessions are archived for ad-hoc queries",
+    )
+    p.add_argument("--catalog-window-sessions", type=int, default=252)
     p.add_argument("--max-top", type=int, default=500)
     p.add_argument("--max-shard", type=int, default=750)
     return p.parse_args(list(argv) if argv is not None else None)
@@ -125,8 +132,158 @@ def sql_quote(value: str) -> str:
     return "'" + str(value).replace("'", "''") + "'"
 
 
-def run_duckdb(args: argparse.Namespace, local_glob: str, scores_path: Path) -> dict[str, Any]:
-    con = duckdb.connect()
+def local_bucket_files(local_dir: Path) -> tuple[list[Path], Path | None]:
+    """Bucket files listed by compute-local's merged manifest, else a directory glob."""
+    manifest_path = local_dir / "local_manifest.json"
+    if not manifest_path.exists():
+        return sorted(local_dir.glob("bucket=*.parquet")), None
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    listed = {int(entry["bucket"]) for entry in manifest.get("buckets") or []}
+    uncovered = sorted(set(range(int(manifest.get("bucket_count") or 0))) - listed)
+    if uncovered:
+        raise SystemExit(f"FATAL: local manifest covers {len(listed)}/{manifest.get('bucket_count')} buckets; missing {uncovered[:10]}")
+    files = [Path(entry["local_path"]) for entry in sorted(manifest.get("buckets") or [], key=lambda entry: int(entry["bucket"]))]
+    missing = [str(path) for path in files if not path.exists()]
+    if missing:
+        raise SystemExit(f"FATAL: local manifest lists missing bucket files: {missing[:5]}")
+    return files, manifest_path
+
+
+def catalog_table_type(con: duckdb.DuckDBPyConnection, name: str) -> str | None:
+    row = con.execute(
+        "SELECT table_type FROM information_schema.tables WHERE table_catalog = current_database() AND table_schema = 'main' AND table_name = ?",
+        [name],
+    ).fetchone()
+    return str(row[0]) if row else None
+
+
+def catalog_has_table(con: duckdb.DuckDBPyConnection, name: str) -> bool:
+    return catalog_table_type(con, name) is not None
+
+
+def refresh_catalog_metadata(con: duckdb.DuckDBPyConnection, metadata_path: Path) -> bool:
+    """Copy the metadata parquet into meta_assets unless the same file was loaded already."""
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS catalog_sources (name VARCHAR PRIMARY KEY, path VARCHAR, size BIGINT, mtime_ns BIGINT, refreshed_at VARCHAR)"
+    )
+    stat = metadata_path.stat()
+    current = (str(metadata_path), int(stat.st_size), int(stat.st_mtime_ns))
+    row = con.execute("SELECT path, size, mtime_ns FROM catalog_sources WHERE name = 'metadata'").fetchone()
+    if row is not None and tuple(row) == current and catalog_has_table(con, "meta_assets"):
+        return False
+    con.execute("CREATE OR REPLACE TABLE meta_assets AS SELECT * FROM read_parquet(?)", [str(metadata_path)])
+    con.execute("INSERT OR REPLACE INTO catalog_sources VALUES ('metadata', ?, ?, ?, ?)", [*current, utc_now_iso()])
+    return True
+
+
+def migrate_scored_daily(con: duckdb.DuckDBPyConnection) -> list[str]:
+    """Create scored_daily or add the columns ``final`` gained; a changed column type is fatal."""
+    final_types = {row[0]: row[1] for row in con.execute("DESCRIBE final").fetchall()}
+    if not catalog_has_table(con, "scored_daily"):
+        con.execute(f"CREATE TABLE scored_daily AS SELECT *, CAST(NULL AS VARCHAR) AS {CATALOG_SESSION} FROM final LIMIT 0")
+        return []
+    stored = {row[0]: row[1] for row in con.execute("DESCRIBE scored_daily").fetchall()}
+    changed = sorted(name for name, dtype in final_types.items() if name in stored and stored[name] != dtype)
+    if changed:
+        raise SystemExit(
+            "FATAL: catalog scored_daily column types changed: "
+            + ", ".join(f"{name} {stored[name]}->{final_types[name]}" for name in changed[:5])
+            + " (migrate the catalog or point --catalog-db at a new file)"
+        )
+    added = [name for name in final_types if name not in stored]
+    for name in added:
+        con.execute(f'ALTER TABLE scored_daily ADD COLUMN "{name}" {final_types[name]}')
+    if CATALOG_SESSION not in stored:
+        con.execute(f"ALTER TABLE scored_daily ADD COLUMN {CATALOG_SESSION} VARCHAR")
+        con.execute(f"UPDATE scored_daily SET {CATALOG_SESSION} = left(CAST(as_of AS VARCHAR), 10)")
+    return added
+
+
+def update_catalog(con: duckdb.DuckDBPyConnection, as_of: str, window_sessions: int) -> dict[str, Any]:
+    """Archive the ``as_of`` session: replace it in scored_daily, the sector/regime aggregates and
+    asset_window_percentiles, then trim every table to the session window.
+
+    Scoring reads only the cached meta_assets back; ``final`` itself is computed from the day's
+    local files either way, so scores are identical with and without a catalog. All tables are keyed by the run's ``as_of``, so re-running a session
+    replaces it. Columns added to ``final`` are added to scored_daily (NULL for older sessions);
+    prior sessions are never dropped because the schema moved.
+    """
+    session = CATALOG_SESSION
+    added = migrate_scored_daily(con)
+    con.execute(f"DELETE FROM scored_daily WHERE {session} = ?", [as_of])
+    con.execute(f"INSERT INTO scored_daily BY NAME SELECT *, ? AS {session} FROM final", [as_of])
+    con.execute(
+        f"DELETE FROM scored_daily WHERE {session} NOT IN "
+        f"(SELECT s FROM (SELECT DISTINCT {session} AS s FROM scored_daily) ORDER BY s DESC LIMIT ?)",
+        [int(window_sessions)],
+    )
+
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sector_daily (
+          as_of VARCHAR, sector VARCHAR, assets BIGINT, sector_breadth_score DOUBLE, median_rvol20 DOUBLE, median_ret_63d DOUBLE
+        )
+        """
+    )
+    con.execute("CREATE TABLE IF NOT EXISTS regime_daily (as_of VARCHAR PRIMARY KEY, assets BIGINT, market_regime_score DOUBLE)")
+    con.execute("DELETE FROM sector_daily WHERE as_of = ?", [as_of])
+    con.execute(
+        """
+        INSERT INTO sector_daily
+        SELECT ?, sector, count(*), any_value(sector_breadth_score), median(rvol20), median(ret_63d)
+        FROM final GROUP BY sector
+        """,
+        [as_of],
+    )
+    con.execute("INSERT OR REPLACE INTO regime_daily SELECT ?, count(*), any_value(market_regime_score) FROM final", [as_of])
+    for table in ("sector_daily", "regime_daily"):
+        con.execute(
+            f"DELETE FROM {table} WHERE as_of NOT IN (SELECT s FROM (SELECT DISTINCT as_of AS s FROM {table}) ORDER BY s DESC LIMIT ?)",
+            [int(window_sessions)],
+        )
+
+    # Only the new session is ranked, against each asset's stored window (which now includes it);
+    # earlier sessions keep the percentiles they were archived with.
+    if catalog_table_type(con, "asset_window_percentiles") == "VIEW":
+        con.execute("DROP VIEW asset_window_percentiles")
+    con.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS asset_window_percentiles (
+          {session} VARCHAR, asset_id VARCHAR, window_sessions BIGINT,
+          rvol20_window_percentile DOUBLE, atr_pct_window_percentile DOUBLE, score_window_percentile DOUBLE
+        )
+        """
+    )
+    con.execute(f"DELETE FROM asset_window_percentiles WHERE {session} = ?", [as_of])
+    con.execute(
+        """
+        INSERT INTO asset_window_percentiles
+        SELECT
+          ?,
+          f.asset_id,
+          count(*),
+          CASE WHEN f.rvol20 IS NOT NULL THEN avg(CASE WHEN h.rvol20 <= f.rvol20 THEN 1.0 ELSE 0.0 END) FILTER (WHERE h.rvol20 IS NOT NULL) END,
+          CASE WHEN f.atr_pct_14 IS NOT NULL THEN avg(CASE WHEN h.atr_pct_14 <= f.atr_pct_14 THEN 1.0 ELSE 0.0 END) FILTER (WHERE h.atr_pct_14 IS NOT NULL) END,
+          CASE WHEN f.final_signal_score IS NOT NULL THEN avg(CASE WHEN h.final_signal_score <= f.final_signal_score THEN 1.0 ELSE 0.0 END) FILTER (WHERE h.final_signal_score IS NOT NULL) END
+        FROM final f
+        JOIN scored_daily h ON h.asset_id = f.asset_id
+        GROUP BY f.asset_id, f.rvol20, f.atr_pct_14, f.final_signal_score
+        """,
+        [as_of],
+    )
+    con.execute(
+        f"DELETE FROM asset_window_percentiles WHERE {session} NOT IN "
+        f"(SELECT s FROM (SELECT DISTINCT {session} AS s FROM scored_daily))"
+    )
+    sessions, rows = con.execute(f"SELECT count(DISTINCT {session}), count(*) FROM scored_daily").fetchone()
+    return {"sessions": int(sessions or 0), "scored_rows": int(rows or 0), "columns_added": added}
+
+
+def run_duckdb(args: argparse.Namespace, local_files: list[Path], scores_path: Path) -> dict[str, Any]:
+    catalog_path = Path(args.catalog_db).resolve() if args.catalog_db else None
+    if catalog_path:
+        catalog_path.parent.mkdir(parents=True, exist_ok=True)
+    con = duckdb.connect(str(catalog_path)) if catalog_path else duckdb.connect()
     con.execute(f"PRAGMA threads={int(args.duckdb_threads)}")
     con.execute(f"PRAGMA memory_limit='{str(args.duckdb_memory_limit)}'")
     if args.duckdb_temp_dir:
@@ -143,8 +300,13 @@ def run_duckdb(args: argparse.Namespace, local_glob: str, scores_path: Path) ->
       'unknown' AS sector_raw,
       l.asset_class AS asset_class_meta
     """
+    metadata_refreshed = None
+    if has_meta and catalog_path:
+        metadata_refreshed = refresh_catalog_metadata(con, metadata_path)
+        con.execute("CREATE TEMP VIEW meta AS SELECT * FROM main.meta_assets")
+    elif has_meta:
+        con.execute(f"CREATE TEMP VIEW meta AS SELECT * FROM read_parquet({sql_quote(str(metadata_path))})")
     if has_meta:
-        con.execute("CREATE TEMP VIEW meta AS SELECT * FROM read_parquet(?)", [str(metadata_path)])
         meta_join = "LEFT JOIN meta m ON l.asset_id = m.asset_id"
         meta_select = """
           COALESCE(CAST(m.symbol AS VARCHAR), regexp_replace(l.asset_id, '^.*:', '')) AS symbol,
@@ -154,7 +316,8 @@ def run_duckdb(args: argparse.Namespace, local_glob: str, scores_path: Path) ->
           COALESCE(CAST(m.asset_class AS VARCHAR), l.asset_class) AS asset_class_meta
         """
 
-    con.execute(f"CREATE TEMP VIEW local AS SELECT * FROM read_parquet({sql_quote(local_glob)})")
+    local_list = "[" + ", ".join(sql_quote(str(path)) for path in local_files) + "]"
+    con.execute(f"CREATE TEMP VIEW local AS SELECT * FROM read_parquet({local_list})")
     sql = f"""
     CREATE TEMP VIEW enriched AS
       SELECT
@@ -251,8 +414,8 @@ def run_duckdb(args: argparse.Namespace, local_glob: str, scores_path: Path) ->
     con.execute(sql)
     scores_path.parent.mkdir(parents=True, exist_ok=True)
     con.execute(
-        f"""
-        COPY (
+        """
+        CREATE TEMP TABLE final AS
           SELECT
             *,
             LEAST(1.0, GREATEST(0.0,
@@ -266,13 +429,23 @@ def run_duckdb(args: argparse.Namespace, local_glob: str, scores_path: Path) ->
               ) * regime_multiplier
             )) AS final_signal_score
           FROM scored
-          ORDER BY final_signal_score DESC, asset_id
-        ) TO '{str(scores_path)}' (FORMAT PARQUET, COMPRESSION ZSTD)
         """
     )
-    counts = con.execute("SELECT count(*) AS rows, count(DISTINCT asset_id) AS assets FROM scored").fetchone()
+    con.execute(f"COPY (SELECT * FROM final ORDER BY final_signal_score DESC, asset_id) TO '{str(scores_path)}' (FORMAT PARQUET, COMPRESSION ZSTD)")
+    counts = con.execute("SELECT count(*) AS rows, count(DISTINCT asset_id) AS assets FROM final").fetchone()
+    result = {"rows": int(counts[0] or 0), "assets": int(counts[1] or 0), "metadata_joined": has_meta}
+    if catalog_path:
+        con.execute("BEGIN TRANSACTION")
+        try:
+            catalog = update_catalog(con, str(args.as_of)[:10], int(args.catalog_window_sessions))
+        except BaseException:
+            con.execute("ROLLBACK")
+            con.close()
+            raise
+        con.execute("COMMIT")
+        result["catalog"] = {"path": str(catalog_path), "metadata_refreshed": metadata_refreshed, **catalog}
     con.close()
-    return {"rows": int(counts[0] or 0), "assets": int(counts[1] or 0), "metadata_joined": has_meta}
+    return result
 
 
 def build_item(row: dict[str, Any], rank: int, total: int) -> dict[str, Any]:
@@ -455,11 +628,11 @@ def main(argv: Iterable[str] | None = None) -> int:
     started = time.time()
     candidate_root = Path(args.candidate_root).resolve()
     local_glob = str(candidate_root / "local" / f"date={str(args.as_of)[:10]}" / "bucket=*.parquet")
-    local_files = sorted((candidate_root / "local" / f"date={str(args.as_of)[:10]}").glob("bucket=*.parquet"))
+    local_files, local_manifest_path = local_bucket_files(candidate_root / "local" / f"date={str(args.as_of)[:10]}")
     if not local_files:
         raise SystemExit(f"FATAL: no local bucket files: {local_glob}")
     scores_path = candidate_root / "global" / f"date={str(args.as_of)[:10]}" / "scores.parquet"
-    counts = run_duckdb(args, local_glob, scores_path)
+    counts = run_duckdb(args, local_files, scores_path)
     write_public_json(args, scores_path, counts)
     metadata = {
         "schema_version": "breakout_v12_global_metadata_v1",
@@ -467,6 +640,8 @@ def main(argv: Iterable[str] | None = None) -> int:
         "as_of": str(args.as_of)[:10],
         "score_version": SCORE_VERSION,
         "local_glob": local_glob,
+        "local_manifest": str(local_manifest_path) if local_manifest_path else None,
+        "local_files": len(local_files),
         "scores_path": str(scores_path),
         "scores_sha256": file_sha256(scores_path),
         "counts": counts,
@@ -4,30 +4,35 @@ from __future__ import annotations
 import argparse
 import hashlib
 import json
+import multiprocessing
 import os
 import resource
 import sys
 import time
 import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
 from pathlib import Path
-from typing import Iterable, Any
+from typing import Callable, Iterable, Any
 
+import numpy as np
 import polars as pl
 
 REPO_ROOT = Path(__file__).resolve().parents[2]
 if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
-from scripts.breakout_compute.lib.breakout_math import (  # noqa: E402
-    absorption_vol_ratio,
-    cluster_support_zone,
-    clv_series,
-    cmf_series,
-    count_failed_lows,
-    detect_pivots,
-    obv_higher_low,
-    safe_div,
-    trend_slope,
+from scripts.breakout_compute.lib.breakout_math_batch import (  # noqa: E402
+    absorption_vol_ratio_batch,
+    cluster_support_zone_batch,
+    clv_series_batch,
+    cmf_series_batch,
+    count_failed_lows_batch,
+    detect_pivots_batch,
+    obv_higher_low_batch,
+    pack_rows,
+    seq_sum,
+    support_zone_record,
+    trend_slope_batch,
 )
 
 
@@ -43,6 +48,13 @@ def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
     p.add_argument("--bucket-count", type=int, default=128)
     p.add_argument("--tail-bars", type=int, default=300)
     p.add_argument("--bucket", type=int, default=-1, help="Optional single bucket")
+    p.add_argument("--workers", type=int, default=int(os.environ.get("RV_BREAKOUT_LOCAL_WORKERS", "1") or "1"), help="Buckets processed in parallel")
+    p.add_argument(
+        "--max-rss-mb",
+        type=float,
+        default=float(os.environ.get("RV_BREAKOUT_LOCAL_MAX_RSS_MB", os.environ.get("RV_BREAKOUT_HARD_RSS_FAIL_MB", "5000")) or "5000"),
+        help="RSS budget across parallel bucket workers",
+    )
     p.add_argument("--compression", default="zstd")
     p.add_argument("--compression-level", type=int, default=3)
     return p.parse_args(list(argv) if argv is not None else None)
@@ -188,8 +200,12 @@ def empty_features_schema() -> dict[str, pl.DataType]:
     }
 
 
-def compute_history_features(data: pl.DataFrame, *, tail_bars: int) -> pl.DataFrame:
-    schema = {
+HISTORY_MIN_BARS = 60
+HISTORY_BAR_COLS = ("open_raw", "high_raw", "low_raw", "close_raw", "volume_raw")
+
+
+def history_features_schema() -> dict[str, pl.DataType]:
+    return {
         "asset_id": pl.Utf8,
         "history_bars_used": pl.Int64,
         "atr_pct_est_history": pl.Float64,
@@ -207,97 +223,112 @@ def compute_history_features(data: pl.DataFrame, *, tail_bars: int) -> pl.DataFr
         "obv_higher_low": pl.Boolean,
         "up_down_volume_ratio_20": pl.Float64,
     }
-    if data.is_empty():
-        return pl.DataFrame(schema=schema)
 
-    rows: list[dict[str, Any]] = []
-    history_df = data.sort(["asset_id", "date"]).group_by("asset_id", maintain_order=True).tail(tail_bars)
-    for asset_id, group_df in history_df.group_by("asset_id", maintain_order=True):
-        aid = asset_id[0] if isinstance(asset_id, tuple) else asset_id
-        opens = group_df["open_raw"].to_list()
-        highs = group_df["high_raw"].to_list()
-        lows = group_df["low_raw"].to_list()
-        closes = group_df["close_raw"].to_list()
-        volumes = group_df["volume_raw"].to_list()
-        n = len(closes)
-        if n < 60:
-            rows.append({
-                "asset_id": str(aid),
-                "history_bars_used": n,
-                "atr_pct_est_history": None,
-                "support_zone_detected": False,
-                "support_zone_center": None,
-                "support_zone_low": None,
-                "support_zone_high": None,
-                "support_zone_width_pct": None,
-                "support_test_count": 0,
-                "base_age_bars": 0,
-                "failed_low_count": 0,
-                "absorption_vol_ratio": None,
-                "clv_trend_20": None,
-                "cmf_recent_20": None,
-                "obv_higher_low": False,
-                "up_down_volume_ratio_20": None,
-            })
-            continue
-
-        pivot_high, pivot_low = detect_pivots(highs, lows, left=3, right=3)
-        recent_close = closes[-14:]
-        recent_high = highs[-14:]
-        recent_low = lows[-14:]
-        trs: list[float] = []
-        for i in range(1, len(recent_close)):
-            h = recent_high[i] if recent_high[i] is not None else recent_close[i]
-            l = recent_low[i] if recent_low[i] is not None else recent_close[i]
-            pc = recent_close[i - 1]
-            if h is None or l is None or pc is None:
-                continue
-            trs.append(max(float(h) - float(l), abs(float(h) - float(pc)), abs(float(l) - float(pc))))
-        close_window = [float(c) for c in closes[-20:] if c is not None]
-        mean_close = sum(close_window) / max(1, len(close_window))
-        atr_pct_est = safe_div(sum(trs) / max(1, len(trs)), mean_close, 0.02)
-
-        zone = cluster_support_zone(pivot_low, atr_pct=atr_pct_est, lookback=min(120, n))
-        failed_low_count = count_failed_lows(lows, closes, pivot_low, lookback=80)
-        clv = clv_series(highs, lows, closes)
-        cmf = cmf_series(highs, lows, closes, volumes, window=20)
-
-        up_v = 0.0
-        down_v = 0.0
-        for i in range(max(0, n - 20), n):
-            o = opens[i]
-            c = closes[i]
-            v = volumes[i]
-            if o is None or c is None or v is None:
-                continue
-            if float(c) >= float(o):
-                up_v += float(v)
-            else:
-                down_v += float(v)
 
+def batch_history_rows(aids: list[str], mats: dict[str, np.ndarray], bars: np.ndarray) -> list[dict[str, Any]]:
+    """History feature rows for many assets over right-aligned NaN-padded matrices (NaN = missing bar value)."""
+    full = np.flatnonzero(bars >= HISTORY_MIN_BARS)
+    opens, highs, lows, closes, volumes = (mats[col][full] for col in HISTORY_BAR_COLS)
+    lengths = bars[full]
+    _, pivot_low = detect_pivots_batch(highs, lows, left=3, right=3, lengths=lengths)
+
+    rc, rh, rl = closes[:, -14:], highs[:, -14:], lows[:, -14:]
+    h = np.where(np.isnan(rh), rc, rh)[:, 1:]
+    l = np.where(np.isnan(rl), rc, rl)[:, 1:]
+    pc = rc[:, :-1]
+    tr_ok = ~np.isnan(h) & ~np.isnan(l) & ~np.isnan(pc)
+    trs = np.where(tr_ok, np.maximum(np.maximum(h - l, np.abs(h - pc)), np.abs(l - pc)), 0.0)
+    mean_tr = seq_sum(trs) / np.maximum(1, tr_ok.sum(axis=1))
+    c20 = closes[:, -20:]
+    mean_close = seq_sum(np.nan_to_num(c20, nan=0.0)) / np.maximum(1, (~np.isnan(c20)).sum(axis=1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        atr_pct = np.where(np.isfinite(mean_close) & (mean_close != 0), mean_tr / mean_close, 0.02)
+
+    o20, v20 = opens[:, -20:], volumes[:, -20:]
+    ok20 = ~np.isnan(o20) & ~np.isnan(c20) & ~np.isnan(v20)
+    up_v = seq_sum(np.where(ok20 & (c20 >= o20), v20, 0.0))
+    down_v = seq_sum(np.where(ok20 & (c20 < o20), v20, 0.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        up_down = np.where(down_v != 0, up_v / down_v, 1.0)
+
+    zone = cluster_support_zone_batch(pivot_low, atr_pct, lookback=np.minimum(120, lengths), lengths=lengths)
+    failed = count_failed_lows_batch(lows, closes, pivot_low, lookback=80)
+    absorption = absorption_vol_ratio_batch(opens, closes, volumes, window=40)
+    clv_trend = trend_slope_batch(clv_series_batch(highs, lows, closes, lengths=lengths), lookback=20)
+    cmf = cmf_series_batch(highs[:, -20:], lows[:, -20:], c20, v20, window=20)
+    obv_hl = obv_higher_low_batch(closes, volumes, lookback=60, lengths=lengths)
+
+    rows = [
+        {
+            "asset_id": str(aid),
+            "history_bars_used": int(n),
+            "atr_pct_est_history": None,
+            "support_zone_detected": False,
+            "support_zone_center": None,
+            "support_zone_low": None,
+            "support_zone_high": None,
+            "support_zone_width_pct": None,
+            "support_test_count": 0,
+            "base_age_bars": 0,
+            "failed_low_count": 0,
+            "absorption_vol_ratio": None,
+            "clv_trend_20": None,
+            "cmf_recent_20": None,
+            "obv_higher_low": False,
+            "up_down_volume_ratio_20": None,
+        }
+        for aid, n in zip(aids, bars.tolist())
+    ]
+    for k, g in enumerate(full.tolist()):
+        n = int(lengths[k])
+        rec = support_zone_record(zone, k)
         base_age = 0
-        if zone.get("detected"):
-            first_test = int(zone.get("first_test_index") or 0)
+        if rec.get("detected"):
+            first_test = int(rec.get("first_test_index") or 0)
             base_age = max(0, n - 1 - first_test)
+        rows[g].update(
+            {
+                "atr_pct_est_history": float(atr_pct[k]),
+                "support_zone_detected": bool(rec.get("detected", False)),
+                "support_zone_center": float(rec.get("center")) if rec.get("center") is not None else None,
+                "support_zone_low": float(rec.get("low")) if rec.get("low") is not None else None,
+                "support_zone_high": float(rec.get("high")) if rec.get("high") is not None else None,
+                "support_zone_width_pct": float(rec.get("width_pct") or 0.0),
+                "support_test_count": int(rec.get("test_count") or 0),
+                "base_age_bars": int(base_age),
+                "failed_low_count": int(failed[k]),
+                "absorption_vol_ratio": float(absorption[k]),
+                "clv_trend_20": float(clv_trend[k]),
+                "cmf_recent_20": float(cmf[k, -1]),
+                "obv_higher_low": bool(obv_hl[k]),
+                "up_down_volume_ratio_20": float(up_down[k]),
+            }
+        )
+    return rows
 
-        rows.append({
-            "asset_id": str(aid),
-            "history_bars_used": n,
-            "atr_pct_est_history": float(atr_pct_est),
-            "support_zone_detected": bool(zone.get("detected", False)),
-            "support_zone_center": float(zone.get("center")) if zone.get("center") is not None else None,
-            "support_zone_low": float(zone.get("low")) if zone.get("low") is not None else None,
-            "support_zone_high": float(zone.get("high")) if zone.get("high") is not None else None,
-            "support_zone_width_pct": float(zone.get("width_pct") or 0.0),
-            "support_test_count": int(zone.get("test_count") or 0),
-            "base_age_bars": int(base_age),
-            "failed_low_count": int(failed_low_count),
-            "absorption_vol_ratio": float(absorption_vol_ratio(opens, closes, volumes, window=40)),
-            "clv_trend_20": float(trend_slope(clv, lookback=20)),
-            "cmf_recent_20": float(cmf[-1] if cmf else 0.0),
-            "obv_higher_low": bool(obv_higher_low(closes, volumes, lookback=60)),
-            "up_down_volume_ratio_20": float(safe_div(up_v, down_v, 1.0)),
-        })
+
+def compute_history_features(data: pl.DataFrame, *, tail_bars: int) -> pl.DataFrame:
+    schema = history_features_schema()
+    if data.is_empty():
+        return pl.DataFrame(schema=schema)
+
+    # NaN/inf bar values count as missing, exactly like nulls.
+    history_df = (
+        data.sort(["asset_id", "date"])
+        .group_by("asset_id", maintain_order=True)
+        .tail(tail_bars)
+        .with_columns(
+            [
+                pl.when(pl.col(col).cast(pl.Float64).is_finite()).then(pl.col(col).cast(pl.Float64)).alias(col)
+                for col in HISTORY_BAR_COLS
+            ]
+        )
+    )
+    groups = history_df.group_by("asset_id", maintain_order=True).agg(pl.len().alias("n"))
+    aids = [str(v) for v in groups["asset_id"].to_list()]
+    bars = groups["n"].to_numpy().astype(np.int64)
+    mats = {col: pack_rows(history_df[col].to_numpy(), bars) for col in HISTORY_BAR_COLS}
+    rows = batch_history_rows(aids, mats, bars)
     return pl.DataFrame(rows, schema=schema) if rows else pl.DataFrame(schema=schema)
 
 
@@ -382,69 +413,151 @@ def bucket_delta_path(root: Path, as_of: str, bucket_id: int) -> Path:
     return root / f"bucket={bucket_id:03d}.parquet"
 
 
+def compute_bucket(
+    bucket_id: int,
+    *,
+    as_of: str,
+    candidate_root: str,
+    last_good_root: str,
+    daily_delta_root: str,
+    tail_bars: int,
+    compression: str,
+    compression_level: int,
+) -> dict[str, Any]:
+    started = time.time()
+    tail_path = Path(last_good_root) / "state" / "tail-bars" / f"bucket={bucket_id:03d}.parquet"
+    delta_path = bucket_delta_path(Path(daily_delta_root), as_of, bucket_id)
+    local_path = Path(candidate_root) / "local" / f"date={as_of}" / f"bucket={bucket_id:03d}.parquet"
+    next_tail_path = Path(candidate_root) / "state" / "tail-bars" / f"bucket={bucket_id:03d}.parquet"
+    if not tail_path.exists():
+        raise SystemExit(f"FATAL: tail bucket missing: {tail_path}")
+    if not delta_path.exists():
+        raise SystemExit(f"FATAL: delta bucket missing: {delta_path}")
+    tail = normalize(pl.read_parquet(tail_path))
+    delta = normalize(pl.read_parquet(delta_path))
+    data = pl.concat([tail, delta], how="vertical_relaxed").unique(["asset_id", "date"], keep="last").sort(["asset_id", "date"])
+    features = compute_features(data, as_of=as_of, bucket_id=bucket_id, tail_bars=tail_bars)
+    next_tail = data.group_by("asset_id", maintain_order=True).tail(tail_bars).sort(["asset_id", "date"])
+
+    write_parquet_atomic(features, local_path, compression=compression, compression_level=compression_level)
+    write_parquet_atomic(next_tail.select(BAR_COLS), next_tail_path, compression=compression, compression_level=compression_level)
+    success_path = local_path.with_suffix("._SUCCESS")
+    success_path.write_text("ok\n", encoding="utf-8")
+    return {
+        "bucket": bucket_id,
+        "tail_path": str(tail_path),
+        "delta_path": str(delta_path),
+        "local_path": str(local_path),
+        "next_tail_path": str(next_tail_path),
+        "rows_in": int(data.height),
+        "rows_out": int(features.height),
+        "tail_rows_out": int(next_tail.height),
+        "asset_count": int(data.select("asset_id").unique().height) if not data.is_empty() else 0,
+        "local_sha256": file_sha256(local_path),
+        "tail_sha256": file_sha256(next_tail_path),
+        "status": "ok",
+        "wall_sec": round(time.time() - started, 3),
+        "peak_rss_mb": rss_mb(),
+        "pid": os.getpid(),
+    }
+
+
+def run_buckets(
+    bucket_ids: list[int],
+    job: dict[str, Any],
+    *,
+    workers: int,
+    max_rss_mb: float,
+    on_entry: Callable[[dict[str, Any]], None],
+) -> dict[str, Any]:
+    """Run compute_bucket over a spawn-based process pool.
+
+    Buckets run one at a time until a worker has reported its peak RSS; after that
+    the number in flight is capped so the parent's RSS plus in-flight x worker peak
+    stays under max_rss_mb.
+    """
+    if workers <= 1 or len(bucket_ids) <= 1:
+        for bucket_id in bucket_ids:
+            on_entry(compute_bucket(bucket_id, **job))
+        return {"workers": 1, "max_in_flight": 1 if bucket_ids else 0, "worker_peak_rss_mb": rss_mb()}
+    pending = list(bucket_ids)
+    running: dict[Future, int] = {}
+    worker_peak = 0.0
+    max_in_flight = 0
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        try:
+            while pending or running:
+                budget = max_rss_mb - rss_mb()
+                limit = 1 if worker_peak <= 0 else max(1, min(workers, int(budget // worker_peak)))
+                while pending and len(running) < limit:
+                    bucket_id = pending.pop(0)
+                    running[pool.submit(compute_bucket, bucket_id, **job)] = bucket_id
+                max_in_flight = max(max_in_flight, len(running))
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    running.pop(future)
+                    entry = future.result()
+                    worker_peak = max(worker_peak, float(entry["peak_rss_mb"]))
+                    on_entry(entry)
+        except BaseException:
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+    return {"workers": workers, "max_in_flight": max_in_flight, "worker_peak_rss_mb": worker_peak}
+
+
 def main(argv: Iterable[str] | None = None) -> int:
     args = parse_args(argv)
+    as_of = str(args.as_of)[:10]
     candidate_root = Path(args.candidate_root).resolve()
-    last_good_root = Path(args.last_good_root).resolve()
-    daily_delta_root = Path(args.daily_delta_root).resolve()
     resources_path = candidate_root / "resources.ndjson"
     local_manifest_entries: list[dict[str, Any]] = []
     bucket_ids = [int(args.bucket)] if int(args.bucket) >= 0 else list(range(int(args.bucket_count)))
+    job = {
+        "as_of": as_of,
+        "candidate_root": str(candidate_root),
+        "last_good_root": str(Path(args.last_good_root).resolve()),
+        "daily_delta_root": str(Path(args.daily_delta_root).resolve()),
+        "tail_bars": int(args.tail_bars),
+        "compression": args.compression,
+        "compression_level": int(args.compression_level),
+    }
 
-    for bucket_id in bucket_ids:
-        started = time.time()
-        tail_path = last_good_root / "state" / "tail-bars" / f"bucket={bucket_id:03d}.parquet"
-        delta_path = bucket_delta_path(daily_delta_root, str(args.as_of)[:10], bucket_id)
-        local_path = candidate_root / "local" / f"date={str(args.as_of)[:10]}" / f"bucket={bucket_id:03d}.parquet"
-        next_tail_path = candidate_root / "state" / "tail-bars" / f"bucket={bucket_id:03d}.parquet"
-        if not tail_path.exists():
-            raise SystemExit(f"FATAL: tail bucket missing: {tail_path}")
-        if not delta_path.exists():
-            raise SystemExit(f"FATAL: delta bucket missing: {delta_path}")
-        tail = normalize(pl.read_parquet(tail_path))
-        delta = normalize(pl.read_parquet(delta_path))
-        data = pl.concat([tail, delta], how="vertical_relaxed").unique(["asset_id", "date"], keep="last").sort(["asset_id", "date"])
-        features = compute_features(data, as_of=str(args.as_of)[:10], bucket_id=bucket_id, tail_bars=int(args.tail_bars))
-        next_tail = data.group_by("asset_id", maintain_order=True).tail(int(args.tail_bars)).sort(["asset_id", "date"])
-
-        write_parquet_atomic(features, local_path, compression=args.compression, compression_level=int(args.compression_level))
-        write_parquet_atomic(next_tail.select(BAR_COLS), next_tail_path, compression=args.compression, compression_level=int(args.compression_level))
-        success_path = local_path.with_suffix("._SUCCESS")
-        success_path.write_text("ok\n", encoding="utf-8")
-        entry = {
-            "bucket": bucket_id,
-            "tail_path": str(tail_path),
-            "delta_path": str(delta_path),
-            "local_path": str(local_path),
-            "next_tail_path": str(next_tail_path),
-            "rows_in": int(data.height),
-            "rows_out": int(features.height),
-            "tail_rows_out": int(next_tail.height),
-            "asset_count": int(data.select("asset_id").unique().height) if not data.is_empty() else 0,
-            "local_sha256": file_sha256(local_path),
-            "tail_sha256": file_sha256(next_tail_path),
-            "status": "ok",
-            "wall_sec": round(time.time() - started, 3),
-            "peak_rss_mb": rss_mb(),
-        }
+    def on_entry(entry: dict[str, Any]) -> None:
         local_manifest_entries.append(entry)
         append_ndjson(resources_path, {"step": "local", **entry})
 
+    pool_stats = run_buckets(
+        bucket_ids,
+        job,
+        workers=max(1, int(args.workers)),
+        max_rss_mb=float(args.max_rss_mb),
+        on_entry=on_entry,
+    )
+    manifest_path = candidate_root / "local" / f"date={as_of}" / "local_manifest.json"
+    if int(args.bucket) >= 0 and manifest_path.exists():
+        # A single-bucket run updates its entry; the other buckets of the same layout stay listed.
+        previous = json.loads(manifest_path.read_text(encoding="utf-8"))
+        if (previous.get("bucket_count"), previous.get("tail_bars")) == (int(args.bucket_count), int(args.tail_bars)):
+            done = {int(entry["bucket"]) for entry in local_manifest_entries}
+            local_manifest_entries.extend(entry for entry in previous.get("buckets") or [] if int(entry["bucket"]) not in done)
+    local_manifest_entries.sort(key=lambda entry: int(entry["bucket"]))
+
     manifest = {
         "schema": "breakout_v12_local_manifest_v1",
         "generated_at": utc_now_iso(),
-        "as_of": str(args.as_of)[:10],
+        "as_of": as_of,
         "bucket_count": int(args.bucket_count),
         "tail_bars": int(args.tail_bars),
         "buckets": local_manifest_entries,
+        "pool": {**pool_stats, "max_rss_mb": float(args.max_rss_mb)},
         "counts": {
             "buckets": len(local_manifest_entries),
             "rows_out": sum(int(x["rows_out"]) for x in local_manifest_entries),
             "tail_rows_out": sum(int(x["tail_rows_out"]) for x in local_manifest_entries),
         },
     }
-    write_json_atomic(candidate_root / "local" / f"date={str(args.as_of)[:10]}" / "local_manifest.json", manifest)
-    print(json.dumps({"ok": True, "manifest": str(candidate_root / "local" / f"date={str(args.as_of)[:10]}" / "local_manifest.json"), "counts": manifest["counts"]}, sort_keys=True))
+    write_json_atomic(manifest_path, manifest)
+    print(json.dumps({"ok": True, "manifest": str(manifest_path), "counts": manifest["counts"]}, sort_keys=True))
     return 0
 
 
@@ -6,6 +6,7 @@ import hashlib
 import json
 import os
 import shutil
+import sys
 import time
 import uuid
 from pathlib import Path
@@ -14,6 +15,11 @@ from typing import Iterable, Any
 import polars as pl
 import pyarrow.parquet as pq
 
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.breakout_compute.lib.asset_buckets import BucketIndex  # noqa: E402
 
 BAR_COLS = ["asset_id", "date", "asset_class", "open_raw", "high_raw", "low_raw", "close_raw", "volume_raw"]
 SOURCE_CANDIDATES = {
@@ -36,6 +42,11 @@ def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
     p.add_argument("--raw-ingest-root", default="")
     p.add_argument("--output-root", required=True, help="Breakout daily-delta root; writes date=YYYY-MM-DD/bucket=NNN.parquet")
     p.add_argument("--bucket-count", type=int, default=128)
+    p.add_argument(
+        "--bucket-index",
+        default=os.environ.get("RV_BREAKOUT_BUCKET_INDEX", ""),
+        help="Optional asset_id -> bucket parquet index (e.g. <tail-root>/state/bucket_index.parquet); new assets are added",
+    )
     p.add_argument("--compression", default="zstd")
     p.add_argument("--compression-level", type=int, default=3)
     p.add_argument("--batch-files", type=int, default=512)
@@ -48,11 +59,6 @@ def utc_now_iso() -> str:
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
 
 
-def stable_bucket(asset_id: Any, bucket_count: int) -> int:
-    h = hashlib.sha256(str(asset_id or "").encode("utf-8")).digest()
-    return int.from_bytes(h[:8], "big") % int(bucket_count)
-
-
 def read_json(path: Path) -> dict[str, Any]:
     return json.loads(path.read_text(encoding="utf-8"))
 
@@ -226,19 +232,12 @@ def main(argv: Iterable[str] | None = None) -> int:
     frames: list[pl.DataFrame] = []
     part_counts: dict[int, int] = {}
     total_rows = 0
+    bucket_index_path = Path(args.bucket_index).expanduser().resolve() if args.bucket_index else None
+    bucket_index = BucketIndex.load(bucket_index_path, int(args.bucket_count)) if bucket_index_path else BucketIndex(int(args.bucket_count))
     for idx, file in enumerate(files):
         df = read_delta_file(file).filter(pl.col("date") == str(args.as_of)[:10])
         if not df.is_empty():
-            frames.append(
-                df.with_columns(
-                    [
-                        pl.col("asset_id")
-                        .map_elements(lambda value: stable_bucket(value, int(args.bucket_count)), return_dtype=pl.Int64)
-                        .alias("_bucket"),
-                        pl.lit(idx, dtype=pl.Int64).alias("_source_order"),
-                    ]
-                )
-            )
+            frames.append(bucket_index.assign(df).with_columns(pl.lit(idx, dtype=pl.Int64).alias("_source_order")))
         if len(frames) >= max(1, int(args.batch_files)):
             total_rows += flush_parts(
                 frames,
@@ -273,6 +272,8 @@ def main(argv: Iterable[str] | None = None) -> int:
         out_path = output_date_root / f"bucket={bucket:03d}.parquet"
         write_parquet_atomic(out_df, out_path, compression=args.compression, compression_level=int(args.compression_level))
         buckets.append({"bucket": bucket, "path": str(out_path), "rows": int(out_df.height), "sha256": file_sha256(out_path)})
+    if bucket_index_path is not None and bucket_index.hashed:
+        bucket_index.save(bucket_index_path)
     try:
         shutil.rmtree(parts_root)
         parent = parts_root.parent
@@ -289,6 +290,7 @@ def main(argv: Iterable[str] | None = None) -> int:
         "bucket_count": int(args.bucket_count),
         "counts": {"source_files": len(files), "rows": int(total_rows), "buckets": len(buckets)},
         "buckets": buckets,
+        "bucket_index": {"path": str(bucket_index_path) if bucket_index_path else None, **bucket_index.stats()},
         "wall_sec": round(time.time() - started, 3),
     }
     atomic_write_json(output_date_root / "daily_delta_manifest.json", summary)
@@ -11,6 +11,7 @@ from datetime import date
 from pathlib import Path
 from typing import Any, Iterable
 
+import numpy as np
 import polars as pl
 
 REPO_ROOT = Path(__file__).resolve().parents[2]
@@ -29,6 +30,19 @@ from scripts.breakout_compute.lib.breakout_math import (  # noqa: E402
     safe_div,
     trend_slope,
 )
+from scripts.breakout_compute.lib.breakout_math_batch import (  # noqa: E402
+    absorption_vol_ratio_batch,
+    cluster_support_zone_batch,
+    clv_series_batch,
+    cmf_series_batch,
+    count_failed_lows_batch,
+    detect_pivots_batch,
+    obv_higher_low_batch,
+    pack_rows,
+    seq_sum,
+    support_zone_record,
+    trend_slope_batch,
+)
 from scripts.quantlab.q1_common import (  # noqa: E402
     DEFAULT_QUANT_ROOT,
     atomic_write_json,
@@ -207,13 +221,175 @@ def _load_snapshot(manifest: dict[str, Any]) -> tuple[Path, dict[str, Any], str,
     return quant_root, snap_manifest, str(snap_manifest.get("snapshot_id") or snap_dir.name), asof_date, bars_root, universe_path
 
 
+BARS_COLUMN_CANDIDATES = {
+    "asset_id": ["asset_id", "canonical_id"],
+    "date": ["date", "trading_date", "asof_date"],
+    "open_raw": ["open_raw", "open"],
+    "high_raw": ["high_raw", "high"],
+    "low_raw": ["low_raw", "low"],
+    "close_raw": ["close_raw", "close", "adj_close"],
+    "volume_raw": ["volume_raw", "volume"],
+    "asset_class": ["asset_class", "asset_type", "type"],
+}
+BARS_FILE_INDEX_SCHEMA = "rv_breakout_bars_file_index_v1"
+BARS_OUTPUT_SCHEMA = {
+    "asset_id": pl.Utf8,
+    "bar_asset_class": pl.Utf8,
+    "date": pl.Date,
+    "open_raw": pl.Float64,
+    "high_raw": pl.Float64,
+    "low_raw": pl.Float64,
+    "close_raw": pl.Float64,
+    "volume_raw": pl.Float64,
+}
+
+
+def _bars_physical_columns(bars_paths: list[str]) -> dict[str, str]:
+    first_schema = pl.scan_parquet(bars_paths[0], hive_partitioning=True).collect_schema()
+    cols = set(first_schema.names())
+    missing = [name for name, candidates in BARS_COLUMN_CANDIDATES.items() if not _first_existing(cols, candidates)]
+    if missing:
+        raise SystemExit(f"FATAL: bars parquet missing required columns: {missing}")
+    return {name: str(_first_existing(cols, candidates)) for name, candidates in BARS_COLUMN_CANDIDATES.items()}
+
+
+def _parsed_date_expr(physical: dict[str, str]) -> pl.Expr:
+    return pl.col(physical["date"]).cast(pl.Utf8, strict=False).str.strptime(pl.Date, strict=False)
+
+
+def _normalize_bars(lf: pl.LazyFrame, physical: dict[str, str], keep: list[str] | None = None) -> pl.LazyFrame:
+    return (
+        lf.with_columns(
+            [
+                pl.col(physical["asset_id"]).cast(pl.Utf8, strict=False).alias("asset_id"),
+                pl.col(physical["asset_class"]).cast(pl.Utf8, strict=False).str.to_lowercase().alias("bar_asset_class"),
+                _parsed_date_expr(physical).alias("date"),
+                pl.col(physical["open_raw"]).cast(pl.Float64, strict=False).alias("open_raw"),
+                pl.col(physical["high_raw"]).cast(pl.Float64, strict=False).alias("high_raw"),
+                pl.col(physical["low_raw"]).cast(pl.Float64, strict=False).alias("low_raw"),
+                pl.col(physical["close_raw"]).cast(pl.Float64, strict=False).alias("close_raw"),
+                pl.col(physical["volume_raw"]).cast(pl.Float64, strict=False).alias("volume_raw"),
+            ]
+        )
+        .select([*BARS_OUTPUT_SCHEMA, *(keep or [])])
+    )
+
+
+def _file_stat_key(path: str) -> tuple[int, int] | None:
+    try:
+        stat = Path(path).stat()
+    except OSError:
+        return None
+    return int(stat.st_size), int(stat.st_mtime_ns)
+
+
+def _describe_bars_file(path: str, physical: dict[str, str], *, with_contents: bool) -> dict[str, Any]:
+    """Footer dtypes of the physical bar columns; with_contents adds asset ids and the date range."""
+    entry: dict[str, Any] = {"dtypes": None}
+    try:
+        schema = pl.read_parquet_schema(path)
+    except Exception:
+        return entry
+    if not all(col in schema for col in physical.values()):
+        return entry
+    entry["dtypes"] = {col: str(schema[col]) for col in sorted(set(physical.values()))}
+    if with_contents:
+        try:
+            summary = (
+                pl.scan_parquet(path, hive_partitioning=False)
+                .select(
+                    pl.col(physical["asset_id"]).cast(pl.Utf8, strict=False).drop_nulls().unique().sort().implode().alias("assets"),
+                    _parsed_date_expr(physical).min().alias("min_date"),
+                    _parsed_date_expr(physical).max().alias("max_date"),
+                )
+                .collect()
+                .row(0, named=True)
+            )
+        except Exception:
+            entry["dtypes"] = None
+            return entry
+        entry["assets"] = [str(v) for v in summary["assets"]]
+        entry["min_date"] = summary["min_date"].isoformat() if summary["min_date"] else None
+        entry["max_date"] = summary["max_date"].isoformat() if summary["max_date"] else None
+    return entry
+
+
+def _bars_file_catalog(bars_root: Path, *, index_path: Path | None = None) -> dict[str, Any]:
+    """Resolved bar files plus per-file footer dtypes (and, with an index, asset sets and date ranges).
+
+    The optional index is a JSON sidecar keyed by file path + size + mtime. Each file's asset set is
+    stored once under its content hash (the pack files of consecutive ingest dates share them).
+    Only new or changed files are opened to refresh it.
+    """
+    bars_paths = _resolve_bars_paths(bars_root)
+    physical = _bars_physical_columns(bars_paths)
+    files: list[dict[str, Any]] = []
+    asset_sets: dict[str, list[str]] = {}
+    if index_path is None:
+        for path in bars_paths:
+            files.append({"path": path, **_describe_bars_file(path, physical, with_contents=False)})
+        return {"paths": bars_paths, "physical": physical, "files": files, "asset_sets": None, "index_path": None}
+
+    index: dict[str, Any] = {}
+    if index_path.exists():
+        try:
+            index = read_json(index_path)
+        except (OSError, ValueError):
+            index = {}
+    if index.get("schema") != BARS_FILE_INDEX_SCHEMA or index.get("physical") != physical:
+        index = {}
+    known = index.get("files") or {}
+    known_sets = index.get("asset_sets") or {}
+    refreshed = 0
+    for path in bars_paths:
+        stat_key = _file_stat_key(path)
+        cached = known.get(path)
+        if cached and stat_key and [cached.get("size"), cached.get("mtime_ns")] == list(stat_key) and (
+            cached.get("dtypes") is None or cached.get("asset_set") in known_sets
+        ):
+            entry = dict(cached)
+        else:
+            described = _describe_bars_file(path, physical, with_contents=True)
+            entry = {"dtypes": described["dtypes"]}
+            if stat_key:
+                entry["size"], entry["mtime_ns"] = stat_key
+            if described["dtypes"] is not None:
+                assets = described["assets"]
+                set_key = stable_hash_obj(assets)[:24]
+                known_sets[set_key] = assets
+                entry.update(asset_set=set_key, min_date=described["min_date"], max_date=described["max_date"])
+            refreshed += 1
+        if entry.get("dtypes") is not None:
+            asset_sets[entry["asset_set"]] = known_sets[entry["asset_set"]]
+        files.append({"path": path, **entry})
+    if refreshed or set(known) != set(bars_paths):
+        atomic_write_json(
+            index_path,
+            {
+                "schema": BARS_FILE_INDEX_SCHEMA,
+                "generated_at": utc_now_iso(),
+                "bars_root": str(bars_root),
+                "physical": physical,
+                "files": {f["path"]: {k: v for k, v in f.items() if k != "path"} for f in files},
+                "asset_sets": asset_sets,
+            },
+        )
+    return {"paths": bars_paths, "physical": physical, "files": files, "asset_sets": asset_sets, "index_path": str(index_path)}
+
+
 def _load_filtered_bars_df(
     *,
     bars_root: Path,
     universe_df: pl.DataFrame,
     asof_date: date,
     feature_config: dict[str, Any],
+    bars_catalog: dict[str, Any] | None = None,
 ) -> tuple[pl.DataFrame, list[str], str]:
+    """Scoped bars in [as_of - lookback, as_of] from every bar file in one streaming scan.
+
+    Files sharing a footer schema are scanned together with asset/date predicates pushed down
+    to row-group statistics; duplicate (asset_id, date) rows keep the one from the last file.
+    """
     input_cfg = feature_config.get("input") or {}
     lookback_days = int(input_cfg.get("lookback_calendar_days") or 520)
     history_bars = int(input_cfg.get("history_pattern_bars") or 300)
@@ -221,84 +397,60 @@ def _load_filtered_bars_df(
     load_days = max(lookback_days, history_days)
     start_date = date.fromordinal(asof_date.toordinal() - load_days).isoformat()
     asof_s = asof_date.isoformat()
-    bars_paths = _resolve_bars_paths(bars_root)
-    first_schema = pl.scan_parquet(bars_paths[0], hive_partitioning=True).collect_schema()
-    cols = set(first_schema.names())
-    required = {
-        "asset_id": ["asset_id", "canonical_id"],
-        "date": ["date", "trading_date", "asof_date"],
-        "open_raw": ["open_raw", "open"],
-        "high_raw": ["high_raw", "high"],
-        "low_raw": ["low_raw", "low"],
-        "close_raw": ["close_raw", "close", "adj_close"],
-        "volume_raw": ["volume_raw", "volume"],
-        "asset_class": ["asset_class", "asset_type", "type"],
-    }
-    missing = [name for name, candidates in required.items() if not _first_existing(cols, candidates)]
-    if missing:
-        raise SystemExit(f"FATAL: bars parquet missing required columns: {missing}")
+    catalog = bars_catalog if bars_catalog is not None else _bars_file_catalog(bars_root)
+    bars_paths = catalog["paths"]
+    physical = catalog["physical"]
 
     asset_ids = universe_df["asset_id"].to_list()
-    physical_cols = sorted({col for candidates in required.values() for col in [_first_existing(cols, candidates)] if col})
-    parts: list[pl.DataFrame] = []
-    compacted_parts: list[pl.DataFrame] = []
+    scoped = set(asset_ids)
+    asset_sets = catalog.get("asset_sets")
+    set_hits: dict[str, bool] = {}
+    groups: dict[str, list[tuple[int, str]]] = {}
+    group_dtypes: dict[str, dict[str, str]] = {}
+    for ordinal, entry in enumerate(catalog["files"]):
+        dtypes = entry.get("dtypes")
+        if dtypes is None:
+            continue
+        if asset_sets is not None:
+            if not entry.get("max_date") or entry["max_date"] < start_date or str(entry.get("min_date")) > asof_s:
+                continue
+            set_key = entry["asset_set"]
+            if set_key not in set_hits:
+                set_hits[set_key] = not scoped.isdisjoint(asset_sets[set_key])
+            if not set_hits[set_key]:
+                continue
+        signature = json.dumps(dtypes, sort_keys=True)
+        groups.setdefault(signature, []).append((ordinal, entry["path"]))
+        group_dtypes[signature] = dtypes
+
     start_lit = pl.lit(start_date).str.strptime(pl.Date)
     asof_lit = pl.lit(asof_s).str.strptime(pl.Date)
-    for file_path in bars_paths:
-        try:
-            raw = pl.read_parquet(file_path, columns=physical_cols)
-        except Exception:
-            continue
-        file_cols = set(raw.columns)
-        part = (
-            raw.lazy()
-            .with_columns(
-            [
-                    _expr(file_cols, required["asset_id"], "asset_id", pl.Utf8),
-                    _expr(file_cols, required["asset_class"], "bar_asset_class", pl.Utf8),
-                    _expr(file_cols, required["date"], "date_raw", pl.Utf8),
-                    _expr(file_cols, required["open_raw"], "open_raw", pl.Float64),
-                    _expr(file_cols, required["high_raw"], "high_raw", pl.Float64),
-                    _expr(file_cols, required["low_raw"], "low_raw", pl.Float64),
-                    _expr(file_cols, required["close_raw"], "close_raw", pl.Float64),
-                    _expr(file_cols, required["volume_raw"], "volume_raw", pl.Float64),
-            ]
-        )
-            .with_columns(
-            [
-                pl.col("bar_asset_class").str.to_lowercase(),
-                pl.col("date_raw").str.strptime(pl.Date, strict=False).alias("date"),
-            ]
-        )
-            .select(["asset_id", "bar_asset_class", "date", "open_raw", "high_raw", "low_raw", "close_raw", "volume_raw"])
+    frames: list[pl.LazyFrame] = []
+    for signature, members in groups.items():
+        dtypes = group_dtypes[signature]
+        ordinals = {path: ordinal for ordinal, path in members}
+        lf = pl.scan_parquet([path for _, path in members], hive_partitioning=False, include_file_paths="_bars_file")
+        # Pushdown on the physical columns when no cast is involved (row-group statistics skip the rest).
+        if dtypes[physical["asset_id"]] == "String":
+            lf = lf.filter(pl.col(physical["asset_id"]).is_in(asset_ids))
+        if dtypes[physical["date"]] == "Date":
+            lf = lf.filter(pl.col(physical["date"]).is_between(start_lit, asof_lit))
+        lf = lf.with_columns(pl.col("_bars_file").replace_strict(ordinals, return_dtype=pl.Int64).alias("_bars_file_ord"))
+        frames.append(
+            _normalize_bars(lf, physical, keep=["_bars_file_ord"])
             .filter(pl.col("asset_id").is_in(asset_ids))
             .filter(pl.col("date") >= start_lit)
             .filter(pl.col("date") <= asof_lit)
-            .collect(engine="streaming")
         )
-        if not part.is_empty():
-            parts.append(part)
-            if len(parts) >= 256:
-                compacted_parts.append(pl.concat(parts, how="diagonal_relaxed"))
-                parts.clear()
-                gc.collect()
-        del raw
-        del part
-    all_parts = compacted_parts + parts
-    bars_df = pl.concat(all_parts, how="diagonal_relaxed") if all_parts else pl.DataFrame(
-        schema={
-            "asset_id": pl.Utf8,
-            "bar_asset_class": pl.Utf8,
-            "date": pl.Date,
-            "open_raw": pl.Float64,
-            "high_raw": pl.Float64,
-            "low_raw": pl.Float64,
-            "close_raw": pl.Float64,
-            "volume_raw": pl.Float64,
-        }
-    )
+    if not frames:
+        return pl.DataFrame(schema=BARS_OUTPUT_SCHEMA), bars_paths, start_date
+    bars_df = pl.concat(frames, how="vertical").collect(engine="streaming")
     if not bars_df.is_empty():
-        bars_df = bars_df.unique(["asset_id", "date"], keep="last").sort(["asset_id", "date"])
+        bars_df = (
+            bars_df.sort(["asset_id", "date", "_bars_file_ord"], maintain_order=True)
+            .unique(["asset_id", "date"], keep="last", maintain_order=True)
+        )
+    bars_df = bars_df.drop("_bars_file_ord")
     return bars_df, bars_paths, start_date
 
 
@@ -441,6 +593,201 @@ def _add_cross_sectional_features(feature_df: pl.DataFrame, asof_date: date, fea
     )
 
 
+HISTORY_MIN_BARS = 60
+HISTORY_KERNEL_CHUNK_ASSETS = int(os.environ.get("RV_BREAKOUT_HISTORY_CHUNK_ASSETS", "4096") or "4096")
+HISTORY_BAR_COLUMNS = ("open_raw", "high_raw", "low_raw", "close_raw", "volume_raw")
+
+
+def _history_feature_row(
+    asset_id: str,
+    opens: list[Any],
+    highs: list[Any],
+    lows: list[Any],
+    closes: list[Any],
+    volumes: list[Any],
+) -> dict[str, Any]:
+    """Scalar reference for one asset's history features (also the path for non-finite bars)."""
+    n = len(closes)
+    if n < HISTORY_MIN_BARS:
+        return {
+            "asset_id": str(asset_id),
+            "history_bars_used": n,
+            "support_zone_detected": False,
+        }
+
+    # Pivots (3/3 causal).
+    pivot_high, pivot_low = detect_pivots(highs, lows, left=3, right=3)
+
+    # ATR pct estimate (rough): mean true range / mean close over last 14.
+    recent_atr_window = closes[-14:]
+    recent_high = highs[-14:]
+    recent_low = lows[-14:]
+    trs: list[float] = []
+    for i in range(1, len(recent_atr_window)):
+        h = recent_high[i] or recent_atr_window[i] or 0.0
+        l = recent_low[i] or recent_atr_window[i] or 0.0
+        pc = recent_atr_window[i - 1] or 0.0
+        tr = max(h - l, abs(h - pc), abs(l - pc)) if all(v is not None for v in (h, l, pc)) else 0.0
+        trs.append(tr)
+    mean_close = sum(c for c in closes[-20:] if c is not None) / max(1, sum(1 for c in closes[-20:] if c is not None))
+    atr_pct_est = safe_div(sum(trs) / max(1, len(trs)), mean_close, 0.02)
+
+    # Support zone.
+    zone = cluster_support_zone(pivot_low, atr_pct=atr_pct_est, lookback=min(120, n))
+
+    # Failed-low count over base.
+    failed_low_count = count_failed_lows(lows, closes, pivot_low, lookback=80)
+
+    # Absorption volume ratio.
+    abs_ratio = absorption_vol_ratio(opens, closes, volumes, window=40)
+
+    # CLV trend over last 20 bars (slope).
+    clv = clv_series(highs, lows, closes)
+    clv_trend = trend_slope(clv, lookback=20)
+
+    # CMF recent (latest value).
+    cmf = cmf_series(highs, lows, closes, volumes, window=20)
+    cmf_recent = cmf[-1] if cmf else 0.0
+
+    # OBV higher-low flag.
+    obv_hl = obv_higher_low(closes, volumes, lookback=60)
+
+    # Up/Down-Volume ratio (last 20 bars).
+    up_v = 0.0
+    down_v = 0.0
+    for i in range(max(0, n - 20), n):
+        o = opens[i]
+        c = closes[i]
+        v = volumes[i]
+        if o is None or c is None or v is None:
+            continue
+        if c >= o:
+            up_v += float(v)
+        else:
+            down_v += float(v)
+    up_down_ratio = safe_div(up_v, down_v, 1.0)
+
+    return _history_feature_record(
+        asset_id,
+        n,
+        atr_pct_est=atr_pct_est,
+        zone=zone,
+        failed_low_count=failed_low_count,
+        abs_ratio=abs_ratio,
+        clv_trend=clv_trend,
+        cmf_recent=cmf_recent,
+        obv_hl=obv_hl,
+        up_down_ratio=up_down_ratio,
+    )
+
+
+def _history_feature_record(
+    asset_id: str,
+    n: int,
+    *,
+    atr_pct_est: float,
+    zone: dict[str, Any],
+    failed_low_count: int,
+    abs_ratio: float,
+    clv_trend: float,
+    cmf_recent: float,
+    obv_hl: bool,
+    up_down_ratio: float,
+) -> dict[str, Any]:
+    # Base age in bars (counting bars since first support test).
+    base_age = 0
+    if zone.get("detected"):
+        first_test = int(zone.get("first_test_index") or 0)
+        base_age = max(0, n - 1 - first_test)
+
+    return {
+        "asset_id": str(asset_id),
+        "history_bars_used": n,
+        "atr_pct_est_history": float(atr_pct_est),
+        "support_zone_detected": bool(zone.get("detected", False)),
+        "support_zone_center": float(zone.get("center")) if zone.get("center") is not None else None,
+        "support_zone_low": float(zone.get("low")) if zone.get("low") is not None else None,
+        "support_zone_high": float(zone.get("high")) if zone.get("high") is not None else None,
+        "support_zone_width_pct": float(zone.get("width_pct") or 0.0),
+        "support_test_count": int(zone.get("test_count") or 0),
+        "base_age_bars": int(base_age),
+        "failed_low_count": int(failed_low_count),
+        "absorption_vol_ratio": float(abs_ratio),
+        "clv_trend_20": float(clv_trend),
+        "cmf_recent_20": float(cmf_recent),
+        "obv_higher_low": bool(obv_hl),
+        "up_down_volume_ratio_20": float(up_down_ratio),
+    }
+
+
+def _history_feature_kernel(
+    opens: np.ndarray,
+    highs: np.ndarray,
+    lows: np.ndarray,
+    closes: np.ndarray,
+    volumes: np.ndarray,
+    bars: np.ndarray,
+) -> dict[str, Any]:
+    """Batched twin of _history_feature_row over right-aligned (assets x bars) matrices.
+
+    NaN marks a missing value or left padding; every asset has at least HISTORY_MIN_BARS bars
+    and only finite values, so the breakout_math_batch results equal the scalar path exactly.
+    """
+    _, pivot_low = detect_pivots_batch(highs, lows, left=3, right=3, lengths=bars)
+
+    # ATR pct estimate: `x or fallback` treats both missing and 0.0 as falsy.
+    rc, rh, rl = closes[:, -14:], highs[:, -14:], lows[:, -14:]
+    rc_or0 = np.where(np.isnan(rc) | (rc == 0), 0.0, rc)
+    h_eff = np.where(np.isnan(rh) | (rh == 0), rc_or0, rh)[:, 1:]
+    l_eff = np.where(np.isnan(rl) | (rl == 0), rc_or0, rl)[:, 1:]
+    prev_c = rc_or0[:, :-1]
+    trs = np.maximum(np.maximum(h_eff - l_eff, np.abs(h_eff - prev_c)), np.abs(l_eff - prev_c))
+    mean_tr = seq_sum(trs) / max(1, trs.shape[1])
+    c20 = closes[:, -20:]
+    mean_close = seq_sum(np.nan_to_num(c20, nan=0.0)) / np.maximum(1, (~np.isnan(c20)).sum(axis=1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        atr_pct = np.where(np.isfinite(mean_close) & (mean_close != 0), mean_tr / mean_close, 0.02)
+
+    # Up/down volume over the last 20 bars.
+    o20, c20, v20 = opens[:, -20:], closes[:, -20:], volumes[:, -20:]
+    ok20 = ~np.isnan(o20) & ~np.isnan(c20) & ~np.isnan(v20)
+    up_v = seq_sum(np.where(ok20 & (c20 >= o20), v20, 0.0))
+    down_v = seq_sum(np.where(ok20 & (c20 < o20), v20, 0.0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        up_down = np.where(down_v != 0, up_v / down_v, 1.0)
+
+    # Only the latest CMF value is used, so the series is evaluated over the last window only.
+    cmf = cmf_series_batch(highs[:, -20:], lows[:, -20:], closes[:, -20:], volumes[:, -20:], window=20)
+    return {
+        "atr_pct_est_history": atr_pct,
+        "zone": cluster_support_zone_batch(pivot_low, atr_pct, lookback=np.minimum(120, bars), lengths=bars),
+        "failed_low_count": count_failed_lows_batch(lows, closes, pivot_low, lookback=80),
+        "absorption_vol_ratio": absorption_vol_ratio_batch(opens, closes, volumes, window=40),
+        "clv_trend_20": trend_slope_batch(clv_series_batch(highs, lows, closes, lengths=bars), lookback=20),
+        "cmf_recent_20": cmf[:, -1],
+        "obv_higher_low": obv_higher_low_batch(closes, volumes, lookback=60, lengths=bars),
+        "up_down_volume_ratio_20": up_down,
+    }
+
+
+def _kernel_rows(asset_ids: list[str], bars: np.ndarray, out: dict[str, Any]) -> list[dict[str, Any]]:
+    return [
+        _history_feature_record(
+            aid,
+            int(bars[k]),
+            atr_pct_est=float(out["atr_pct_est_history"][k]),
+            zone=support_zone_record(out["zone"], k),
+            failed_low_count=int(out["failed_low_count"][k]),
+            abs_ratio=float(out["absorption_vol_ratio"][k]),
+            clv_trend=float(out["clv_trend_20"][k]),
+            cmf_recent=float(out["cmf_recent_20"][k]),
+            obv_hl=bool(out["obv_higher_low"][k]),
+            up_down_ratio=float(out["up_down_volume_ratio_20"][k]),
+        )
+        for k, aid in enumerate(asset_ids)
+    ]
+
+
 def _compute_history_features(
     *,
     bars_df: pl.DataFrame,
@@ -450,6 +797,8 @@ def _compute_history_features(
     """History-based features per asset (pivots, support zone, failed lows,
     absorption ratio, CLV trend, CMF, OBV higher-low, up/down volume ratio).
 
+    Assets are evaluated in chunks by _history_feature_kernel over contiguous
+    per-asset arrays; assets with NaN/inf bars go through _history_feature_row.
     Returns one row per asset with the new feature columns. Joins onto feature_df by asset_id.
     """
     if not asset_ids or bars_df.is_empty():
@@ -461,104 +810,56 @@ def _compute_history_features(
         .sort(["asset_id", "date"])
         .group_by("asset_id", maintain_order=True)
         .tail(history_bars)
+        .select(["asset_id", *HISTORY_BAR_COLUMNS])
         .collect(engine="streaming")
     )
     if history_df.is_empty():
         return pl.DataFrame(schema={"asset_id": pl.Utf8})
 
-    out_rows: list[dict[str, Any]] = []
-    for asset_id, group_df in history_df.group_by("asset_id", maintain_order=True):
-        aid = asset_id[0] if isinstance(asset_id, tuple) else asset_id
-        opens = group_df["open_raw"].to_list()
-        highs = group_df["high_raw"].to_list()
-        lows = group_df["low_raw"].to_list()
-        closes = group_df["close_raw"].to_list()
-        volumes = group_df["volume_raw"].to_list()
-        n = len(closes)
-        if n < 60:
-            out_rows.append({
-                "asset_id": str(aid),
-                "history_bars_used": n,
-                "support_zone_detected": False,
-            })
-            continue
+    non_finite = pl.any_horizontal(
+        [(pl.col(col).is_nan() | pl.col(col).is_infinite()).fill_null(False) for col in HISTORY_BAR_COLUMNS]
+    )
+    groups = history_df.group_by("asset_id", maintain_order=True).agg(
+        pl.len().alias("n"),
+        non_finite.any().alias("non_finite"),
+    )
+    group_ids = [str(v) for v in groups["asset_id"].to_list()]
+    group_n = groups["n"].to_numpy().astype(np.int64)
+    group_non_finite = groups["non_finite"].to_numpy()
+    offsets = np.concatenate([[0], np.cumsum(group_n)])
+    values = {col: history_df[col].cast(pl.Float64).to_numpy() for col in HISTORY_BAR_COLUMNS}
 
-        # Pivots (3/3 causal).
-        pivot_high, pivot_low = detect_pivots(highs, lows, left=3, right=3)
-
-        # ATR pct estimate (rough): mean true range / mean close over last 14.
-        recent_atr_window = closes[-14:]
-        recent_high = highs[-14:]
-        recent_low = lows[-14:]
-        trs: list[float] = []
-        for i in range(1, len(recent_atr_window)):
-            h = recent_high[i] or recent_atr_window[i] or 0.0
-            l = recent_low[i] or recent_atr_window[i] or 0.0
-            pc = recent_atr_window[i - 1] or 0.0
-            tr = max(h - l, abs(h - pc), abs(l - pc)) if all(v is not None for v in (h, l, pc)) else 0.0
-            trs.append(tr)
-        mean_close = sum(c for c in closes[-20:] if c is not None) / max(1, sum(1 for c in closes[-20:] if c is not None))
-        atr_pct_est = safe_div(sum(trs) / max(1, len(trs)), mean_close, 0.02)
-
-        # Support zone.
-        zone = cluster_support_zone(pivot_low, atr_pct=atr_pct_est, lookback=min(120, n))
-
-        # Failed-low count over base.
-        failed_low_count = count_failed_lows(lows, closes, pivot_low, lookback=80)
-
-        # Absorption volume ratio.
-        abs_ratio = absorption_vol_ratio(opens, closes, volumes, window=40)
-
-        # CLV trend over last 20 bars (slope).
-        clv = clv_series(highs, lows, closes)
-        clv_trend = trend_slope(clv, lookback=20)
-
-        # CMF recent (latest value).
-        cmf = cmf_series(highs, lows, closes, volumes, window=20)
-        cmf_recent = cmf[-1] if cmf else 0.0
-
-        # OBV higher-low flag.
-        obv_hl = obv_higher_low(closes, volumes, lookback=60)
-
-        # Up/Down-Volume ratio (last 20 bars).
-        up_v = 0.0
-        down_v = 0.0
-        for i in range(max(0, n - 20), n):
-            o = opens[i]
-            c = closes[i]
-            v = volumes[i]
-            if o is None or c is None or v is None:
+    out_rows: list[dict[str, Any]] = []
+    chunk = max(1, HISTORY_KERNEL_CHUNK_ASSETS)
+    for chunk_start in range(0, len(group_ids), chunk):
+        members = range(chunk_start, min(len(group_ids), chunk_start + chunk))
+        kernel_members = [g for g in members if group_n[g] >= HISTORY_MIN_BARS and not group_non_finite[g]]
+        kernel_rows: dict[int, dict[str, Any]] = {}
+        if kernel_members:
+            bars = group_n[kernel_members]
+            within = np.arange(int(bars.sum())) - np.repeat(np.cumsum(bars) - bars, bars)
+            src = np.repeat(offsets[kernel_members], bars) + within
+            mats = {col: pack_rows(values[col][src], bars) for col in HISTORY_BAR_COLUMNS}
+            result = _history_feature_kernel(
+                mats["open_raw"], mats["high_raw"], mats["low_raw"], mats["close_raw"], mats["volume_raw"], bars
+            )
+            for g, row in zip(kernel_members, _kernel_rows([group_ids[g] for g in kernel_members], bars, result)):
+                kernel_rows[g] = row
+        for g in members:
+            if g in kernel_rows:
+                out_rows.append(kernel_rows[g])
                 continue
-            if c >= o:
-                up_v += float(v)
-            else:
-                down_v += float(v)
-        up_down_ratio = safe_div(up_v, down_v, 1.0)
-
-        # Base age in bars (counting bars since first support test).
-        base_age = 0
-        if zone.get("detected"):
-            first_test = int(zone.get("first_test_index") or 0)
-            base_age = max(0, n - 1 - first_test)
-
-        out_rows.append({
-            "asset_id": str(aid),
-            "history_bars_used": n,
-            "atr_pct_est_history": float(atr_pct_est),
-            "support_zone_detected": bool(zone.get("detected", False)),
-            "support_zone_center": float(zone.get("center")) if zone.get("center") is not None else None,
-            "support_zone_low": float(zone.get("low")) if zone.get("low") is not None else None,
-            "support_zone_high": float(zone.get("high")) if zone.get("high") is not None else None,
-            "support_zone_width_pct": float(zone.get("width_pct") or 0.0),
-            "support_test_count": int(zone.get("test_count") or 0),
-            "base_age_bars": int(base_age),
-            "failed_low_count": int(failed_low_count),
-            "absorption_vol_ratio": float(abs_ratio),
-            "clv_trend_20": float(clv_trend),
-            "cmf_recent_20": float(cmf_recent),
-            "obv_higher_low": bool(obv_hl),
-            "up_down_volume_ratio_20": float(up_down_ratio),
-        })
+            part = history_df.slice(int(offsets[g]), int(group_n[g]))
+            out_rows.append(
+                _history_feature_row(
+                    group_ids[g],
+                    part["open_raw"].to_list(),
+                    part["high_raw"].to_list(),
+                    part["low_raw"].to_list(),
+                    part["close_raw"].to_list(),
+                    part["volume_raw"].to_list(),
+                )
+            )
 
     return pl.DataFrame(out_rows) if out_rows else pl.DataFrame(schema={"asset_id": pl.Utf8})
 
@@ -684,6 +985,14 @@ def main(argv: Iterable[str]) -> int:
     bars_cutoff = ""
     bars_rows_loaded = 0
     history_bars = int(input_cfg.get("history_pattern_bars") or 300)
+    index_flag = os.environ.get("RV_BREAKOUT_ASSET_FILE_INDEX")
+    use_file_index = (index_flag.strip().lower() in {"1", "true", "yes"}) if index_flag else bool(input_cfg.get("asset_file_index"))
+    bars_file_index_path = (
+        quant_root / "breakout" / "state" / "bars_file_index" / f"{stable_hash_obj(str(bars_root))[:16]}.json"
+        if use_file_index
+        else None
+    )
+    bars_catalog = _bars_file_catalog(bars_root, index_path=bars_file_index_path)
 
     for offset in range(0, universe_df.height, chunk_size):
         universe_chunk = universe_df.slice(offset, chunk_size)
@@ -692,6 +1001,7 @@ def main(argv: Iterable[str]) -> int:
             universe_df=universe_chunk,
             asof_date=asof_date,
             feature_config=feature_config,
+            bars_catalog=bars_catalog,
         )
         if not bars_paths:
             bars_paths = chunk_bars_paths
@@ -773,6 +1083,7 @@ def main(argv: Iterable[str]) -> int:
         "sources": {
             "quant_root": str(quant_root),
             "bars_root": str(bars_root),
+            "bars_file_index": bars_catalog["index_path"],
             "bars_cutoff": bars_cutoff,
             "scope_file": str(scope_file) if scope_file else None,
             "universe_parquet": str(universe_path),
@@ -9,6 +9,7 @@ from datetime import timedelta
 from pathlib import Path
 from typing import Any, Iterable
 
+import numpy as np
 import polars as pl
 
 REPO_ROOT = Path(__file__).resolve().parents[2]
@@ -16,9 +17,13 @@ if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
 from scripts.breakout_compute.lib.breakout_math import first_touch_outcome  # noqa: E402
+from scripts.breakout_compute.lib.breakout_math_batch import FIRST_TOUCH_OUTCOMES, first_touch_outcome_horizons_batch, pack_rows  # noqa: E402
 from scripts.quantlab.q1_common import DEFAULT_QUANT_ROOT, atomic_write_json, latest_materialized_snapshot_dir, parse_iso_date, read_json, utc_now_iso  # noqa: E402
 
 
+FORWARD_BAR_COLS = ["open_raw", "high_raw", "low_raw", "close_raw"]
+
+
 def parse_args(argv: Iterable[str]) -> argparse.Namespace:
     p = argparse.ArgumentParser()
     p.add_argument("--input-manifest", required=True)
@@ -94,6 +99,128 @@ def _bars_root(manifest: dict[str, Any], quant_root: Path) -> Path:
     return bars
 
 
+def _rounded(values: np.ndarray, missing: np.ndarray) -> pl.Series:
+    # Python round() per value: np.round scales by 1e6 and can land one ulp off.
+    return pl.Series([None if miss else round(v, 6) for v, miss in zip(values.tolist(), missing.tolist())], dtype=pl.Float64)
+
+
+def evaluate_outcome_frames(
+    signals: pl.DataFrame,
+    bars: pl.DataFrame,
+    *,
+    signal_date: str,
+    horizons: list[int],
+    target_atr: float,
+    stop_atr: float,
+    gap_threshold: float,
+) -> dict[int, pl.DataFrame]:
+    """Outcome frames per horizon for normalized signals and their forward bars (sorted by asset/date).
+
+    Signals are joined to (assets x max_horizon) forward-bar matrices and every horizon is read
+    off one pass of running extremes; only assets with NaN/inf bars go through the scalar
+    first_touch_outcome.
+    """
+    if not horizons:
+        return {}
+    max_horizon = max(horizons)
+    width = max(max_horizon, 0)
+    forward = bars.with_columns(pl.int_range(pl.len()).over("asset_id").alias("_bar")).filter(pl.col("_bar") < max_horizon)
+    forward_n = forward.group_by("asset_id", maintain_order=True).agg(
+        pl.len().alias("n"),
+        pl.col("open_raw").first().alias("first_open"),
+        pl.any_horizontal([(pl.col(c).is_nan() | pl.col(c).is_infinite()).fill_null(False) for c in FORWARD_BAR_COLS]).any().alias("non_finite"),
+    )
+    # The extra all-NaN row stands in for signals without bars.
+    asset_n = np.append(forward_n["n"].to_numpy().astype(np.int64), 0)
+    asset_mats = {
+        col: np.vstack([pack_rows(forward[col].to_numpy(), asset_n[:-1], width=width, align="left"), np.full((1, width), np.nan)])
+        for col in FORWARD_BAR_COLS
+    }
+
+    sig = signals.select(
+        pl.col("event_id").cast(pl.Utf8).fill_null(""),
+        pl.col("asset_id").cast(pl.Utf8).fill_null("")
+        .replace_strict(forward_n["asset_id"], pl.int_range(forward_n.height, eager=True), default=forward_n.height, return_dtype=pl.Int64)
+        .alias("_asset_row"),
+        pl.col("close").cast(pl.Float64, strict=False).fill_null(0.0),
+        pl.col("atr14").cast(pl.Float64, strict=False).fill_null(0.0),
+    )
+    rows_idx = sig["_asset_row"].to_numpy()
+    first_open = np.append(forward_n["first_open"].fill_null(0.0).to_numpy().astype(np.float64), 0.0)[rows_idx]
+    close = sig["close"].to_numpy()
+    # `float(first_open or close or 0.0)` / `float(atr14 or 0.0)`; NaN is truthy and passes through.
+    entry = np.where(first_open == 0, np.where(close == 0, 0.0, close), first_open)
+    atr = sig["atr14"].to_numpy() + 0.0
+    invalid = (atr <= 0) | (entry <= 0)
+    atr = np.where(invalid & (1.0 > atr), 1.0, atr)
+    lengths = np.where(invalid, 0, asset_n[rows_idx])
+    scalar_rows = np.flatnonzero(np.append(forward_n["non_finite"].to_numpy(), False)[rows_idx] & ~invalid)
+
+    signal_mats = {col: mat[rows_idx] for col, mat in asset_mats.items()}
+    results = first_touch_outcome_horizons_batch(
+        signal_mats["high_raw"],
+        signal_mats["low_raw"],
+        signal_mats["open_raw"],
+        signal_mats["close_raw"],
+        entry_price=entry,
+        atr=atr,
+        horizons=horizons,
+        target_atr=target_atr,
+        stop_atr=stop_atr,
+        gap_event_threshold_atr=gap_threshold,
+        lengths=lengths,
+    )
+    if scalar_rows.size:
+        # NaN/inf bars keep their scalar semantics in first_touch_outcome.
+        scalar_bars = {
+            str(part["asset_id"][0]): part.to_dicts()
+            for part in forward.filter(pl.col("asset_id").is_in(forward_n.filter("non_finite")["asset_id"])).partition_by("asset_id", maintain_order=True)
+        }
+        scalar_ids = forward_n["asset_id"].gather(rows_idx[scalar_rows]).to_list()
+        for horizon, result in results.items():
+            for k, asset_id in zip(scalar_rows.tolist(), scalar_ids):
+                outcome = first_touch_outcome(
+                    scalar_bars[asset_id],
+                    entry_price=float(entry[k]),
+                    atr=float(atr[k]),
+                    horizon=horizon,
+                    target_atr=target_atr,
+                    stop_atr=stop_atr,
+                    gap_event_threshold_atr=gap_threshold,
+                )
+                result["first_touch"][k] = FIRST_TOUCH_OUTCOMES.index(outcome["first_touch"])
+                for key in ("target_hit", "stop_hit", "time_stop", "mfe_atr", "mae_atr", "gap_event"):
+                    result[key][k] = outcome[key]
+
+    target_price = entry + atr * target_atr
+    stop_price = entry - atr * stop_atr
+    labels = np.array(FIRST_TOUCH_OUTCOMES, dtype=object)
+    frames: dict[int, pl.DataFrame] = {}
+    for horizon in horizons:
+        result = results[horizon]
+        missing = result["first_touch"] == 0
+        frames[horizon] = pl.DataFrame(
+            {
+                "event_id": sig["event_id"],
+                "signal_date": pl.Series([signal_date] * sig.height, dtype=pl.Utf8),
+                "horizon": pl.Series([int(horizon)] * sig.height, dtype=pl.Int64),
+                "entry_price": entry,
+                "target_price": target_price,
+                "stop_price": stop_price,
+                "first_touch": pl.Series(labels[result["first_touch"]].tolist(), dtype=pl.Utf8),
+                "target_hit": result["target_hit"],
+                "stop_hit": result["stop_hit"],
+                "time_stop": result["time_stop"],
+                "mfe_atr": _rounded(result["mfe_atr"], missing),
+                "mae_atr": _rounded(result["mae_atr"], missing),
+                "gap_event": result["gap_event"],
+                "overlap_suppressed": pl.Series([False] * sig.height, dtype=pl.Boolean),
+                "benchmark_adjusted_return": pl.Series([None] * sig.height, dtype=pl.Null),
+            }
+        )
+    return frames
+
+
 def main(argv: Iterable[str]) -> int:
     args = parse_args(argv)
     manifest = read_json(Path(args.input_manifest).resolve())
@@ -113,6 +240,9 @@ def main(argv: Iterable[str]) -> int:
         return 0
 
     horizons = [int(x) for x in outcome_config.get("horizons", [10, 20])]
+    if not horizons:
+        print(json.dumps({"ok": True, "written": []}, sort_keys=True))
+        return 0
     max_horizon = max(horizons)
     signal_dt = parse_iso_date(signal_date)
     end_dt = signal_dt + timedelta(days=max_horizon * 3)
@@ -143,62 +273,29 @@ def main(argv: Iterable[str]) -> int:
         .sort(["asset_id", "date"])
         .collect(engine="streaming")
     )
-    bars_by_asset: dict[str, list[dict[str, Any]]] = {}
-    for row in bars.to_dicts():
-        bars_by_asset.setdefault(str(row["asset_id"]), []).append(row)
 
-    output_rows: dict[int, list[dict[str, Any]]] = {h: [] for h in horizons}
     target_atr = float(outcome_config.get("target_atr") or 2.0)
     stop_atr = float(outcome_config.get("stop_atr") or 1.0)
     gap_cfg = outcome_config.get("gap_handling") or {}
     gap_threshold = float(gap_cfg.get("gap_event_threshold_atr") or 2.0)
-
-    for signal in signals.to_dicts():
-        asset_id = str(signal.get("asset_id") or "")
-        forward = bars_by_asset.get(asset_id) or []
-        entry = float((forward[0].get("open_raw") if forward else None) or signal.get("close") or 0.0)
-        atr = float(signal.get("atr14") or 0.0)
-        if atr <= 0 or entry <= 0:
-            forward = []
-            atr = max(atr, 1.0)
-        for horizon in horizons:
-            result = first_touch_outcome(
-                forward,
-                entry_price=entry,
-                atr=atr,
-                horizon=horizon,
-                target_atr=target_atr,
-                stop_atr=stop_atr,
-                gap_event_threshold_atr=gap_threshold,
-            )
-            output_rows[horizon].append(
-                {
-                    "event_id": str(signal.get("event_id") or ""),
-                    "signal_date": signal_date,
-                    "horizon": int(horizon),
-                    "entry_price": float(entry),
-                    "target_price": float(entry + atr * target_atr),
-                    "stop_price": float(entry - atr * stop_atr),
-                    "first_touch": result["first_touch"],
-                    "target_hit": bool(result["target_hit"]),
-                    "stop_hit": bool(result["stop_hit"]),
-                    "time_stop": bool(result["time_stop"]),
-                    "mfe_atr": result["mfe_atr"],
-                    "mae_atr": result["mae_atr"],
-                    "gap_event": bool(result["gap_event"]),
-                    "overlap_suppressed": False,
-                    "benchmark_adjusted_return": None,
-                }
-            )
+    frames = evaluate_outcome_frames(
+        signals,
+        bars,
+        signal_date=signal_date,
+        horizons=horizons,
+        target_atr=target_atr,
+        stop_atr=stop_atr,
+        gap_threshold=gap_threshold,
+    )
 
     written: list[str] = []
-    for horizon, rows in output_rows.items():
+    for horizon, frame in frames.items():
         out_dir = quant_root / "breakout" / "outcomes" / f"horizon={horizon}d" / f"signal_date={signal_date}"
         out_dir.mkdir(parents=True, exist_ok=True)
         out_path = out_dir / "outcomes.parquet"
         if out_path.exists() and not args.replace:
             continue
-        pl.DataFrame(rows).write_parquet(out_path)
+        frame.write_parquet(out_path)
         atomic_write_json(
             out_dir / "metadata.json",
             {
@@ -206,7 +303,7 @@ def main(argv: Iterable[str]) -> int:
                 "generated_at": utc_now_iso(),
                 "signal_date": signal_date,
                 "horizon": horizon,
-                "rows": len(rows),
+                "rows": frame.height,
                 "outcomes_parquet": str(out_path),
                 "append_only": True,
             },
@@ -0,0 +1,76 @@
+"""Deterministic asset_id -> bucket assignment for Breakout V12 bucket files.
+
+A bucket is the first 8 bytes of sha256(asset_id) modulo the bucket count, so
+existing ``bucket=NNN.parquet`` state stays valid. ``BucketIndex`` hashes each
+distinct asset id once and maps rows natively instead of calling hashlib per
+row; it can be persisted as parquet and reused across runs.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Iterable
+
+import polars as pl
+
+
+def stable_bucket(asset_id: Any, bucket_count: int) -> int:
+    h = hashlib.sha256(str(asset_id or "").encode("utf-8")).digest()
+    return int.from_bytes(h[:8], "big") % int(bucket_count)
+
+
+class BucketIndex:
+    def __init__(self, bucket_count: int, mapping: dict[str, int] | None = None) -> None:
+        if int(bucket_count) <= 0:
+            raise ValueError("bucket_count must be > 0")
+        self.bucket_count = int(bucket_count)
+        self.mapping: dict[str, int] = dict(mapping or {})
+        self.hashed = 0
+
+    def buckets_for(self, asset_ids: Iterable[str]) -> list[int]:
+        out = []
+        for asset_id in asset_ids:
+            bucket = self.mapping.get(asset_id)
+            if bucket is None:
+                bucket = stable_bucket(asset_id, self.bucket_count)
+                self.mapping[asset_id] = bucket
+                self.hashed += 1
+            out.append(bucket)
+        return out
+
+    def assign(self, df: pl.DataFrame, *, column: str = "asset_id", alias: str = "_bucket") -> pl.DataFrame:
+        """Add the Int64 bucket of ``column`` (null/empty ids share the bucket of "")."""
+        ids = df.get_column(column).cast(pl.Utf8).fill_null("")
+        distinct = ids.unique().to_list()
+        buckets = pl.Series(self.buckets_for(distinct), dtype=pl.Int64)
+        return df.with_columns(ids.replace_strict(pl.Series(distinct, dtype=pl.Utf8), buckets, return_dtype=pl.Int64).alias(alias))
+
+    @classmethod
+    def load(cls, path: Path, bucket_count: int) -> "BucketIndex":
+        """Index stored at ``path``; empty when missing, unreadable or for another bucket count."""
+        index = cls(bucket_count)
+        try:
+            df = pl.read_parquet(path, columns=["asset_id", "bucket", "bucket_count"])
+        except (OSError, pl.exceptions.PolarsError):
+            return index
+        df = df.filter(pl.col("bucket_count") == index.bucket_count)
+        index.mapping = dict(zip(df["asset_id"].to_list(), df["bucket"].to_list()))
+        return index
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.parent / f".{path.name}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        pl.DataFrame(
+            {
+                "asset_id": list(self.mapping),
+                "bucket": list(self.mapping.values()),
+                "bucket_count": [self.bucket_count] * len(self.mapping),
+            },
+            schema={"asset_id": pl.Utf8, "bucket": pl.Int64, "bucket_count": pl.Int64},
+        ).sort("asset_id").write_parquet(tmp, compression="zstd")
+        tmp.replace(path)
+
+    def stats(self) -> dict[str, int]:
+        return {"assets": len(self.mapping), "hashed": self.hashed, "bucket_count": self.bucket_count}
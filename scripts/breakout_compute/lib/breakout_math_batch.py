@@ -0,0 +1,425 @@
+"""NumPy batch twins of the breakout_math primitives over (assets x bars) matrices.
+
+Bar matrices hold one asset per row as float64, right-aligned: asset ``k``
+occupies the last ``lengths[k]`` columns (default: the full width) and NaN
+marks both a missing value (``None`` in the scalar API) and left padding.
+Forward bars for ``first_touch_outcome_batch`` are left-aligned instead.
+
+Sums run left to right (cumsum never reorders), so every result equals the
+scalar reference in breakout_math bit for bit. Values the scalar functions
+round are returned unrounded; ``support_zone_record`` / ``first_touch_record``
+rebuild the exact scalar dicts. NaN/inf *values* have no batch meaning (the
+scalar code treats them differently from ``None``), so callers route such
+assets through the scalar functions.
+"""
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+
+FIRST_TOUCH_OUTCOMES = ("missing_forward_data", "time", "target", "stop")
+
+
+def pack_rows(
+    values: np.ndarray,
+    lengths: np.ndarray,
+    *,
+    width: int | None = None,
+    align: str = "right",
+) -> np.ndarray:
+    """Scatter concatenated per-asset runs into a NaN-padded (assets x width) matrix.
+
+    Runs longer than ``width`` keep their last (right) or first (left) ``width`` values.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    if width is None:
+        width = int(lengths.max()) if lengths.size else 0
+    used = np.minimum(lengths, int(width))
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    starts = np.concatenate([[0], np.cumsum(used)])[:-1]
+    within = np.arange(int(used.sum())) - np.repeat(starts, used)
+    rows = np.repeat(np.arange(lengths.size), used)
+    if align == "right":
+        src = np.repeat(offsets[1:] - used, used) + within
+        cols = np.repeat(int(width) - used, used) + within
+    elif align == "left":
+        src = np.repeat(offsets[:-1], used) + within
+        cols = within
+    else:
+        raise ValueError(f"unknown align: {align}")
+    out = np.full((lengths.size, int(width)), np.nan)
+    out[rows, cols] = np.asarray(values, dtype=np.float64)[src]
+    return out
+
+
+def seq_sum(values: np.ndarray) -> np.ndarray:
+    """Row sums accumulated left to right, matching Python's ``sum()`` exactly."""
+    if values.shape[1] == 0:
+        return np.zeros(values.shape[0])
+    # "+ 0.0" mirrors sum()'s int 0 start (turns a lone -0.0 into 0.0).
+    return np.cumsum(values, axis=1)[:, -1] + 0.0
+
+
+def _shift_cols(values: np.ndarray, offset: int, fill: Any) -> np.ndarray:
+    # out[:, c] = values[:, c + offset]
+    out = np.full_like(values, fill)
+    if offset > 0:
+        out[:, :-offset] = values[:, offset:]
+    elif offset < 0:
+        out[:, -offset:] = values[:, :offset]
+    else:
+        out[:] = values
+    return out
+
+
+def _lengths(values: np.ndarray, lengths: Any) -> np.ndarray:
+    if lengths is None:
+        return np.full(values.shape[0], values.shape[1], dtype=np.int64)
+    n = np.broadcast_to(np.asarray(lengths, dtype=np.int64), (values.shape[0],))
+    return np.minimum(n, values.shape[1])
+
+
+def _rel_cols(values: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """Asset-relative bar index of every column (negative inside left padding)."""
+    return np.arange(values.shape[1])[None, :] - (values.shape[1] - n)[:, None]
+
+
+def _rolling_seq_sum(values: np.ndarray, window: int) -> np.ndarray:
+    out = np.zeros_like(values)
+    for back in range(window - 1, -1, -1):
+        out = out + _shift_cols(values, -back, 0.0)
+    return out
+
+
+def detect_pivots_batch(
+    highs: np.ndarray,
+    lows: np.ndarray,
+    left: int = 3,
+    right: int = 3,
+    lengths: Any = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Batch detect_pivots; NaN where a bar is not a pivot."""
+    n = _lengths(highs, lengths)
+    rel = _rel_cols(highs, n)
+    hl_ok = ~np.isnan(highs) & ~np.isnan(lows)
+    is_ph = hl_ok & (rel >= left) & (rel < n[:, None] - right)
+    is_pl = is_ph.copy()
+    for offset in range(-left, right + 1):
+        if offset == 0:
+            continue
+        # A neighbour only blocks when both its high and low are present.
+        nb_ok = _shift_cols(hl_ok, offset, False)
+        with np.errstate(invalid="ignore"):
+            is_ph &= ~(nb_ok & (_shift_cols(highs, offset, np.nan) >= highs))
+            is_pl &= ~(nb_ok & (_shift_cols(lows, offset, np.nan) <= lows))
+    return np.where(is_ph, highs, np.nan), np.where(is_pl, lows, np.nan)
+
+
+def cluster_support_zone_batch(
+    pivot_lows: np.ndarray,
+    atr_pct: Any,
+    zone_floor_pct: float = 0.025,
+    atr_k: float = 0.75,
+    lookback: Any = 120,
+    lengths: Any = None,
+) -> dict[str, np.ndarray]:
+    """Batch cluster_support_zone. ``atr_pct`` and ``lookback`` may be per-asset arrays.
+
+    Indices are asset-relative (-1 when no zone); center/low/high/width_pct are unrounded.
+    """
+    n = _lengths(pivot_lows, lengths)
+    width = pivot_lows.shape[1]
+    cols = np.arange(width)
+    look = np.maximum(np.broadcast_to(np.asarray(lookback, dtype=np.int64), n.shape), 0)
+    recent = np.where(cols[None, :] >= (width - np.minimum(n, look))[:, None], pivot_lows, np.nan)
+    has_pivots = ~np.isnan(recent).all(axis=1)
+    anchor = np.where(has_pivots, np.nanmin(np.where(has_pivots[:, None], recent, 0.0), axis=1), np.nan)
+    atr = np.nan_to_num(np.broadcast_to(np.asarray(atr_pct, dtype=np.float64), n.shape), nan=0.0)
+    width_pct = np.fmax(zone_floor_pct, atr_k * atr)
+    with np.errstate(invalid="ignore"):
+        in_band = (recent >= (anchor * (1.0 - width_pct / 2.0))[:, None]) & (
+            recent <= (anchor * (1.0 + width_pct / 2.0))[:, None]
+        )
+        loose = recent <= (anchor * (1.0 + width_pct))[:, None]
+    cluster = np.where((in_band.sum(axis=1) >= 2)[:, None], in_band, loose)
+    test_count = cluster.sum(axis=1)
+    detected = test_count >= 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        center = np.where(detected, seq_sum(np.where(cluster, recent, 0.0)) / test_count, np.nan)
+        low = np.where(detected, np.where(cluster, recent, np.inf).min(axis=1), np.nan)
+        high = np.where(detected, np.where(cluster, recent, -np.inf).max(axis=1), np.nan)
+        zone_width = np.where(detected & (center > 0), (high - low) / np.maximum(center, 1e-9), 0.0)
+    start = width - n
+    return {
+        "detected": detected,
+        "has_pivots": has_pivots,
+        "test_count": test_count,
+        "center": center,
+        "low": low,
+        "high": high,
+        "width_pct": zone_width,
+        "first_test_index": np.where(detected, cluster.argmax(axis=1) - start, -1),
+        "last_test_index": np.where(detected, width - 1 - cluster[:, ::-1].argmax(axis=1) - start, -1),
+    }
+
+
+def support_zone_record(zone: dict[str, np.ndarray], k: int) -> dict[str, Any]:
+    """Row ``k`` of cluster_support_zone_batch as the scalar cluster_support_zone dict."""
+    if not zone["detected"][k]:
+        if not zone["has_pivots"][k]:
+            return {"detected": False}
+        return {"detected": False, "test_count": int(zone["test_count"][k])}
+    center = float(zone["center"][k])
+    return {
+        "detected": True,
+        "center": round(center, 6),
+        "low": round(float(zone["low"][k]), 6),
+        "high": round(float(zone["high"][k]), 6),
+        "width_pct": round(float(zone["width_pct"][k]), 6) if center > 0 else 0.0,
+        "test_count": int(zone["test_count"][k]),
+        "first_test_index": int(zone["first_test_index"][k]),
+        "last_test_index": int(zone["last_test_index"][k]),
+        "method": "pivot_cluster_atr_adjusted",
+    }
+
+
+def count_failed_lows_batch(
+    lows: np.ndarray,
+    closes: np.ndarray,
+    pivot_lows: np.ndarray,
+    lookback: int = 80,
+    reclaim_tol: float = 0.002,
+) -> np.ndarray:
+    """Batch count_failed_lows: low undercuts the latest prior pivot low (within lookback) but closes back near it."""
+    n_assets, width = closes.shape
+    cols = np.arange(width)
+    pivot_idx = np.maximum.accumulate(np.where(np.isnan(pivot_lows), -1, cols[None, :]), axis=1)
+    prior_idx = np.concatenate([np.full((n_assets, 1), -1), pivot_idx[:, :-1]], axis=1)
+    prior_ok = (prior_idx >= 0) & (prior_idx >= cols[None, :] - lookback)
+    anchor = np.take_along_axis(pivot_lows, np.maximum(prior_idx, 0), axis=1)
+    with np.errstate(invalid="ignore"):
+        failed = prior_ok & (lows < anchor) & (closes >= anchor * (1.0 - reclaim_tol))
+    return failed.sum(axis=1)
+
+
+def absorption_vol_ratio_batch(
+    opens: np.ndarray,
+    closes: np.ndarray,
+    volumes: np.ndarray,
+    window: int = 40,
+) -> np.ndarray:
+    """Batch absorption_vol_ratio: mean down-bar volume / mean up-bar volume over the last window bars."""
+    if window <= 0 or closes.shape[1] == 0:
+        return np.ones(closes.shape[0])
+    o, c, v = opens[:, -window:], closes[:, -window:], volumes[:, -window:]
+    ok = ~np.isnan(o) & ~np.isnan(c) & ~np.isnan(v)
+    down = ok & (c < o)
+    up = ok & (c >= o)
+    down_n = down.sum(axis=1)
+    up_n = up.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg_down = np.where(down_n > 0, seq_sum(np.where(down, v, 0.0)) / down_n, 1.0)
+        avg_up = np.where(up_n > 0, seq_sum(np.where(up, v, 0.0)) / up_n, 1.0)
+        return np.where(np.isfinite(avg_up) & (avg_up != 0), avg_down / avg_up, 1.0)
+
+
+def _clv_raw(highs: np.ndarray, lows: np.ndarray, closes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    ok = ~np.isnan(highs) & ~np.isnan(lows) & ~np.isnan(closes)
+    rng = highs - lows
+    with np.errstate(invalid="ignore", divide="ignore"):
+        clv = ((closes - lows) - (highs - closes)) / rng
+        ok &= rng > 0
+    return clv, ok
+
+
+def clv_series_batch(
+    highs: np.ndarray,
+    lows: np.ndarray,
+    closes: np.ndarray,
+    lengths: Any = None,
+) -> np.ndarray:
+    """Batch clv_series; 0.0 for missing or zero-range bars, NaN in padding."""
+    n = _lengths(closes, lengths)
+    clv, ok = _clv_raw(highs, lows, closes)
+    return np.where(_rel_cols(closes, n) >= 0, np.where(ok, clv, 0.0), np.nan)
+
+
+def cmf_series_batch(
+    highs: np.ndarray,
+    lows: np.ndarray,
+    closes: np.ndarray,
+    volumes: np.ndarray,
+    window: int = 20,
+    lengths: Any = None,
+) -> np.ndarray:
+    """Batch cmf_series (rolling Chaikin Money Flow); NaN in padding."""
+    n = _lengths(closes, lengths)
+    rel = _rel_cols(closes, n)
+    clv, ok = _clv_raw(highs, lows, closes)
+    with np.errstate(invalid="ignore"):
+        mfv = np.where(ok & ~np.isnan(volumes), clv * volumes, 0.0)
+    slice_mfv = _rolling_seq_sum(mfv, window)
+    slice_vol = _rolling_seq_sum(np.nan_to_num(volumes, nan=0.0), window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cmf = np.where(np.isfinite(slice_vol) & (slice_vol != 0), slice_mfv / slice_vol, 0.0)
+    return np.where(rel >= 0, np.where(rel >= window - 1, cmf, 0.0), np.nan)
+
+
+def trend_slope_batch(values: np.ndarray, lookback: int = 20) -> np.ndarray:
+    """Batch trend_slope over the last ``lookback`` columns; non-finite values are skipped."""
+    seq = values[:, -lookback:] if lookback > 0 else values[:, :0]
+    valid = np.isfinite(seq)
+    m = valid.sum(axis=1)
+    m_div = np.maximum(m, 1)
+    # Positions of the surviving values, as in the scalar's compacted range(m).
+    xs = np.cumsum(valid, axis=1) - 1.0
+    mean_x = (m * (m - 1) // 2) / m_div
+    mean_y = seq_sum(np.where(valid, seq, 0.0)) / m_div
+    dx = xs - mean_x[:, None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        num = seq_sum(np.where(valid, dx * (seq - mean_y[:, None]), 0.0))
+        den = seq_sum(np.where(valid, dx**2, 0.0))
+        slope = num / den
+        slope = np.where(mean_y == 0, slope, slope / np.abs(mean_y))
+    return np.where((m < 3) | (den == 0), 0.0, slope)
+
+
+def obv_higher_low_batch(
+    closes: np.ndarray,
+    volumes: np.ndarray,
+    lookback: int = 60,
+    lengths: Any = None,
+) -> np.ndarray:
+    """Batch obv_higher_low: min of the recent half of OBV above the min of the half before."""
+    n = _lengths(closes, lengths)
+    if closes.shape[1] < lookback + 5:
+        return np.zeros(closes.shape[0], dtype=bool)
+    prev = _shift_cols(closes, -1, np.nan)
+    ok = ~np.isnan(closes) & ~np.isnan(prev) & ~np.isnan(volumes)
+    step = np.where(ok & (closes > prev), volumes, np.where(ok & (closes < prev), -volumes, 0.0))
+    obv = np.cumsum(step, axis=1)
+    half = -lookback // 2
+    recent_min = obv[:, half:].min(axis=1)
+    prior_min = obv[:, -lookback:half].min(axis=1)
+    return (n >= lookback + 5) & (recent_min > prior_min)
+
+
+def first_touch_outcome_batch(
+    highs: np.ndarray,
+    lows: np.ndarray,
+    opens: np.ndarray,
+    closes: np.ndarray,
+    *,
+    entry_price: Any,
+    atr: Any,
+    horizon: int,
+    target_atr: float,
+    stop_atr: float,
+    gap_event_threshold_atr: float,
+    lengths: Any = None,
+) -> dict[str, np.ndarray]:
+    """Batch first_touch_outcome over left-aligned forward bars (column 0 = first bar after the signal).
+
+    ``lengths`` is the number of forward bars per row. ``first_touch`` holds indices into
+    FIRST_TOUCH_OUTCOMES; mfe/mae are unrounded and NaN when a row has no forward bars.
+    """
+    return first_touch_outcome_horizons_batch(
+        highs,
+        lows,
+        opens,
+        closes,
+        entry_price=entry_price,
+        atr=atr,
+        horizons=[horizon],
+        target_atr=target_atr,
+        stop_atr=stop_atr,
+        gap_event_threshold_atr=gap_event_threshold_atr,
+        lengths=lengths,
+    )[horizon]
+
+
+def first_touch_outcome_horizons_batch(
+    highs: np.ndarray,
+    lows: np.ndarray,
+    opens: np.ndarray,
+    closes: np.ndarray,
+    *,
+    entry_price: Any,
+    atr: Any,
+    horizons: list[int],
+    target_atr: float,
+    stop_atr: float,
+    gap_event_threshold_atr: float,
+    lengths: Any = None,
+) -> dict[int, dict[str, np.ndarray]]:
+    """first_touch_outcome_batch for several horizons from one pass over the forward window.
+
+    The first hit position and the running MFE/MAE/gap state do not depend on the horizon, so
+    each horizon only reads them at its own terminal bar.
+    """
+    n_rows, width = closes.shape
+    n = _lengths(closes, lengths)
+    entry = np.broadcast_to(np.asarray(entry_price, dtype=np.float64), (n_rows,))
+    atr_v = np.broadcast_to(np.asarray(atr, dtype=np.float64), (n_rows,))
+    max_used = np.minimum(n, max([0, *(int(h) for h in horizons)]))
+    cols = np.arange(width)
+    valid = cols[None, :] < max_used[:, None]
+    e = entry[:, None]
+
+    def _or(primary: np.ndarray, fallback: Any) -> np.ndarray:
+        # `bar.get(key) or fallback`: missing and 0.0 both fall through.
+        return np.where(np.isnan(primary) | (primary == 0), fallback, primary)
+
+    close_or_entry = _or(closes, e)
+    high = _or(highs, close_or_entry)
+    low = _or(lows, close_or_entry)
+    open_price = _or(opens, e)
+    has_atr = (atr_v != 0)[:, None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        up = np.where(has_atr, (high - e) / atr_v[:, None], 0.0)
+        down = np.where(has_atr, (low - e) / atr_v[:, None], 0.0)
+        gap = valid & has_atr & (np.abs(open_price - e) / atr_v[:, None] >= gap_event_threshold_atr)
+        hit_stop = valid & (low <= (entry - atr_v * stop_atr)[:, None])
+        hit_target = valid & (high >= (entry + atr_v * target_atr)[:, None])
+    hit = hit_stop | hit_target
+    first_hit = np.where(hit.any(axis=1), hit.argmax(axis=1) if width else 0, width)
+    rows = np.arange(n_rows)
+    stop_at_hit = hit_stop[rows, np.minimum(first_hit, width - 1)] if width else np.zeros(n_rows, dtype=bool)
+    zero = np.zeros((n_rows, 1))
+    # Running extremes from 0.0 (fmax/fmin skip NaN like Python's max/min against a float).
+    mfe_run = np.fmax.accumulate(np.concatenate([zero, up], axis=1), axis=1)
+    mae_run = np.fmin.accumulate(np.concatenate([zero, down], axis=1), axis=1)
+    gap_run = np.concatenate([np.zeros((n_rows, 1), dtype=bool), np.logical_or.accumulate(gap, axis=1)], axis=1)
+    has_bars = n > 0
+
+    out: dict[int, dict[str, np.ndarray]] = {}
+    for horizon in horizons:
+        used = np.minimum(n, max(0, int(horizon)))
+        any_hit = first_hit < used
+        term = np.where(any_hit, first_hit, used - 1)
+        stop_first = any_hit & stop_at_hit
+        out[horizon] = {
+            "first_touch": np.where(any_hit, np.where(stop_first, 3, 2), np.where(has_bars, 1, 0)),
+            "target_hit": any_hit & ~stop_first,
+            "stop_hit": stop_first,
+            "time_stop": ~any_hit & has_bars,
+            "mfe_atr": np.where(has_bars, mfe_run[rows, term + 1], np.nan),
+            "mae_atr": np.where(has_bars, mae_run[rows, term + 1], np.nan),
+            "gap_event": gap_run[rows, term + 1],
+        }
+    return out
+
+
+def first_touch_record(result: dict[str, np.ndarray], k: int) -> dict[str, Any]:
+    """Row ``k`` of first_touch_outcome_batch as the scalar first_touch_outcome dict."""
+    has_bars = bool(result["first_touch"][k])
+    return {
+        "first_touch": FIRST_TOUCH_OUTCOMES[int(result["first_touch"][k])],
+        "target_hit": bool(result["target_hit"][k]),
+        "stop_hit": bool(result["stop_hit"][k]),
+        "time_stop": bool(result["time_stop"][k]),
+        "mfe_atr": round(float(result["mfe_atr"][k]), 6) if has_bars else None,
+        "mae_atr": round(float(result["mae_atr"][k]), 6) if has_bars else None,
+        "gap_event": bool(result["gap_event"][k]),
+    }
@@ -1,13 +1,23 @@
 import os
+import sys
 import glob
 import gzip
 import json
-import requests
+import asyncio
 import subprocess
+import urllib.error
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.quantlab.async_http_fetch import AsyncFetchEngine  # noqa: E402
 
 DATA_DIR = 'public/data/v3/series/adjusted_all'
+MAX_IN_FLIGHT = 10
+EODHD_RATE_PER_SEC = float(os.environ.get('RV_EODHD_RATE_PER_SEC', '15') or '0')
 
 def get_api_key():
     path = os.path.expanduser('~/Desktop/EHDHD_API_KEY.env.rtf')
@@ -28,22 +38,31 @@ def get_api_key():
     except:
         return None
 
-def process_file(file_path, api_token):
+def read_rows(file_path):
+    current_rows = []
+    last_date = None
+    with gzip.open(file_path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                 row = json.loads(line)
+                 current_rows.append(row)
+                 last_date = row.get('date')
+    return current_rows, last_date
+
+def write_rows(file_path, rows):
+    with gzip.open(file_path, 'wt', encoding='utf-8') as f:
+        for r in rows:
+             f.write(json.dumps(r) + '\n')
+
+async def process_file(engine, file_path, api_token):
+    loop = asyncio.get_running_loop()
     filename = os.path.basename(file_path)
     safe_id = filename.replace('.ndjson.gz', '')
     parts = safe_id.split('__')
     ticker = f"{parts[1]}.{parts[0]}" if len(parts) == 2 else safe_id
-    
-    last_date = None
-    current_rows = []
-    
+
     try:
-        with gzip.open(file_path, 'rt', encoding='utf-8') as f:
-            for line in f:
-                if line.strip():
-                     row = json.loads(line)
-                     current_rows.append(row)
-                     last_date = row.get('date')
+        current_rows, last_date = await loop.run_in_executor(None, read_rows, file_path)
     except Exception as e:
         return f"[{ticker}] Read error: {e}"
         
@@ -53,39 +72,66 @@ def process_file(file_path, api_token):
     url = f"https://eodhd.com/api/eod/{ticker}?from={last_date}&api_token={api_token}&fmt=json"
     
     try:
-         res = requests.get(url, timeout=10)
-         if res.status_code == 200:
-              new_bars = res.json()
-              added = 0
-              if not isinstance(new_bars, list):
-                   return f"[{ticker}] Non-list payout"
+         res = await engine.fetch(url, timeout_sec=10)
+         new_bars = res.json()
+         added = 0
+         if not isinstance(new_bars, list):
+              return f"[{ticker}] Non-list payout"
+              
+         for bar in new_bars:
+              b_date = bar.get('date')
+              if b_date and b_date > last_date:
+                   mapped = {
+                       'close': bar.get('adjusted_close') or bar.get('close'),
+                       'high': bar.get('high'),
+                       'low': bar.get('low'),
+                       'volume': bar.get('volume'),
+                       'date': b_date
+                   }
+                   current_rows.append(mapped)
+                   added += 1
                    
-              for bar in new_bars:
-                   b_date = bar.get('date')
-                   if b_date and b_date > last_date:
-                        mapped = {
-                            'close': bar.get('adjusted_close') or bar.get('close'),
-                            'high': bar.get('high'),
-                            'low': bar.get('low'),
-                            'volume': bar.get('volume'),
-                            'date': b_date
-                        }
-                        current_rows.append(mapped)
-                        added += 1
-                        
-              if added > 0:
-                   with gzip.open(file_path, 'wt', encoding='utf-8') as f:
-                        for r in current_rows:
-                             f.write(json.dumps(r) + '\n')
-                   return f"[{ticker}] Added {added} bars"
-              return f"[{ticker}] No new bars"
-         elif res.status_code == 404:
+         if added > 0:
+              await loop.run_in_executor(None, write_rows, file_path, current_rows)
+              return f"[{ticker}] Added {added} bars"
+         return f"[{ticker}] No new bars"
+    except urllib.error.HTTPError as e:
+         if e.code == 404:
               return f"[{ticker}] 404 Not Found"
-         else:
-              return f"[{ticker}] HTTP {res.status_code}"
+         return f"[{ticker}] HTTP {e.code}"
     except Exception as e:
          return f"[{ticker}] Error: {e}"
 
+async def sync_all(files, api_token):
+    engine = AsyncFetchEngine(
+        host_rates={'eodhd.com': EODHD_RATE_PER_SEC},
+        max_connections_per_host=MAX_IN_FLIGHT,
+        max_retries=3,
+    )
+    slots = asyncio.Semaphore(MAX_IN_FLIGHT)
+    success_count = 0
+    error_count = 0
+
+    async def bounded(file_path):
+        async with slots:
+            return await process_file(engine, file_path, api_token)
+
+    try:
+        tasks = [asyncio.ensure_future(bounded(f)) for f in files]
+        for i, task in enumerate(asyncio.as_completed(tasks)):
+             res_str = await task
+             if "Added" in res_str:
+                  success_count += 1
+             elif "Error" in res_str or "HTTP" in res_str:
+                  error_count += 1
+                  
+             if (i + 1) % 500 == 0:
+                  print(f"Processed {i+1}/{len(files)}... Updated: {success_count}, Errors/Offline: {error_count}")
+    finally:
+        await engine.aclose()
+    print(f"HTTP stats: {json.dumps(engine.stats.as_dict())}")
+    return success_count, error_count
+
 def main():
     api_token = get_api_key()
     if not api_token:
@@ -97,23 +143,9 @@ def main():
         print(f"No files found in {DATA_DIR}")
         return
         
-    print(f"Syncing {len(files)} tickers using ThreadPool (Max 10 threads)...")
-    
-    success_count = 0
-    error_count = 0
+    print(f"Syncing {len(files)} tickers on the async fetch engine (max {MAX_IN_FLIGHT} in flight, {EODHD_RATE_PER_SEC:g} req/s)...")
     
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        future_to_file = {executor.submit(process_file, f, api_token): f for f in files}
-        
-        for i, future in enumerate(as_completed(future_to_file)):
-             res_str = future.result()
-             if "Added" in res_str:
-                  success_count += 1
-             elif "Error" in res_str or "HTTP" in res_str:
-                  error_count += 1
-                  
-             if (i + 1) % 500 == 0:
-                  print(f"Processed {i+1}/{len(files)}... Updated: {success_count}, Errors/Offline: {error_count}")
+    success_count, error_count = asyncio.run(sync_all(files, api_token))
                   
     print(f"All done. Updated {success_count} files, non-200 responses: {error_count}")
 
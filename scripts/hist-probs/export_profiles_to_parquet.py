@@ -1,5 +1,15 @@
 #!/usr/bin/env python3
-"""Export hist-probs JSON profiles to an internal shadow Parquet store."""
+"""Export hist-probs JSON profiles to an internal shadow Parquet store.
+
+Profiles are picked by ticker without parsing them: the ticker comes from the
+shard path (``<prefix>/<TICKER>.json``) or, for flat files, from the first bytes
+of the file. Each selected profile is then parsed exactly once on a process
+pool and its rows are streamed, prefix by prefix, into one Parquet file per
+symbol prefix with row groups of ``--row-group-rows`` rows. A state file keeps
+the (path, mtime_ns, size) of every exported profile so later runs only reparse
+changed profiles and only rewrite the prefixes they touch. A prefix whose
+Parquet file has gone missing is re-exported whole.
+"""
 
 from __future__ import annotations
 
@@ -7,9 +17,12 @@ import argparse
 import json
 import os
 import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone
+from itertools import groupby
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable, Iterator
 
 
 METRIC_FIELDS = (
@@ -22,6 +35,23 @@ METRIC_FIELDS = (
     "mae",
     "mfe",
 )
+ROW_FIELDS = (
+    "ticker",
+    "symbol_prefix",
+    "symbol_partition",
+    "year",
+    "latest_date",
+    "computed_at",
+    "bars_count",
+    "event_key",
+    "horizon",
+    "source_path",
+) + METRIC_FIELDS
+INT_FIELDS = {"bars_count", "n"}
+STATE_SCHEMA = "hist_probs_parquet_shadow_state_v1"
+STATE_FILE = "_state.json"
+HEADER_BYTES = 512
+HEADER_TICKER_RE = re.compile(rb'"ticker"\s*:\s*"([^"\\]*)"')
 
 
 def load_pyarrow():
@@ -50,6 +80,14 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--tickers", help="Comma-separated ticker allowlist.")
     parser.add_argument("--max-profiles", type=int, help="Limit parsed profiles for shadow tests.")
     parser.add_argument("--compression", default="snappy")
+    parser.add_argument("--row-group-rows", type=int, default=65_536)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=min(8, os.cpu_count() or 1),
+        help="Processes parsing profiles (1 = parse in-process).",
+    )
+    parser.add_argument("--full", action="store_true", help="Ignore the state file and rebuild every prefix.")
     parser.add_argument("--dry-run", action="store_true", help="Scan/report only; no pyarrow needed.")
     return parser.parse_args()
 
@@ -108,27 +146,56 @@ def load_profile(path: Path) -> dict[str, Any] | None:
     return value
 
 
-def pick_profile_paths(input_root: Path, allowlist: set[str] | None, max_profiles: int | None) -> dict[str, Path]:
-    selected: dict[str, tuple[tuple[int, int], Path]] = {}
+def header_ticker(path: Path) -> str | None:
+    try:
+        with path.open("rb") as handle:
+            head = handle.read(HEADER_BYTES)
+    except OSError:
+        return None
+    match = HEADER_TICKER_RE.search(head)
+    return normalize_ticker(match.group(1).decode("utf-8", "replace")) if match else None
+
+
+def path_ticker(input_root: Path, path: Path) -> str | None:
+    """Ticker of a profile path without JSON parsing (None for non-profile files)."""
+    if path.parent != input_root:
+        stem = normalize_ticker(path.stem)
+        if stem and path.parent.name == shard_prefix(stem):
+            return stem
+    ticker = header_ticker(path)
+    if ticker:
+        return ticker
+    # Header without a leading ticker key: fall back to a full parse for this file only.
+    profile = load_profile(path)
+    return normalize_ticker(profile.get("ticker")) if profile else None
+
+
+def pick_profile_sources(
+    input_root: Path,
+    allowlist: set[str] | None,
+    max_profiles: int | None,
+) -> dict[str, list[tuple[str, int, int]]]:
+    """Candidate (path, mtime_ns, size) per ticker, best first (sharded over flat, then newest)."""
+    selected: dict[str, list[tuple[tuple[int, int], tuple[str, int, int]]]] = {}
     for path in sorted(input_root.rglob("*.json")):
-        profile = load_profile(path)
-        if not profile:
+        ticker = path_ticker(input_root, path)
+        if not ticker:
             continue
-        ticker = normalize_ticker(profile.get("ticker"))
         if allowlist and ticker not in allowlist:
             continue
         is_sharded = int(path.parent != input_root)
         try:
-            mtime_ns = path.stat().st_mtime_ns
+            stat = path.stat()
+            mtime_ns, size = stat.st_mtime_ns, stat.st_size
         except OSError:
-            mtime_ns = 0
-        rank = (is_sharded, mtime_ns)
-        current = selected.get(ticker)
-        if current is None or rank > current[0]:
-            selected[ticker] = (rank, path)
+            mtime_ns, size = 0, 0
+        selected.setdefault(ticker, []).append(((is_sharded, mtime_ns), (str(path), mtime_ns, size)))
         if max_profiles and len(selected) >= max_profiles and not allowlist:
             break
-    return {ticker: path for ticker, (_, path) in selected.items()}
+    return {
+        ticker: [source for _, source in sorted(candidates, key=lambda item: item[0], reverse=True)]
+        for ticker, candidates in selected.items()
+    }
 
 
 def profile_rows(path: Path, profile: dict[str, Any]) -> list[dict[str, Any]]:
@@ -161,19 +228,100 @@ def profile_rows(path: Path, profile: dict[str, Any]) -> list[dict[str, Any]]:
     return rows
 
 
-def write_symbol_year(rows: list[dict[str, Any]], output_root: Path, compression: str) -> Path:
+def rows_to_columns(rows: list[dict[str, Any]]) -> dict[str, list[Any]]:
+    return {field: [row[field] for row in rows] for field in ROW_FIELDS}
+
+
+def export_profile(task: tuple[str, list[tuple[str, int, int]]]) -> dict[str, Any]:
+    """Parse one ticker's profile (first valid candidate) into columnar rows."""
+    ticker, sources = task
+    for source in sources:
+        path = Path(source[0])
+        profile = load_profile(path)
+        if not profile or normalize_ticker(profile.get("ticker")) != ticker:
+            continue
+        rows = profile_rows(path, profile)
+        return {"ticker": ticker, "sources": sources, "path": str(path), "rows": len(rows), "columns": rows_to_columns(rows)}
+    return {"ticker": ticker, "sources": sources, "path": None, "rows": 0, "columns": rows_to_columns([])}
+
+
+def iter_exports(tasks: list[tuple[str, list[tuple[str, int, int]]]], workers: int) -> Iterator[dict[str, Any]]:
+    """Export results in task order, parsed in-process or on a process pool."""
+    if workers <= 1 or len(tasks) <= 1:
+        yield from map(export_profile, tasks)
+        return
+    chunksize = max(1, min(256, len(tasks) // (workers * 8)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(export_profile, tasks, chunksize=chunksize)
+
+
+def arrow_schema(pa):
+    return pa.schema(
+        [(field, pa.int64() if field in INT_FIELDS else pa.float64() if field in METRIC_FIELDS else pa.string()) for field in ROW_FIELDS]
+    )
+
+
+def prefix_file(output_root: Path, prefix: str) -> Path:
+    return output_root / f"symbol_prefix={safe_partition(prefix)}" / "part.parquet"
+
+
+def write_prefix(
+    output_root: Path,
+    prefix: str,
+    results: list[dict[str, Any]],
+    drop_tickers: set[str],
+    compression: str,
+    row_group_rows: int,
+) -> tuple[Path, int] | None:
+    """Rewrite one prefix file: keep untouched tickers, replace/drop the given ones."""
     pa, pq = load_pyarrow()
-    prefix = safe_partition(rows[0]["symbol_prefix"])
-    symbol = safe_partition(rows[0]["symbol_partition"])
-    year = safe_partition(rows[0]["year"])
-    dest_dir = output_root / f"symbol_prefix={prefix}" / f"symbol={symbol}" / f"year={year}"
-    dest_dir.mkdir(parents=True, exist_ok=True)
-    dest = dest_dir / "data.parquet"
-    tmp = dest_dir / f".data.{os.getpid()}.tmp.parquet"
-    table = pa.Table.from_pylist(rows)
-    pq.write_table(table, tmp, compression=compression)
+    import pyarrow.compute as pc  # type: ignore
+
+    schema = arrow_schema(pa)
+    dest = prefix_file(output_root, prefix)
+    tables = []
+    if dest.exists():
+        existing = pq.read_table(dest, schema=schema)
+        if drop_tickers:
+            existing = existing.filter(pc.invert(pc.is_in(existing["ticker"], value_set=pa.array(sorted(drop_tickers)))))
+        tables.append(existing)
+    for result in results:
+        if result["rows"]:
+            tables.append(pa.Table.from_pydict(result["columns"], schema=schema))
+    table = pa.concat_tables(tables) if tables else schema.empty_table()
+    if table.num_rows == 0:
+        if dest.exists():
+            dest.unlink()
+        return None
+    # Stable sort keeps each profile's event/horizon order within its ticker.
+    table = table.take(pc.sort_indices(table, sort_keys=[("ticker", "ascending")]))
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.parent / f".{dest.name}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp, compression=compression, row_group_size=max(1, row_group_rows))
+    os.replace(tmp, dest)
+    return dest, table.num_rows
+
+
+def read_state(output_root: Path) -> dict[str, dict[str, Any]]:
+    try:
+        state = json.loads((output_root / STATE_FILE).read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return {}
+    if not isinstance(state, dict) or state.get("schema") != STATE_SCHEMA:
+        return {}
+    return dict(state.get("profiles") or {})
+
+
+def write_state(output_root: Path, profiles: dict[str, dict[str, Any]]) -> None:
+    dest = output_root / STATE_FILE
+    tmp = output_root / f".{STATE_FILE}.{os.getpid()}.tmp"
+    payload = {"schema": STATE_SCHEMA, "profiles": dict(sorted(profiles.items()))}
+    tmp.write_text(json.dumps(payload, separators=(",", ":")) + "\n", encoding="utf-8")
     os.replace(tmp, dest)
-    return dest
+
+
+def same_sources(entry: dict[str, Any] | None, sources: Iterable[tuple[str, int, int]]) -> bool:
+    return bool(entry) and [list(source) for source in entry.get("sources") or []] == [list(source) for source in sources]
 
 
 def main() -> int:
@@ -182,40 +330,90 @@ def main() -> int:
     input_root = abs_path(repo_root, args.input_root)
     output_root = abs_path(repo_root, args.output_root)
     allowlist = {normalize_ticker(item) for item in args.tickers.split(",") if item.strip()} if args.tickers else None
-    profile_paths = pick_profile_paths(input_root, allowlist, args.max_profiles)
+    profile_sources = pick_profile_sources(input_root, allowlist, args.max_profiles)
+    complete_scan = not allowlist and not args.max_profiles
+
+    previous = {} if args.full else read_state(output_root)
+    incremental = bool(previous)
+    state = dict(previous)
+    # Exported rows whose prefix file is gone: the whole prefix has to be parsed again.
+    missing_prefixes = {
+        shard_prefix(ticker)
+        for ticker, entry in previous.items()
+        if int(entry.get("rows") or 0) and not prefix_file(output_root, shard_prefix(ticker)).exists()
+    }
+    tasks = [
+        (ticker, sources)
+        for ticker, sources in profile_sources.items()
+        if shard_prefix(ticker) in missing_prefixes or not same_sources(previous.get(ticker), sources)
+    ]
+    if not complete_scan:
+        # Tickers outside this run's scan are re-exported from their recorded sources.
+        tasks.extend(
+            (ticker, [tuple(source) for source in entry.get("sources") or []])
+            for ticker, entry in previous.items()
+            if ticker not in profile_sources and shard_prefix(ticker) in missing_prefixes
+        )
+    tasks.sort(key=lambda task: (shard_prefix(task[0]), task[0]))
+    removed = sorted(set(previous) - set(profile_sources)) if complete_scan else []
+    removed_by_prefix: dict[str, set[str]] = {}
+    for ticker in removed:
+        removed_by_prefix.setdefault(shard_prefix(ticker), set()).add(ticker)
+        state.pop(ticker, None)
+
+    if not args.dry_run:
+        output_root.mkdir(parents=True, exist_ok=True)
+        if not incremental:
+            # Full rebuild: drop every prefix directory (also the old symbol/year layout).
+            for stale in output_root.glob("symbol_prefix=*"):
+                shutil.rmtree(stale)
+
     total_rows = 0
-    written_files: list[str] = []
     empty_profiles = 0
-
-    for ticker, path in sorted(profile_paths.items()):
-        profile = load_profile(path)
-        if not profile:
-            empty_profiles += 1
-            continue
-        rows = profile_rows(path, profile)
-        if not rows:
-            empty_profiles += 1
+    written_files: list[str] = []
+    for prefix, group in groupby(iter_exports(tasks, max(1, int(args.workers))), key=lambda result: shard_prefix(result["ticker"])):
+        results = list(group)
+        for result in results:
+            total_rows += result["rows"]
+            if not result["rows"]:
+                empty_profiles += 1
+            state[result["ticker"]] = {"sources": result["sources"], "path": result["path"], "rows": result["rows"]}
+        if args.dry_run:
             continue
-        total_rows += len(rows)
+        drop = {result["ticker"] for result in results} | removed_by_prefix.pop(prefix, set())
+        written = write_prefix(output_root, prefix, results, drop if incremental else set(), args.compression, args.row_group_rows)
+        if written:
+            written_files.append(str(written[0]))
+    for prefix, drop in sorted(removed_by_prefix.items()):
         if not args.dry_run:
-            output_root.mkdir(parents=True, exist_ok=True)
-            written_files.append(str(write_symbol_year(rows, output_root, args.compression)))
+            written = write_prefix(output_root, prefix, [], drop, args.compression, args.row_group_rows)
+            if written:
+                written_files.append(str(written[0]))
 
     manifest = {
-        "schema": "hist_probs_parquet_shadow_manifest_v1",
+        "schema": "hist_probs_parquet_shadow_manifest_v2",
         "generated_at": datetime.now(timezone.utc).isoformat(),
         "source_root": str(input_root),
         "output_root": str(output_root),
         "dry_run": args.dry_run,
-        "profiles": len(profile_paths),
+        "incremental": incremental,
+        "workers": max(1, int(args.workers)),
+        "row_group_rows": int(args.row_group_rows),
+        "profiles": len(profile_sources),
+        "profiles_parsed": len(tasks),
+        "profiles_unchanged": len(set(profile_sources) - {ticker for ticker, _ in tasks}),
+        "profiles_removed": len(removed),
+        "prefixes_missing_rebuilt": sorted(missing_prefixes),
         "empty_profiles": empty_profiles,
         "rows": total_rows,
+        "rows_total": sum(int(entry.get("rows") or 0) for entry in state.values()),
         "written_files": written_files,
-        "partitioning": ["symbol_prefix", "symbol", "year"],
+        "partitioning": ["symbol_prefix"],
         "json_boundary": "public/data/hist-probs remains JSON; this store is internal shadow only.",
     }
     print(json.dumps(manifest, indent=2, sort_keys=True))
     if not args.dry_run:
+        write_state(output_root, state)
         (output_root / "manifest.json").write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n")
     return 0
 
@@ -87,7 +87,7 @@ const latestSuccessPath = quantlabRoot
   ? path.join(quantlabRoot, 'ops', 'q1_daily_delta_ingest', 'latest_success.json')
   : null;
 const latestDateCachePath = quantlabRoot
-  ? path.join(quantlabRoot, 'ops', 'cache', 'q1_daily_delta_latest_date_index.stock_etf.json')
+  ? path.join(quantlabRoot, 'ops', 'cache', 'q1_daily_delta_latest_date_index.stock_etf.parquet')
   : null;
 const packStateCachePath = quantlabRoot
   ? path.join(quantlabRoot, 'ops', 'cache', 'q1_daily_delta_v7_pack_state.stock_etf.json')
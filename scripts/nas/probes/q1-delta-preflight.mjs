@@ -52,7 +52,7 @@ const writablePaths = [
 const pythonCheck = checkPythonModule('pyarrow');
 const quantlabRoot = quantlabRoots.find((candidate) => exists(candidate)) || null;
 const latestDateCache = quantlabRoot
-  ? path.join(quantlabRoot, 'ops', 'cache', 'q1_daily_delta_latest_date_index.stock_etf.json')
+  ? path.join(quantlabRoot, 'ops', 'cache', 'q1_daily_delta_latest_date_index.stock_etf.parquet')
   : null;
 const packStateCache = quantlabRoot
   ? path.join(quantlabRoot, 'ops', 'cache', 'q1_daily_delta_v7_pack_state.stock_etf.json')
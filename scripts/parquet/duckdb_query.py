@@ -28,6 +28,11 @@ def parse_args() -> argparse.Namespace:
     source.add_argument("--sql", help="SQL string to execute.")
     source.add_argument("--sql-file", type=Path, help="File containing SQL to execute.")
     parser.add_argument("--database", default=":memory:", help="DuckDB database path. Default: :memory:.")
+    parser.add_argument(
+        "--read-only",
+        action="store_true",
+        help="Open --database read-only, e.g. the breakout-v12 global catalog (compute-global-daily.py --catalog-db).",
+    )
     parser.add_argument(
         "--format",
         choices=("json", "jsonl", "csv"),
@@ -68,7 +73,7 @@ def main() -> int:
     args = parse_args()
     sql = args.sql_file.read_text(encoding="utf-8") if args.sql_file else args.sql
     duckdb = load_duckdb()
-    con = duckdb.connect(args.database)
+    con = duckdb.connect(args.database, read_only=bool(args.read_only and args.database != ":memory:"))
     try:
         if args.threads:
             con.execute(f"PRAGMA threads={int(args.threads)}")
@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+"""
+Shared asyncio HTTP fetch engine for provider ingest (EODHD, Stooq).
+
+- stdlib only: HTTP/1.1 over asyncio streams with per-host keep-alive connection pools
+- per-host token-bucket rate limiting (requests/sec + burst) sized to the provider quota
+- jittered exponential backoff for transient failures (connection errors, 5xx)
+- 429 handling that honours Retry-After and pauses the whole host bucket, not just one request
+- redirects (301/302/303/307/308) are followed like urllib, bounded to `max_redirects` hops and
+  only to the same origin or to https
+- non-2xx responses surface as urllib.error.HTTPError so existing `exc.code` handling keeps working
+- HTTP(S)_PROXY / NO_PROXY are honoured like urllib (trust_env=True): CONNECT tunnels for https
+
+Async callers use AsyncFetchEngine directly. Synchronous scripts (thread pools, serial loops)
+use BackgroundFetchEngine / shared_fetch_engine(), which runs one event loop on a daemon
+thread so every worker shares the same limiter and connection pool.
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import email.utils
+import gzip
+import io
+import json
+import os
+import random
+import ssl
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from dataclasses import dataclass, field
+from email.message import Message
+from typing import Any, Iterable
+
+
+DEFAULT_USER_AGENT = "RubikVault-http-fetch/1.0"
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+REDIRECT_STATUSES = frozenset({301, 302, 303, 307, 308})
+DEFAULT_RATE_PER_SEC = float(os.environ.get("RV_HTTP_RATE_PER_SEC", "0") or "0")
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int
+    headers: dict[str, str]
+    body: bytes
+    attempts: int
+    elapsed_sec: float
+
+    def text(self, encoding: str = "utf-8") -> str:
+        return self.body.decode(encoding, errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.text())
+
+
+@dataclass
+class FetchStats:
+    requests: int = 0
+    retries: int = 0
+    throttled_429: int = 0
+    connections_opened: int = 0
+    connections_reused: int = 0
+    rate_limit_wait_sec: float = 0.0
+    by_host: dict[str, int] = field(default_factory=dict)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "throttled_429": self.throttled_429,
+            "connections_opened": self.connections_opened,
+            "connections_reused": self.connections_reused,
+            "rate_limit_wait_sec": round(self.rate_limit_wait_sec, 3),
+            "by_host": dict(sorted(self.by_host.items())),
+        }
+
+
+class _StaleConnection(Exception):
+    """Keep-alive connection was closed by the peer before a response arrived."""
+
+
+def parse_retry_after(value: str | None, *, now: float | None = None) -> float | None:
+    text = str(value or "").strip()
+    if not text:
+        return None
+    try:
+        return max(0.0, float(text))
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(text)
+    except (TypeError, ValueError):
+        return None
+    if parsed is None:
+        return None
+    return max(0.0, parsed.timestamp() - (time.time() if now is None else now))
+
+
+def redirect_target(url: str, location: str | None) -> str | None:
+    """Absolute redirect URL, or None when it is missing or would leave the origin for non-https."""
+    if not location:
+        return None
+    target = urllib.parse.urljoin(url, location.strip())
+    src, dst = urllib.parse.urlsplit(url), urllib.parse.urlsplit(target)
+    if dst.scheme.lower() == "https":
+        return target
+    same_origin = (src.scheme.lower(), (src.hostname or "").lower(), src.port) == (
+        dst.scheme.lower(),
+        (dst.hostname or "").lower(),
+        dst.port,
+    )
+    return target if same_origin else None
+
+
+def _http_error(url: str, status: int, reason: str, resp_headers: dict[str, str], body: bytes, attempts: int):
+    msg = Message()
+    for key, value in resp_headers.items():
+        msg[key] = value
+    err = urllib.error.HTTPError(url, status, reason, msg, io.BytesIO(body))
+    setattr(err, "attempts", attempts)
+    return err
+
+
+def backoff_delay(attempt: int, *, base_sec: float, max_sec: float, rng: random.Random | None = None) -> float:
+    """Exponential backoff with "equal jitter": half fixed, half random, capped at max_sec."""
+    ceiling = min(float(max_sec), float(base_sec) * (2 ** max(0, int(attempt) - 1)))
+    return ceiling / 2.0 + (rng or random).uniform(0.0, ceiling / 2.0)
+
+
+class TokenBucket:
+    def __init__(self, rate_per_sec: float, burst: float | None = None):
+        self.rate = max(0.0, float(rate_per_sec or 0.0))
+        self.capacity = max(1.0, float(burst if burst else max(1.0, self.rate)))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock: asyncio.Lock | None = None
+
+    def pause_for(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + max(0.0, float(seconds)))
+
+    async def acquire(self) -> float:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                elif self.rate <= 0:
+                    return waited
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1.0:
+                        self.tokens -= 1.0
+                        return waited
+                    delay = (1.0 - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+
+class _Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.requests = 0
+
+    def close(self) -> None:
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+
+def _proxy_authorization(proxy: urllib.parse.SplitResult) -> str:
+    if not proxy.username:
+        return ""
+    creds = f"{urllib.parse.unquote(proxy.username)}:{urllib.parse.unquote(proxy.password or '')}"
+    return "Basic " + base64.b64encode(creds.encode("utf-8")).decode("ascii")
+
+
+async def _open_tunnel(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    host: str,
+    port: int,
+    proxy: urllib.parse.SplitResult,
+) -> None:
+    lines = [f"CONNECT {host}:{port} HTTP/1.1", f"Host: {host}:{port}"]
+    auth = _proxy_authorization(proxy)
+    if auth:
+        lines.append(f"Proxy-Authorization: {auth}")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    await writer.drain()
+    status_line = await reader.readline()
+    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+        pass
+    parts = status_line.decode("latin-1").split(" ", 2)
+    if len(parts) < 2 or parts[1] != "200":
+        raise ConnectionError(f"proxy_connect_failed:{status_line.strip()[:80]!r}")
+
+
+class _HostPool:
+    def __init__(self, max_connections: int):
+        self.idle: list[_Connection] = []
+        self.slots = asyncio.Semaphore(max(1, int(max_connections)))
+
+
+class AsyncFetchEngine:
+    def __init__(
+        self,
+        *,
+        rate_per_sec: float = DEFAULT_RATE_PER_SEC,
+        burst: float | None = None,
+        host_rates: dict[str, float] | None = None,
+        max_connections_per_host: int = 8,
+        timeout_sec: float = 25.0,
+        max_retries: int = 3,
+        backoff_base_sec: float = 0.5,
+        backoff_max_sec: float = 30.0,
+        retry_after_max_sec: float = 120.0,
+        retry_statuses: Iterable[int] = RETRYABLE_STATUSES,
+        max_redirects: int = 10,
+        user_agent: str = DEFAULT_USER_AGENT,
+        seed: int | None = None,
+        trust_env: bool = True,
+    ):
+        self.rate_per_sec = float(rate_per_sec or 0.0)
+        self.burst = burst
+        self.host_rates = {str(k).lower(): float(v) for k, v in (host_rates or {}).items()}
+        self.max_connections_per_host = max(1, int(max_connections_per_host))
+        self.timeout_sec = float(timeout_sec)
+        self.max_retries = max(1, int(max_retries))
+        self.backoff_base_sec = float(backoff_base_sec)
+        self.backoff_max_sec = float(backoff_max_sec)
+        self.retry_after_max_sec = float(retry_after_max_sec)
+        self.retry_statuses = frozenset(int(s) for s in retry_statuses)
+        self.max_redirects = max(0, int(max_redirects))
+        self.user_agent = user_agent
+        self.stats = FetchStats()
+        self._rng = random.Random(seed)
+        self._buckets: dict[str, TokenBucket] = {}
+        self._pools: dict[tuple[str, str, int], _HostPool] = {}
+        self._ssl_context: ssl.SSLContext | None = None
+        self._proxies: dict[str, str] = urllib.request.getproxies_environment() if trust_env else {}
+
+    # -- limiter / pool ------------------------------------------------------
+    def bucket(self, host: str) -> TokenBucket:
+        key = host.lower()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.host_rates.get(key, self.rate_per_sec), self.burst)
+            self._buckets[key] = bucket
+        return bucket
+
+    def _pool(self, key: tuple[str, str, int]) -> _HostPool:
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = _HostPool(self.max_connections_per_host)
+            self._pools[key] = pool
+        return pool
+
+    def _proxy_for(self, scheme: str, host: str) -> urllib.parse.SplitResult | None:
+        proxy = self._proxies.get(scheme)
+        if not proxy or urllib.request.proxy_bypass_environment(host, self._proxies):
+            return None
+        return urllib.parse.urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+
+    async def _open(self, scheme: str, host: str, port: int, timeout: float) -> _Connection:
+        ssl_ctx = None
+        if scheme == "https":
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            ssl_ctx = self._ssl_context
+        proxy = self._proxy_for(scheme, host)
+        if proxy is None:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port, ssl=ssl_ctx, server_hostname=host if ssl_ctx else None),
+                timeout,
+            )
+        else:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(proxy.hostname, proxy.port or 80), timeout)
+            if ssl_ctx is not None:
+                try:
+                    await asyncio.wait_for(_open_tunnel(reader, writer, host, port, proxy), timeout)
+                    await asyncio.wait_for(writer.start_tls(ssl_ctx, server_hostname=host), timeout)
+                except BaseException:
+                    writer.close()
+                    raise
+        self.stats.connections_opened += 1
+        return _Connection(reader, writer)
+
+    # -- single HTTP/1.1 exchange --------------------------------------------
+    async def _exchange(
+        self,
+        conn: _Connection,
+        *,
+        host_header: str,
+        target: str,
+        headers: dict[str, str],
+    ) -> tuple[int, str, dict[str, str], bytes, bool]:
+        lines = [f"GET {target} HTTP/1.1", f"Host: {host_header}"]
+        merged = {"user-agent": self.user_agent, "accept-encoding": "gzip", "connection": "keep-alive"}
+        merged.update({str(k).lower(): str(v) for k, v in (headers or {}).items()})
+        lines.extend(f"{k}: {v}" for k, v in merged.items())
+        conn.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await conn.writer.drain()
+
+        status_line = await conn.reader.readline()
+        if not status_line:
+            raise _StaleConnection()
+        parts = status_line.decode("latin-1").strip().split(" ", 2)
+        if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+            raise ConnectionError(f"bad_status_line:{status_line[:80]!r}")
+        version, status = parts[0], int(parts[1])
+        reason = parts[2] if len(parts) > 2 else ""
+        resp_headers: dict[str, str] = {}
+        while True:
+            line = await conn.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            resp_headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == "HTTP/1.1" and resp_headers.get("connection", "").lower() != "close"
+        if status in (204, 304) or 100 <= status < 200:
+            body = b""
+        elif "chunked" in resp_headers.get("transfer-encoding", "").lower():
+            chunks = []
+            while True:
+                size_line = await conn.reader.readline()
+                size = int(size_line.split(b";", 1)[0].strip() or b"0", 16)
+                if size == 0:
+                    while (await conn.reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await conn.reader.readexactly(size))
+                await conn.reader.readline()
+            body = b"".join(chunks)
+        elif "content-length" in resp_headers:
+            body = await conn.reader.readexactly(int(resp_headers["content-length"]))
+        else:
+            body = await conn.reader.read()
+            keep_alive = False
+        if resp_headers.get("content-encoding", "").lower() == "gzip" and body:
+            body = gzip.decompress(body)
+        return status, reason, resp_headers, body, keep_alive
+
+    async def _request_once(self, url: str, headers: dict[str, str], timeout: float) -> tuple[int, str, dict[str, str], bytes]:
+        parsed = urllib.parse.urlsplit(url)
+        scheme = parsed.scheme.lower()
+        if scheme not in {"http", "https"}:
+            raise ValueError(f"unsupported_scheme:{scheme}")
+        host = parsed.hostname or ""
+        port = parsed.port or (443 if scheme == "https" else 80)
+        target = parsed.path or "/"
+        if parsed.query:
+            target = f"{target}?{parsed.query}"
+        default_port = (scheme == "https" and port == 443) or (scheme == "http" and port == 80)
+        host_header = host if default_port else f"{host}:{port}"
+        proxy = self._proxy_for(scheme, host) if scheme == "http" else None
+        if proxy is not None:
+            # Plain-http requests go to the proxy in absolute form; https uses the CONNECT tunnel from _open.
+            target = f"http://{host_header}{target}"
+            auth = _proxy_authorization(proxy)
+            if auth:
+                headers = {**(headers or {}), "proxy-authorization": auth}
+        pool = self._pool((scheme, host, port))
+        async with pool.slots:
+            # A pooled connection may have been closed by the server while idle; retry once fresh.
+            for _ in range(2):
+                reused = bool(pool.idle)
+                conn = pool.idle.pop() if reused else await self._open(scheme, host, port, timeout)
+                try:
+                    status, reason, resp_headers, body, keep_alive = await asyncio.wait_for(
+                        self._exchange(conn, host_header=host_header, target=target, headers=headers),
+                        timeout,
+                    )
+                except _StaleConnection:
+                    conn.close()
+                    if reused:
+                        continue
+                    raise ConnectionError("connection_closed_before_response")
+                except BaseException:
+                    conn.close()
+                    raise
+                if reused:
+                    self.stats.connections_reused += 1
+                conn.requests += 1
+                if keep_alive:
+                    pool.idle.append(conn)
+                else:
+                    conn.close()
+                return status, reason, resp_headers, body
+        raise ConnectionError("connection_pool_exhausted")
+
+    # -- public API -------------------------------------------------------------
+    async def fetch(
+        self,
+        url: str,
+        *,
+        headers: dict[str, str] | None = None,
+        timeout_sec: float | None = None,
+        max_retries: int | None = None,
+        raise_for_status: bool = True,
+    ) -> FetchResult:
+        started = time.monotonic()
+        timeout = float(timeout_sec or self.timeout_sec)
+        attempts_allowed = max(1, int(max_retries or self.max_retries))
+        host = (urllib.parse.urlsplit(url).hostname or "").lower()
+        bucket = self.bucket(host)
+        attempt = 0
+        redirects = 0
+        while True:
+            attempt += 1
+            self.stats.rate_limit_wait_sec += await bucket.acquire()
+            self.stats.requests += 1
+            self.stats.by_host[host] = self.stats.by_host.get(host, 0) + 1
+            delay: float | None = None
+            try:
+                status, reason, resp_headers, body = await self._request_once(url, dict(headers or {}), timeout)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError) as exc:
+                if attempt >= attempts_allowed:
+                    raise urllib.error.URLError(f"{type(exc).__name__}:{exc}") from exc
+                delay = backoff_delay(attempt, base_sec=self.backoff_base_sec, max_sec=self.backoff_max_sec, rng=self._rng)
+            else:
+                location = redirect_target(url, resp_headers.get("location")) if status in REDIRECT_STATUSES else None
+                if location is not None:
+                    redirects += 1
+                    if redirects > self.max_redirects:
+                        raise _http_error(url, status, f"too_many_redirects:{reason}", resp_headers, body, attempt)
+                    if urllib.parse.urlsplit(location).hostname != urllib.parse.urlsplit(url).hostname:
+                        headers = {k: v for k, v in (headers or {}).items() if str(k).lower() not in {"authorization", "cookie"}}
+                    url = location
+                    host = (urllib.parse.urlsplit(url).hostname or "").lower()
+                    bucket = self.bucket(host)
+                    attempt = 0
+                    continue
+                if status in self.retry_statuses and attempt < attempts_allowed:
+                    if status == 429:
+                        self.stats.throttled_429 += 1
+                        retry_after = parse_retry_after(resp_headers.get("retry-after"))
+                        if retry_after is not None:
+                            delay = min(self.retry_after_max_sec, retry_after)
+                            bucket.pause_for(delay)
+                    if delay is None:
+                        delay = backoff_delay(attempt, base_sec=self.backoff_base_sec, max_sec=self.backoff_max_sec, rng=self._rng)
+                else:
+                    result = FetchResult(
+                        url=url,
+                        status=status,
+                        headers=resp_headers,
+                        body=body,
+                        attempts=attempt,
+                        elapsed_sec=time.monotonic() - started,
+                    )
+                    if raise_for_status and not 200 <= status < 300:
+                        raise _http_error(url, status, reason, resp_headers, body, attempt)
+                    return result
+            self.stats.retries += 1
+            await asyncio.sleep(delay)
+
+    async def fetch_json(self, url: str, **kwargs: Any) -> tuple[Any, int]:
+        result = await self.fetch(url, **kwargs)
+        return result.json(), result.attempts
+
+    async def aclose(self) -> None:
+        for pool in self._pools.values():
+            while pool.idle:
+                pool.idle.pop().close()
+        self._pools.clear()
+
+
+class BackgroundFetchEngine:
+    """Runs an AsyncFetchEngine on a private event loop thread for synchronous callers."""
+
+    def __init__(self, **engine_kwargs: Any):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="rv-http-fetch", daemon=True)
+        self._thread.start()
+        self.engine: AsyncFetchEngine = self._submit(self._build(engine_kwargs))
+
+    async def _build(self, engine_kwargs: dict[str, Any]) -> AsyncFetchEngine:
+        return AsyncFetchEngine(**engine_kwargs)
+
+    def _submit(self, coro: Any) -> Any:
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def fetch(self, url: str, **kwargs: Any) -> FetchResult:
+        return self._submit(self.engine.fetch(url, **kwargs))
+
+    def fetch_json(self, url: str, **kwargs: Any) -> tuple[Any, int]:
+        return self._submit(self.engine.fetch_json(url, **kwargs))
+
+    @property
+    def stats(self) -> FetchStats:
+        return self.engine.stats
+
+    def close(self) -> None:
+        if not self._loop.is_running():
+            return
+        self._submit(self.engine.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop.close()
+
+
+_SHARED_ENGINE: BackgroundFetchEngine | None = None
+_SHARED_ENGINE_CONFIG: dict[str, Any] = {}
+_SHARED_ENGINE_LOCK = threading.Lock()
+
+
+def configure_shared_fetch_engine(**engine_kwargs: Any) -> None:
+    """Set engine options before first use; replaces an already-running shared engine."""
+    global _SHARED_ENGINE, _SHARED_ENGINE_CONFIG
+    with _SHARED_ENGINE_LOCK:
+        _SHARED_ENGINE_CONFIG = dict(engine_kwargs)
+        if _SHARED_ENGINE is not None:
+            _SHARED_ENGINE.close()
+            _SHARED_ENGINE = None
+
+
+def shared_fetch_engine() -> BackgroundFetchEngine:
+    global _SHARED_ENGINE
+    with _SHARED_ENGINE_LOCK:
+        if _SHARED_ENGINE is None:
+            _SHARED_ENGINE = BackgroundFetchEngine(**_SHARED_ENGINE_CONFIG)
+        return _SHARED_ENGINE
+
+
+def shared_fetch_stats() -> dict[str, Any]:
+    """Stats of the running shared engine; zeros when none was started (never starts one)."""
+    with _SHARED_ENGINE_LOCK:
+        return (_SHARED_ENGINE.stats if _SHARED_ENGINE is not None else FetchStats()).as_dict()
+
+
+def close_shared_fetch_engine() -> dict[str, Any]:
+    """Close the shared engine and return its final stats (zeros when none was started)."""
+    global _SHARED_ENGINE
+    with _SHARED_ENGINE_LOCK:
+        engine = _SHARED_ENGINE
+        _SHARED_ENGINE = None
+        if engine is None:
+            return FetchStats().as_dict()
+        engine.close()
+        return engine.stats.as_dict()
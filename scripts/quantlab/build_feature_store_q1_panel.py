@@ -2,15 +2,14 @@
 from __future__ import annotations
 
 import argparse
-import gzip
 import hashlib
-import json
 import sys
 from datetime import timedelta
 from pathlib import Path
 from typing import Iterable
 
 import polars as pl
+import pyarrow.compute as pc
 
 REPO_ROOT = Path(__file__).resolve().parents[2]
 if str(REPO_ROOT) not in sys.path:
@@ -26,6 +25,7 @@ from scripts.quantlab.q1_common import (  # noqa: E402
     stable_hash_obj,
     utc_now_iso,
 )
+from scripts.quantlab.registry_index import isin as registry_isin, load_registry_index, strip as registry_strip  # noqa: E402
 
 
 DEF_PANEL_DAYS = 140
@@ -190,27 +190,18 @@ def _load_or_build_registry_packkey_cache(
     else:
         cache_read_error = None
 
-    mappings: dict[str, str] = {}
-    scanned_registry_rows = 0
-    missing_pointer_rows = 0
-    with gzip.open(registry_path, "rt", encoding="utf-8") as fh:
-        for line in fh:
-            line = line.strip()
-            if not line:
-                continue
-            scanned_registry_rows += 1
-            try:
-                obj = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-            cid = str(obj.get("canonical_id") or "").strip()
-            if not cid:
-                continue
-            rel_pack = str(((obj.get("pointers") or {}).get("history_pack")) or "").strip()
-            if not rel_pack:
-                missing_pointer_rows += 1
-                continue
-            mappings[cid] = _rel_to_pack_key(rel_pack)
+    table, index_info = load_registry_index(registry_path)
+    cids = registry_strip(table["canonical_id"])
+    rel_packs = registry_strip(table["history_pack"])
+    has_cid = pc.not_equal(cids, "")
+    has_pack = pc.not_equal(rel_packs, "")
+    scanned_registry_rows = int(index_info["rows_total"])
+    missing_pointer_rows = int(pc.sum(pc.and_(has_cid, pc.invert(has_pack))).as_py() or 0)
+    keep = pc.and_(has_cid, has_pack)
+    mappings: dict[str, str] = {
+        cid: _rel_to_pack_key(rel_pack)
+        for cid, rel_pack in zip(cids.filter(keep).to_pylist(), rel_packs.filter(keep).to_pylist())
+    }
 
     cache_payload = {
         "schema": "quantlab_v7_registry_packkey_cache_v1",
@@ -393,25 +384,13 @@ def _select_bars_files_from_registry_allowlist(
                 "allowlist_assets_total": len(allow_asset_ids),
                 "registry_path": str(registry_path),
             }
-        with gzip.open(registry_path, "rt", encoding="utf-8") as fh:
-            for line in fh:
-                line = line.strip()
-                if not line:
-                    continue
-                scanned_registry_rows += 1
-                try:
-                    obj = json.loads(line)
-                except json.JSONDecodeError:
-                    continue
-                cid = str(obj.get("canonical_id") or "").strip()
-                if cid not in allow_set:
-                    continue
-                selected_assets_found += 1
-                rel_pack = str(((obj.get("pointers") or {}).get("history_pack")) or "").strip()
-                if not rel_pack:
-                    missing_pointer_assets += 1
-                    continue
-                selected_pack_keys.add(_rel_to_pack_key(rel_pack))
+        table, index_info = load_registry_index(registry_path)
+        scanned_registry_rows = int(index_info["rows_total"])
+        allowed = registry_isin(registry_strip(table["canonical_id"]), allow_set)
+        rel_packs = registry_strip(table["history_pack"]).filter(allowed).to_pylist()
+        selected_assets_found = len(rel_packs)
+        missing_pointer_assets = sum(1 for rel_pack in rel_packs if not rel_pack)
+        selected_pack_keys = {_rel_to_pack_key(rel_pack) for rel_pack in rel_packs if rel_pack}
 
     if not selected_pack_keys:
         return None, {
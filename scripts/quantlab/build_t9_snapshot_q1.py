@@ -17,7 +17,6 @@ The snapshot is reproducible and hash-addressed by source-file metadata + select
 from __future__ import annotations
 
 import argparse
-import gzip
 import hashlib
 import json
 import os
@@ -29,10 +28,22 @@ from typing import Iterable
 
 try:
     import pyarrow as pa
+    import pyarrow.compute as pc
     import pyarrow.parquet as pq
 except Exception as exc:  # pragma: no cover
     raise SystemExit(f"FATAL: pyarrow is required: {exc}")
 
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.quantlab.registry_index import (  # noqa: E402
+    isin as registry_isin,
+    load_registry_index,
+    strip as registry_strip,
+    upper as registry_upper,
+)
+
 
 def utc_now_iso() -> str:
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
@@ -134,8 +145,8 @@ def _last_num(lst):
 
 
 def _adv20_dollar_from_row(o: dict) -> float | None:
-    closes = o.get("_tmp_recent_closes") or []
-    vols = o.get("_tmp_recent_volumes") or []
+    closes = o.get("recent_closes") or []
+    vols = o.get("recent_volumes") or []
     vals = []
     if isinstance(closes, list) and isinstance(vols, list):
         for c, v in zip(closes[-20:], vols[-20:]):
@@ -174,6 +185,16 @@ def liquidity_bucket(adv20_dollar: float | None, asset_class: str) -> str:
     return "micro"
 
 
+REGISTRY_ASSET_CLASSES = {
+    "STOCK": "stock",
+    "ETF": "etf",
+    "CRYPTO": "crypto",
+    "FOREX": "forex",
+    "BOND": "bond",
+    "INDEX": "index",
+}
+
+
 def build_universe_rows(registry_path: Path, asof_date: str, include_classes: set[str], snapshot_id: str) -> tuple[list[dict], dict]:
     rows: list[dict] = []
     counts = {
@@ -183,76 +204,62 @@ def build_universe_rows(registry_path: Path, asof_date: str, include_classes: se
         "eligible_entry": 0,
         "eligible_exit": 0,
     }
-    with gzip.open(registry_path, "rt", encoding="utf-8") as fh:
-        for line in fh:
-            line = line.strip()
-            if not line:
-                continue
-            counts["rows_total"] += 1
-            try:
-                o = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-            type_norm = str(o.get("type_norm") or "").upper()
-            asset_class = {
-                "STOCK": "stock",
-                "ETF": "etf",
-                "CRYPTO": "crypto",
-                "FOREX": "forex",
-                "BOND": "bond",
-                "INDEX": "index",
-            }.get(type_norm)
-            if not asset_class or asset_class not in include_classes:
-                continue
-            cid = str(o.get("canonical_id") or "").strip()
-            if not cid:
-                continue
-            bars_count = int(o.get("bars_count") or 0)
-            price_raw = _last_num(o.get("_tmp_recent_closes"))
-            adv20_d = _adv20_dollar_from_row(o)
-            history_pack = str(((o.get("pointers") or {}).get("history_pack")) or "").strip()
-            has_pack = bool(history_pack)
-            if not has_pack:
-                elig_reason = "MISSING_HISTORY_PACK_POINTER"
-                is_entry = False
-                is_exit = False
-            elif bars_count < 200:
-                elig_reason = "INSUFFICIENT_BARS_LT_200"
-                is_entry = False
-                is_exit = True
-            elif not price_raw or price_raw <= 0:
-                elig_reason = "NONPOSITIVE_LATEST_PRICE"
-                is_entry = False
-                is_exit = True
-            else:
-                elig_reason = "OK"
-                is_entry = True
-                is_exit = True
-            row = {
-                "asset_id": cid,
-                "asof_date": asof_date,
-                "asset_class": asset_class,
-                "symbol": str(o.get("symbol") or ""),
-                "exchange": str(o.get("exchange") or ""),
-                "currency": str(o.get("currency") or ""),
-                "country": str(o.get("country") or ""),
-                "price_raw": float(price_raw) if price_raw is not None else None,
-                "bars_count": bars_count,
-                "last_trade_date": str(o.get("last_trade_date") or ""),
-                "adv20_dollar": float(adv20_d) if adv20_d is not None else None,
-                "adv20_percentile": None,  # filled later
-                "liquidity_bucket": "",    # filled later
-                "is_entry_eligible": bool(is_entry),
-                "is_exit_eligible": bool(is_exit),
-                "eligibility_reason": elig_reason,
-                "universe_version": snapshot_id,
-                "universe_hash": "",
-            }
-            rows.append(row)
-            counts["rows_selected"] += 1
-            counts["by_asset_class"][asset_class] = counts["by_asset_class"].get(asset_class, 0) + 1
-            counts["eligible_entry"] += int(is_entry)
-            counts["eligible_exit"] += int(is_exit)
+    table, index_info = load_registry_index(registry_path)
+    counts["rows_total"] = int(index_info["rows_total"])
+    type_norms = registry_upper(table["type_norm"])
+    cids = registry_strip(table["canonical_id"])
+    selected_types = [t for t, cls in REGISTRY_ASSET_CLASSES.items() if cls in include_classes]
+    keep = pc.and_(registry_isin(type_norms, selected_types), pc.not_equal(cids, ""))
+    table = table.append_column("type_upper", type_norms).append_column("cid", cids).filter(keep)
+    for o in table.to_pylist():
+        asset_class = REGISTRY_ASSET_CLASSES[o["type_upper"]]
+        cid = o["cid"]
+        bars_count = int(o["bars_count"])
+        price_raw = _last_num(o["recent_closes"])
+        adv20_d = _adv20_dollar_from_row(o)
+        history_pack = o["history_pack"].strip()
+        has_pack = bool(history_pack)
+        if not has_pack:
+            elig_reason = "MISSING_HISTORY_PACK_POINTER"
+            is_entry = False
+            is_exit = False
+        elif bars_count < 200:
+            elig_reason = "INSUFFICIENT_BARS_LT_200"
+            is_entry = False
+            is_exit = True
+        elif not price_raw or price_raw <= 0:
+            elig_reason = "NONPOSITIVE_LATEST_PRICE"
+            is_entry = False
+            is_exit = True
+        else:
+            elig_reason = "OK"
+            is_entry = True
+            is_exit = True
+        row = {
+            "asset_id": cid,
+            "asof_date": asof_date,
+            "asset_class": asset_class,
+            "symbol": o["symbol"],
+            "exchange": o["exchange"],
+            "currency": o["currency"],
+            "country": o["country"],
+            "price_raw": float(price_raw) if price_raw is not None else None,
+            "bars_count": bars_count,
+            "last_trade_date": o["last_trade_date"],
+            "adv20_dollar": float(adv20_d) if adv20_d is not None else None,
+            "adv20_percentile": None,  # filled later
+            "liquidity_bucket": "",    # filled later
+            "is_entry_eligible": bool(is_entry),
+            "is_exit_eligible": bool(is_exit),
+            "eligibility_reason": elig_reason,
+            "universe_version": snapshot_id,
+            "universe_hash": "",
+        }
+        rows.append(row)
+        counts["rows_selected"] += 1
+        counts["by_asset_class"][asset_class] = counts["by_asset_class"].get(asset_class, 0) + 1
+        counts["eligible_entry"] += int(is_entry)
+        counts["eligible_exit"] += int(is_exit)
 
     # Percentiles + buckets by asset class
     for cls in sorted({r["asset_class"] for r in rows}):
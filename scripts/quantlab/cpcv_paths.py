@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""Combinatorial (CPCV-light) path enumeration shared across Stage B candidates.
+
+Which fold combinations count as paths depends only on the fold layout (fold
+count, test windows, embargo) and the combo policy, never on a candidate's
+sharpes. ``CpcvPathEngine.layout`` resolves that once per layout, including the
+policy-relaxation ladder, and caches the surviving combinations as index
+matrices. ``path_means`` then evaluates every path for any number of candidates
+at once by gathering the fold-sharpe matrix. The fold values are summed left to
+right and divided by the combo size, like the original per-combo loop, so path
+means are bit-identical.
+"""
+from __future__ import annotations
+
+import itertools
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class CpcvLayout:
+    n: int
+    combo_sizes: list[int]
+    requested_combo_sizes: list[int]
+    combos: list[np.ndarray]  # one (paths_k, k) index matrix per combo size, itertools order
+    combos_considered_total: int
+    combos_skipped_adjacent_total: int
+    combos_skipped_temporal_total: int
+    used_skip_adjacent: bool
+    used_temporal_filter: bool
+    policy_relaxations: list[str] = field(default_factory=list)
+
+    @property
+    def combos_effective_total(self) -> int:
+        return int(sum(len(idx) for idx in self.combos))
+
+
+def _gap_days(a_start: date, a_end: date, b_start: date, b_end: date) -> int:
+    if a_end < b_start:
+        return int((b_start - a_end).days - 1)
+    if b_end < a_start:
+        return int((a_start - b_end).days - 1)
+    return -1
+
+
+def _pair_valid_matrix(fold_windows: list[dict | None], n: int, min_test_gap_days: int, min_embargo_gap_days: int) -> np.ndarray:
+    valid = np.zeros((n, n), dtype=bool)
+    for i in range(n):
+        wi = fold_windows[i] if i < len(fold_windows) else None
+        for j in range(i + 1, n):
+            wj = fold_windows[j] if j < len(fold_windows) else None
+            if wi is None or wj is None:
+                continue
+            gap = _gap_days(wi["test_start"], wi["test_end"], wj["test_start"], wj["test_end"])
+            required = max(
+                int(min_test_gap_days),
+                int(max(int(wi.get("embargo_days") or 0), int(wj.get("embargo_days") or 0)) + int(min_embargo_gap_days)),
+            )
+            valid[i, j] = valid[j, i] = gap >= 0 and gap >= required
+    return valid
+
+
+def _layout_key(fold_windows: list[dict | None] | None, n: int, policy: tuple) -> tuple:
+    windows = tuple(
+        None if w is None else (w.get("test_start"), w.get("test_end"), int(w.get("embargo_days") or 0))
+        for w in (fold_windows or [])[:n]
+    )
+    return (n, bool(fold_windows), windows, policy)
+
+
+class CpcvPathEngine:
+    def __init__(self) -> None:
+        self._layouts: dict[tuple, CpcvLayout] = {}
+        self._all_combos: dict[tuple[int, int], np.ndarray] = {}
+        self.layout_builds = 0
+
+    def _combos(self, n: int, k: int) -> np.ndarray:
+        key = (n, k)
+        if key not in self._all_combos:
+            self._all_combos[key] = np.array(list(itertools.combinations(range(n), k)), dtype=np.int64).reshape(-1, k)
+        return self._all_combos[key]
+
+    def _evaluate(
+        self, n: int, combo_sizes: list[int], skip_adjacent: bool, pair_valid: np.ndarray | None
+    ) -> tuple[list[np.ndarray], int, int, int]:
+        kept: list[np.ndarray] = []
+        considered = skipped_adjacent = skipped_temporal = 0
+        for k in combo_sizes:
+            idx = self._combos(n, k)
+            considered += len(idx)
+            if skip_adjacent and k > 1:
+                adjacent = (np.diff(idx, axis=1) <= 1).any(axis=1)
+                skipped_adjacent += int(adjacent.sum())
+                idx = idx[~adjacent]
+            if pair_valid is not None and k > 1:
+                ok = np.ones(len(idx), dtype=bool)
+                for a, b in itertools.combinations(range(k), 2):
+                    ok &= pair_valid[idx[:, a], idx[:, b]]
+                skipped_temporal += int((~ok).sum())
+                idx = idx[ok]
+            kept.append(idx)
+        return kept, considered, skipped_adjacent, skipped_temporal
+
+    def layout(
+        self,
+        n: int,
+        *,
+        fold_windows: list[dict | None] | None,
+        min_combo_size: int,
+        skip_adjacent_folds: bool,
+        temporal_filter: bool,
+        min_test_gap_days: int,
+        min_embargo_gap_days: int,
+        relaxation_mode: str,
+    ) -> CpcvLayout:
+        """Surviving combinations for ``n`` folds (n >= 2) under the policy, relaxing it as the allow mode does."""
+        policy = (
+            max(1, int(min_combo_size)),
+            bool(skip_adjacent_folds),
+            bool(temporal_filter),
+            max(0, int(min_test_gap_days)),
+            max(0, int(min_embargo_gap_days)),
+            str(relaxation_mode or "allow"),
+        )
+        key = _layout_key(fold_windows, n, policy)
+        cached = self._layouts.get(key)
+        if cached is not None:
+            return cached
+        self.layout_builds += 1
+        requested_min, skip_adjacent, temporal, test_gap, embargo_gap, relax_mode = policy
+        combo_sizes = list(range(requested_min, n)) or [max(1, n - 1)]
+        pair_valid = _pair_valid_matrix(fold_windows or [], n, test_gap, embargo_gap) if fold_windows else None
+        relaxations: list[str] = []
+
+        def run() -> tuple[list[np.ndarray], int, int, int]:
+            return self._evaluate(n, combo_sizes, skip_adjacent, pair_valid if temporal else None)
+
+        kept, considered, skipped_adj, skipped_tmp = run()
+        if relax_mode == "allow" and not any(len(idx) for idx in kept) and skip_adjacent:
+            skip_adjacent = False
+            relaxations.append("disable_skip_adjacent_when_no_effective_paths")
+            kept, considered, skipped_adj, skipped_tmp = run()
+        if relax_mode == "allow" and not any(len(idx) for idx in kept) and temporal:
+            temporal = False
+            relaxations.append("disable_temporal_filter_when_no_effective_paths")
+            kept, considered, skipped_adj, skipped_tmp = run()
+        layout = CpcvLayout(
+            n=n,
+            combo_sizes=combo_sizes,
+            requested_combo_sizes=list(combo_sizes),
+            combos=kept,
+            combos_considered_total=considered,
+            combos_skipped_adjacent_total=skipped_adj,
+            combos_skipped_temporal_total=skipped_tmp,
+            used_skip_adjacent=skip_adjacent,
+            used_temporal_filter=temporal,
+            policy_relaxations=relaxations,
+        )
+        self._layouts[key] = layout
+        return layout
+
+    @staticmethod
+    def path_means(layout: CpcvLayout, sharpes: Any) -> np.ndarray:
+        """Path-mean matrix (paths, candidates) for a (folds, candidates) sharpe matrix."""
+        values = np.asarray(sharpes, dtype=np.float64)
+        if values.ndim == 1:
+            values = values[:, None]
+        blocks = []
+        for idx in layout.combos:
+            if not len(idx):
+                continue
+            acc = values[idx[:, 0]].copy()
+            for pos in range(1, idx.shape[1]):
+                acc += values[idx[:, pos]]
+            blocks.append(acc / idx.shape[1])
+        if not blocks:
+            return np.zeros((0, values.shape[1]), dtype=np.float64)
+        return np.concatenate(blocks, axis=0)
+
+    def path_means_by_candidate(self, folds_by_candidate: dict[str, tuple[list[float], list[dict | None]]], **policy: Any) -> dict[str, list[float]]:
+        """Path means per candidate, one gather per shared layout; candidates with < 2 folds are skipped."""
+        groups: dict[int, tuple[CpcvLayout, list[str]]] = {}
+        for cid, (sharpes, windows) in folds_by_candidate.items():
+            if len(sharpes) <= 1:
+                continue
+            layout = self.layout(len(sharpes), fold_windows=windows, **policy)
+            groups.setdefault(id(layout), (layout, []))[1].append(cid)
+        out: dict[str, list[float]] = {}
+        for layout, cids in groups.values():
+            matrix = np.array([folds_by_candidate[cid][0] for cid in cids], dtype=np.float64).T
+            means = self.path_means(layout, matrix)
+            for j, cid in enumerate(cids):
+                out[cid] = means[:, j].tolist()
+        return out
+
+    def stats(self) -> dict[str, int]:
+        return {"layouts_cached": len(self._layouts), "layout_builds": self.layout_builds}
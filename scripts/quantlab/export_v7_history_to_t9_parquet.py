@@ -3,7 +3,7 @@
 Resumable local export: v7 history packs (ndjson.gz) -> Parquet on external SSD (T9).
 
 This does NOT modify the existing website/v7 history store. It reads from:
-  mirrors/universe-v7/history/**/*.ndjson.gz
+  mirrors/universe-v7/history/**/*.ndjson.gz (or their .arrowpack stores with --pack-store arrow)
 and writes a Quant/analytics-friendly raw layer to an external target (default T9).
 
 Scope (default):
@@ -14,7 +14,6 @@ Scope (default):
 from __future__ import annotations
 
 import argparse
-import gzip
 import hashlib
 import json
 import os
@@ -22,6 +21,7 @@ import sys
 import time
 import uuid
 from collections import defaultdict
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
@@ -30,11 +30,31 @@ from typing import Dict, Iterable, List, Tuple
 
 try:
     import pyarrow as pa
+    import pyarrow.compute as pc
     import pyarrow.parquet as pq
 except Exception as exc:  # pragma: no cover - runtime dependency check
     print(f"FATAL: pyarrow is required: {exc}", file=sys.stderr)
     sys.exit(2)
 
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.quantlab.history_pack_store import (  # noqa: E402
+    DEFAULT_PACK_STORE,
+    PACK_STORE_CHOICES,
+    open_pack,
+    pack_exists,
+)
+from scripts.quantlab.pack_pool import iter_ordered_results, publish_staged_outputs, reset_staging  # noqa: E402
+from scripts.quantlab.raw_bars_writer import BAR_COLUMNS, RAW_BARS_SCHEMA, RawBarsSink  # noqa: E402
+from scripts.quantlab.registry_index import (  # noqa: E402
+    isin as registry_isin,
+    load_registry_index,
+    strip as registry_strip,
+    upper as registry_upper,
+)
+
 
 def utc_now_iso() -> str:
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
@@ -70,13 +90,13 @@ def rel_to_pack_key(rel_pack: str) -> str:
     return hashlib.sha1(rel_pack.encode("utf-8")).hexdigest()[:16]
 
 
-def resolve_pack_path(repo_root: Path, rel_pack: str) -> Path:
+def resolve_pack_path(repo_root: Path, rel_pack: str, pack_store: str = DEFAULT_PACK_STORE) -> Path:
     requested = (repo_root / "mirrors/universe-v7" / rel_pack).resolve()
-    if requested.exists():
+    if pack_exists(requested, pack_store):
         return requested
     parent = requested.parent
     fallback = parent / "pack_0001.ndjson.gz"
-    if fallback.exists():
+    if pack_exists(fallback, pack_store):
         return fallback
     if parent.exists():
         candidates = sorted(parent.glob("*.ndjson.gz"))
@@ -169,6 +189,18 @@ def parse_args(argv: Iterable[str]) -> argparse.Namespace:
     )
     p.add_argument("--compression", default="snappy")
     p.add_argument("--job-name", default="")
+    p.add_argument(
+        "--pack-store",
+        choices=list(PACK_STORE_CHOICES),
+        default=DEFAULT_PACK_STORE,
+        help="History pack backend to read (must match the refresh writer's --pack-store).",
+    )
+    p.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ.get("RV_T9_EXPORT_WORKERS", "1") or "1"),
+        help="Packs flattened in parallel worker processes; the parent still owns state/manifest writes.",
+    )
     return p.parse_args(list(argv))
 
 
@@ -188,42 +220,37 @@ def _load_force_packs(args: argparse.Namespace) -> set[str]:
 def build_registry_index(
     registry_path: Path, include_types: set[str]
 ) -> Tuple[Dict[str, AssetMeta], Dict[str, set[str]], dict]:
+    table, index_info = load_registry_index(registry_path)
     asset_meta: Dict[str, AssetMeta] = {}
     pack_to_assets: Dict[str, set[str]] = defaultdict(set)
-    stats = {"rows_total": 0, "rows_selected": 0, "missing_pack_pointer": 0, "types": defaultdict(int)}
-    with gzip.open(registry_path, "rt", encoding="utf-8") as fh:
-        for line in fh:
-            line = line.strip()
-            if not line:
-                continue
-            stats["rows_total"] += 1
-            try:
-                obj = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-            type_norm = str(obj.get("type_norm") or "").upper()
-            stats["types"][type_norm] += 1
-            if type_norm not in include_types:
-                continue
-            cid = str(obj.get("canonical_id") or "").strip()
-            if not cid:
-                continue
-            rel_pack = str(((obj.get("pointers") or {}).get("history_pack")) or "").strip()
-            if not rel_pack:
-                stats["missing_pack_pointer"] += 1
-                continue
-            asset_meta[cid] = AssetMeta(
-                asset_id=cid,
-                symbol=str(obj.get("symbol") or ""),
-                exchange=str(obj.get("exchange") or ""),
-                currency=str(obj.get("currency") or ""),
-                type_norm=type_norm,
-                provider_symbol=str(obj.get("provider_symbol") or obj.get("symbol") or ""),
-                country=str(obj.get("country") or ""),
-            )
-            pack_to_assets[rel_pack].add(cid)
-            stats["rows_selected"] += 1
-    stats["types"] = dict(stats["types"])
+    type_upper = registry_upper(table["type_norm"])
+    type_counts = pc.value_counts(type_upper)
+    stats = {
+        "rows_total": int(index_info["rows_total"]),
+        "rows_selected": 0,
+        "missing_pack_pointer": 0,
+        "types": {str(v): int(c) for v, c in zip(type_counts.field("values").to_pylist(), type_counts.field("counts").to_pylist())},
+        "registry_index": index_info["status"],
+    }
+    selected = table.append_column("type_upper", type_upper).filter(
+        pc.and_(registry_isin(type_upper, include_types), pc.not_equal(registry_strip(table["canonical_id"]), ""))
+    )
+    has_pack = pc.not_equal(registry_strip(selected["history_pack"]), "")
+    stats["missing_pack_pointer"] = int(selected.num_rows - pc.sum(has_pack).as_py() if selected.num_rows else 0)
+    selected = selected.filter(has_pack)
+    for obj in selected.select(["canonical_id", "symbol", "exchange", "currency", "type_upper", "provider_symbol", "country", "history_pack"]).to_pylist():
+        cid = obj["canonical_id"].strip()
+        asset_meta[cid] = AssetMeta(
+            asset_id=cid,
+            symbol=obj["symbol"],
+            exchange=obj["exchange"],
+            currency=obj["currency"],
+            type_norm=obj["type_upper"],
+            provider_symbol=obj["provider_symbol"] or obj["symbol"],
+            country=obj["country"],
+        )
+        pack_to_assets[obj["history_pack"].strip()].add(cid)
+        stats["rows_selected"] += 1
     return asset_meta, pack_to_assets, stats
 
 
@@ -232,8 +259,10 @@ def flatten_rows_for_pack(
     rel_pack: str,
     wanted_assets: set[str],
     asset_meta: Dict[str, AssetMeta],
-) -> Tuple[Dict[str, Dict[str, List]], dict]:
-    rows_by_class: Dict[str, Dict[str, List]] = {}
+    sink: RawBarsSink,
+    pack_store: str = DEFAULT_PACK_STORE,
+) -> dict:
+    """Feed every wanted asset's bars in ``pack_path`` to ``sink``; returns per-pack stats."""
     per_pack_stats = {
         "records_seen": 0,
         "records_matched": 0,
@@ -243,96 +272,87 @@ def flatten_rows_for_pack(
     }
     seen_assets = set()
 
-    def ensure_bucket(asset_class: str) -> Dict[str, List]:
-        if asset_class in rows_by_class:
-            return rows_by_class[asset_class]
-        rows_by_class[asset_class] = {k: [] for k in [
-            "asset_id", "date", "asset_class", "exchange", "symbol", "provider_symbol",
-            "currency", "country", "provider", "is_trading_day", "data_quality_flag",
-            "source_pack_rel", "open_raw", "high_raw", "low_raw", "close_raw", "volume_raw",
-            "adjusted_close_raw"
-        ]}
-        return rows_by_class[asset_class]
-
-    with gzip.open(pack_path, "rt", encoding="utf-8") as fh:
-        for line in fh:
-            line = line.strip()
-            if not line:
-                continue
-            per_pack_stats["records_seen"] += 1
-            try:
-                rec = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-            cid = str(rec.get("canonical_id") or "").strip()
-            if cid not in wanted_assets:
-                continue
-            meta = asset_meta.get(cid)
-            if not meta:
+    # wanted_assets is only a read hint: the arrow store uses it to skip untouched assets,
+    # ndjson-gz still streams the whole pack and the loop keeps filtering.
+    handle = open_pack(pack_path, pack_store)
+    for rec in handle.iter_records(wanted_assets if handle.store == "arrow" else None):
+        per_pack_stats["records_seen"] += 1
+        cid = str(rec.get("canonical_id") or "").strip()
+        if cid not in wanted_assets:
+            continue
+        meta = asset_meta.get(cid)
+        if not meta:
+            continue
+        per_pack_stats["records_matched"] += 1
+        seen_assets.add(cid)
+        out: Dict[str, List] = {name: [] for name in BAR_COLUMNS}
+        add_date, add_open, add_high, add_low, add_close, add_volume, add_adj = (out[name].append for name in BAR_COLUMNS)
+        for bar in rec.get("bars") or []:
+            date = str(bar.get("date") or "").strip()
+            if not date:
                 continue
-            per_pack_stats["records_matched"] += 1
-            seen_assets.add(cid)
-            bars = rec.get("bars") or []
-            asset_class = sanitize_type_norm(meta.type_norm)
-            out = ensure_bucket(asset_class)
-            for bar in bars:
-                date = str(bar.get("date") or "").strip()
-                if not date:
-                    continue
-                out["asset_id"].append(meta.asset_id)
-                out["date"].append(date)
-                out["asset_class"].append(asset_class)
-                out["exchange"].append(meta.exchange)
-                out["symbol"].append(meta.symbol)
-                out["provider_symbol"].append(meta.provider_symbol)
-                out["currency"].append(meta.currency)
-                out["country"].append(meta.country)
-                out["provider"].append("EODHD")
-                out["is_trading_day"].append(True)
-                out["data_quality_flag"].append(0)
-                out["source_pack_rel"].append(rel_pack)
-                out["open_raw"].append(bar.get("open"))
-                out["high_raw"].append(bar.get("high"))
-                out["low_raw"].append(bar.get("low"))
-                out["close_raw"].append(bar.get("close"))
-                out["volume_raw"].append(bar.get("volume"))
-                out["adjusted_close_raw"].append(bar.get("adjusted_close"))
-                per_pack_stats["bars_written"] += 1
+            add_date(date)
+            add_open(bar.get("open"))
+            add_high(bar.get("high"))
+            add_low(bar.get("low"))
+            add_close(bar.get("close"))
+            add_volume(bar.get("volume"))
+            add_adj(bar.get("adjusted_close"))
+        sink.add_asset(sanitize_type_norm(meta.type_norm), meta, rel_pack, out)
+        per_pack_stats["bars_written"] += len(out["date"])
 
     per_pack_stats["assets_emitted"] = len(seen_assets)
     per_pack_stats["missing_targets_in_pack"] = max(0, len(wanted_assets) - len(seen_assets))
-    return rows_by_class, per_pack_stats
+    return per_pack_stats
 
 
 def write_parquet_rows(out_path: Path, rows: Dict[str, List], compression: str = "snappy") -> int:
     if not rows or not rows["asset_id"]:
         return 0
+    return write_parquet_table(out_path, pa.Table.from_pydict(rows, schema=RAW_BARS_SCHEMA), compression)
+
+
+def write_parquet_table(out_path: Path, table: pa.Table, compression: str = "snappy") -> int:
+    if table.num_rows == 0:
+        return 0
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    schema = pa.schema([
-        ("asset_id", pa.string()),
-        ("date", pa.string()),
-        ("asset_class", pa.string()),
-        ("exchange", pa.string()),
-        ("symbol", pa.string()),
-        ("provider_symbol", pa.string()),
-        ("currency", pa.string()),
-        ("country", pa.string()),
-        ("provider", pa.string()),
-        ("is_trading_day", pa.bool_()),
-        ("data_quality_flag", pa.int32()),
-        ("source_pack_rel", pa.string()),
-        ("open_raw", pa.float64()),
-        ("high_raw", pa.float64()),
-        ("low_raw", pa.float64()),
-        ("close_raw", pa.float64()),
-        ("volume_raw", pa.float64()),
-        ("adjusted_close_raw", pa.float64()),
-    ])
-    table = pa.Table.from_pydict(rows, schema=schema)
     pq.write_table(table, out_path, compression=compression)
     return table.num_rows
 
 
+def export_pack(task: dict) -> dict:
+    """Flatten one pack into ``<out_root>/asset_class=*/part_<pack_key>.parquet``; also the pool worker entry point."""
+    started = time.time()
+    out_root = Path(task["out_root"])
+    pack_key = rel_to_pack_key(task["rel_pack"])
+    sink = RawBarsSink(
+        lambda asset_class: out_root / f"asset_class={asset_class}" / f"part_{pack_key}.parquet",
+        compression=task["compression"],
+    )
+    try:
+        per_pack_stats = flatten_rows_for_pack(
+            Path(task["pack_path"]),
+            task["rel_pack"],
+            set(task["wanted_assets"]),
+            task["asset_meta"],
+            sink,
+            task["pack_store"],
+        )
+        written = sink.close()
+    except BaseException:
+        sink.abort()
+        raise
+    return {
+        "pack_key": pack_key,
+        "duration_sec": round(time.time() - started, 3),
+        "stats": per_pack_stats,
+        "outputs": [
+            {"asset_class": asset_class, "path": str(out_path), "rows": n}
+            for asset_class, out_path, n in written
+        ],
+    }
+
+
 def main(argv: Iterable[str]) -> int:
     args = parse_args(argv)
     repo_root = Path(args.repo_root).resolve()
@@ -408,66 +428,86 @@ def main(argv: Iterable[str]) -> int:
             packs_manifest_path.parent.mkdir(parents=True, exist_ok=True)
             packs_manifest_path.write_text("")
 
-        for idx, (rel_pack, wanted_assets) in enumerate(pack_items, start=1):
-            if rel_pack in completed_packs:
-                continue
-            pack_abs = resolve_pack_path(repo_root, rel_pack)
-            if not pack_abs.exists():
-                failed_packs[rel_pack] = {"error": "pack_missing", "at": utc_now_iso()}
-                state["failed_packs"] = failed_packs
-                state["stats"]["packs_failed"] = len(failed_packs)
-                state["updated_at"] = utc_now_iso()
-                atomic_write_json(state_path, state)
-                continue
+        workers = max(1, int(args.workers or 1))
+        staging_root = job_root / "staging" if workers > 1 else None
+        reset_staging(staging_root)
+        state["workers"] = {"requested": workers, "mode": "process_pool_parent_writes" if workers > 1 else "serial"}
+        state.pop("pool_broken", None)
 
-            started = time.time()
-            print(f"[export] [{idx}/{len(pack_items)}] {rel_pack} (targets={len(wanted_assets)})")
-            try:
-                rows_by_class, per_pack_stats = flatten_rows_for_pack(pack_abs, rel_pack, wanted_assets, asset_meta)
-                output_files = []
-                pack_key = rel_to_pack_key(rel_pack)
-                for asset_class, rows in rows_by_class.items():
-                    out_path = raw_root / f"asset_class={asset_class}" / f"part_{pack_key}.parquet"
-                    n = write_parquet_rows(out_path, rows, compression=args.compression)
-                    if n > 0:
-                        output_files.append({"asset_class": asset_class, "path": str(out_path), "rows": n})
-
-                event = {
-                    "ts": utc_now_iso(),
+        def iter_tasks():
+            for idx, (rel_pack, wanted_assets) in enumerate(pack_items, start=1):
+                if rel_pack in completed_packs:
+                    continue
+                pack_abs = resolve_pack_path(repo_root, rel_pack, args.pack_store)
+                if not pack_exists(pack_abs, args.pack_store):
+                    failed_packs[rel_pack] = {"error": "pack_missing", "at": utc_now_iso()}
+                    state["failed_packs"] = failed_packs
+                    state["stats"]["packs_failed"] = len(failed_packs)
+                    state["updated_at"] = utc_now_iso()
+                    atomic_write_json(state_path, state)
+                    continue
+                yield {
                     "rel_pack": rel_pack,
-                    "resolved_pack_path": str(pack_abs),
-                    "pack_key": pack_key,
-                    "duration_sec": round(time.time() - started, 3),
-                    "targets": len(wanted_assets),
-                    "stats": per_pack_stats,
-                    "outputs": output_files,
+                    "index": idx,
+                    "pack_path": str(pack_abs),
+                    "wanted_assets": sorted(wanted_assets),
+                    "asset_meta": {cid: asset_meta[cid] for cid in wanted_assets if cid in asset_meta},
+                    "out_root": str(staging_root or raw_root),
+                    "compression": args.compression,
+                    "pack_store": args.pack_store,
                 }
-                with packs_manifest_path.open("a", encoding="utf-8") as outfh:
-                    outfh.write(json.dumps(event, ensure_ascii=False) + "\n")
 
-                completed_packs.add(rel_pack)
-                if rel_pack in failed_packs:
-                    failed_packs.pop(rel_pack, None)
+        try:
+            for task, result, error in iter_ordered_results(export_pack, iter_tasks(), workers):
+                rel_pack = task["rel_pack"]
+                print(f"[export] [{task['index']}/{len(pack_items)}] {rel_pack} (targets={len(task['wanted_assets'])})")
+                try:
+                    if error is not None:
+                        raise error
+                    per_pack_stats = result["stats"]
+                    output_files = publish_staged_outputs(result["outputs"], staging_root, raw_root)
+
+                    event = {
+                        "ts": utc_now_iso(),
+                        "rel_pack": rel_pack,
+                        "resolved_pack_path": task["pack_path"],
+                        "pack_key": result["pack_key"],
+                        "duration_sec": result["duration_sec"],
+                        "targets": len(task["wanted_assets"]),
+                        "stats": per_pack_stats,
+                        "outputs": output_files,
+                    }
+                    with packs_manifest_path.open("a", encoding="utf-8") as outfh:
+                        outfh.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+                    completed_packs.add(rel_pack)
+                    if rel_pack in failed_packs:
+                        failed_packs.pop(rel_pack, None)
+                        state["failed_packs"] = failed_packs
+                        state["stats"]["packs_failed"] = len(failed_packs)
+                    state["completed_packs"] = sorted(completed_packs)
+                    state["stats"]["packs_done"] = len(completed_packs)
+                    state["stats"]["bars_written"] = int(state["stats"].get("bars_written", 0)) + int(per_pack_stats["bars_written"])
+                    state["stats"]["assets_emitted"] = int(state["stats"].get("assets_emitted", 0)) + int(per_pack_stats["assets_emitted"])
+                    state["updated_at"] = utc_now_iso()
+                    atomic_write_json(state_path, state)
+                except Exception as exc:  # pragma: no cover - runtime resilience
+                    failed_packs[rel_pack] = {"error": str(exc) or type(exc).__name__, "at": utc_now_iso()}
                     state["failed_packs"] = failed_packs
                     state["stats"]["packs_failed"] = len(failed_packs)
-                state["completed_packs"] = sorted(completed_packs)
-                state["stats"]["packs_done"] = len(completed_packs)
-                state["stats"]["bars_written"] = int(state["stats"].get("bars_written", 0)) + int(per_pack_stats["bars_written"])
-                state["stats"]["assets_emitted"] = int(state["stats"].get("assets_emitted", 0)) + int(per_pack_stats["assets_emitted"])
-                state["updated_at"] = utc_now_iso()
-                atomic_write_json(state_path, state)
-            except KeyboardInterrupt:
-                print("[export] interrupted", file=sys.stderr)
-                state["updated_at"] = utc_now_iso()
-                atomic_write_json(state_path, state)
-                return 130
-            except Exception as exc:  # pragma: no cover - runtime resilience
-                failed_packs[rel_pack] = {"error": str(exc), "at": utc_now_iso()}
-                state["failed_packs"] = failed_packs
-                state["stats"]["packs_failed"] = len(failed_packs)
-                state["updated_at"] = utc_now_iso()
-                atomic_write_json(state_path, state)
-                print(f"[export] ERROR {rel_pack}: {exc}", file=sys.stderr)
+                    if isinstance(exc, BrokenProcessPool) and "pool_broken" not in state:
+                        # A worker died; the pool fails this pack and every later one, which resume retries.
+                        state["pool_broken"] = {"at": utc_now_iso(), "first_failed_pack": rel_pack, "error": str(exc) or type(exc).__name__}
+                    state["updated_at"] = utc_now_iso()
+                    atomic_write_json(state_path, state)
+                    print(f"[export] ERROR {rel_pack}: {exc or type(exc).__name__}", file=sys.stderr)
+        except KeyboardInterrupt:
+            print("[export] interrupted", file=sys.stderr)
+            state["updated_at"] = utc_now_iso()
+            atomic_write_json(state_path, state)
+            return 130
+        finally:
+            reset_staging(staging_root)
 
         # macOS/exFAT can create AppleDouble sidecar files (._*) on external drives.
         # Remove them in our export tree so downstream parquet scans don't choke on fake *.parquet sidecars.
@@ -497,6 +537,7 @@ def main(argv: Iterable[str]) -> int:
             "registry_stats": reg_stats,
             "completed_packs": len(completed_packs),
             "failed_packs": len(failed_packs),
+            "pool_broken": state.get("pool_broken"),
             "appledouble_removed": appledouble_removed,
         }
         atomic_write_json(manifest_path, manifest)
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""Persisted per-asset rolling state behind the Q1 latest-only incremental features.
+
+One row per asset holds the bounded windows (recent closes, volumes, dollar
+volume, true range, EWMA vol, bar dates) and the exponential accumulators
+(EMA 12/26, MACD signal, RSI gain/loss averages, EWMA variances). Appending a
+session folds its bar into the state, so a daily update costs O(1) per changed
+asset instead of recomputing every window from ``lookback_calendar_days`` of raw
+bars. Assets without usable state are bootstrapped once from that window, and
+so are assets that receive a bar on or before the state's ``last_date`` (late,
+corrected or gap-filled bars cannot be folded into the accumulators).
+
+The exponential features keep accumulating past the window start, so they can
+drift slightly from a windowed rebuild; ``compare_feature_frames`` measures it.
+"""
+from __future__ import annotations
+
+import uuid
+from datetime import date
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import polars as pl
+
+ROLLING_STATE_SCHEMA = "quantlab_q1_feature_rolling_state_v1"
+
+# Ring -> width; rings hold the most recent per-bar values right-aligned, NaN-padded.
+RING_WIDTHS = {
+    "closes": 200,
+    "volumes": 60,
+    "dollar_volumes": 20,
+    "true_ranges": 14,
+    "ewma_vol_20s": 20,
+}
+# Accumulator -> (alpha, skip counter). Alphas mirror the windowed expressions.
+EWM_ACCUMULATORS = {
+    "ema_12": (2.0 / 13.0, "close_skips"),
+    "ema_26": (2.0 / 27.0, "close_skips"),
+    "macd_signal": (2.0 / 10.0, "macd_skips"),
+    "avg_gain_14": (1.0 / 14.0, ""),
+    "avg_loss_14": (1.0 / 14.0, ""),
+    "ewvar_20": (2.0 / 21.0, "logret_skips"),
+    "ewvar_60": (2.0 / 61.0, "logret_skips"),
+}
+SKIP_COUNTERS = ("close_skips", "macd_skips", "logret_skips")
+LAST_BAR_COLUMNS = ("last_open", "last_high", "last_low")
+FEATURE_COLUMNS = [
+    "ret_1d",
+    "ret_5d",
+    "ret_20d",
+    "logret_1d",
+    "close_raw",
+    "sma_20",
+    "sma_50",
+    "sma_200",
+    "ema_12",
+    "ema_26",
+    "macd",
+    "macd_signal",
+    "macd_hist",
+    "rsi_14",
+    "boll_z_20",
+    "dist_vwap_20",
+    "atr_14",
+    "atr_pct_14",
+    "ewma_vol_20",
+    "ewma_vol_60",
+    "vov_20",
+    "adv20_dollar",
+    "turnover_ratio",
+    "range_pct",
+    "gap_open",
+]
+_EPOCH = date(1970, 1, 1)
+
+
+def date_capacity(lookback_calendar_days: int) -> int:
+    """Bar dates kept per asset: at most one bar per calendar day of the lookback window."""
+    return int(lookback_calendar_days) + 1
+
+
+def _days(value: date) -> int:
+    return (value - _EPOCH).days
+
+
+def _empty_arrays(n: int, capacity: int) -> dict[str, np.ndarray]:
+    arrays = {name: np.full((n, width), np.nan) for name, width in RING_WIDTHS.items()}
+    arrays["dates"] = np.full((n, capacity), np.nan)
+    for name in [*EWM_ACCUMULATORS, *LAST_BAR_COLUMNS]:
+        arrays[name] = np.full(n, np.nan)
+    for name in SKIP_COUNTERS:
+        arrays[name] = np.zeros(n)
+    return arrays
+
+
+def state_schema(capacity: int) -> dict[str, pl.DataType]:
+    schema: dict[str, pl.DataType] = {"asset_id": pl.Utf8, "asset_class": pl.Utf8, "last_date": pl.Date}
+    for name, width in RING_WIDTHS.items():
+        schema[name] = pl.Array(pl.Float64, width)
+    schema["dates"] = pl.Array(pl.Float64, capacity)
+    for name in [*EWM_ACCUMULATORS, *LAST_BAR_COLUMNS, *SKIP_COUNTERS]:
+        schema[name] = pl.Float64
+    return schema
+
+
+def _state_frame(keys: pl.DataFrame, arrays: dict[str, np.ndarray], capacity: int) -> pl.DataFrame:
+    schema = state_schema(capacity)
+    columns = [keys[name].cast(schema[name]) for name in ("asset_id", "asset_class", "last_date")]
+    for name, dtype in schema.items():
+        if name not in keys.columns:
+            columns.append(pl.Series(name, arrays[name], dtype=dtype))
+    return pl.DataFrame(columns)
+
+
+def _state_arrays(state: pl.DataFrame) -> dict[str, np.ndarray]:
+    return {name: state[name].to_numpy().astype(np.float64) for name in state.columns if name not in ("asset_id", "asset_class", "last_date")}
+
+
+def _ewm_update(arrays: dict[str, np.ndarray], name: str, rows: np.ndarray, x: np.ndarray) -> None:
+    # ewm_mean(adjust=False) with nulls: a gap of k bars decays the old value by (1 - alpha)^(k + 1).
+    alpha, counter = EWM_ACCUMULATORS[name]
+    old = arrays[name][rows]
+    skips = arrays[counter][rows] if counter else np.zeros(rows.size)
+    decay = (1.0 - alpha) ** (skips + 1.0)
+    with np.errstate(invalid="ignore"):
+        blended = (decay * old + alpha * x) / (decay + alpha)
+    arrays[name][rows] = np.where(np.isnan(x), old, np.where(np.isnan(old), x, blended))
+
+
+def _append_ring(ring: np.ndarray, new_values: np.ndarray, row_of: np.ndarray, rev: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    # Keep the last ``width`` of (old ring + new values); ``rev`` counts new bars from each asset's end.
+    width = ring.shape[1]
+    taken = np.minimum(counts, width)
+    keep = rev < width
+    fresh = np.full_like(ring, np.nan)
+    fresh[row_of[keep], (taken[row_of] - 1 - rev)[keep]] = new_values[keep]
+    extended = np.concatenate([ring, fresh], axis=1)
+    return np.take_along_axis(extended, taken[:, None] + np.arange(width)[None, :], axis=1)
+
+
+def _fold_step(arrays: dict[str, np.ndarray], rows: np.ndarray, prev: np.ndarray, bar: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    close = bar["close_raw"]
+    high = bar["high_raw"]
+    low = bar["low_raw"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        delta = close - prev
+        true_range = np.fmax(np.fmax(np.abs(high - low), np.abs(high - prev)), np.abs(low - prev))
+        logret = np.log(close) - np.log(prev)
+    _ewm_update(arrays, "ema_12", rows, close)
+    _ewm_update(arrays, "ema_26", rows, close)
+    macd = np.where(np.isnan(close), np.nan, arrays["ema_12"][rows] - arrays["ema_26"][rows])
+    _ewm_update(arrays, "macd_signal", rows, macd)
+    _ewm_update(arrays, "avg_gain_14", rows, np.where(delta > 0, delta, 0.0))
+    _ewm_update(arrays, "avg_loss_14", rows, np.where(delta < 0, -delta, 0.0))
+    _ewm_update(arrays, "ewvar_20", rows, logret * logret)
+    _ewm_update(arrays, "ewvar_60", rows, logret * logret)
+    for counter, x in (("close_skips", close), ("macd_skips", macd), ("logret_skips", logret)):
+        arrays[counter][rows] = np.where(np.isnan(x), arrays[counter][rows] + 1.0, 0.0)
+    arrays["last_open"][rows] = bar["open_raw"]
+    arrays["last_high"][rows] = high
+    arrays["last_low"][rows] = low
+    return {
+        "closes": close,
+        "volumes": bar["volume_raw"],
+        "dollar_volumes": close * bar["volume_raw"],
+        "true_ranges": true_range,
+        "ewma_vol_20s": np.where(np.isnan(logret), np.nan, np.sqrt(arrays["ewvar_20"][rows])),
+        "dates": bar["date"],
+    }
+
+
+def fold_bars(
+    state: pl.DataFrame | None,
+    bars: pl.DataFrame,
+    *,
+    capacity: int,
+) -> pl.DataFrame:
+    """Fold bars (asset_id/asset_class/date/OHLCV, sorted by asset and date) into ``state``.
+
+    Assets missing from ``state`` start empty; bars at or before an asset's
+    ``last_date`` are ignored, so callers re-bootstrap assets flagged by
+    ``late_bar_assets`` instead. Returns state rows for every asset in either input.
+    """
+    if state is None:
+        state = pl.DataFrame(schema=state_schema(capacity))
+    keys = pl.concat(
+        [
+            state.select("asset_id", "asset_class", "last_date"),
+            bars.select("asset_id").unique(maintain_order=True).join(state.select("asset_id"), on="asset_id", how="anti").with_columns(
+                pl.lit(None, dtype=pl.Utf8).alias("asset_class"), pl.lit(None, dtype=pl.Date).alias("last_date")
+            ),
+        ]
+    )
+    arrays = _state_arrays(state)
+    fresh = _empty_arrays(keys.height - state.height, capacity)
+    arrays = {name: np.concatenate([arrays[name], fresh[name]]) if name in arrays else fresh[name] for name in fresh}
+    new_bars = (
+        bars.join(keys.with_row_index("_state_row").select("asset_id", "_state_row", pl.col("last_date").alias("_state_last")), on="asset_id", maintain_order="left")
+        .filter(pl.col("_state_last").is_null() | (pl.col("date") > pl.col("_state_last")))
+        .with_row_index("_pos")
+        .with_columns(
+            pl.int_range(pl.len()).over("asset_id").alias("_step"),
+            pl.int_range(pl.len()).reverse().over("asset_id").alias("_rev"),
+        )
+    )
+    if new_bars.is_empty():
+        return _state_frame(keys, arrays, capacity)
+
+    row_of = new_bars["_state_row"].to_numpy().astype(np.int64)
+    ring_values = {name: np.full(new_bars.height, np.nan) for name in (*RING_WIDTHS, "dates")}
+    prev_close = arrays["closes"][:, -1].copy()
+    for step in new_bars.sort("_step", maintain_order=True).partition_by("_step", maintain_order=True):
+        rows = step["_state_row"].to_numpy().astype(np.int64)
+        pos = step["_pos"].to_numpy().astype(np.int64)
+        bar = {col: step[col].cast(pl.Float64).to_numpy() for col in ("open_raw", "high_raw", "low_raw", "close_raw", "volume_raw")}
+        bar["date"] = step["date"].cast(pl.Int32).cast(pl.Float64).to_numpy()
+        for name, values in _fold_step(arrays, rows, prev_close[rows], bar).items():
+            ring_values[name][pos] = values
+        prev_close[rows] = bar["close_raw"]
+    counts = np.bincount(row_of, minlength=keys.height)
+    rev = new_bars["_rev"].to_numpy().astype(np.int64)
+    for name, values in ring_values.items():
+        arrays[name] = _append_ring(arrays[name], values, row_of, rev, counts)
+
+    latest = new_bars.filter(pl.col("_rev") == 0).select("asset_id", pl.col("asset_class").alias("_class"), pl.col("date").alias("_date"))
+    keys = keys.join(latest, on="asset_id", how="left", maintain_order="left").select(
+        "asset_id",
+        pl.coalesce("_class", "asset_class").alias("asset_class"),
+        pl.coalesce("_date", "last_date").alias("last_date"),
+    )
+    return _state_frame(keys, arrays, capacity)
+
+
+def late_bar_assets(state: pl.DataFrame, bars: pl.DataFrame) -> list[str]:
+    """Assets with a bar on or before their ``last_date`` whose date is not in the stored ``dates`` ring.
+
+    Bars older than the ring's first date are outside every later window and are not checked.
+    """
+    if state.is_empty() or bars.is_empty():
+        return []
+    day = pl.col("date").cast(pl.Int32).cast(pl.Float64)
+    late = (
+        bars.select("asset_id", "date")
+        .join(state.select("asset_id", "last_date", "dates"), on="asset_id")
+        .filter(
+            (pl.col("date") <= pl.col("last_date"))
+            & (day >= pl.col("dates").arr.min())
+            & ~pl.col("dates").arr.contains(day)
+        )
+    )
+    return sorted(set(late["asset_id"].to_list()))
+
+
+def state_features(
+    state: pl.DataFrame,
+    *,
+    asof_date: date,
+    lookback_calendar_days: int,
+    min_rows_window: int,
+) -> pl.DataFrame:
+    """Latest-only feature rows from the state, in the incremental feature-file layout.
+
+    ``_rows_in_window`` counts the asset's bars inside the lookback window ending
+    before ``asof_date``; assets below ``min_rows_window`` (or with none) are dropped.
+    """
+    closes = state["closes"].to_numpy().astype(np.float64)
+    volumes = state["volumes"].to_numpy().astype(np.float64)
+    dollar_volumes = state["dollar_volumes"].to_numpy().astype(np.float64)
+    ewma_vol_20s = state["ewma_vol_20s"].to_numpy().astype(np.float64)
+    dates = state["dates"].to_numpy().astype(np.float64)
+    start_days = _days(asof_date) - int(lookback_calendar_days)
+    with np.errstate(invalid="ignore"):
+        rows_in_window = (dates >= start_days).sum(axis=1)
+    close = closes[:, -1]
+    prev = closes[:, -2]
+    close_ok = ~np.isnan(close)
+
+    def acc(name: str) -> np.ndarray:
+        return state[name].to_numpy().astype(np.float64)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        logret = np.log(close) - np.log(prev)
+        sma_20 = closes[:, -20:].mean(axis=1)
+        ema_12 = np.where(close_ok, acc("ema_12"), np.nan)
+        ema_26 = np.where(close_ok, acc("ema_26"), np.nan)
+        macd = ema_12 - ema_26
+        macd_signal = np.where(close_ok, acc("macd_signal"), np.nan)
+        avg_loss = acc("avg_loss_14")
+        vol_sum_20 = volumes[:, -20:].sum(axis=1)
+        vwap_20 = dollar_volumes.sum(axis=1) / np.where(vol_sum_20 > 0, vol_sum_20, np.nan)
+        atr_14 = state["true_ranges"].to_numpy().astype(np.float64).mean(axis=1)
+        values = {
+            "ret_1d": close / prev - 1.0,
+            "ret_5d": close / closes[:, -6] - 1.0,
+            "ret_20d": close / closes[:, -21] - 1.0,
+            "logret_1d": logret,
+            "close_raw": close,
+            "sma_20": sma_20,
+            "sma_50": closes[:, -50:].mean(axis=1),
+            "sma_200": closes.mean(axis=1),
+            "ema_12": ema_12,
+            "ema_26": ema_26,
+            "macd": macd,
+            "macd_signal": macd_signal,
+            "macd_hist": macd - macd_signal,
+            "rsi_14": 100 - (100 / (1 + (acc("avg_gain_14") / np.where(avg_loss > 0, avg_loss, np.nan)))),
+            "boll_z_20": (close - sma_20) / closes[:, -20:].std(axis=1, ddof=1),
+            "dist_vwap_20": close / vwap_20 - 1.0,
+            "atr_14": atr_14,
+            "atr_pct_14": atr_14 / close,
+            "ewma_vol_20": ewma_vol_20s[:, -1],
+            "ewma_vol_60": np.where(np.isnan(logret), np.nan, np.sqrt(acc("ewvar_60"))),
+            "vov_20": ewma_vol_20s.std(axis=1, ddof=1),
+            "adv20_dollar": dollar_volumes.mean(axis=1),
+            "turnover_ratio": volumes[:, -20:].mean(axis=1) / volumes.mean(axis=1),
+            "range_pct": (acc("last_high") - acc("last_low")) / close,
+            "gap_open": acc("last_open") / prev - 1.0,
+        }
+    frame = pl.DataFrame(
+        [
+            state["asset_id"],
+            pl.Series("asof_date", [asof_date] * state.height, dtype=pl.Date),
+            state["last_date"].alias("feature_date"),
+            state["asset_class"],
+            *(pl.Series(name, values[name], dtype=pl.Float64).fill_nan(None) for name in FEATURE_COLUMNS),
+            pl.Series("_rows_in_window", rows_in_window, dtype=pl.UInt32),
+        ]
+    ).with_columns(
+        pl.col("close_raw").is_null().alias("has_missing_bars_lookback"),
+        (pl.col("close_raw") <= 0).alias("ca_suspicious_flag"),
+    )
+    return frame.select([*frame.columns[:-3], "has_missing_bars_lookback", "ca_suspicious_flag", "_rows_in_window"]).filter((pl.col("_rows_in_window") >= max(int(min_rows_window), 1)))
+
+
+def bootstrap_state(bars: pl.DataFrame, *, capacity: int) -> pl.DataFrame:
+    """Fresh state from an asset's bars (sorted by asset and date), e.g. its lookback window."""
+    return fold_bars(None, bars, capacity=capacity)
+
+
+def read_state(path: Path, *, capacity: int) -> pl.DataFrame | None:
+    """Stored state, or None when it is missing, unreadable or built for another window."""
+    if not path.exists():
+        return None
+    try:
+        state = pl.read_parquet(path)
+    except (OSError, pl.exceptions.PolarsError):
+        return None
+    if dict(state.schema) != state_schema(capacity):
+        return None
+    return state
+
+
+def write_state(path: Path, state: pl.DataFrame) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    state.sort("asset_id").write_parquet(tmp)
+    tmp.replace(path)
+
+
+def compare_feature_frames(
+    incremental: pl.DataFrame,
+    rebuilt: pl.DataFrame,
+    *,
+    rtol: float = 1e-6,
+    atol: float = 1e-9,
+) -> dict[str, Any]:
+    """Per-column agreement of incremental feature rows with a windowed rebuild (joined on asset_id)."""
+    inc_ids = set(incremental["asset_id"].to_list())
+    full_ids = set(rebuilt["asset_id"].to_list())
+    joined = incremental.join(rebuilt, on="asset_id", how="inner", suffix="__full")
+    columns: dict[str, dict[str, Any]] = {}
+    for name in ["feature_date", *FEATURE_COLUMNS, "has_missing_bars_lookback", "_rows_in_window"]:
+        a = joined[name]
+        b = joined[f"{name}__full"]
+        if a.dtype.is_float():
+            diff = (a - b).abs()
+            close = (diff <= atol + rtol * b.abs()) | (a.is_null() & b.is_null())
+            max_abs = diff.max()
+        else:
+            close = (a == b).fill_null(a.is_null() & b.is_null())
+            max_abs = None
+        bad = int((~close.fill_null(False)).sum())
+        columns[name] = {"mismatches": bad, "max_abs_diff": None if max_abs is None else float(max_abs)}
+    only_incremental = sorted(inc_ids - full_ids)
+    only_rebuilt = sorted(full_ids - inc_ids)
+    return {
+        "ok": not only_incremental and not only_rebuilt and all(c["mismatches"] == 0 for c in columns.values()),
+        "rtol": rtol,
+        "atol": atol,
+        "assets_compared": joined.height,
+        "only_incremental_total": len(only_incremental),
+        "only_rebuilt_total": len(only_rebuilt),
+        "only_incremental_sample": only_incremental[:20],
+        "only_rebuilt_sample": only_rebuilt[:20],
+        "columns": columns,
+    }
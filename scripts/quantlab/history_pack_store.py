@@ -0,0 +1,545 @@
+#!/usr/bin/env python3
+"""
+v7 history pack storage backends.
+
+- ndjson-gz: the legacy layout, one gzip NDJSON file per pack with one
+  {"canonical_id", "bars"} record per asset. Every upsert rewrites the whole pack.
+- arrow: a sidecar directory `<pack>.arrowpack/` holding an Arrow IPC base file plus
+  append-only segment files (one record batch per asset). An upsert writes one small
+  segment containing only the touched assets and repoints them in manifest.json;
+  untouched assets are never decoded or rewritten. Segments are folded back into a
+  new base once `compact_after_segments` is reached. Arrow upserts never touch the
+  ndjson-gz pack: it is an explicit, deferred export (`--export-ndjson`, or
+  `--history-root` to export every pack whose arrow store is ahead) for consumers
+  that only know that format. The manifest records the pack's size/mtime at the
+  last import/export (`ndjson_mirror`) and the arrow generation it matches
+  (`mirror_generation`).
+  A pack changed by an ndjson-gz writer while the arrow store matched it makes the
+  arrow store stale (it is re-imported); an arrow store ahead of the pack makes the
+  ndjson-gz backend fail instead of serving or overwriting old bars.
+
+Readers go through open_pack()/iter_pack_records() so refresh_v7_history_from_eodhd.py,
+run_daily_delta_ingest_q1.py and export_v7_history_to_t9_parquet.py share one
+interface. The module only needs pyarrow for the arrow backend; ndjson-gz stays
+stdlib-only.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import json
+import math
+import os
+import sys
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+
+PACK_STORE_CHOICES = ("ndjson-gz", "arrow")
+DEFAULT_PACK_STORE = os.environ.get("RV_HISTORY_PACK_STORE", "ndjson-gz")
+ARROW_PACK_SCHEMA = "rv_v7_history_pack_store_arrow_v1"
+ARROW_PACK_SUFFIX = ".arrowpack"
+ARROW_COMPACT_AFTER_SEGMENTS = int(os.environ.get("RV_HISTORY_PACK_COMPACT_AFTER", "32") or "32")
+BAR_FIELDS = ("date", "open", "high", "low", "close", "volume", "adjusted_close")
+
+
+def utc_now_iso() -> str:
+    return datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+
+
+def _atomic_tmp(path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path.parent / f".{path.name}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def read_ndjson_gz_records(path: Path) -> Iterator[dict[str, Any]]:
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            raw = line.strip()
+            if not raw:
+                continue
+            try:
+                yield json.loads(raw)
+            except json.JSONDecodeError:
+                continue
+
+
+def write_ndjson_gz(path: Path, rows: Iterable[dict[str, Any]]) -> None:
+    tmp = _atomic_tmp(path)
+    with gzip.open(tmp, "wt", encoding="utf-8") as fh:
+        for row in rows:
+            fh.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")))
+            fh.write("\n")
+    tmp.replace(path)
+
+
+def arrow_pack_dir(pack_path: Path) -> Path:
+    name = pack_path.name
+    for suffix in (".ndjson.gz", ".ndjson", ".gz"):
+        if name.endswith(suffix):
+            name = name[: -len(suffix)]
+            break
+    return pack_path.with_name(f"{name}{ARROW_PACK_SUFFIX}")
+
+
+def arrow_manifest_path(pack_path: Path) -> Path:
+    return arrow_pack_dir(pack_path) / "manifest.json"
+
+
+def has_arrow_pack(pack_path: Path) -> bool:
+    return arrow_manifest_path(pack_path).exists()
+
+
+def _stat_key(path: Path) -> list[int] | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return [int(st.st_size), int(st.st_mtime_ns)]
+
+
+def _mirror_is_current(manifest: dict[str, Any]) -> bool:
+    # Manifests written before mirror_generation existed were mirrored on every upsert.
+    generation = manifest.get("generation")
+    return manifest.get("mirror_generation", generation) == generation
+
+
+def arrow_store_state(pack_path: Path, manifest: dict[str, Any] | None = None) -> str:
+    """Relation between the arrow store and the ndjson-gz pack.
+
+    "none" (no arrow store), "in_sync", "arrow_newer" (pack missing or not yet exported),
+    "ndjson_newer" (pack rewritten after the last sync; arrow store stale) or "diverged"
+    (both changed since the last sync).
+    """
+    if _stat_key(arrow_manifest_path(pack_path)) is None:
+        return "none"
+    if manifest is None:
+        manifest = json.loads(arrow_manifest_path(pack_path).read_text(encoding="utf-8"))
+    pack_stat = _stat_key(pack_path)
+    current = _mirror_is_current(manifest)
+    if pack_stat is not None and manifest.get("ndjson_mirror") == pack_stat:
+        return "in_sync" if current else "arrow_newer"
+    if pack_stat is None:
+        return "arrow_newer"
+    return "ndjson_newer" if current else "diverged"
+
+
+def assert_ndjson_pack_current(pack_path: Path) -> None:
+    """Raise when the arrow store holds bars the ndjson-gz pack does not (not exported yet)."""
+    state = arrow_store_state(pack_path)
+    if state in ("arrow_newer", "diverged"):
+        raise RuntimeError(f"ndjson_pack_stale_arrow_store_newer:{pack_path} (run history_pack_store.py --export-ndjson)")
+
+
+def resolve_pack_store(value: str | None) -> str:
+    name = str(value or DEFAULT_PACK_STORE).strip().lower()
+    if name not in PACK_STORE_CHOICES:
+        raise ValueError(f"unknown_pack_store:{name}")
+    return name
+
+
+def pack_stat_path(pack_path: Path, pack_store: str | None = None) -> Path:
+    """File whose size/mtime tracks pack content for the given store (used by stat-based caches)."""
+    if resolve_pack_store(pack_store) == "arrow" and has_arrow_pack(pack_path):
+        return arrow_manifest_path(pack_path)
+    return pack_path
+
+
+def pack_exists(pack_path: Path, pack_store: str | None = None) -> bool:
+    return pack_stat_path(pack_path, pack_store).exists()
+
+
+def pack_sha256(pack_path: Path) -> str:
+    """Content hash of the ndjson-gz pack (in arrow mode: as of its last export)."""
+    if not pack_path.exists():
+        return ""
+    return f"sha256:{sha256_file(pack_path)}"
+
+
+def arrow_manifest_sha256(pack_path: Path) -> str:
+    path = arrow_manifest_path(pack_path)
+    if not path.exists():
+        return ""
+    return f"sha256:{sha256_file(path)}"
+
+
+def _coerce_float(value: Any) -> float | None:
+    if value is None:
+        return None
+    try:
+        num = float(value)
+    except Exception:
+        return None
+    return num if math.isfinite(num) else None
+
+
+class NdjsonGzPackHandle:
+    """Whole-file pack: loaded once, rewritten on upsert."""
+
+    store = "ndjson-gz"
+
+    def __init__(self, pack_path: Path):
+        self.pack_path = pack_path
+        self._rows: list[dict[str, Any]] | None = None
+
+    def _read_file(self) -> Iterator[dict[str, Any]]:
+        assert_ndjson_pack_current(self.pack_path)
+        if self.pack_path.exists():
+            yield from read_ndjson_gz_records(self.pack_path)
+
+    def _load(self) -> list[dict[str, Any]]:
+        if self._rows is None:
+            self._rows = list(self._read_file())
+        return self._rows
+
+    def iter_records(self, canonical_ids: Iterable[str] | None = None) -> Iterator[dict[str, Any]]:
+        wanted = None if canonical_ids is None else set(canonical_ids)
+        source = self._rows if self._rows is not None else self._read_file()
+        for rec in source:
+            if wanted is not None and str(rec.get("canonical_id") or "").strip() not in wanted:
+                continue
+            yield rec
+
+    def read_assets(self, canonical_ids: Iterable[str]) -> dict[str, list[dict[str, Any]]]:
+        wanted = set(canonical_ids)
+        out: dict[str, list[dict[str, Any]]] = {}
+        for rec in self._load():
+            cid = str(rec.get("canonical_id") or "").strip()
+            if cid in wanted:
+                out[cid] = list(rec.get("bars") or [])
+        return out
+
+    def effective_rows(self, updates: dict[str, list[dict[str, Any]]] | None = None) -> list[dict[str, Any]]:
+        by_asset = {str(row.get("canonical_id") or "").strip(): row for row in self._load()}
+        for cid, bars in (updates or {}).items():
+            existing = by_asset.get(cid)
+            if existing is None:
+                by_asset[cid] = {"canonical_id": cid, "bars": bars}
+            else:
+                existing["bars"] = bars
+        return [by_asset[key] for key in sorted(by_asset)]
+
+    def upsert(self, updates: dict[str, list[dict[str, Any]]]) -> dict[str, Any]:
+        if not updates:
+            return {"store": self.store, "written_assets": 0}
+        rows = self.effective_rows(updates)
+        write_ndjson_gz(self.pack_path, rows)
+        self._rows = rows
+        return {"store": self.store, "written_assets": len(rows), "rewritten_pack": True}
+
+
+class ArrowPackHandle:
+    """Base + segment Arrow IPC pack: upserts append one segment for the touched assets only."""
+
+    store = "arrow"
+
+    def __init__(self, pack_path: Path, *, compact_after_segments: int = ARROW_COMPACT_AFTER_SEGMENTS):
+        try:
+            import pyarrow as pa
+            import pyarrow.ipc as ipc
+        except Exception as exc:  # pragma: no cover
+            raise RuntimeError(f"pyarrow_required_for_arrow_pack_store:{exc}")
+        self._pa = pa
+        self._ipc = ipc
+        self.pack_path = pack_path
+        self.root = arrow_pack_dir(pack_path)
+        self.manifest_path = self.root / "manifest.json"
+        self.compact_after_segments = max(1, int(compact_after_segments))
+        self._manifest: dict[str, Any] | None = None
+        self._stale_manifest: dict[str, Any] | None = None
+        self._readers: dict[str, Any] = {}
+        self.schema = pa.schema(
+            [("canonical_id", pa.string()), ("date", pa.string())]
+            + [(field, pa.float64()) for field in BAR_FIELDS[1:]]
+        )
+
+    # -- manifest ---------------------------------------------------------
+    def _load_manifest(self) -> dict[str, Any] | None:
+        if self._manifest is None and self._stale_manifest is None and self.manifest_path.exists():
+            doc = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+            if doc.get("schema") != ARROW_PACK_SCHEMA:
+                raise RuntimeError(f"arrow_pack_schema_mismatch:{self.manifest_path}")
+            state = arrow_store_state(self.pack_path, doc)
+            if state == "ndjson_newer":
+                # An ndjson-gz writer changed the pack after the arrow store: read and re-import the pack.
+                self._stale_manifest = doc
+            elif state == "diverged":
+                raise RuntimeError(f"arrow_pack_diverged_from_ndjson:{self.pack_path}")
+            else:
+                self._manifest = doc
+        return self._manifest
+
+    def _write_manifest(self, doc: dict[str, Any]) -> None:
+        doc["updated_at"] = utc_now_iso()
+        tmp = _atomic_tmp(self.manifest_path)
+        tmp.write_text(json.dumps(doc, ensure_ascii=False, sort_keys=True, separators=(",", ":")))
+        tmp.replace(self.manifest_path)
+        self._manifest = doc
+
+    # -- io ---------------------------------------------------------------
+    def _reader(self, file_name: str):
+        reader = self._readers.get(file_name)
+        if reader is None:
+            source = self._pa.memory_map(str(self.root / file_name), "r")
+            reader = self._ipc.open_file(source)
+            self._readers[file_name] = reader
+        return reader
+
+    def _close_readers(self) -> None:
+        self._readers.clear()
+
+    def _batch_to_bars(self, batch) -> list[dict[str, Any]]:
+        cols = {name: batch.column(name).to_pylist() for name in BAR_FIELDS}
+        return [{name: cols[name][i] for name in BAR_FIELDS} for i in range(batch.num_rows)]
+
+    def _bars_to_batch(self, canonical_id: str, bars: list[dict[str, Any]]):
+        pa = self._pa
+        arrays = [
+            pa.array([canonical_id] * len(bars), type=pa.string()),
+            pa.array([str(bar.get("date") or "")[:10] for bar in bars], type=pa.string()),
+        ]
+        for field in BAR_FIELDS[1:]:
+            arrays.append(pa.array([_coerce_float(bar.get(field)) for bar in bars], type=pa.float64()))
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+    def _write_ipc(self, file_name: str, assets: dict[str, list[dict[str, Any]]]) -> dict[str, list[Any]]:
+        path = self.root / file_name
+        tmp = _atomic_tmp(path)
+        locations: dict[str, list[Any]] = {}
+        options = self._ipc.IpcWriteOptions(compression="zstd")
+        with self._pa.OSFile(str(tmp), "wb") as sink:
+            with self._ipc.new_file(sink, self.schema, options=options) as writer:
+                for batch_index, cid in enumerate(sorted(assets)):
+                    writer.write_batch(self._bars_to_batch(cid, assets[cid]))
+                    locations[cid] = [file_name, batch_index]
+        tmp.replace(path)
+        return locations
+
+    def _legacy_handle(self) -> NdjsonGzPackHandle:
+        return NdjsonGzPackHandle(self.pack_path)
+
+    # -- public interface ---------------------------------------------------
+    def iter_records(self, canonical_ids: Iterable[str] | None = None) -> Iterator[dict[str, Any]]:
+        manifest = self._load_manifest()
+        if manifest is None:
+            yield from self._legacy_handle().iter_records(canonical_ids)
+            return
+        assets = manifest.get("assets") or {}
+        wanted = sorted(assets) if canonical_ids is None else sorted(set(canonical_ids))
+        for cid in wanted:
+            location = assets.get(cid)
+            if not location:
+                continue
+            file_name, batch_index = location
+            batch = self._reader(file_name).get_batch(int(batch_index))
+            yield {"canonical_id": cid, "bars": self._batch_to_bars(batch)}
+
+    def read_assets(self, canonical_ids: Iterable[str]) -> dict[str, list[dict[str, Any]]]:
+        if self._load_manifest() is None:
+            return self._legacy_handle().read_assets(canonical_ids)
+        return {rec["canonical_id"]: rec["bars"] for rec in self.iter_records(canonical_ids)}
+
+    def effective_rows(self, updates: dict[str, list[dict[str, Any]]] | None = None) -> list[dict[str, Any]]:
+        by_asset = {rec["canonical_id"]: rec for rec in self.iter_records()}
+        for cid, bars in (updates or {}).items():
+            by_asset[cid] = {"canonical_id": cid, "bars": bars}
+        return [by_asset[key] for key in sorted(by_asset)]
+
+    def upsert(self, updates: dict[str, list[dict[str, Any]]]) -> dict[str, Any]:
+        if not updates:
+            return {"store": self.store, "written_assets": 0}
+        manifest = self._load_manifest()
+        if manifest is None:
+            # Import the NDJSON pack as the base generation (first upsert, or the arrow store went stale).
+            # The pack itself is left as is; the updates only reach it through export_ndjson().
+            previous = self._stale_manifest
+            return self._write_base(
+                self.effective_rows_from_legacy(updates),
+                generation=int((previous or {}).get("generation") or 0) + 1,
+                previous=previous,
+                ndjson_mirror=_stat_key(self.pack_path),
+                mirror_current=False,
+            )
+        segments = list(manifest.get("segments") or [])
+        if len(segments) + 1 >= self.compact_after_segments:
+            return self._write_base(
+                self.effective_rows(updates),
+                generation=int(manifest.get("generation") or 0) + 1,
+                previous=manifest,
+                ndjson_mirror=manifest.get("ndjson_mirror"),
+                mirror_current=False,
+            )
+        generation = int(manifest.get("generation") or 0) + 1
+        seg_name = f"seg-{generation:08d}.arrow"
+        locations = self._write_ipc(seg_name, updates)
+        doc = dict(manifest)
+        doc["assets"] = {**(manifest.get("assets") or {}), **locations}
+        doc["segments"] = segments + [seg_name]
+        doc["mirror_generation"] = manifest.get("mirror_generation", manifest.get("generation"))
+        doc["generation"] = generation
+        self._write_manifest(doc)
+        return {"store": self.store, "written_assets": len(locations), "segment": seg_name, "compacted": False}
+
+    @staticmethod
+    def _normalized_rows(rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        return [{"canonical_id": str(row.get("canonical_id") or "").strip(), "bars": list(row.get("bars") or [])} for row in rows]
+
+    def effective_rows_from_legacy(self, updates: dict[str, list[dict[str, Any]]]) -> list[dict[str, Any]]:
+        return self._normalized_rows(self._legacy_handle().effective_rows(updates))
+
+    def compact(self) -> dict[str, Any]:
+        manifest = self._load_manifest()
+        if manifest is None:
+            previous = self._stale_manifest
+            return self._write_base(
+                self.effective_rows_from_legacy({}),
+                generation=int((previous or {}).get("generation") or 0) + 1,
+                previous=previous,
+                ndjson_mirror=_stat_key(self.pack_path),
+                mirror_current=True,
+            )
+        if not manifest.get("segments"):
+            return {"store": self.store, "written_assets": 0, "compacted": False}
+        return self._write_base(
+            self.effective_rows(),
+            generation=int(manifest.get("generation") or 0) + 1,
+            previous=manifest,
+            ndjson_mirror=manifest.get("ndjson_mirror"),
+            mirror_current=_mirror_is_current(manifest),
+        )
+
+    def export_ndjson(self) -> int:
+        """Rewrite the ndjson-gz pack from the arrow store and record it as the current mirror.
+
+        Returns the number of exported assets; 0 when there is no arrow store to export or
+        the pack already matches it.
+        """
+        manifest = self._load_manifest()
+        if manifest is None or arrow_store_state(self.pack_path, manifest) == "in_sync":
+            return 0
+        rows = self.effective_rows()
+        write_ndjson_gz(self.pack_path, rows)
+        self._write_manifest(
+            {**manifest, "ndjson_mirror": _stat_key(self.pack_path), "mirror_generation": manifest.get("generation")}
+        )
+        return len(rows)
+
+    def _write_base(
+        self,
+        rows: list[dict[str, Any]],
+        *,
+        generation: int,
+        previous: dict[str, Any] | None,
+        ndjson_mirror: list[int] | None,
+        mirror_current: bool,
+    ) -> dict[str, Any]:
+        base_name = f"base-{generation:08d}.arrow"
+        assets = {row["canonical_id"]: list(row.get("bars") or []) for row in rows if row.get("canonical_id")}
+        locations = self._write_ipc(base_name, assets)
+        self._close_readers()
+        self._write_manifest(
+            {
+                "schema": ARROW_PACK_SCHEMA,
+                "created_at": (previous or {}).get("created_at") or utc_now_iso(),
+                "source_pack": self.pack_path.name,
+                "generation": generation,
+                "base": base_name,
+                "segments": [],
+                "assets": locations,
+                "ndjson_mirror": ndjson_mirror,
+                "mirror_generation": generation if mirror_current else (previous or {}).get("mirror_generation"),
+            }
+        )
+        stale = [(previous or {}).get("base")] + list((previous or {}).get("segments") or [])
+        for name in stale:
+            if not name or name == base_name:
+                continue
+            try:
+                (self.root / str(name)).unlink()
+            except FileNotFoundError:
+                pass
+        return {"store": self.store, "written_assets": len(locations), "base": base_name, "compacted": True}
+
+
+def open_pack(pack_path: Path, pack_store: str | None = None):
+    if resolve_pack_store(pack_store) == "arrow":
+        return ArrowPackHandle(pack_path)
+    return NdjsonGzPackHandle(pack_path)
+
+
+def iter_pack_records(
+    pack_path: Path,
+    *,
+    pack_store: str | None = None,
+    canonical_ids: Iterable[str] | None = None,
+) -> Iterator[dict[str, Any]]:
+    yield from open_pack(pack_path, pack_store).iter_records(canonical_ids)
+
+
+def read_pack_rows(pack_path: Path, pack_store: str | None = None) -> list[dict[str, Any]]:
+    return list(iter_pack_records(pack_path, pack_store=pack_store))
+
+
+def discover_arrow_packs(history_root: Path) -> list[Path]:
+    """Pack paths of every arrow store under ``history_root`` (from each manifest's source_pack)."""
+    out = []
+    for manifest_path in sorted(history_root.rglob(f"*{ARROW_PACK_SUFFIX}/manifest.json")):
+        try:
+            source = json.loads(manifest_path.read_text(encoding="utf-8")).get("source_pack")
+        except (OSError, json.JSONDecodeError):
+            continue
+        if source:
+            out.append(manifest_path.parent.parent / str(source))
+    return out
+
+
+def parse_args(argv: Iterable[str]) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Inspect, compact or export v7 history packs in the arrow store.")
+    p.add_argument("packs", nargs="*", help="Pack paths (the .ndjson.gz path; the .arrowpack sidecar is derived).")
+    p.add_argument("--history-root", default="", help="Also process every arrow store found under this directory.")
+    p.add_argument("--compact", action="store_true", help="Fold segments into a new base (imports legacy packs).")
+    p.add_argument(
+        "--export-ndjson",
+        action="store_true",
+        help="Rewrite the legacy .ndjson.gz pack from the arrow store where the store is ahead of it.",
+    )
+    args = p.parse_args(list(argv))
+    if not args.packs and not args.history_root:
+        p.error("pass pack paths and/or --history-root")
+    return args
+
+
+def main(argv: Iterable[str]) -> int:
+    args = parse_args(argv)
+    pack_paths = [Path(raw).expanduser().resolve() for raw in args.packs]
+    if args.history_root:
+        pack_paths.extend(discover_arrow_packs(Path(args.history_root).expanduser().resolve()))
+    for pack_path in pack_paths:
+        handle = ArrowPackHandle(pack_path)
+        result: dict[str, Any] = {"pack": str(pack_path), "arrow_store": has_arrow_pack(pack_path)}
+        result["state_before"] = arrow_store_state(pack_path)
+        if args.compact:
+            result["compact"] = handle.compact()
+        if args.export_ndjson:
+            result["exported_assets"] = handle.export_ndjson()
+        manifest = handle._load_manifest() or {}
+        result["segments"] = len(manifest.get("segments") or [])
+        result["assets"] = len(manifest.get("assets") or {})
+        print(json.dumps(result, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
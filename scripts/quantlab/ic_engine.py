@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Vectorized information-coefficient kernels for the Stage A cheap gates.
+
+All candidate score columns are evaluated in a single Polars pass: the pooled
+rank IC with one ``select`` and the per-date cross-sectional IC with one
+``group_by(date)``. Each score column uses its own pairwise-complete rows
+(score and target both non-null), matching the per-column ``drop_nulls`` of the
+old list-based kernel; NaN values are kept and rank last.
+"""
+from __future__ import annotations
+
+import math
+from typing import Iterable
+
+import polars as pl
+
+IC_METHODS = ("spearman", "pearson")
+
+
+def _pair_exprs(score_col: str, target_col: str, method: str) -> tuple[pl.Expr, pl.Expr]:
+    if method not in IC_METHODS:
+        raise ValueError(f"unsupported IC method: {method}")
+    mask = pl.col(score_col).is_not_null() & pl.col(target_col).is_not_null()
+    score = pl.col(score_col).filter(mask)
+    target = pl.col(target_col).filter(mask)
+    if method == "spearman":
+        score, target = score.rank("average"), target.rank("average")
+    return pl.corr(score, target), mask.sum()
+
+
+def _finite_or(value, default: float | None) -> float | None:
+    if value is None:
+        return default
+    value = float(value)
+    return value if math.isfinite(value) else default
+
+
+def pooled_rank_ic(df: pl.DataFrame, score_cols: Iterable[str], target_col: str, *, min_rows: int = 30) -> dict[str, float]:
+    """Spearman IC of each score column against the target over all rows (0.0 when undefined)."""
+    score_cols = list(score_cols)
+    if not score_cols:
+        return {}
+    exprs = []
+    for i, col in enumerate(score_cols):
+        corr, n = _pair_exprs(col, target_col, "spearman")
+        exprs += [corr.alias(f"ic_{i}"), n.alias(f"n_{i}")]
+    row = df.select(exprs).row(0, named=True)
+    return {
+        col: (_finite_or(row[f"ic_{i}"], 0.0) if int(row[f"n_{i}"] or 0) >= max(2, int(min_rows)) else 0.0)
+        for i, col in enumerate(score_cols)
+    }
+
+
+def daily_ic(
+    df: pl.DataFrame,
+    score_cols: Iterable[str],
+    target_col: str,
+    *,
+    date_col: str,
+    method: str = "spearman",
+    min_rows: int = 30,
+) -> pl.DataFrame:
+    """Long frame (date, score_col, ic, n) of per-date cross-sectional ICs.
+
+    ``ic`` is null for dates with fewer than ``min_rows`` complete pairs or a
+    constant score/target cross-section.
+    """
+    score_cols = list(score_cols)
+    schema = {date_col: df.schema.get(date_col, pl.Utf8), "score_col": pl.Utf8, "ic": pl.Float64, "n": pl.Int64}
+    if not score_cols or df.is_empty():
+        return pl.DataFrame(schema=schema)
+    exprs = []
+    for i, col in enumerate(score_cols):
+        corr, n = _pair_exprs(col, target_col, method)
+        exprs += [corr.alias(f"ic_{i}"), n.cast(pl.Int64).alias(f"n_{i}")]
+    wide = df.group_by(date_col).agg(exprs).sort(date_col)
+    frames = [
+        wide.select(
+            pl.col(date_col),
+            pl.lit(col, dtype=pl.Utf8).alias("score_col"),
+            pl.when((pl.col(f"n_{i}") >= max(2, int(min_rows))) & pl.col(f"ic_{i}").is_finite())
+            .then(pl.col(f"ic_{i}"))
+            .otherwise(None)
+            .cast(pl.Float64)
+            .alias("ic"),
+            pl.col(f"n_{i}").alias("n"),
+        )
+        for i, col in enumerate(score_cols)
+    ]
+    return pl.concat(frames, how="vertical").select(list(schema))
+
+
+def ic_summary(daily: pl.DataFrame) -> dict[str, dict[str, float]]:
+    """IC mean, std, information ratio (mean/std), hit rate (share > 0) and day count per score column."""
+    if daily.is_empty():
+        return {}
+    agg = (
+        daily.drop_nulls("ic")
+        .group_by("score_col")
+        .agg(
+            pl.col("ic").mean().alias("ic_mean"),
+            pl.col("ic").std().alias("ic_std"),
+            (pl.col("ic") > 0).mean().alias("ic_hit_rate"),
+            pl.len().alias("ic_days"),
+        )
+    )
+    out: dict[str, dict[str, float]] = {
+        col: {"ic_mean": 0.0, "ic_std": 0.0, "ic_ir": 0.0, "ic_hit_rate": 0.0, "ic_days": 0} for col in daily["score_col"].unique().to_list()
+    }
+    for row in agg.iter_rows(named=True):
+        mean = _finite_or(row["ic_mean"], 0.0)
+        std = _finite_or(row["ic_std"], 0.0)
+        out[row["score_col"]] = {
+            "ic_mean": mean,
+            "ic_std": std,
+            "ic_ir": mean / std if std > 1e-12 else 0.0,
+            "ic_hit_rate": _finite_or(row["ic_hit_rate"], 0.0),
+            "ic_days": int(row["ic_days"]),
+        }
+    return out
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Per-asset latest bar date over the raw EODHD parquet layer.
+
+The index is a two-column parquet (asset_id, date; ISO date strings, sorted by
+asset_id) built with a grouped max over a multi-file scan. Cache metadata
+(schema, raw-file fingerprint and the per-file stat list it was built from)
+lives in the parquet schema metadata, so new ``ingest_date=`` partitions can be
+folded into a previous index without rescanning the files it already covers.
+"""
+from __future__ import annotations
+
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Iterable
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+LATEST_DATE_CACHE_SCHEMA = "q1_daily_delta_latest_date_cache_v2"
+DEFAULT_LATEST_DATE_CACHE_REL = "ops/cache/q1_daily_delta_latest_date_index.stock_etf.parquet"
+METADATA_KEY = b"q1_latest_date_cache"
+INDEX_SCHEMA = pa.schema([("asset_id", pa.string()), ("date", pa.string())])
+SCAN_BATCH_ROWS = 1 << 20
+
+
+def _max_date_by_asset(table: pa.Table) -> pa.Table:
+    aids = table["asset_id"].cast(pa.string())
+    dates = table["date"].cast(pa.string())
+    valid = pc.and_(
+        pc.and_(pc.is_valid(aids), pc.not_equal(aids, "")),
+        pc.and_(pc.is_valid(dates), pc.not_equal(dates, "")),
+    )
+    pairs = pa.table({"asset_id": aids, "date": dates}).filter(pc.fill_null(valid, False))
+    grouped = pairs.group_by("asset_id").aggregate([("date", "max")])
+    return pa.table({"asset_id": grouped["asset_id"], "date": grouped["date_max"]}, schema=INDEX_SCHEMA)
+
+
+def merge_latest_dates(tables: Iterable[pa.Table]) -> pa.Table:
+    """Fold partial (asset_id, date) indexes into one, keeping the max date per asset."""
+    parts = [t.select(["asset_id", "date"]).cast(INDEX_SCHEMA) for t in tables if t.num_rows]
+    if not parts:
+        return INDEX_SCHEMA.empty_table()
+    merged = _max_date_by_asset(pa.concat_tables(parts)) if len(parts) > 1 else parts[0]
+    return merged.sort_by("asset_id")
+
+
+def scan_latest_dates(files: list[Path]) -> tuple[pa.Table, dict[str, Any]]:
+    """Grouped max(date) per asset_id over ``files``, aggregated batch by batch to bound memory."""
+    stats = {"files_scanned": len(files), "rows_scanned": 0, "assets_seen": 0}
+    partials: list[pa.Table] = []
+    if files:
+        dataset = ds.dataset([str(fp) for fp in files], format="parquet")
+        for batch in dataset.to_batches(columns=["asset_id", "date"], batch_size=SCAN_BATCH_ROWS):
+            stats["rows_scanned"] += batch.num_rows
+            partials.append(_max_date_by_asset(pa.Table.from_batches([batch])))
+    table = merge_latest_dates(partials)
+    stats["assets_seen"] = table.num_rows
+    return table, stats
+
+
+def latest_dates_to_table(latest_dates: dict[str, str]) -> pa.Table:
+    items = sorted(latest_dates.items())
+    return pa.table(
+        {"asset_id": [k for k, _ in items], "date": [v for _, v in items]},
+        schema=INDEX_SCHEMA,
+    )
+
+
+def table_to_latest_dates(table: pa.Table) -> dict[str, str]:
+    return dict(zip(table["asset_id"].to_pylist(), table["date"].to_pylist()))
+
+
+def read_latest_date_cache(cache_path: Path) -> tuple[dict[str, Any], pa.Table | None]:
+    """(metadata, index table) of a cache written by ``write_latest_date_cache``; ({}, None) if unusable."""
+    try:
+        table = pq.read_table(cache_path)
+    except (OSError, pa.ArrowException):
+        return {}, None
+    try:
+        meta = json.loads((table.schema.metadata or {}).get(METADATA_KEY) or b"{}")
+    except json.JSONDecodeError:
+        meta = {}
+    if not isinstance(meta, dict) or meta.get("schema") != LATEST_DATE_CACHE_SCHEMA:
+        return {}, None
+    return meta, table.select(["asset_id", "date"]).cast(INDEX_SCHEMA)
+
+
+def write_latest_date_cache(cache_path: Path, index: pa.Table | dict[str, str], meta: dict[str, Any]) -> None:
+    table = latest_dates_to_table(index) if isinstance(index, dict) else index.cast(INDEX_SCHEMA)
+    payload = {**meta, "schema": LATEST_DATE_CACHE_SCHEMA}
+    table = table.replace_schema_metadata({METADATA_KEY: json.dumps(payload, ensure_ascii=False).encode("utf-8")})
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache_path.parent / f".{cache_path.name}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    pq.write_table(table, tmp, compression="zstd")
+    tmp.replace(cache_path)
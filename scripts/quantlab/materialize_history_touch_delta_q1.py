@@ -16,7 +16,15 @@ REPO_ROOT = Path(__file__).resolve().parents[2]
 if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
+from scripts.quantlab.history_pack_store import DEFAULT_PACK_STORE, PACK_STORE_CHOICES  # noqa: E402
+from scripts.quantlab.latest_date_index import (  # noqa: E402
+    DEFAULT_LATEST_DATE_CACHE_REL,
+    read_latest_date_cache,
+    table_to_latest_dates,
+    write_latest_date_cache,
+)
 from scripts.quantlab.q1_common import atomic_write_json, utc_now_iso  # noqa: E402
+from scripts.quantlab.raw_bars_writer import RawBarsSink  # noqa: E402
 
 
 def parse_args(argv: Iterable[str]) -> argparse.Namespace:
@@ -34,9 +42,15 @@ def parse_args(argv: Iterable[str]) -> argparse.Namespace:
     p.add_argument("--ingest-date", default=date.today().isoformat())
     p.add_argument("--include-types", default="STOCK,ETF")
     p.add_argument("--history-touch-report", default="mirrors/universe-v7/reports/history_touch_report.json")
-    p.add_argument("--latest-date-cache-path", default="ops/cache/q1_daily_delta_latest_date_index.stock_etf.json")
+    p.add_argument("--latest-date-cache-path", default=DEFAULT_LATEST_DATE_CACHE_REL)
     p.add_argument("--job-name", default="")
     p.add_argument("--compression", default="snappy")
+    p.add_argument(
+        "--pack-store",
+        choices=list(PACK_STORE_CHOICES),
+        default=DEFAULT_PACK_STORE,
+        help="History pack backend to read (must match the refresh writer's --pack-store).",
+    )
     p.add_argument("--ignore-latest-date-cache", action="store_true")
     p.add_argument("--resume-completed-packs", action="store_true")
     p.add_argument(
@@ -73,9 +87,10 @@ def _load_latest_dates(cache_path: Path, *, ignore_cache: bool = False) -> tuple
         return {}, {}
     if not cache_path.exists():
         return {}, {}
-    payload = json.loads(cache_path.read_text())
-    latest_dates = payload.get("latest_dates") or {}
-    return payload, {str(k): str(v) for k, v in dict(latest_dates).items() if str(k) and str(v)}
+    meta, table = read_latest_date_cache(cache_path)
+    if table is None:
+        return {}, {}
+    return meta, table_to_latest_dates(table)
 
 
 def _empty_stats(selected_packs_total: int) -> dict[str, int]:
@@ -341,41 +356,40 @@ def main(argv: Iterable[str]) -> int:
         if rel_pack in completed_pack_set:
             continue
         wanted_assets = pack_to_assets[rel_pack]
-        pack_abs = delta_mod._history_pack_path(repo_root, rel_pack)
+        pack_abs = delta_mod._history_pack_path(repo_root, rel_pack, args.pack_store)
         started = time.time()
         process_memory_before_kb = _read_process_status_kb()
         try:
-            rows_by_class, per_pack_stats = exporter.flatten_rows_for_pack(pack_abs, rel_pack, wanted_assets, asset_meta_exporter)
+            sink = RawBarsSink()
+            per_pack_stats = exporter.flatten_rows_for_pack(
+                pack_abs, rel_pack, wanted_assets, asset_meta_exporter, sink, args.pack_store
+            )
             stats["bars_rows_scanned_in_selected_packs"] += int(per_pack_stats.get("bars_written", 0))
             filter_stats_total: dict[str, int] = {}
             outputs: list[dict[str, Any]] = []
             pack_key = exporter.rel_to_pack_key(rel_pack)
             pack_emitted_keys_seen: set[tuple[str, str]] = set()
 
-            for asset_class, rows in rows_by_class.items():
-                filtered, fstats = delta_mod.filter_rows_newer_than_latest(
-                    rows,
+            for asset_class, table in sink.tables().items():
+                filtered, fstats = delta_mod.filter_table_newer_than_latest(
+                    table,
                     latest_dates,
                     pack_emitted_keys_seen,
                     max_allowed_date=str(args.ingest_date),
                 )
                 for key, value in fstats.items():
                     filter_stats_total[key] = int(filter_stats_total.get(key, 0)) + int(value)
-                if not filtered.get("asset_id"):
+                if filtered.num_rows == 0:
                     continue
                 out_path = raw_ingest_root / f"asset_class={asset_class}" / f"delta_{pack_key}.parquet"
-                rows_written = exporter.write_parquet_rows(out_path, filtered, compression=str(args.compression))
+                rows_written = exporter.write_parquet_table(out_path, filtered, compression=str(args.compression))
                 if rows_written <= 0:
                     continue
                 outputs.append({"asset_class": asset_class, "path": str(out_path), "rows": rows_written})
-                dates = filtered.get("date") or []
-                asset_ids = filtered.get("asset_id") or []
-                for asset_id, row_date in zip(asset_ids, dates):
-                    if not asset_id or not row_date:
-                        continue
-                    prev = latest_dates.get(str(asset_id), "")
-                    latest_dates[str(asset_id)] = max(str(row_date), prev)
-                    emitted_assets.add(str(asset_id))
+                for asset_id, row_date in zip(filtered["asset_id"].to_pylist(), filtered["date"].to_pylist()):
+                    prev = latest_dates.get(asset_id, "")
+                    latest_dates[asset_id] = max(row_date, prev)
+                    emitted_assets.add(asset_id)
             process_memory_after_kb = _read_process_status_kb()
             _update_process_peaks(stats, process_memory_before_kb, process_memory_after_kb)
             rows_out_total = int(filter_stats_total.get("rows_out", 0))
@@ -447,11 +461,9 @@ def main(argv: Iterable[str]) -> int:
             )
             flush_every = int(args.latest_date_cache_flush_every or 0)
             if flush_every > 0 and len(completed_packs) % flush_every == 0:
-                cache_payload.setdefault("schema", "q1_daily_delta_latest_date_cache_v1")
                 cache_payload["generated_at"] = utc_now_iso()
-                cache_payload["latest_dates"] = latest_dates
                 cache_payload["files_total"] = max(int(cache_payload.get("files_total") or 0), int(stats["packs_done"]))
-                atomic_write_json(latest_date_cache_path, cache_payload)
+                write_latest_date_cache(latest_date_cache_path, latest_dates, cache_payload)
         except Exception as exc:
             failed_packs[rel_pack] = {"error": f"{type(exc).__name__}:{exc}", "at": utc_now_iso()}
             stats["packs_failed"] = len(failed_packs)
@@ -477,11 +489,9 @@ def main(argv: Iterable[str]) -> int:
                 },
             )
 
-    cache_payload.setdefault("schema", "q1_daily_delta_latest_date_cache_v1")
     cache_payload["generated_at"] = utc_now_iso()
-    cache_payload["latest_dates"] = latest_dates
     cache_payload["files_total"] = max(int(cache_payload.get("files_total") or 0), int(stats["packs_done"]))
-    atomic_write_json(latest_date_cache_path, cache_payload)
+    write_latest_date_cache(latest_date_cache_path, latest_dates, cache_payload)
 
     rows_emitted_delta = int(stats["bars_rows_emitted_delta"])
     rows_skipped_old_or_known = int(stats["rows_skipped_old_or_known"])
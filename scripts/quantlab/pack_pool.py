@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Ordered process-pool fan-out for per-pack flatten jobs.
+
+Packs are independent units of work: each one is flattened into its own
+per-pack parquet file(s). Workers write those files under a staging root and
+return plain result dicts; the parent consumes results strictly in submission
+order, moves the staged files to their final location and stays the only
+writer of state.json / packs_manifest.ndjson. A run with N workers therefore
+leaves the same files, manifest lines and resume state as a serial run.
+"""
+from __future__ import annotations
+
+import shutil
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+
+PoolResult = tuple[dict[str, Any], dict[str, Any] | None, Exception | None]
+
+
+def iter_ordered_results(
+    fn: Callable[[dict[str, Any]], dict[str, Any]],
+    tasks: Iterable[dict[str, Any]],
+    workers: int,
+    *,
+    max_pending: int = 0,
+) -> Iterator[PoolResult]:
+    """Yield (task, result, error) for every task in input order.
+
+    With ``workers <= 1`` tasks run inline, one at a time, pulled lazily from
+    ``tasks``. Otherwise at most ``max_pending`` (default 2 * workers) tasks are
+    in flight; closing the iterator early cancels whatever has not started yet.
+    ``fn`` and the tasks must be picklable for the pool path.
+
+    If a worker dies (OOM kill, segfault) the pool is broken: in-flight tasks
+    that had not finished and every task not yet submitted are then yielded,
+    still in order, with the ``BrokenProcessPool`` error instead of raising out
+    of the loop.
+    """
+    if workers <= 1:
+        for task in tasks:
+            try:
+                yield task, fn(task), None
+            except Exception as exc:
+                yield task, None, exc
+        return
+
+    window = max(workers, int(max_pending or 0) or 2 * workers)
+    pending: deque[tuple[dict[str, Any], Future]] = deque()
+    task_iter = iter(tasks)
+    unsubmitted: list[dict[str, Any]] = []
+    broken: BrokenProcessPool | None = None
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        exhausted = False
+        while broken is None:
+            while not exhausted and len(pending) < window:
+                task = next(task_iter, None)
+                if task is None:
+                    exhausted = True
+                    break
+                try:
+                    pending.append((task, pool.submit(fn, task)))
+                except BrokenProcessPool as exc:
+                    broken = exc
+                    unsubmitted.append(task)
+                    break
+            if broken is not None or not pending:
+                break
+            task, future = pending.popleft()
+            try:
+                result = future.result()
+            except BrokenProcessPool as exc:
+                broken = exc
+                yield task, None, exc
+                break
+            except Exception as exc:
+                yield task, None, exc
+                continue
+            yield task, result, None
+        if broken is not None:
+            while pending:
+                # Futures that finished before the crash keep their results.
+                task, future = pending.popleft()
+                try:
+                    result = future.result()
+                except Exception as exc:
+                    yield task, None, exc
+                    continue
+                yield task, result, None
+            for task in unsubmitted:
+                yield task, None, broken
+            for task in task_iter:
+                yield task, None, broken
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def publish_staged_outputs(outputs: list[dict[str, Any]], staging_root: Path | None, final_root: Path) -> list[dict[str, Any]]:
+    """Move staged output files under ``final_root`` (same relative path); returns outputs with final paths."""
+    if staging_root is None:
+        return outputs
+    published = []
+    for item in outputs:
+        staged = Path(item["path"])
+        dest = final_root / staged.relative_to(staging_root)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(staged), str(dest))
+        published.append({**item, "path": str(dest)})
+    return published
+
+
+def reset_staging(staging_root: Path | None) -> None:
+    """Drop leftovers of an earlier (crashed or stopped) run; callers hold the job lock."""
+    if staging_root is not None:
+        shutil.rmtree(staging_root, ignore_errors=True)
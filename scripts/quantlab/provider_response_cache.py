@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""On-disk, content-addressed cache of provider HTTP responses.
+
+Entries are keyed by the request identity (endpoint path plus symbol/from/to and
+other non-secret query params) and point at zlib-compressed, sha256-addressed
+body blobs, so identical payloads are stored once. Freshness follows the market
+session of the data's as-of date: a response that already carries the bar of a
+closed session is cached for days; one for a session still in progress, or one
+that is empty or stops short of the as-of date (the provider may not have
+published that bar yet), only for minutes. Total blob size is bounded with LRU
+eviction (entry mtime is bumped on every hit).
+
+Restarted refreshes replay already-fetched responses from disk instead of
+spending provider quota again.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+import zlib
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+from urllib.parse import parse_qsl, urlsplit
+
+CACHE_SCHEMA = "rv_provider_response_cache_entry_v1"
+DEFAULT_RESPONSE_CACHE_DIR = os.environ.get(
+    "RV_PROVIDER_CACHE_DIR", "mirrors/universe-v7/state/provider-response-cache"
+)
+DEFAULT_RESPONSE_CACHE_MAX_MB = float(os.environ.get("RV_PROVIDER_CACHE_MAX_MB", "2048") or "0")
+SECRET_QUERY_KEYS = frozenset({"api_token", "apikey", "api_key", "token"})
+SESSION_CLOSE_UTC_HOUR = 22
+FINAL_SESSION_TTL_SEC = float(os.environ.get("RV_PROVIDER_CACHE_FINAL_TTL_SEC", str(7 * 86400)))
+OPEN_SESSION_TTL_SEC = float(os.environ.get("RV_PROVIDER_CACHE_OPEN_TTL_SEC", "900"))
+
+
+def response_cache_key(url: str, as_of: str = "") -> tuple[str, dict[str, Any]]:
+    """Hash of (endpoint, symbol, from, to, params); ``as_of`` stands in for ``to`` on date-less URLs."""
+    parts = urlsplit(url)
+    params = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in SECRET_QUERY_KEYS
+    )
+    query = dict(params)
+    endpoint = parts.path.rstrip("/")
+    symbol = query.get("s", "")
+    if not symbol:
+        endpoint, _, symbol = endpoint.rpartition("/")
+    ident = {
+        "endpoint": f"{parts.hostname or ''}{endpoint}",
+        "symbol": symbol,
+        "from": query.get("from", ""),
+        "to": query.get("to", query.get("date", "")) or str(as_of or "")[:10],
+        "params": params,
+    }
+    digest = hashlib.sha256(json.dumps(ident, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+    return digest, ident
+
+
+def session_is_final(as_of: str, now: float | None = None) -> bool:
+    """True once every major venue has closed the session for ``as_of``."""
+    try:
+        day = date.fromisoformat(str(as_of)[:10])
+    except ValueError:
+        return False
+    current = datetime.fromtimestamp(time.time() if now is None else now, tz=timezone.utc)
+    if day < current.date():
+        return True
+    if day > current.date():
+        return False
+    return day.weekday() >= 5 or current.hour >= SESSION_CLOSE_UTC_HOUR
+
+
+def session_ttl_sec(as_of: str, now: float | None = None) -> float:
+    return FINAL_SESSION_TTL_SEC if session_is_final(as_of, now) else OPEN_SESSION_TTL_SEC
+
+
+def response_has_session_bar(body: bytes, as_of: str) -> bool:
+    """True when ``body`` (EODHD JSON rows or Stooq CSV) contains a row dated ``as_of``."""
+    day = str(as_of or "")[:10]
+    if not day or day.encode("ascii", "ignore") not in body:
+        return False
+    text = body.decode("utf-8", errors="replace").lstrip()
+    if text.startswith("["):
+        try:
+            rows = json.loads(text)
+        except ValueError:
+            return False
+        return any(isinstance(row, dict) and str(row.get("date") or "")[:10] == day for row in rows)
+    return any(line.startswith(f"{day},") for line in text.splitlines())
+
+
+def _atomic_write_bytes(path: Path, payload: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp.write_bytes(payload)
+    tmp.replace(path)
+
+
+class ProviderResponseCache:
+    def __init__(
+        self,
+        root: Path,
+        *,
+        max_bytes: int = int(DEFAULT_RESPONSE_CACHE_MAX_MB * 1024 * 1024),
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.root = Path(root)
+        self.max_bytes = max(0, int(max_bytes))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self._approx_bytes: int | None = None
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "stores": 0,
+            "blobs_written": 0,
+            "bytes_served": 0,
+            "bytes_stored_compressed": 0,
+            "evicted_entries": 0,
+            "evicted_blobs": 0,
+        }
+
+    def _entry_path(self, key: str) -> Path:
+        return self.root / "entries" / key[:2] / f"{key}.json"
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.root / "blobs" / digest[:2] / f"{digest}.z"
+
+    def _blob_sizes(self) -> dict[str, int]:
+        out: dict[str, int] = {}
+        for blob_path in (self.root / "blobs").glob("*/*.z"):
+            try:
+                out[blob_path.stem] = blob_path.stat().st_size
+            except OSError:
+                continue
+        return out
+
+    def _bump(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += amount
+
+    def get(self, url: str, *, as_of: str = "") -> bytes | None:
+        key, _ = response_cache_key(url, as_of)
+        entry_path = self._entry_path(key)
+        try:
+            entry = json.loads(entry_path.read_text(encoding="utf-8"))
+            if float(entry.get("expires_at") or 0) <= self._clock():
+                self._bump("expired")
+                self._bump("misses")
+                return None
+            body = zlib.decompress(self._blob_path(str(entry["blob"])).read_bytes())
+        except (OSError, ValueError, KeyError, zlib.error):
+            self._bump("misses")
+            return None
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        self._bump("hits")
+        self._bump("bytes_served", len(body))
+        return body
+
+    def put(self, url: str, body: bytes, *, as_of: str = "") -> None:
+        key, ident = response_cache_key(url, as_of)
+        now = self._clock()
+        digest = hashlib.sha256(body).hexdigest()
+        blob_path = self._blob_path(digest)
+        added_bytes = 0
+        try:
+            if not blob_path.exists():
+                compressed = zlib.compress(body, 6)
+                _atomic_write_bytes(blob_path, compressed)
+                added_bytes = len(compressed)
+                self._bump("blobs_written")
+                self._bump("bytes_stored_compressed", added_bytes)
+            entry = {
+                "schema": CACHE_SCHEMA,
+                "key": key,
+                "request": ident,
+                "blob": digest,
+                "size": len(body),
+                "as_of": ident["to"],
+                "stored_at": now,
+                "expires_at": now + (
+                    session_ttl_sec(ident["to"], now) if response_has_session_bar(body, ident["to"]) else OPEN_SESSION_TTL_SEC
+                ),
+            }
+            _atomic_write_bytes(self._entry_path(key), json.dumps(entry, sort_keys=True).encode("utf-8"))
+        except OSError:
+            return
+        self._bump("stores")
+        if self.max_bytes <= 0 or not added_bytes:
+            return
+        with self._lock:
+            if self._approx_bytes is None:
+                self._approx_bytes = sum(self._blob_sizes().values())
+            else:
+                self._approx_bytes += added_bytes
+            due = self._approx_bytes > self.max_bytes
+        if due and self._evict_lock.acquire(blocking=False):
+            try:
+                self.evict()
+            finally:
+                self._evict_lock.release()
+
+    def evict(self) -> dict[str, int]:
+        """Drop expired entries, then least-recently-used ones until blobs fit in max_bytes."""
+        now = self._clock()
+        entries: list[tuple[float, Path, str, bool]] = []
+        for entry_path in (self.root / "entries").glob("*/*.json"):
+            try:
+                mtime = entry_path.stat().st_mtime
+                entry = json.loads(entry_path.read_text(encoding="utf-8"))
+                entries.append((mtime, entry_path, str(entry["blob"]), float(entry.get("expires_at") or 0) <= now))
+            except (OSError, ValueError, KeyError):
+                entries.append((0.0, entry_path, "", True))
+        blob_sizes = self._blob_sizes()
+        refs: dict[str, int] = {}
+        for _, _, blob, _ in entries:
+            refs[blob] = refs.get(blob, 0) + 1
+        total = sum(blob_sizes.values())
+        target = int(self.max_bytes * 0.9) if self.max_bytes > 0 else -1
+        evicted_entries = 0
+        evicted_blobs = 0
+
+        def _drop_blob(blob: str) -> None:
+            nonlocal total, evicted_blobs
+            size = blob_sizes.pop(blob, None)
+            if size is None:
+                return
+            self._blob_path(blob).unlink(missing_ok=True)
+            total -= size
+            evicted_blobs += 1
+
+        entries.sort(key=lambda item: item[0])
+        for mtime, entry_path, blob, expired in entries:
+            if not expired and (target < 0 or total <= target):
+                continue
+            entry_path.unlink(missing_ok=True)
+            evicted_entries += 1
+            refs[blob] = refs.get(blob, 1) - 1
+            if refs[blob] <= 0:
+                _drop_blob(blob)
+        for blob in [name for name in blob_sizes if refs.get(name, 0) <= 0]:
+            _drop_blob(blob)
+        self._bump("evicted_entries", evicted_entries)
+        self._bump("evicted_blobs", evicted_blobs)
+        with self._lock:
+            self._approx_bytes = total
+        return {"evicted_entries": evicted_entries, "evicted_blobs": evicted_blobs, "bytes_after": total}
+
+    def stats_dict(self) -> dict[str, Any]:
+        with self._lock:
+            out = dict(self.stats)
+        out["root"] = str(self.root)
+        out["max_bytes"] = self.max_bytes
+        return out
+
+
+_SHARED_CACHE: ProviderResponseCache | None = None
+
+
+def configure_shared_response_cache(root: Path | str | None, *, max_mb: float = DEFAULT_RESPONSE_CACHE_MAX_MB) -> ProviderResponseCache | None:
+    global _SHARED_CACHE
+    _SHARED_CACHE = None
+    if root is not None and str(root).strip():
+        _SHARED_CACHE = ProviderResponseCache(Path(root), max_bytes=int(max(0.0, float(max_mb)) * 1024 * 1024))
+    return _SHARED_CACHE
+
+
+def shared_response_cache() -> ProviderResponseCache | None:
+    return _SHARED_CACHE
+
+
+def close_shared_response_cache() -> dict[str, Any] | None:
+    """Run a final eviction pass and return the cache stats (None when disabled)."""
+    global _SHARED_CACHE
+    cache = _SHARED_CACHE
+    _SHARED_CACHE = None
+    if cache is None:
+        return None
+    try:
+        cache.evict()
+    except OSError:
+        pass
+    return cache.stats_dict()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Columnar builder for the raw EODHD bars layer (one row per asset_id, date).
+
+Flatteners hand over one asset at a time: its per-bar columns as lists plus
+the asset's metadata. Identity columns (asset_id, exchange, symbol, ...) are
+constant within an asset, so they are kept as one run per asset and expanded
+with an Arrow ``take`` when a batch is built instead of being appended per bar.
+Batches are flushed every ``batch_rows`` rows, either to a streaming
+``ParquetWriter`` per asset class (written to a temp file and renamed on
+``close``) or, without ``path_for_class``, kept in memory as tables.
+"""
+from __future__ import annotations
+
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+RAW_BARS_SCHEMA = pa.schema([
+    ("asset_id", pa.string()),
+    ("date", pa.string()),
+    ("asset_class", pa.string()),
+    ("exchange", pa.string()),
+    ("symbol", pa.string()),
+    ("provider_symbol", pa.string()),
+    ("currency", pa.string()),
+    ("country", pa.string()),
+    ("provider", pa.string()),
+    ("is_trading_day", pa.bool_()),
+    ("data_quality_flag", pa.int32()),
+    ("source_pack_rel", pa.string()),
+    ("open_raw", pa.float64()),
+    ("high_raw", pa.float64()),
+    ("low_raw", pa.float64()),
+    ("close_raw", pa.float64()),
+    ("volume_raw", pa.float64()),
+    ("adjusted_close_raw", pa.float64()),
+])
+BAR_COLUMNS = ("date", "open_raw", "high_raw", "low_raw", "close_raw", "volume_raw", "adjusted_close_raw")
+RUN_COLUMNS = tuple(name for name in RAW_BARS_SCHEMA.names if name not in BAR_COLUMNS)
+DEFAULT_BATCH_ROWS = 262_144
+
+
+class _ClassBuffer:
+    def __init__(self) -> None:
+        self._reset()
+
+    def _reset(self) -> None:
+        self.runs: dict[str, list[Any]] = {name: [] for name in RUN_COLUMNS}
+        self.run_lengths: list[int] = []
+        self.bars: dict[str, list[pa.Array]] = {name: [] for name in BAR_COLUMNS}
+        self.rows = 0
+
+    def take_batch(self) -> pa.RecordBatch:
+        run_index = pa.array(np.repeat(np.arange(len(self.run_lengths), dtype=np.int32), self.run_lengths))
+        columns = []
+        for field in RAW_BARS_SCHEMA:
+            if field.name in self.bars:
+                columns.append(pa.concat_arrays(self.bars[field.name]))
+            else:
+                columns.append(pa.array(self.runs[field.name], type=field.type).take(run_index))
+        batch = pa.RecordBatch.from_arrays(columns, schema=RAW_BARS_SCHEMA)
+        self._reset()
+        return batch
+
+
+class RawBarsSink:
+    def __init__(
+        self,
+        path_for_class: Callable[[str], Path] | None = None,
+        *,
+        compression: str = "snappy",
+        batch_rows: int = DEFAULT_BATCH_ROWS,
+    ) -> None:
+        self.path_for_class = path_for_class
+        self.compression = compression
+        self.batch_rows = max(1, int(batch_rows))
+        self._buffers: dict[str, _ClassBuffer] = {}
+        self._writers: dict[str, tuple[pq.ParquetWriter, Path, Path]] = {}
+        self._batches: dict[str, list[pa.RecordBatch]] = {}
+        self.rows_by_class: dict[str, int] = {}
+
+    def add_asset(self, asset_class: str, meta: Any, rel_pack: str, bars: dict[str, list[Any]]) -> None:
+        """Append one asset's bars; ``bars`` maps each of BAR_COLUMNS to equal-length lists or arrays."""
+        buf = self._buffers.setdefault(asset_class, _ClassBuffer())
+        n = len(bars["date"])
+        if n == 0:
+            return
+        constants = {
+            "asset_id": meta.asset_id,
+            "asset_class": asset_class,
+            "exchange": meta.exchange,
+            "symbol": meta.symbol,
+            "provider_symbol": meta.provider_symbol,
+            "currency": meta.currency,
+            "country": meta.country,
+            "provider": "EODHD",
+            "is_trading_day": True,
+            "data_quality_flag": 0,
+            "source_pack_rel": rel_pack,
+        }
+        for name in RUN_COLUMNS:
+            buf.runs[name].append(constants[name])
+        buf.run_lengths.append(n)
+        for name in BAR_COLUMNS:
+            buf.bars[name].append(pa.array(bars[name], type=RAW_BARS_SCHEMA.field(name).type))
+        buf.rows += n
+        self.rows_by_class[asset_class] = self.rows_by_class.get(asset_class, 0) + n
+        if buf.rows >= self.batch_rows:
+            self._flush(asset_class)
+
+    def _flush(self, asset_class: str) -> None:
+        buf = self._buffers.get(asset_class)
+        if buf is None or buf.rows == 0:
+            return
+        batch = buf.take_batch()
+        if self.path_for_class is None:
+            self._batches.setdefault(asset_class, []).append(batch)
+            return
+        if asset_class not in self._writers:
+            out_path = self.path_for_class(asset_class)
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = out_path.parent / f".{out_path.name}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+            self._writers[asset_class] = (pq.ParquetWriter(tmp, RAW_BARS_SCHEMA, compression=self.compression), tmp, out_path)
+        self._writers[asset_class][0].write_batch(batch)
+
+    def close(self) -> list[tuple[str, Path, int]]:
+        """Flush, finalize every written file and return (asset_class, path, rows) in first-seen class order."""
+        out: list[tuple[str, Path, int]] = []
+        for asset_class in list(self._buffers):
+            self._flush(asset_class)
+            if asset_class not in self._writers:
+                continue
+            writer, tmp, out_path = self._writers[asset_class]
+            writer.close()
+            tmp.replace(out_path)
+            out.append((asset_class, out_path, self.rows_by_class[asset_class]))
+        self._writers = {}
+        return out
+
+    def abort(self) -> None:
+        for writer, tmp, _ in self._writers.values():
+            try:
+                writer.close()
+            finally:
+                tmp.unlink(missing_ok=True)
+        self._writers = {}
+
+    def tables(self) -> dict[str, pa.Table]:
+        """In-memory mode: flushed tables per asset class, in first-seen class order."""
+        for asset_class in list(self._buffers):
+            self._flush(asset_class)
+        return {
+            cls: pa.Table.from_batches(self._batches[cls], schema=RAW_BARS_SCHEMA)
+            for cls in self._buffers
+            if cls in self._batches
+        }
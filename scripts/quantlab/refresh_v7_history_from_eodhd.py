@@ -14,19 +14,46 @@ import sys
 import time
 import urllib.error
 import urllib.parse
-import urllib.request
 import uuid
 from dataclasses import dataclass
-from datetime import date, datetime, timezone
+from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
 from typing import Any, Iterable
 
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.quantlab.async_http_fetch import (  # noqa: E402
+    close_shared_fetch_engine,
+    configure_shared_fetch_engine,
+    shared_fetch_engine,
+    shared_fetch_stats,
+)
+from scripts.quantlab.history_pack_store import (  # noqa: E402
+    DEFAULT_PACK_STORE,
+    PACK_STORE_CHOICES,
+    open_pack,
+    pack_exists,
+    arrow_manifest_sha256,
+    pack_sha256,
+)
+from scripts.quantlab.provider_response_cache import (  # noqa: E402
+    DEFAULT_RESPONSE_CACHE_DIR,
+    DEFAULT_RESPONSE_CACHE_MAX_MB,
+    close_shared_response_cache,
+    configure_shared_response_cache,
+    shared_response_cache,
+)
+from scripts.quantlab.registry_index import isin as registry_isin, load_registry_index, strip as registry_strip  # noqa: E402
+
 
 BASE_URL = "https://eodhd.com/api"
 EODHD_DISABLED_REASON: str | None = None
 DEFAULT_ENV_FILE = Path(__file__).resolve().parents[2] / ".env.local"
 STOP_REQUESTED = False
 FLOCK_HANDLES: dict[str, int] = {}
+GAP_FILL_STALE_EXCHANGE_DAYS = 4
 
 
 def utc_now_iso() -> str:
@@ -338,6 +365,24 @@ def parse_args(argv: Iterable[str]) -> argparse.Namespace:
     p.add_argument("--concurrency", type=int, default=1)
     p.add_argument("--progress-every", type=int, default=0)
     p.add_argument("--sleep-ms", type=int, default=0)
+    p.add_argument(
+        "--rate-limit-per-sec",
+        type=float,
+        default=float(os.environ.get("RV_EODHD_RATE_PER_SEC", "15") or "0"),
+        help="Token-bucket request rate for eodhd.com shared by all workers (EODHD allows 1000/min). 0 disables.",
+    )
+    p.add_argument(
+        "--http-max-connections",
+        type=int,
+        default=int(os.environ.get("RV_HTTP_MAX_CONNECTIONS_PER_HOST", "0") or "0"),
+        help="Keep-alive connections per host; 0 uses max(4, --concurrency).",
+    )
+    p.add_argument(
+        "--response-cache-dir",
+        default=DEFAULT_RESPONSE_CACHE_DIR,
+        help="Provider response cache (repo-relative or absolute); restarted runs replay cached responses. Empty disables.",
+    )
+    p.add_argument("--response-cache-max-mb", type=float, default=DEFAULT_RESPONSE_CACHE_MAX_MB)
     p.add_argument("--timeout-sec", type=float, default=25.0)
     p.add_argument("--max-retries", type=int, default=3)
     p.add_argument("--max-eodhd-calls", type=int, default=0)
@@ -348,8 +393,23 @@ def parse_args(argv: Iterable[str]) -> argparse.Namespace:
         default=os.environ.get("RV_HISTORY_WRITE_MODE", "merge"),
         help="merge keeps current full-pack writes; delta-shadow writes sidecars too; delta is opt-in future cutover mode.",
     )
+    p.add_argument(
+        "--pack-store",
+        choices=list(PACK_STORE_CHOICES),
+        default=DEFAULT_PACK_STORE,
+        help=(
+            "ndjson-gz rewrites whole gzip packs; arrow upserts touched assets into a <pack>.arrowpack/ segment store "
+            "and leaves the gzip pack to history_pack_store.py --export-ndjson."
+        ),
+    )
     p.add_argument("--bulk-last-day", action="store_true", default=os.environ.get("RV_EODHD_BULK_LAST_DAY", "0") == "1")
     p.add_argument("--bulk-exchange-cost", type=int, default=100)
+    p.add_argument(
+        "--bulk-gap-fill",
+        action="store_true",
+        default=os.environ.get("RV_EODHD_BULK_GAP_FILL", "0") == "1",
+        help="Planner mode: bulk last-day per exchange first, then per-symbol history only for assets more than one session behind. Implies --bulk-last-day.",
+    )
     p.add_argument(
         "--exchange-checkpoint-path",
         default=os.environ.get("RV_MARKET_REFRESH_EXCHANGE_CHECKPOINT_PATH", ""),
@@ -450,35 +510,154 @@ def write_exchange_checkpoint(path: Path, doc: dict[str, Any]) -> None:
     atomic_write_json(path, doc)
 
 
+def asset_last_dates_path(checkpoint_path: Path) -> Path:
+    name = checkpoint_path.name[: -len(".json")] if checkpoint_path.name.endswith(".json") else checkpoint_path.name
+    return checkpoint_path.with_name(f"{name}.asset-last-dates.json")
+
+
+def load_asset_last_dates(path: Path, job_name: str) -> dict[str, str]:
+    doc = load_json(path, {})
+    if doc.get("job_name") != job_name or not isinstance(doc.get("last_dates"), dict):
+        return {}
+    return {str(k): str(v) for k, v in doc["last_dates"].items() if str(v or "").strip()}
+
+
+def write_asset_last_dates(path: Path, *, job_name: str, run_id: str, last_dates: dict[str, str]) -> None:
+    atomic_write_json(
+        path,
+        {
+            "schema": "rv_v7_market_refresh_asset_last_dates_v1",
+            "generated_at": utc_now_iso(),
+            "job_name": job_name,
+            "run_id": run_id,
+            "assets_count": len(last_dates),
+            "last_dates": dict(sorted(last_dates.items())),
+        },
+    )
+
+
+def read_pack_last_dates(
+    history_root: Path,
+    metas: Iterable[AssetMeta],
+    pack_store: str = DEFAULT_PACK_STORE,
+) -> dict[str, str]:
+    by_pack: dict[str, list[str]] = {}
+    for meta in metas:
+        by_pack.setdefault(meta.history_pack, []).append(meta.canonical_id)
+    out: dict[str, str] = {}
+    for rel_pack in sorted(by_pack):
+        pack_path = resolve_history_pack_path(history_root, rel_pack, pack_store)
+        if not pack_exists(pack_path, pack_store):
+            continue
+        for canonical_id, bars in open_pack(pack_path, pack_store).read_assets(by_pack[rel_pack]).items():
+            if bars:
+                out[canonical_id] = str(bars[-1].get("date") or "")[:10]
+    return out
+
+
+def previous_weekday(day: str) -> str:
+    current = parse_iso_date(day) - timedelta(days=1)
+    while current.weekday() >= 5:
+        current -= timedelta(days=1)
+    return current.isoformat()
+
+
+def expected_previous_session(last_dates: Iterable[str], to_date: str) -> str:
+    """Most common pre-run last date on an exchange, i.e. the session peers ended on.
+
+    Falls back to the previous weekday when the exchange has no usable history or
+    its peers are themselves stale, so holidays do not trigger exchange-wide gap fills
+    while missed runs still do.
+    """
+    counts: dict[str, int] = {}
+    for value in last_dates:
+        if value and value < to_date:
+            counts[value] = counts.get(value, 0) + 1
+    if counts:
+        session = max(counts, key=lambda key: (counts[key], key))
+        if (parse_iso_date(to_date) - parse_iso_date(session)).days <= GAP_FILL_STALE_EXCHANGE_DAYS:
+            return session
+    return previous_weekday(to_date)
+
+
+def plan_gap_fills(
+    targets: list[tuple[int, str, AssetMeta]],
+    *,
+    last_dates: dict[str, str],
+    from_date: str,
+    to_date: str,
+    bulk_completed_exchanges: set[str],
+    bulk_seen_ids: set[str],
+) -> tuple[list[tuple[int, str, AssetMeta, str]], dict[str, Any]]:
+    """Pick the assets a bulk last-day pass cannot bring current on its own.
+
+    Assets on a bulk-completed exchange need per-symbol history when they were more
+    than one session behind before the bulk day was applied, or when the bulk file
+    did not return them (halts, provider-symbol mismatches) although the exchange had
+    a ``to_date`` session; assets whose exchange bulk did not complete need anything
+    short of ``to_date``. An exchange with no asset at ``to_date`` after bulk (holiday)
+    keeps one-session-behind assets as current.
+    """
+    sessions_by_exchange: dict[str, list[str]] = {}
+    traded_exchanges: set[str] = set()
+    for _, canonical_id, meta in targets:
+        last = last_dates.get(canonical_id, "")
+        sessions_by_exchange.setdefault(meta.exchange, []).append(last)
+        if canonical_id in bulk_seen_ids or last >= to_date:
+            traded_exchanges.add(meta.exchange)
+    expected_by_exchange = {
+        ex: expected_previous_session(values, to_date) for ex, values in sessions_by_exchange.items()
+    }
+    planned: list[tuple[int, str, AssetMeta, str]] = []
+    reasons: dict[str, int] = {}
+    for index, canonical_id, meta in targets:
+        last = last_dates.get(canonical_id, "")
+        if not last:
+            reason = "no_history"
+        elif last >= to_date:
+            continue
+        elif meta.exchange not in bulk_completed_exchanges:
+            reason = "bulk_exchange_unavailable"
+        elif last < expected_by_exchange[meta.exchange]:
+            reason = "behind_exchange_session"
+        elif canonical_id not in bulk_seen_ids and meta.exchange in traded_exchanges:
+            reason = "missing_from_bulk"
+        else:
+            continue
+        gap_from = from_date
+        if last:
+            gap_from = max(from_date, (parse_iso_date(last) + timedelta(days=1)).isoformat())
+        planned.append((index, canonical_id, meta, gap_from))
+        reasons[reason] = reasons.get(reason, 0) + 1
+    summary = {
+        "gap_fill_count": len(planned),
+        "gap_fill_reasons": dict(sorted(reasons.items())),
+        "expected_previous_session_by_exchange": dict(sorted(expected_by_exchange.items())),
+    }
+    return planned, summary
+
+
 def build_registry_index(registry_path: Path, allowlist: set[str]) -> dict[str, AssetMeta]:
+    table, _ = load_registry_index(registry_path)
+    table = table.filter(registry_isin(registry_strip(table["canonical_id"]), allowlist))
     out: dict[str, AssetMeta] = {}
-    with gzip.open(registry_path, "rt", encoding="utf-8") as fh:
-        for line in fh:
-            raw = line.strip()
-            if not raw:
-                continue
-            try:
-                obj = json.loads(raw)
-            except json.JSONDecodeError:
-                continue
-            canonical_id = str(obj.get("canonical_id") or "").strip()
-            if canonical_id not in allowlist:
-                continue
-            rel_pack = str(((obj.get("pointers") or {}).get("history_pack")) or "").strip()
-            exchange = str(obj.get("exchange") or "").strip().upper()
-            symbol = str(obj.get("symbol") or "").strip()
-            if not rel_pack:
-                rel_pack = synthesize_history_pack(canonical_id, exchange, symbol)
-            out[canonical_id] = AssetMeta(
-                canonical_id=canonical_id,
-                symbol=symbol,
-                exchange=exchange,
-                currency=str(obj.get("currency") or "").strip().upper(),
-                type_norm=normalize_type(obj.get("type_norm")),
-                provider_symbol=str(obj.get("provider_symbol") or obj.get("symbol") or "").strip().upper(),
-                country=str(obj.get("country") or "").strip().upper(),
-                history_pack=rel_pack,
-            )
+    for obj in table.select(["canonical_id", "symbol", "exchange", "currency", "country", "type_norm", "provider_symbol", "history_pack"]).to_pylist():
+        canonical_id = obj["canonical_id"].strip()
+        rel_pack = obj["history_pack"].strip()
+        exchange = obj["exchange"].strip().upper()
+        symbol = obj["symbol"].strip()
+        if not rel_pack:
+            rel_pack = synthesize_history_pack(canonical_id, exchange, symbol)
+        out[canonical_id] = AssetMeta(
+            canonical_id=canonical_id,
+            symbol=symbol,
+            exchange=exchange,
+            currency=obj["currency"].strip().upper(),
+            type_norm=normalize_type(obj["type_norm"]),
+            provider_symbol=(obj["provider_symbol"] or obj["symbol"]).strip().upper(),
+            country=obj["country"].strip().upper(),
+            history_pack=rel_pack,
+        )
     return out
 
 
@@ -554,15 +733,23 @@ def fetch_daily_stooq(
     if not query_symbol:
         return {"query_symbol": "", "attempts": 0, "rows": []}
     url = f"https://stooq.com/q/d/l/?s={urllib.parse.quote(query_symbol)}&i=d"
-    req = urllib.request.Request(
-        url,
-        headers={
-            "accept": "text/csv",
-            "user-agent": "RubikVault-v7-refresh/1.0",
-        },
-    )
-    with urllib.request.urlopen(req, timeout=float(timeout_sec)) as resp:
-        payload = resp.read().decode("utf-8")
+    cache = shared_response_cache()
+    body = cache.get(url, as_of=to_date) if cache is not None else None
+    attempts = 0
+    if body is None:
+        body = shared_fetch_engine().fetch(
+            url,
+            headers={
+                "accept": "text/csv",
+                "user-agent": "RubikVault-v7-refresh/1.0",
+            },
+            timeout_sec=float(timeout_sec),
+            max_retries=1,
+        ).body
+        attempts = 1
+        if cache is not None:
+            cache.put(url, body, as_of=to_date)
+    payload = body.decode("utf-8", errors="replace")
     rows: list[dict[str, Any]] = []
     from_iso = parse_iso_date(from_date).isoformat()
     to_iso = parse_iso_date(to_date).isoformat()
@@ -591,36 +778,32 @@ def fetch_daily_stooq(
             rows.append(row)
     return {
         "query_symbol": query_symbol,
-        "attempts": 1,
+        "attempts": attempts,
         "rows": rows,
     }
 
 
-def fetch_json(url: str, *, timeout_sec: float, max_retries: int) -> tuple[Any, int]:
-    last_error: Exception | None = None
-    for attempt in range(1, max(1, int(max_retries)) + 1):
-        try:
-            req = urllib.request.Request(
-                url,
-                headers={
-                    "accept": "application/json",
-                    "user-agent": "RubikVault-v7-refresh/1.0",
-                },
-            )
-            with urllib.request.urlopen(req, timeout=float(timeout_sec)) as resp:
-                payload = resp.read().decode("utf-8")
-            return json.loads(payload), attempt
-        except urllib.error.HTTPError as exc:
-            if exc.code in {401, 402, 403, 429}:
-                raise
-            last_error = exc
-        except Exception as exc:
-            last_error = exc
-        if attempt < max(1, int(max_retries)):
-            time.sleep(0.3 * attempt)
-    if last_error:
-        raise last_error
-    raise RuntimeError("fetch_failed")
+def fetch_json(url: str, *, timeout_sec: float, max_retries: int, use_cache: bool = True) -> tuple[Any, int]:
+    # Retries, jittered backoff and 429 Retry-After handling live in the shared fetch engine;
+    # 401/402/403 and exhausted 429s still surface as urllib.error.HTTPError.
+    # Responses replayed from the provider response cache report zero attempts.
+    cache = shared_response_cache() if use_cache else None
+    cached = cache.get(url) if cache is not None else None
+    if cached is not None:
+        return json.loads(cached.decode("utf-8")), 0
+    result = shared_fetch_engine().fetch(
+        url,
+        headers={
+            "accept": "application/json",
+            "user-agent": "RubikVault-v7-refresh/1.0",
+        },
+        timeout_sec=float(timeout_sec),
+        max_retries=max(1, int(max_retries)),
+    )
+    payload = json.loads(result.text())
+    if cache is not None:
+        cache.put(url, result.body)
+    return payload, result.attempts
 
 
 def preflight_eodhd_access(
@@ -645,7 +828,7 @@ def preflight_eodhd_access(
     }
     url = f"{BASE_URL}/eod/{urllib.parse.quote(query_symbol)}?{urllib.parse.urlencode(query)}"
     try:
-        fetch_json(url, timeout_sec=timeout_sec, max_retries=1)
+        fetch_json(url, timeout_sec=timeout_sec, max_retries=1, use_cache=False)
         return {
             "ok": True,
             "reason": "ok",
@@ -723,7 +906,7 @@ def fetch_bulk_last_day_eodhd(
                 }
             )
     return {
-        "attempts": int(attempts or 1),
+        "attempts": int(attempts),
         "rows": rows,
     }
 
@@ -822,52 +1005,111 @@ def fetch_daily_eod(
     }
 
 
-def read_pack_rows(path: Path) -> list[dict[str, Any]]:
-    rows: list[dict[str, Any]] = []
-    if not path.exists():
-        return rows
-    with gzip.open(path, "rt", encoding="utf-8") as fh:
-        for line in fh:
-            raw = line.strip()
-            if not raw:
-                continue
-            rows.append(json.loads(raw))
-    return rows
+def read_pack_rows(path: Path, pack_store: str = DEFAULT_PACK_STORE) -> list[dict[str, Any]]:
+    return list(open_pack(path, pack_store).iter_records())
 
 
-def merge_bars(existing: list[dict[str, Any]], incoming: list[dict[str, Any]]) -> list[dict[str, Any]]:
+def _bisect_bar_date(bars: list[dict[str, Any]], day: str) -> int:
+    lo, hi = 0, len(bars)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if str(bars[mid].get("date") or "") < day:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _bars_in_pack_order(bars: list[dict[str, Any]]) -> bool:
+    prev = ""
+    for bar in bars:
+        day = bar.get("date")
+        if not isinstance(day, str) or len(day) != 10 or day <= prev:
+            return False
+        prev = day
+    return True
+
+
+def _resort_merge(
+    existing: list[dict[str, Any]],
+    clean_by_date: dict[str, dict[str, Any]],
+) -> tuple[list[dict[str, Any]], bool]:
     by_date: dict[str, dict[str, Any]] = {}
     for row in existing:
         clean = sanitize_row(row)
-        if clean is None:
-            continue
-        by_date[str(clean["date"])] = clean
+        if clean is not None:
+            by_date[str(clean["date"])] = clean
+    by_date.update(clean_by_date)
+    merged = [by_date[day] for day in sorted(by_date)]
+    if merged == existing:
+        return existing, False
+    return merged, True
+
+
+def splice_bars(
+    existing: list[dict[str, Any]],
+    incoming: list[dict[str, Any]],
+) -> tuple[list[dict[str, Any]], bool]:
+    """Splice sanitized incoming bars into an existing date-sorted bar list.
+
+    When the existing dates are strictly increasing pack dates (one pass to check), each
+    incoming date costs one binary search and the common "next session" case is an append.
+    Otherwise the histories go through the full sanitize+sort merge. The returned flag is
+    True only if a date was added or an existing bar's sanitized values changed, so callers
+    never need to deep-compare the merged history against the original.
+    """
+    clean_by_date: dict[str, dict[str, Any]] = {}
     for row in incoming:
         clean = sanitize_row(row)
         if clean is None:
             continue
-        by_date[str(clean["date"])] = clean
-    return [by_date[key] for key in sorted(by_date)]
+        clean_by_date[str(clean["date"])] = clean
+    if not _bars_in_pack_order(existing):
+        return _resort_merge(existing, clean_by_date)
+    merged = existing
+    changed = False
+    for day in sorted(clean_by_date):
+        row = clean_by_date[day]
+        if merged and str(merged[-1].get("date") or "") < day:
+            pos = len(merged)
+        else:
+            pos = _bisect_bar_date(merged, day)
+        if pos < len(merged) and str(merged[pos].get("date") or "") == day:
+            if merged[pos] == row or sanitize_row(merged[pos]) == row:
+                continue
+            if not changed:
+                merged = list(existing)
+                changed = True
+            merged[pos] = row
+            continue
+        if not changed:
+            merged = list(existing)
+            changed = True
+        if pos == len(merged):
+            merged.append(row)
+        else:
+            merged.insert(pos, row)
+    return merged, changed
 
 
-def compute_pack_update(
-    *,
-    pack_path: Path,
+def merge_bars(existing: list[dict[str, Any]], incoming: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    merged, _ = splice_bars(existing, incoming)
+    return merged
+
+
+def merge_pack_updates(
+    handle: Any,
     pack_updates: dict[str, list[dict[str, Any]]],
-) -> tuple[bool, list[dict[str, Any]], list[dict[str, Any]]]:
-    rows = read_pack_rows(pack_path)
-    by_asset = {str(row.get("canonical_id") or "").strip(): row for row in rows}
+) -> tuple[list[dict[str, Any]], dict[str, list[dict[str, Any]]]]:
+    existing_by_asset = handle.read_assets(pack_updates.keys())
     changed_assets: list[dict[str, Any]] = []
+    merged_by_asset: dict[str, list[dict[str, Any]]] = {}
     for canonical_id, incoming_rows in pack_updates.items():
-        existing = by_asset.get(canonical_id)
-        existing_bars = list(existing.get("bars") or []) if existing else []
-        merged = merge_bars(existing_bars, incoming_rows)
-        if merged == existing_bars:
+        existing_bars = existing_by_asset.get(canonical_id) or []
+        merged, changed = splice_bars(existing_bars, incoming_rows)
+        if not changed:
             continue
-        if existing is None:
-            by_asset[canonical_id] = {"canonical_id": canonical_id, "bars": merged}
-        else:
-            existing["bars"] = merged
+        merged_by_asset[canonical_id] = merged
         changed_assets.append(
             {
                 "canonical_id": canonical_id,
@@ -877,22 +1119,34 @@ def compute_pack_update(
                 "last_date_after": str(merged[-1].get("date") if merged else ""),
             }
         )
+    return changed_assets, merged_by_asset
+
+
+def compute_pack_update(
+    *,
+    pack_path: Path,
+    pack_updates: dict[str, list[dict[str, Any]]],
+    pack_store: str = DEFAULT_PACK_STORE,
+) -> tuple[bool, list[dict[str, Any]], list[dict[str, Any]]]:
+    handle = open_pack(pack_path, pack_store)
+    changed_assets, merged_by_asset = merge_pack_updates(handle, pack_updates)
     if not changed_assets:
-        return False, [], rows
-    out_rows = [by_asset[key] for key in sorted(by_asset)]
-    return True, changed_assets, out_rows
+        return False, [], []
+    return True, changed_assets, handle.effective_rows(merged_by_asset)
 
 
 def update_pack(
     *,
     pack_path: Path,
     pack_updates: dict[str, list[dict[str, Any]]],
-) -> tuple[bool, list[dict[str, Any]], list[dict[str, Any]]]:
-    changed, changed_assets, out_rows = compute_pack_update(pack_path=pack_path, pack_updates=pack_updates)
-    if not changed:
-        return False, [], out_rows
-    write_ndjson_gz(pack_path, out_rows)
-    return True, changed_assets, out_rows
+    pack_store: str = DEFAULT_PACK_STORE,
+) -> tuple[bool, list[dict[str, Any]], dict[str, Any]]:
+    handle = open_pack(pack_path, pack_store)
+    changed_assets, merged_by_asset = merge_pack_updates(handle, pack_updates)
+    if not changed_assets:
+        return False, [], {}
+    write_stats = handle.upsert(merged_by_asset)
+    return True, changed_assets, write_stats
 
 
 def sha256_rows(rows: list[dict[str, Any]]) -> str:
@@ -976,7 +1230,7 @@ def fetch_asset_rows(
     }
 
 
-def resolve_history_pack_path(history_root: Path, rel_pack: str) -> Path:
+def resolve_history_pack_path(history_root: Path, rel_pack: str, pack_store: str = DEFAULT_PACK_STORE) -> Path:
     rel = Path(str(rel_pack).strip())
     stripped = Path(*rel.parts[1:]) if rel.parts[:1] == ("history",) else rel
     candidates = [
@@ -985,13 +1239,15 @@ def resolve_history_pack_path(history_root: Path, rel_pack: str) -> Path:
         history_root / rel,
     ]
     for candidate in candidates:
-        if candidate.exists():
+        if pack_exists(candidate, pack_store):
             return candidate
     return candidates[0]
 
 
 def main(argv: Iterable[str]) -> int:
     args = parse_args(argv)
+    if args.bulk_gap_fill:
+        args.bulk_last_day = True
     repo_root = Path(args.repo_root).resolve()
     env_file = Path(args.env_file).expanduser().resolve()
     allowlist_path = Path(args.allowlist_path).expanduser().resolve()
@@ -1033,6 +1289,16 @@ def main(argv: Iterable[str]) -> int:
 
     signal.signal(signal.SIGINT, request_stop)
     signal.signal(signal.SIGTERM, request_stop)
+    configure_shared_fetch_engine(
+        host_rates={"eodhd.com": max(0.0, float(args.rate_limit_per_sec or 0.0))},
+        max_connections_per_host=int(args.http_max_connections or 0) or max(4, int(args.concurrency or 1)),
+        timeout_sec=float(args.timeout_sec),
+        max_retries=max(1, int(args.max_retries)),
+    )
+    configure_shared_response_cache(
+        resolve_repo_rel(repo_root, args.response_cache_dir) if str(args.response_cache_dir or "").strip() else None,
+        max_mb=float(args.response_cache_max_mb),
+    )
 
     acquire_job_lock(lock_path)
     try:
@@ -1170,6 +1436,7 @@ def main(argv: Iterable[str]) -> int:
                     "generated_at": utc_now_iso(),
                     "run_id": run_id,
                     "write_mode": args.write_mode,
+                    "pack_store": args.pack_store,
                     "from_date": from_date,
                     "to_date": to_date,
                     "entries_count": len(delta_manifest_entries),
@@ -1184,7 +1451,8 @@ def main(argv: Iterable[str]) -> int:
             stooq_attempts_total += int(item.get("stooq_attempts") or 0)
             rows = list(item.get("rows") or [])
             if rows:
-                fetched_with_data += 1
+                if str(item["canonical_id"]) not in bulk_seen_ids:
+                    fetched_with_data += 1
                 pack_updates.setdefault(str(item["history_pack"]), {})[str(item["canonical_id"])] = rows
             fetched_assets_by_index[int(item["index"])] = {
                 "canonical_id": str(item["canonical_id"]),
@@ -1252,17 +1520,20 @@ def main(argv: Iterable[str]) -> int:
             flush_total = len(pack_updates)
             flush_count = 0
             for rel_pack in sorted(pack_updates):
-                pack_path = resolve_history_pack_path(history_root, rel_pack)
+                pack_path = resolve_history_pack_path(history_root, rel_pack, args.pack_store)
                 updates_for_pack = pack_updates[rel_pack]
+                out_rows: list[dict[str, Any]] = []
                 if args.write_mode == "delta":
                     changed, changed_assets, out_rows = compute_pack_update(
                         pack_path=pack_path,
                         pack_updates=updates_for_pack,
+                        pack_store=args.pack_store,
                     )
                 else:
-                    changed, changed_assets, out_rows = update_pack(
+                    changed, changed_assets, _ = update_pack(
                         pack_path=pack_path,
                         pack_updates=updates_for_pack,
+                        pack_store=args.pack_store,
                     )
                 flush_count += 1
                 if not changed:
@@ -1271,10 +1542,14 @@ def main(argv: Iterable[str]) -> int:
                     continue
                 last_successful_write = utc_now_iso()
                 if args.write_mode == "delta":
-                    pack_sha = f"sha256:{sha256_file(pack_path)}" if pack_path.exists() else ""
+                    pack_sha = pack_sha256(pack_path)
                     history_effective_sha = f"sha256:{sha256_rows(out_rows)}"
+                elif args.pack_store == "arrow":
+                    # The ndjson-gz pack only changes on --export-ndjson; the manifest tracks the new bars.
+                    pack_sha = pack_sha256(pack_path)
+                    history_effective_sha = arrow_manifest_sha256(pack_path)
                 else:
-                    pack_sha = f"sha256:{sha256_file(pack_path)}"
+                    pack_sha = pack_sha256(pack_path)
                     history_effective_sha = pack_sha
                 delta_entry = None
                 if args.write_mode in {"delta-shadow", "delta"}:
@@ -1301,6 +1576,8 @@ def main(argv: Iterable[str]) -> int:
                 )
                 current["pack_sha256"] = pack_sha
                 current["history_effective_sha256"] = history_effective_sha
+                if args.pack_store == "arrow":
+                    current["arrow_manifest_sha256"] = arrow_manifest_sha256(pack_path)
                 current["touched_assets"] = int(current.get("touched_assets") or 0) + len(changed_assets)
                 current["changed_assets"].extend(changed_assets)
                 if delta_entry:
@@ -1329,6 +1606,11 @@ def main(argv: Iterable[str]) -> int:
             _write_progress_state("running", reason)
 
         bulk_checkpoint_noop = False
+        bulk_seen_ids: set[str] = set()
+        fetch_plan: dict[str, Any] | None = None
+        asset_last_dates: dict[str, str] = {}
+        last_dates_path = asset_last_dates_path(exchange_checkpoint_path)
+        fetch_targets = [(index, canonical_id, meta, from_date) for index, canonical_id, meta in indexed_registry]
         if args.bulk_last_day:
             bulk_exchange_cost = max(1, int(args.bulk_exchange_cost or 100))
             exchange_checkpoint = load_or_init_exchange_checkpoint(
@@ -1342,6 +1624,13 @@ def main(argv: Iterable[str]) -> int:
             write_exchange_checkpoint(exchange_checkpoint_path, exchange_checkpoint)
             completed_exchange_checkpoint = set((exchange_checkpoint.get("completed_exchanges") or {}).keys())
             skipped_completed_exchanges: list[str] = []
+            if args.bulk_gap_fill:
+                asset_last_dates = load_asset_last_dates(last_dates_path, args.job_name)
+                unseeded = [meta for _, canonical_id, meta in indexed_registry if canonical_id not in asset_last_dates]
+                if unseeded:
+                    asset_last_dates.update(read_pack_last_dates(history_root, unseeded, args.pack_store))
+                pre_bulk_last_dates = dict(asset_last_dates)
+                exchange_checkpoint["asset_last_dates_path"] = str(last_dates_path)
             index_by_id = {canonical_id: index for index, canonical_id, _ in indexed_registry}
             lookup: dict[tuple[str, str], AssetMeta] = {}
             for _, _, meta in indexed_registry:
@@ -1358,7 +1647,7 @@ def main(argv: Iterable[str]) -> int:
             bulk_rows_matched = 0
             bulk_rows_wrong_date = 0
             bulk_exchange_errors: list[dict[str, Any]] = []
-            bulk_seen_ids: set[str] = set()
+            bulk_requests = 0
             for ex in exchanges:
                 if bool(args.resume_exchange_checkpoint) and ex in completed_exchange_checkpoint:
                     skipped_completed_exchanges.append(ex)
@@ -1373,6 +1662,7 @@ def main(argv: Iterable[str]) -> int:
                 if max_eodhd_calls > 0 and eodhd_attempts_total >= max_eodhd_calls:
                     skipped_due_to_stop += sum(1 for _, _, meta in indexed_registry if meta.exchange == ex)
                     continue
+                bulk_requests += 1
                 try:
                     bulk = fetch_bulk_last_day_eodhd(
                         api_key=api_key,
@@ -1381,7 +1671,7 @@ def main(argv: Iterable[str]) -> int:
                         timeout_sec=float(args.timeout_sec),
                         max_retries=int(args.max_retries),
                     )
-                    eodhd_attempts_total += int(bulk.get("attempts") or 1) * bulk_exchange_cost
+                    eodhd_attempts_total += int(bulk.get("attempts", 1)) * bulk_exchange_cost
                 except urllib.error.HTTPError as exc:
                     if exc.code in {401, 402, 403, 429}:
                         globals()["EODHD_DISABLED_REASON"] = f"eodhd_http_{exc.code}"
@@ -1522,8 +1812,36 @@ def main(argv: Iterable[str]) -> int:
                     ),
                     flush=True,
                 )
-        elif concurrency <= 1:
-            for index, canonical_id, meta in indexed_registry:
+            if args.bulk_gap_fill:
+                bulk_completed_exchanges = set((exchange_checkpoint.get("completed_exchanges") or {}).keys())
+                fetch_targets, gap_plan = plan_gap_fills(
+                    indexed_registry,
+                    last_dates=pre_bulk_last_dates,
+                    from_date=from_date,
+                    to_date=to_date,
+                    bulk_completed_exchanges=bulk_completed_exchanges,
+                    bulk_seen_ids=bulk_seen_ids,
+                )
+                fetch_plan = {
+                    "mode": "bulk_gap_fill",
+                    "assets_planned": len(indexed_registry),
+                    "exchanges_total": len(exchanges),
+                    "exchanges_bulk_completed": len(bulk_completed_exchanges & set(exchanges)),
+                    "bulk_covered_count": len(bulk_seen_ids),
+                    "gap_fill_count": gap_plan["gap_fill_count"],
+                    "gap_fill_reasons": gap_plan["gap_fill_reasons"],
+                    "bulk_request_count": bulk_requests,
+                    "gap_fill_request_count": gap_plan["gap_fill_count"],
+                    "request_count": bulk_requests + gap_plan["gap_fill_count"],
+                    "per_asset_request_count_avoided": max(0, len(indexed_registry) - gap_plan["gap_fill_count"]),
+                    "asset_last_dates_path": str(last_dates_path),
+                    "expected_previous_session_by_exchange": gap_plan["expected_previous_session_by_exchange"],
+                }
+                print(json.dumps({"fetch_plan": {k: v for k, v in fetch_plan.items() if k != "expected_previous_session_by_exchange"}}), flush=True)
+            else:
+                fetch_targets = []
+        if fetch_targets and concurrency <= 1:
+            for index, canonical_id, meta, asset_from_date in fetch_targets:
                 if _eodhd_budget_stopped(meta):
                     skipped_due_to_stop += 1
                     continue
@@ -1533,7 +1851,7 @@ def main(argv: Iterable[str]) -> int:
                         canonical_id=canonical_id,
                         meta=meta,
                         api_key=api_key,
-                        from_date=from_date,
+                        from_date=asset_from_date,
                         to_date=to_date,
                         timeout_sec=float(args.timeout_sec),
                         max_retries=int(args.max_retries),
@@ -1576,13 +1894,13 @@ def main(argv: Iterable[str]) -> int:
                     )
                 if int(args.sleep_ms) > 0 and index < len(allowlist_ids):
                     time.sleep(float(args.sleep_ms) / 1000.0)
-        else:
+        elif fetch_targets:
             next_position = 0
             pending: dict[Any, tuple[int, str, AssetMeta]] = {}
             with ThreadPoolExecutor(max_workers=concurrency) as executor:
-                while next_position < len(indexed_registry) or pending:
-                    while next_position < len(indexed_registry) and len(pending) < concurrency:
-                        index, canonical_id, meta = indexed_registry[next_position]
+                while next_position < len(fetch_targets) or pending:
+                    while next_position < len(fetch_targets) and len(pending) < concurrency:
+                        index, canonical_id, meta, asset_from_date = fetch_targets[next_position]
                         next_position += 1
                         if _eodhd_budget_stopped(meta):
                             skipped_due_to_stop += 1
@@ -1593,7 +1911,7 @@ def main(argv: Iterable[str]) -> int:
                             canonical_id=canonical_id,
                             meta=meta,
                             api_key=api_key,
-                            from_date=from_date,
+                            from_date=asset_from_date,
                             to_date=to_date,
                             timeout_sec=float(args.timeout_sec),
                             max_retries=int(args.max_retries),
@@ -1628,7 +1946,7 @@ def main(argv: Iterable[str]) -> int:
                                         "progress": {
                                             "completed": completed_fetches,
                                             "submitted": next_position,
-                                            "total": len(indexed_registry),
+                                            "total": len(fetch_targets),
                                             "assets_fetched_with_data": fetched_with_data,
                                             "api_attempts_total": eodhd_attempts_total,
                                             "eodhd_attempts_total": eodhd_attempts_total,
@@ -1645,6 +1963,13 @@ def main(argv: Iterable[str]) -> int:
                             )
 
         _flush_pack_updates("final_flush")
+        if fetch_plan is not None:
+            for entry in list(fetched_assets_by_index.values()) + changed_entries:
+                last_after = str(entry.get("last_date_after") or entry.get("last_date") or "")[:10]
+                if last_after > asset_last_dates.get(entry["canonical_id"], ""):
+                    asset_last_dates[entry["canonical_id"]] = last_after
+            write_asset_last_dates(last_dates_path, job_name=args.job_name, run_id=run_id, last_dates=asset_last_dates)
+            fetch_plan["gap_fill_completed"] = completed_fetches - len(bulk_seen_ids)
         fetched_assets = [fetched_assets_by_index[key] for key in sorted(fetched_assets_by_index)]
         fetched_asset_ids = [str(row.get("canonical_id") or "") for row in fetched_assets if str(row.get("canonical_id") or "")]
         fetched_assets_path = state_root / f"{args.job_name}.fetched-assets.json"
@@ -1690,6 +2015,7 @@ def main(argv: Iterable[str]) -> int:
                     "history_pack": row["history_pack"],
                     "pack_sha256": row["pack_sha256"],
                     "history_effective_sha256": row.get("history_effective_sha256") or row["pack_sha256"],
+                    **({"arrow_manifest_sha256": row["arrow_manifest_sha256"]} if row.get("arrow_manifest_sha256") else {}),
                     "touched_assets": row["touched_assets"],
                     "delta_files": row.get("delta_files") or [],
                 }
@@ -1717,6 +2043,7 @@ def main(argv: Iterable[str]) -> int:
                 "provider_blocked_reason": EODHD_DISABLED_REASON,
                 "us_provider_mode": args.us_provider_mode,
                 "write_mode": args.write_mode,
+                "pack_store": args.pack_store,
                 "history_delta_manifest_path": str(delta_manifest_path) if delta_manifest_entries else None,
                 "exchange_checkpoint_path": str(exchange_checkpoint_path),
                 "exchange_checkpoint_resume_enabled": bool(args.resume_exchange_checkpoint),
@@ -1754,13 +2081,17 @@ def main(argv: Iterable[str]) -> int:
             "global_lock_path": str(global_lock_path),
             "us_provider_mode": args.us_provider_mode,
             "write_mode": args.write_mode,
+            "pack_store": args.pack_store,
             "history_touch_report_path": str(reports_root / "history_touch_report.json"),
             "history_delta_manifest_path": str(delta_manifest_path) if delta_manifest_entries else None,
             "exchange_checkpoint_path": str(exchange_checkpoint_path),
             "exchange_checkpoint_resume_enabled": bool(args.resume_exchange_checkpoint),
             "exchange_checkpoint_skipped_completed_count": len(locals().get("skipped_completed_exchanges", [])),
             "bulk_checkpoint_noop": bool(bulk_checkpoint_noop),
+            "fetch_plan": fetch_plan,
             "fetched_assets_path": str(fetched_assets_path),
+            "http_fetch_stats": shared_fetch_stats(),
+            "response_cache_stats": shared_response_cache().stats_dict() if shared_response_cache() is not None else None,
             "changed_packs": changed_packs[:50],
             "fetched_assets_sample": fetched_assets[:50],
             "fetch_errors": fetch_errors[:50],
@@ -1787,6 +2118,7 @@ def main(argv: Iterable[str]) -> int:
                 "provider_preflight": eodhd_preflight,
                 "provider_blocked_reason": EODHD_DISABLED_REASON,
                 "write_mode": args.write_mode,
+                "pack_store": args.pack_store,
                 "history_delta_manifest_path": str(delta_manifest_path) if delta_manifest_entries else None,
                 "exchange_checkpoint_path": str(exchange_checkpoint_path),
                 "exchange_checkpoint_resume_enabled": bool(args.resume_exchange_checkpoint),
@@ -1797,6 +2129,8 @@ def main(argv: Iterable[str]) -> int:
         print(json.dumps(report, ensure_ascii=False, indent=2))
         return exit_code
     finally:
+        close_shared_fetch_engine()
+        close_shared_response_cache()
         release_flock_lock(global_lock_path)
         release_job_lock(lock_path)
 
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Compiled columnar index of the v7 universe registry (registry.ndjson.gz).
+
+The gzip NDJSON registry is parsed once into an uncompressed Arrow IPC file
+that scripts memory-map instead of re-running ``json.loads`` per line. A JSON
+sidecar records the source registry's path, size, mtime and sha256; the index
+is reused while size and mtime match, re-validated by hash when only the mtime
+moved (checkouts, copies), and recompiled otherwise.
+
+String columns hold ``str(value or "")`` of the registry field, unstripped, so
+callers keep their own strip/upper normalization. ``history_pack`` and
+``pack_sha256`` come from ``pointers``.
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import uuid
+from pathlib import Path
+from typing import Any, Iterable
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.quantlab.q1_common import atomic_write_json, stable_hash_file, utc_now_iso  # noqa: E402
+
+REGISTRY_INDEX_SCHEMA = "quantlab_v7_registry_index_v1"
+DEFAULT_REGISTRY = "public/data/universe/v7/registry/registry.ndjson.gz"
+STRING_FIELDS = ("canonical_id", "symbol", "exchange", "currency", "country", "type_norm", "provider_symbol", "last_trade_date")
+POINTER_FIELDS = ("history_pack", "pack_sha256")
+INDEX_SCHEMA = pa.schema(
+    [(name, pa.string()) for name in STRING_FIELDS + POINTER_FIELDS]
+    + [
+        ("bars_count", pa.int64()),
+        ("avg_volume_30d", pa.float64()),
+        ("recent_closes", pa.list_(pa.float64())),
+        ("recent_volumes", pa.list_(pa.float64())),
+    ]
+)
+
+
+def default_index_path(registry_path: Path) -> Path:
+    root = Path(os.environ.get("RV_REGISTRY_INDEX_DIR") or REPO_ROOT / "mirrors" / "quantlab" / "registry_index")
+    resolved = str(Path(registry_path).resolve())
+    stem = Path(registry_path).name.split(".", 1)[0]
+    return root / f"{stem}.{hashlib.sha1(resolved.encode('utf-8')).hexdigest()[:12]}.arrow"
+
+
+def _meta_path(index_path: Path) -> Path:
+    return index_path.with_name(index_path.name + ".meta.json")
+
+
+def _to_float(value: Any) -> float | None:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value: Any) -> int | None:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _float_list(value: Any) -> list[float | None] | None:
+    return [_to_float(v) for v in value] if isinstance(value, list) else None
+
+
+def _source_stat(registry_path: Path) -> tuple[int, int]:
+    st = registry_path.stat()
+    return int(st.st_size), int(st.st_mtime_ns)
+
+
+def compile_registry_index(registry_path: Path, index_path: Path | None = None) -> dict[str, Any]:
+    """Parse the registry once and write the Arrow IPC index plus its sidecar; returns the sidecar."""
+    registry_path = Path(registry_path).resolve()
+    index_path = Path(index_path) if index_path else default_index_path(registry_path)
+    size, mtime_ns = _source_stat(registry_path)
+    columns: dict[str, list] = {field.name: [] for field in INDEX_SCHEMA}
+    rows_total = 0
+    rows_invalid = 0
+    with gzip.open(registry_path, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            rows_total += 1
+            try:
+                obj = json.loads(line)
+            except json.JSONDecodeError:
+                rows_invalid += 1
+                continue
+            if not isinstance(obj, dict):
+                rows_invalid += 1
+                continue
+            pointers = obj.get("pointers") if isinstance(obj.get("pointers"), dict) else {}
+            for name in STRING_FIELDS:
+                columns[name].append(str(obj.get(name) or ""))
+            for name in POINTER_FIELDS:
+                columns[name].append(str(pointers.get(name) or ""))
+            columns["bars_count"].append(_to_int(obj.get("bars_count")))
+            columns["avg_volume_30d"].append(_to_float(obj.get("avg_volume_30d") or 0.0))
+            columns["recent_closes"].append(_float_list(obj.get("_tmp_recent_closes")))
+            columns["recent_volumes"].append(_float_list(obj.get("_tmp_recent_volumes")))
+    table = pa.Table.from_pydict(columns, schema=INDEX_SCHEMA)
+
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = index_path.parent / f".{index_path.name}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, INDEX_SCHEMA) as writer:
+        writer.write_table(table)
+    tmp.replace(index_path)
+    meta = {
+        "schema": REGISTRY_INDEX_SCHEMA,
+        "compiled_at": utc_now_iso(),
+        "source_path": str(registry_path),
+        "source_size_bytes": size,
+        "source_mtime_ns": mtime_ns,
+        "source_sha256": stable_hash_file(registry_path),
+        "rows_total": rows_total,
+        "rows_invalid": rows_invalid,
+        "rows_indexed": table.num_rows,
+    }
+    atomic_write_json(_meta_path(index_path), meta)
+    return meta
+
+
+def _read_meta(index_path: Path) -> dict[str, Any] | None:
+    try:
+        meta = json.loads(_meta_path(index_path).read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return None
+    return meta if isinstance(meta, dict) and meta.get("schema") == REGISTRY_INDEX_SCHEMA else None
+
+
+def load_registry_index(registry_path: Path, index_path: Path | None = None) -> tuple[pa.Table, dict[str, Any]]:
+    """Memory-mapped registry index table, compiling it first when missing or stale."""
+    registry_path = Path(registry_path).resolve()
+    index_path = Path(index_path) if index_path else default_index_path(registry_path)
+    size, mtime_ns = _source_stat(registry_path)
+    meta = _read_meta(index_path) if index_path.exists() else None
+    status = "compiled"
+    if meta and meta.get("source_path") == str(registry_path):
+        if int(meta.get("source_size_bytes") or -1) == size and int(meta.get("source_mtime_ns") or -1) == mtime_ns:
+            status = "hit"
+        elif int(meta.get("source_size_bytes") or -1) == size and meta.get("source_sha256") == stable_hash_file(registry_path):
+            status = "hit_rehashed"
+            meta = {**meta, "source_mtime_ns": mtime_ns}
+            atomic_write_json(_meta_path(index_path), meta)
+    if status == "compiled":
+        meta = compile_registry_index(registry_path, index_path)
+    table = pa.ipc.open_file(pa.memory_map(str(index_path), "r")).read_all()
+    return table, {**meta, "status": status, "index_path": str(index_path)}
+
+
+def upper(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    return pc.utf8_upper(column)
+
+
+def strip(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    return pc.utf8_trim_whitespace(column)
+
+
+def isin(column: pa.ChunkedArray, values: Iterable[str]) -> pa.ChunkedArray:
+    return pc.is_in(column, value_set=pa.array(sorted(set(values)), type=pa.string()))
+
+
+def parse_args(argv: Iterable[str]) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Compile the v7 registry NDJSON into a memory-mappable Arrow index.")
+    p.add_argument("--repo-root", default=str(REPO_ROOT))
+    p.add_argument("--registry", default=DEFAULT_REGISTRY)
+    p.add_argument("--index-path", default="", help="Default: $RV_REGISTRY_INDEX_DIR or mirrors/quantlab/registry_index")
+    p.add_argument("--force", action="store_true", help="Recompile even when the index is fresh.")
+    return p.parse_args(list(argv))
+
+
+def main(argv: Iterable[str]) -> int:
+    args = parse_args(argv)
+    registry_path = Path(args.registry)
+    if not registry_path.is_absolute():
+        registry_path = Path(args.repo_root) / registry_path
+    index_path = Path(args.index_path) if args.index_path else None
+    if args.force:
+        compile_registry_index(registry_path, index_path)
+    _, info = load_registry_index(registry_path, index_path)
+    print(json.dumps(info, indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -2,7 +2,6 @@
 from __future__ import annotations
 
 import argparse
-import math
 import sys
 from pathlib import Path
 from typing import Iterable
@@ -13,7 +12,8 @@ REPO_ROOT = Path(__file__).resolve().parents[2]
 if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
-from scripts.quantlab.q1_common import DEFAULT_QUANT_ROOT, atomic_write_json, utc_now_iso
+from scripts.quantlab.ic_engine import pooled_rank_ic  # noqa: E402
+from scripts.quantlab.q1_common import DEFAULT_QUANT_ROOT, atomic_write_json, utc_now_iso  # noqa: E402
 
 
 def parse_args(argv: Iterable[str]) -> argparse.Namespace:
@@ -31,29 +31,7 @@ def _z(expr: pl.Expr) -> pl.Expr:
 
 
 def _spearman_ic(df: pl.DataFrame, score_col: str, target_col: str) -> float:
-    sub = df.select([score_col, target_col]).drop_nulls()
-    if sub.height < 20:
-        return 0.0
-    # rank-based correlation proxy
-    ranked = sub.with_columns(
-        [
-            pl.col(score_col).rank("average").alias("_rs"),
-            pl.col(target_col).rank("average").alias("_rt"),
-        ]
-    )
-    rs = ranked["_rs"].to_list()
-    rt = ranked["_rt"].to_list()
-    n = len(rs)
-    if n < 2:
-        return 0.0
-    m1 = sum(rs) / n
-    m2 = sum(rt) / n
-    cov = sum((a - m1) * (b - m2) for a, b in zip(rs, rt))
-    v1 = sum((a - m1) ** 2 for a in rs)
-    v2 = sum((b - m2) ** 2 for b in rt)
-    if v1 <= 0 or v2 <= 0:
-        return 0.0
-    return float(cov / math.sqrt(v1 * v2))
+    return pooled_rank_ic(df, [score_col], target_col, min_rows=20)[score_col]
 
 
 def main(argv: Iterable[str]) -> int:
@@ -16,6 +16,7 @@ REPO_ROOT = Path(__file__).resolve().parents[2]
 if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
+from scripts.quantlab.ic_engine import daily_ic, ic_summary, pooled_rank_ic  # noqa: E402
 from scripts.quantlab.q1_common import (  # noqa: E402
     DEFAULT_QUANT_ROOT,
     atomic_write_json,
@@ -24,6 +25,7 @@ from scripts.quantlab.q1_common import (  # noqa: E402
     infer_panel_output_tag_from_part_glob,
     utc_now_iso,
 )
+from scripts.quantlab.stagea_fold_cache import DEFAULT_FOLD_CACHE_MAX_MB, FoldCache, date_content_hashes, fold_cache_key  # noqa: E402
 
 
 def parse_args(argv: Iterable[str]) -> argparse.Namespace:
@@ -49,32 +51,28 @@ def parse_args(argv: Iterable[str]) -> argparse.Namespace:
     )
     p.add_argument("--run-id-suffix", default="")
     p.add_argument("--fixed-universe-path", help="Path to a JSON file containing the habitat-stratified perfect universe.")
+    p.add_argument(
+        "--fold-cache-root",
+        default="",
+        help="Fold train-stats/test-frame cache (default: <quant-root>/cache/stagea_folds/feature_store_version=<v>).",
+    )
+    p.add_argument("--fold-cache-max-mb", type=float, default=DEFAULT_FOLD_CACHE_MAX_MB, help="LRU budget for the fold cache; 0 disables eviction.")
+    p.add_argument("--no-fold-cache", action="store_true")
     return p.parse_args(list(argv))
 
 
 def _spearman_ic(df: pl.DataFrame, score_col: str, target_col: str) -> float:
-    sub = df.select([score_col, target_col]).drop_nulls()
-    if sub.height < 30:
-        return 0.0
-    ranked = sub.with_columns(
-        [
-            pl.col(score_col).rank("average").alias("_rs"),
-            pl.col(target_col).rank("average").alias("_rt"),
-        ]
-    )
-    rs = ranked["_rs"].to_list()
-    rt = ranked["_rt"].to_list()
-    n = len(rs)
-    if n < 2:
-        return 0.0
-    m1 = sum(rs) / n
-    m2 = sum(rt) / n
-    cov = sum((a - m1) * (b - m2) for a, b in zip(rs, rt))
-    v1 = sum((a - m1) ** 2 for a in rs)
-    v2 = sum((b - m2) ** 2 for b in rt)
-    if v1 <= 0 or v2 <= 0:
-        return 0.0
-    return float(cov / math.sqrt(v1 * v2))
+    return pooled_rank_ic(df, [score_col], target_col, min_rows=30)[score_col]
+
+
+def _daily_ic_fields(summary: dict | None) -> dict:
+    summary = summary or {}
+    return {
+        "ic_5d_daily_mean": float(summary.get("ic_mean", 0.0)),
+        "ic_5d_daily_ir": float(summary.get("ic_ir", 0.0)),
+        "ic_5d_daily_hit_rate": float(summary.get("ic_hit_rate", 0.0)),
+        "ic_5d_days": int(summary.get("ic_days", 0)),
+    }
 
 
 def _safe_float(v, default=0.0) -> float:
@@ -187,6 +185,10 @@ def _build_folds(unique_dates: list[str], fold_count: int, test_days: int, embar
     return folds
 
 
+# Bump whenever _train_stats or _prepare_test_features change; it is part of the fold cache key.
+FOLD_FEATURE_SET = "stagea_train_z_v1"
+
+
 def _train_stats(train_df: pl.DataFrame) -> dict[str, tuple[float, float]]:
     train_df = train_df.with_columns(pl.col("adv20_dollar").clip(lower_bound=1e-9).log().alias("_log_adv20"))
     cols = [
@@ -226,8 +228,11 @@ def _prepare_test_features(test_df: pl.DataFrame, stats: dict[str, tuple[float,
     return test_df.with_columns(exprs)
 
 
-def _candidate_metrics_on_fold(test_scored: pl.DataFrame, score_col: str, target_col: str = "fwd_ret_5d") -> dict:
-    ic = _spearman_ic(test_scored, score_col, target_col)
+def _candidate_metrics_on_fold(
+    test_scored: pl.DataFrame, score_col: str, target_col: str = "fwd_ret_5d", ic: float | None = None
+) -> dict:
+    if ic is None:
+        ic = _spearman_ic(test_scored, score_col, target_col)
     n = test_scored.height
     if n <= 0:
         return {
@@ -342,6 +347,7 @@ def main(argv: Iterable[str]) -> int:
 
     candidates = _candidates(args.candidate_profile)
     fold_metric_rows: list[dict] = []
+    daily_frames: list[pl.DataFrame] = []
     by_candidate: dict[str, dict] = {
         c.candidate_id: {
             "candidate_id": c.candidate_id,
@@ -354,22 +360,60 @@ def main(argv: Iterable[str]) -> int:
     # Pre-split per date strings to reduce repeated casts in filters.
     df = df.with_columns(pl.col("asof_date").dt.strftime("%Y-%m-%d").alias("_asof_s"))
 
+    fold_cache = None
+    date_hashes: dict[str, str] = {}
+    if not args.no_fold_cache:
+        cache_root = Path(args.fold_cache_root) if args.fold_cache_root else quant_root / "cache" / "stagea_folds" / f"feature_store_version={args.feature_store_version}"
+        fold_cache = FoldCache(cache_root, max_bytes=int(max(0.0, float(args.fold_cache_max_mb)) * 1024 * 1024))
+        date_hashes = date_content_hashes(df, "_asof_s")
+
     for fold in folds:
-        train_dates = set(fold["train_dates"])
-        test_dates = set(fold["test_dates"])
-        train_df = df.filter(pl.col("_asof_s").is_in(list(train_dates)))
-        test_df = df.filter(pl.col("_asof_s").is_in(list(test_dates)))
-        if train_df.height < 500 or test_df.height < 200:
+        cache_key = fold_cache_key(date_hashes, fold["train_dates"], fold["test_dates"], FOLD_FEATURE_SET) if fold_cache else ""
+        cached = fold_cache.load(cache_key) if fold_cache else None
+        if cached is not None:
+            cache_meta, test_prepped = cached
+            stats = cache_meta["train_stats"]
+            train_rows, test_rows = int(cache_meta["train_rows"]), int(cache_meta["test_rows"])
+        else:
+            train_dates = set(fold["train_dates"])
+            test_dates = set(fold["test_dates"])
+            train_df = df.filter(pl.col("_asof_s").is_in(list(train_dates)))
+            test_df = df.filter(pl.col("_asof_s").is_in(list(test_dates)))
+            train_rows, test_rows = train_df.height, test_df.height
+        if train_rows < 500 or test_rows < 200:
             fold["skipped"] = True
-            fold["skip_reason"] = f"insufficient_rows train={train_df.height} test={test_df.height}"
+            fold["skip_reason"] = f"insufficient_rows train={train_rows} test={test_rows}"
             continue
-        stats = _train_stats(train_df)
-        test_prepped = _prepare_test_features(test_df, stats)
-
+        if cached is None:
+            stats = _train_stats(train_df)
+            # Contiguous like a cache reload, so cold and warm runs aggregate in the same order.
+            test_prepped = _prepare_test_features(test_df, stats).rechunk()
+            if fold_cache:
+                fold_cache.store(
+                    cache_key,
+                    stats,
+                    test_prepped,
+                    feature_set=FOLD_FEATURE_SET,
+                    train_rows=train_rows,
+                    test_rows=test_rows,
+                    train_start=fold["train_start"],
+                    train_end=fold["train_end"],
+                    test_start=fold["test_start"],
+                    test_end=fold["test_end"],
+                    created_at=utc_now_iso(),
+                )
+
+        # Score every candidate at once; pooled and per-date ICs come from one pass each.
+        score_cols = {cand.candidate_id: f"_score_{cand.candidate_id}" for cand in candidates}
+        scored = test_prepped.with_columns([cand.score_expr_factory().alias(score_cols[cand.candidate_id]) for cand in candidates])
+        pooled_ic = pooled_rank_ic(scored, score_cols.values(), "fwd_ret_5d", min_rows=30)
+        fold_daily = daily_ic(scored, score_cols.values(), "fwd_ret_5d", date_col="_asof_s", min_rows=30)
+        daily_frames.append(fold_daily)
+        fold_daily_summary = ic_summary(fold_daily)
         for cand in candidates:
-            score_col = f"_score_{cand.candidate_id}"
-            scored = test_prepped.with_columns(cand.score_expr_factory().alias(score_col))
-            m = _candidate_metrics_on_fold(scored, score_col, target_col="fwd_ret_5d")
+            score_col = score_cols[cand.candidate_id]
+            m = _candidate_metrics_on_fold(scored, score_col, target_col="fwd_ret_5d", ic=pooled_ic[score_col])
+            m.update(_daily_ic_fields(fold_daily_summary.get(score_col)))
             row = {
                 "fold_id": fold["fold_id"],
                 "candidate_id": cand.candidate_id,
@@ -382,11 +426,14 @@ def main(argv: Iterable[str]) -> int:
     if not fold_metric_rows:
         raise SystemExit("FATAL: no fold metrics generated")
 
+    # Per-date ICs pooled over every test day of every fold.
+    oos_daily_summary = ic_summary(pl.concat(daily_frames, how="vertical"))
     cand_rows: list[dict] = []
     for cand in candidates:
         metrics = by_candidate[cand.candidate_id]["fold_metrics"]
         if not metrics:
             continue
+        oos_daily = _daily_ic_fields(oos_daily_summary.get(f"_score_{cand.candidate_id}"))
         ic_vals = [float(m["ic_5d"]) for m in metrics]
         sharpe_vals = [float(m["oos_sharpe_proxy"]) for m in metrics]
         spread_vals = [float(m["top_minus_bottom_5d"]) for m in metrics]
@@ -400,6 +447,7 @@ def main(argv: Iterable[str]) -> int:
                 "folds_used": len(metrics),
                 "ic_5d_oos_mean": statistics.fmean(ic_vals),
                 "ic_5d_oos_min": min(ic_vals),
+                **{key.replace("ic_5d_", "ic_5d_oos_", 1): value for key, value in oos_daily.items()},
                 "oos_sharpe_proxy_mean": statistics.fmean(sharpe_vals),
                 "oos_sharpe_proxy_min": min(sharpe_vals),
                 "top_minus_bottom_5d_mean": statistics.fmean(spread_vals),
@@ -509,6 +557,7 @@ def main(argv: Iterable[str]) -> int:
             "notes": [
                 "Q1 upgrade from proxy-only single-slice to real temporal folds with fold artifacts.",
                 "Still a Cheap Gate Stage A approximation (no CPCV, no expensive stress suite yet).",
+                "ic_5d is the pooled rank IC per fold; ic_5d_daily_* summarize per-date cross-sectional rank ICs.",
             ],
         },
         "inputs": {
@@ -524,6 +573,7 @@ def main(argv: Iterable[str]) -> int:
             "folds_total": len(folds),
             "fold_metrics_rows": len(fold_metric_rows),
         },
+        "fold_cache": {"enabled": fold_cache is not None, "feature_set": FOLD_FEATURE_SET, **(fold_cache.stats() if fold_cache else {})},
         "gates_proxy": {
             "ic_5d_oos_mean_min": 0.0,
             "maxdd_proxy_pct_mean_max": 35.0,
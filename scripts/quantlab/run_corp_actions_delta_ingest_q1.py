@@ -2,18 +2,17 @@
 from __future__ import annotations
 
 import argparse
-import gzip
 import json
 import os
 import time
 from datetime import date, datetime, timezone
 from pathlib import Path
 from typing import Any, Iterable
-from urllib.error import HTTPError, URLError
-from urllib.parse import urlencode
-from urllib.request import Request, urlopen
+from urllib.error import URLError
+from urllib.parse import urlencode, urlsplit
 
 import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.parquet as pq
 
 REPO_ROOT = Path(__file__).resolve().parents[2]
@@ -21,7 +20,25 @@ REPO_ROOT = Path(__file__).resolve().parents[2]
 if str(REPO_ROOT) not in os.sys.path:
     os.sys.path.insert(0, str(REPO_ROOT))
 
+from scripts.quantlab.async_http_fetch import (  # noqa: E402
+    close_shared_fetch_engine,
+    configure_shared_fetch_engine,
+    shared_fetch_engine,
+)
+from scripts.quantlab.provider_response_cache import (  # noqa: E402
+    DEFAULT_RESPONSE_CACHE_DIR,
+    DEFAULT_RESPONSE_CACHE_MAX_MB,
+    close_shared_response_cache,
+    configure_shared_response_cache,
+    shared_response_cache,
+)
 from scripts.quantlab.q1_common import DEFAULT_QUANT_ROOT, atomic_write_json, stable_hash_obj, utc_now_iso  # noqa: E402
+from scripts.quantlab.registry_index import (  # noqa: E402
+    isin as registry_isin,
+    load_registry_index,
+    strip as registry_strip,
+    upper as registry_upper,
+)
 
 
 def parse_args(argv: Iterable[str]) -> argparse.Namespace:
@@ -39,6 +56,18 @@ def parse_args(argv: Iterable[str]) -> argparse.Namespace:
     p.add_argument("--max-calls", type=int, default=0)
     p.add_argument("--max-retries", type=int, default=1)
     p.add_argument("--sleep-ms", type=int, default=0)
+    p.add_argument(
+        "--rate-limit-per-sec",
+        type=float,
+        default=float(os.environ.get("RV_EODHD_RATE_PER_SEC", "15") or "0"),
+        help="Token-bucket request rate for the API host (EODHD allows 1000/min). 0 disables.",
+    )
+    p.add_argument(
+        "--response-cache-dir",
+        default=DEFAULT_RESPONSE_CACHE_DIR,
+        help="Provider response cache (relative to --repo-root or absolute); empty disables.",
+    )
+    p.add_argument("--response-cache-max-mb", type=float, default=DEFAULT_RESPONSE_CACHE_MAX_MB)
     p.add_argument("--from-date", default="")
     p.add_argument("--job-name", default="")
     p.add_argument("--compression", default="snappy")
@@ -50,26 +79,30 @@ def parse_args(argv: Iterable[str]) -> argparse.Namespace:
     return p.parse_args(list(argv))
 
 
-def _http_json(url: str, timeout_sec: float) -> tuple[int, Any]:
-    req = Request(url, headers={"User-Agent": "quantlab-q1-corp-actions/1.0"})
+def _http_json(url: str, timeout_sec: float, max_retries: int = 1, as_of: str = "") -> tuple[int, Any, int]:
+    cache = shared_response_cache()
+    cached = cache.get(url, as_of=as_of) if cache is not None else None
+    if cached is not None:
+        return 200, json.loads(cached.decode("utf-8")), 0
     try:
-        with urlopen(req, timeout=timeout_sec) as resp:
-            status = int(getattr(resp, "status", 200))
-            raw = resp.read().decode("utf-8", errors="replace")
-            try:
-                data = json.loads(raw)
-            except Exception:
-                data = {"_raw": raw}
-            return status, data
-    except HTTPError as exc:
-        body = exc.read().decode("utf-8", errors="replace") if hasattr(exc, "read") else ""
-        try:
-            data = json.loads(body) if body else {}
-        except Exception:
-            data = {"_raw": body}
-        return int(exc.code), data
+        result = shared_fetch_engine().fetch(
+            url,
+            headers={"User-Agent": "quantlab-q1-corp-actions/1.0"},
+            timeout_sec=timeout_sec,
+            max_retries=max_retries,
+            raise_for_status=False,
+        )
     except URLError as exc:
-        return 599, {"error": str(exc)}
+        return 599, {"error": str(exc)}, max(1, int(max_retries))
+    raw = result.text()
+    try:
+        data = json.loads(raw) if raw else {}
+    except Exception:
+        data = {"_raw": raw}
+    else:
+        if cache is not None and int(result.status) == 200 and raw:
+            cache.put(url, result.body, as_of=as_of)
+    return int(result.status), data, int(result.attempts)
 
 
 def _normalize_include_types(v: str) -> set[str]:
@@ -80,42 +113,36 @@ def _load_registry_assets(registry_path: Path, include_types: set[str], force_ci
     rows: list[dict[str, str]] = []
     if not registry_path.exists():
         return rows
-    with gzip.open(registry_path, "rt", encoding="utf-8") as fh:
-        for line in fh:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                obj = json.loads(line)
-            except Exception:
-                continue
-            cid = str(obj.get("canonical_id") or "").strip()
-            if not cid:
-                continue
-            tnorm = str(obj.get("type_norm") or "").strip().upper()
-            if force_cids and cid not in force_cids:
-                continue
-            if (not force_cids) and include_types and tnorm not in include_types:
-                continue
-            provider_symbol = str(obj.get("provider_symbol") or "").strip()
-            symbol = str(obj.get("symbol") or "").strip()
-            exchange = str(obj.get("exchange") or "").strip()
-            if not provider_symbol and symbol and exchange:
-                provider_symbol = f"{symbol}.{exchange}"
-            # EODHD endpoints for corporate actions expect exchange-qualified symbols in most cases.
-            if provider_symbol and exchange and "." not in provider_symbol:
-                provider_symbol = f"{provider_symbol}.{exchange}"
-            if not provider_symbol:
-                continue
-            rows.append(
-                {
-                    "canonical_id": cid,
-                    "asset_id": cid,
-                    "provider_symbol": provider_symbol,
-                    "type_norm": tnorm,
-                    "exchange": exchange,
-                }
-            )
+    table, _ = load_registry_index(registry_path)
+    cids = registry_strip(table["canonical_id"])
+    tnorms = registry_upper(registry_strip(table["type_norm"]))
+    keep = pc.not_equal(cids, "")
+    if force_cids:
+        keep = pc.and_(keep, registry_isin(cids, force_cids))
+    elif include_types:
+        keep = pc.and_(keep, registry_isin(tnorms, include_types))
+    table = table.select(["provider_symbol", "symbol", "exchange"]).append_column("cid", cids).append_column("tnorm", tnorms).filter(keep)
+    for obj in table.to_pylist():
+        cid = obj["cid"]
+        provider_symbol = obj["provider_symbol"].strip()
+        symbol = obj["symbol"].strip()
+        exchange = obj["exchange"].strip()
+        if not provider_symbol and symbol and exchange:
+            provider_symbol = f"{symbol}.{exchange}"
+        # EODHD endpoints for corporate actions expect exchange-qualified symbols in most cases.
+        if provider_symbol and exchange and "." not in provider_symbol:
+            provider_symbol = f"{provider_symbol}.{exchange}"
+        if not provider_symbol:
+            continue
+        rows.append(
+            {
+                "canonical_id": cid,
+                "asset_id": cid,
+                "provider_symbol": provider_symbol,
+                "type_norm": obj["tnorm"],
+                "exchange": exchange,
+            }
+        )
     rows.sort(key=lambda r: (r["canonical_id"], r["provider_symbol"]))
     return rows
 
@@ -173,17 +200,12 @@ def _iter_list_payload(data: Any) -> list[dict[str, Any]]:
     return []
 
 
-def _fetch_with_retries(url: str, timeout_sec: float, max_retries: int, sleep_ms: int) -> tuple[int, Any, int]:
-    attempts = 0
-    while True:
-        attempts += 1
-        status, data = _http_json(url, timeout_sec=timeout_sec)
-        if status < 500 and status not in (429,):
-            return status, data, attempts
-        if attempts > max(0, int(max_retries)):
-            return status, data, attempts
-        if sleep_ms > 0:
-            time.sleep(float(sleep_ms) / 1000.0)
+def _fetch_with_retries(
+    url: str, timeout_sec: float, max_retries: int, sleep_ms: int, as_of: str = ""
+) -> tuple[int, Any, int]:
+    # 429/5xx/connection retries use the fetch engine's jittered backoff (429 honours Retry-After);
+    # sleep_ms is kept as per-asset pacing in main().
+    return _http_json(url, timeout_sec=timeout_sec, max_retries=max(0, int(max_retries)) + 1, as_of=as_of)
 
 
 def _write_parquet(path: Path, rows: list[dict[str, Any]], compression: str) -> int:
@@ -326,111 +348,125 @@ def main(argv: Iterable[str]) -> int:
     rows_out: list[dict[str, Any]] = []
     asset_events = 0
     fatal_statuses = {401, 402, 403, 429}
+    api_host = urlsplit(str(args.api_base_url)).hostname or ""
+    configure_shared_fetch_engine(
+        host_rates={api_host: max(0.0, float(args.rate_limit_per_sec or 0.0))},
+        timeout_sec=float(args.timeout_sec),
+    )
+    configure_shared_response_cache(
+        (repo_root / str(args.response_cache_dir)).resolve() if str(args.response_cache_dir or "").strip() else None,
+        max_mb=float(args.response_cache_max_mb),
+    )
 
-    for i, asset in enumerate(assets):
-        if int(args.max_calls) > 0 and calls_total >= int(args.max_calls):
-            break
-        provider_symbol = str(asset["provider_symbol"])
-        base_params = {"api_token": token, "fmt": "json"}
-        if str(args.from_date).strip():
-            base_params["from"] = str(args.from_date).strip()
-
-        div_url = f"{str(args.api_base_url).rstrip('/')}/div/{provider_symbol}?{urlencode(base_params)}"
-        spl_url = f"{str(args.api_base_url).rstrip('/')}/splits/{provider_symbol}?{urlencode(base_params)}"
-
-        for endpoint_name, url in (("div", div_url), ("splits", spl_url)):
+    try:
+        for i, asset in enumerate(assets):
             if int(args.max_calls) > 0 and calls_total >= int(args.max_calls):
                 break
-            status, data, attempts = _fetch_with_retries(
-                url=url,
-                timeout_sec=float(args.timeout_sec),
-                max_retries=int(args.max_retries),
-                sleep_ms=int(args.sleep_ms),
-            )
-            calls_total += int(attempts)
-            if status >= 400:
-                if int(status) in fatal_statuses:
-                    fatal_http_errors_total += 1
-                errors.append(
-                    {
-                        "canonical_id": asset["canonical_id"],
-                        "provider_symbol": provider_symbol,
-                        "endpoint": endpoint_name,
-                        "status": int(status),
-                    }
+            provider_symbol = str(asset["provider_symbol"])
+            base_params = {"api_token": token, "fmt": "json"}
+            if str(args.from_date).strip():
+                base_params["from"] = str(args.from_date).strip()
+
+            div_url = f"{str(args.api_base_url).rstrip('/')}/div/{provider_symbol}?{urlencode(base_params)}"
+            spl_url = f"{str(args.api_base_url).rstrip('/')}/splits/{provider_symbol}?{urlencode(base_params)}"
+
+            for endpoint_name, url in (("div", div_url), ("splits", spl_url)):
+                if int(args.max_calls) > 0 and calls_total >= int(args.max_calls):
+                    break
+                status, data, attempts = _fetch_with_retries(
+                    url=url,
+                    timeout_sec=float(args.timeout_sec),
+                    max_retries=int(args.max_retries),
+                    sleep_ms=int(args.sleep_ms),
+                    as_of=str(args.ingest_date),
                 )
-                continue
-            events = _iter_list_payload(data)
-            if endpoint_name == "div":
-                for ev in events:
-                    d = _event_date(ev, ["date", "exDate", "ex_date", "paymentDate", "payment_date"])
-                    if not d:
-                        continue
-                    try:
-                        cash = float(ev.get("dividend", ev.get("value", ev.get("amount", 0.0))) or 0.0)
-                    except Exception:
-                        cash = 0.0
-                    if cash == 0.0:
-                        continue
-                    ca_id = stable_hash_obj(
-                        {
-                            "asset_id": asset["asset_id"],
-                            "date": d,
-                            "action_type": "dividend_cash",
-                            "cash": cash,
-                            "provider_symbol": provider_symbol,
-                        }
-                    )[:24]
-                    rows_out.append(
-                        {
-                            "asset_id": asset["asset_id"],
-                            "effective_date": d,
-                            "action_type": "dividend_cash",
-                            "split_factor": None,
-                            "dividend_cash": float(cash),
-                            "source_confidence": 0.95,
-                            "ca_id": ca_id,
-                            "provider_symbol": provider_symbol,
-                            "provider": "EODHD",
-                            "ingest_date": str(args.ingest_date),
-                            "source_endpoint": "div",
-                        }
-                    )
-            else:
-                for ev in events:
-                    d = _event_date(ev, ["date", "splitDate", "split_date"])
-                    if not d:
-                        continue
-                    sf = _parse_split_factor(ev.get("split", ev.get("split_factor")))
-                    if sf is None:
-                        continue
-                    ca_id = stable_hash_obj(
-                        {
-                            "asset_id": asset["asset_id"],
-                            "date": d,
-                            "action_type": "split",
-                            "split_factor": sf,
-                            "provider_symbol": provider_symbol,
-                        }
-                    )[:24]
-                    rows_out.append(
+                calls_total += int(attempts)
+                if status >= 400:
+                    if int(status) in fatal_statuses:
+                        fatal_http_errors_total += 1
+                    errors.append(
                         {
-                            "asset_id": asset["asset_id"],
-                            "effective_date": d,
-                            "action_type": "split",
-                            "split_factor": float(sf),
-                            "dividend_cash": None,
-                            "source_confidence": 0.97,
-                            "ca_id": ca_id,
+                            "canonical_id": asset["canonical_id"],
                             "provider_symbol": provider_symbol,
-                            "provider": "EODHD",
-                            "ingest_date": str(args.ingest_date),
-                            "source_endpoint": "splits",
+                            "endpoint": endpoint_name,
+                            "status": int(status),
                         }
                     )
-        if int(args.sleep_ms) > 0:
-            time.sleep(float(args.sleep_ms) / 1000.0)
-        asset_events += 1
+                    continue
+                events = _iter_list_payload(data)
+                if endpoint_name == "div":
+                    for ev in events:
+                        d = _event_date(ev, ["date", "exDate", "ex_date", "paymentDate", "payment_date"])
+                        if not d:
+                            continue
+                        try:
+                            cash = float(ev.get("dividend", ev.get("value", ev.get("amount", 0.0))) or 0.0)
+                        except Exception:
+                            cash = 0.0
+                        if cash == 0.0:
+                            continue
+                        ca_id = stable_hash_obj(
+                            {
+                                "asset_id": asset["asset_id"],
+                                "date": d,
+                                "action_type": "dividend_cash",
+                                "cash": cash,
+                                "provider_symbol": provider_symbol,
+                            }
+                        )[:24]
+                        rows_out.append(
+                            {
+                                "asset_id": asset["asset_id"],
+                                "effective_date": d,
+                                "action_type": "dividend_cash",
+                                "split_factor": None,
+                                "dividend_cash": float(cash),
+                                "source_confidence": 0.95,
+                                "ca_id": ca_id,
+                                "provider_symbol": provider_symbol,
+                                "provider": "EODHD",
+                                "ingest_date": str(args.ingest_date),
+                                "source_endpoint": "div",
+                            }
+                        )
+                else:
+                    for ev in events:
+                        d = _event_date(ev, ["date", "splitDate", "split_date"])
+                        if not d:
+                            continue
+                        sf = _parse_split_factor(ev.get("split", ev.get("split_factor")))
+                        if sf is None:
+                            continue
+                        ca_id = stable_hash_obj(
+                            {
+                                "asset_id": asset["asset_id"],
+                                "date": d,
+                                "action_type": "split",
+                                "split_factor": sf,
+                                "provider_symbol": provider_symbol,
+                            }
+                        )[:24]
+                        rows_out.append(
+                            {
+                                "asset_id": asset["asset_id"],
+                                "effective_date": d,
+                                "action_type": "split",
+                                "split_factor": float(sf),
+                                "dividend_cash": None,
+                                "source_confidence": 0.97,
+                                "ca_id": ca_id,
+                                "provider_symbol": provider_symbol,
+                                "provider": "EODHD",
+                                "ingest_date": str(args.ingest_date),
+                                "source_endpoint": "splits",
+                            }
+                        )
+            if int(args.sleep_ms) > 0:
+                time.sleep(float(args.sleep_ms) / 1000.0)
+            asset_events += 1
+    finally:
+        http_fetch_stats = close_shared_fetch_engine()
+        response_cache_stats = close_shared_response_cache()
 
     # de-dup by ca_id
     dedup: dict[str, dict[str, Any]] = {}
@@ -459,6 +495,7 @@ def main(argv: Iterable[str]) -> int:
             "max_retries": int(args.max_retries),
             "timeout_sec": float(args.timeout_sec),
             "sleep_ms": int(args.sleep_ms),
+            "rate_limit_per_sec": float(args.rate_limit_per_sec),
         },
         "stats": {
             "assets_selected_total": int(len(assets)),
@@ -468,6 +505,8 @@ def main(argv: Iterable[str]) -> int:
             "errors_total": int(len(errors)),
             "fatal_http_errors_total": int(fatal_http_errors_total),
         },
+        "http_fetch_stats": http_fetch_stats,
+        "response_cache_stats": response_cache_stats,
         "artifacts": {
             "corp_actions_parquet": str(out_path),
             "job_root": str(job_root),
@@ -15,7 +15,6 @@ This script does not call provider APIs directly. It consumes the local v7 histo
 """
 
 import argparse
-import gzip
 import importlib.util
 import json
 import os
@@ -24,16 +23,47 @@ import sys
 import time
 import uuid
 from collections import defaultdict
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict
 from datetime import date, datetime, timezone
+from functools import partial
 from pathlib import Path
 from typing import Any, Dict, Iterable, List, Tuple
 
 try:
     import pyarrow as pa
-    import pyarrow.parquet as pq
+    import pyarrow.compute as pc
 except Exception as exc:  # pragma: no cover
     raise SystemExit(f"FATAL: pyarrow required: {exc}")
 
+REPO_ROOT = Path(__file__).resolve().parents[2]
+if str(REPO_ROOT) not in sys.path:
+    sys.path.insert(0, str(REPO_ROOT))
+
+from scripts.quantlab.history_pack_store import (  # noqa: E402
+    DEFAULT_PACK_STORE,
+    PACK_STORE_CHOICES,
+    open_pack,
+    pack_stat_path,
+    read_ndjson_gz_records,
+)
+from scripts.quantlab.latest_date_index import (  # noqa: E402
+    DEFAULT_LATEST_DATE_CACHE_REL,
+    merge_latest_dates,
+    read_latest_date_cache,
+    scan_latest_dates,
+    table_to_latest_dates,
+    write_latest_date_cache,
+)
+from scripts.quantlab.pack_pool import iter_ordered_results, publish_staged_outputs, reset_staging  # noqa: E402
+from scripts.quantlab.raw_bars_writer import BAR_COLUMNS, RawBarsSink  # noqa: E402
+from scripts.quantlab.registry_index import (  # noqa: E402
+    isin as registry_isin,
+    load_registry_index,
+    strip as registry_strip,
+    upper as registry_upper,
+)
+
 
 def utc_now_iso() -> str:
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
@@ -112,7 +142,7 @@ def parse_args(argv: Iterable[str]) -> argparse.Namespace:
         "--workers",
         type=int,
         default=int(os.environ.get("RV_Q1_WORKERS", "1") or "1"),
-        help="Safe rollout flag; default 1 keeps parent-owned parquet/state writes deterministic.",
+        help="Packs flattened in parallel worker processes; the parent still publishes outputs and owns state/manifest writes in pack order.",
     )
     p.add_argument("--force-pack", action="append", default=[])
     p.add_argument(
@@ -124,8 +154,8 @@ def parse_args(argv: Iterable[str]) -> argparse.Namespace:
     p.add_argument("--job-name", default="")
     p.add_argument(
         "--latest-date-cache-path",
-        default="ops/cache/q1_daily_delta_latest_date_index.stock_etf.json",
-        help="Path relative to quant-root (or absolute) for latest-date index cache",
+        default=DEFAULT_LATEST_DATE_CACHE_REL,
+        help="Path relative to quant-root (or absolute) for the latest-date index cache (parquet)",
     )
     p.add_argument(
         "--pack-state-cache-path",
@@ -148,6 +178,12 @@ def parse_args(argv: Iterable[str]) -> argparse.Namespace:
         default=os.environ.get("RV_HISTORY_READ_DELTAS", "0") == "1",
         help="Overlay history delta sidecars while reading packs. Default off.",
     )
+    p.add_argument(
+        "--pack-store",
+        choices=list(PACK_STORE_CHOICES),
+        default=DEFAULT_PACK_STORE,
+        help="History pack backend to read (must match the refresh writer's --pack-store).",
+    )
     p.add_argument("--rebuild-latest-date-cache", action="store_true")
     p.add_argument("--full-scan-packs", action="store_true", help="Ignore pack mtime cache and scan all packs")
     p.add_argument("--max-emitted-rows", type=int, default=0, help="Optional safety stop for smoke tests")
@@ -220,7 +256,7 @@ def _resolve_repo_rel(repo_root: Path, p: str) -> Path:
     return path if path.is_absolute() else (repo_root / path)
 
 
-def _history_pack_path(repo_root: Path, rel_pack: str) -> Path:
+def _history_pack_path(repo_root: Path, rel_pack: str, pack_store: str = DEFAULT_PACK_STORE) -> Path:
     # Local Mac storage can be mounted either as mirrors/universe-v7/<rel_pack>
     # or under the history symlink target as mirrors/universe-v7/history/<rel_pack>.
     rel = Path(str(rel_pack).strip())
@@ -231,7 +267,7 @@ def _history_pack_path(repo_root: Path, rel_pack: str) -> Path:
         repo_root / "mirrors/universe-v7" / "history" / rel,
     ]
     for candidate in candidates:
-        if candidate.exists():
+        if pack_stat_path(candidate, pack_store).exists():
             return candidate
     return candidates[0]
 
@@ -310,7 +346,7 @@ def list_raw_parquet_files(raw_provider_root: Path, include_asset_classes: set[s
     return files
 
 
-def raw_files_fingerprint(files: list[Path], raw_provider_root: Path) -> dict[str, Any]:
+def raw_file_stats(files: list[Path], raw_provider_root: Path) -> list[tuple[str, int, int]]:
     items = []
     for fp in files:
         st = fp.stat()
@@ -319,7 +355,11 @@ def raw_files_fingerprint(files: list[Path], raw_provider_root: Path) -> dict[st
         except Exception:
             rel = str(fp)
         items.append((rel, st.st_size, st.st_mtime_ns))
-    items.sort()
+    return items
+
+
+def raw_files_fingerprint(files: list[Path], raw_provider_root: Path, items: list[tuple[str, int, int]] | None = None) -> dict[str, Any]:
+    items = sorted(items if items is not None else raw_file_stats(files, raw_provider_root))
     return {
         "files_total": len(items),
         "fingerprint": stable_hash_obj(items),
@@ -328,63 +368,27 @@ def raw_files_fingerprint(files: list[Path], raw_provider_root: Path) -> dict[st
     }
 
 
-def build_latest_date_index_from_raw(files: list[Path]) -> tuple[dict[str, str], dict[str, Any]]:
-    latest: dict[str, str] = {}
-    stats = {"files_scanned": 0, "rows_scanned": 0, "assets_seen": 0}
-    for fp in files:
-        pf = pq.ParquetFile(fp)
-        tbl = pf.read(columns=["asset_id", "date"])
-        data = tbl.to_pydict()
-        aids = data.get("asset_id") or []
-        dates = data.get("date") or []
-        stats["files_scanned"] += 1
-        stats["rows_scanned"] += len(aids)
-        for aid, d in zip(aids, dates):
-            if not aid or not d:
-                continue
-            d = str(d)
-            prev = latest.get(aid)
-            if prev is None or d > prev:
-                latest[aid] = d
-    stats["assets_seen"] = len(latest)
-    return latest, stats
-
-
 def build_registry_pack_sha_index(registry_path: Path, include_types: set[str]) -> tuple[dict[str, str], dict[str, Any]]:
+    table, index_info = load_registry_index(registry_path)
+    rel_packs = registry_strip(table["history_pack"])
+    selected = pc.and_(registry_isin(registry_upper(table["type_norm"]), include_types), pc.not_equal(rel_packs, ""))
+    rel_packs = rel_packs.filter(selected).to_pylist()
+    shas = registry_strip(table["pack_sha256"]).filter(selected).to_pylist()
     pack_sha: dict[str, str] = {}
-    rows_total = 0
-    rows_selected = 0
     missing_pack_sha = 0
     conflicting_pack_sha = 0
-    with gzip.open(registry_path, "rt", encoding="utf-8") as fh:
-        for line in fh:
-            line = line.strip()
-            if not line:
-                continue
-            rows_total += 1
-            try:
-                obj = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-            type_norm = str(obj.get("type_norm") or "").upper()
-            if type_norm not in include_types:
-                continue
-            rel_pack = str(((obj.get("pointers") or {}).get("history_pack")) or "").strip()
-            if not rel_pack:
-                continue
-            rows_selected += 1
-            sha = str(((obj.get("pointers") or {}).get("pack_sha256")) or "").strip()
-            if not sha:
-                missing_pack_sha += 1
-                continue
-            prev = pack_sha.get(rel_pack)
-            if prev and prev != sha:
-                conflicting_pack_sha += 1
-                continue
-            pack_sha[rel_pack] = sha
+    for rel_pack, sha in zip(rel_packs, shas):
+        if not sha:
+            missing_pack_sha += 1
+            continue
+        prev = pack_sha.get(rel_pack)
+        if prev and prev != sha:
+            conflicting_pack_sha += 1
+            continue
+        pack_sha[rel_pack] = sha
     return pack_sha, {
-        "rows_total": rows_total,
-        "rows_selected": rows_selected,
+        "rows_total": int(index_info["rows_total"]),
+        "rows_selected": len(rel_packs),
         "packs_with_sha": len(pack_sha),
         "missing_pack_sha_rows": missing_pack_sha,
         "conflicting_pack_sha_rows": conflicting_pack_sha,
@@ -397,35 +401,58 @@ def load_or_build_latest_date_cache(
     files: list[Path],
     rebuild: bool = False,
 ) -> tuple[dict[str, str], dict[str, Any]]:
-    fp = raw_files_fingerprint(files, raw_provider_root)
-    if not rebuild:
-        cached = load_json(cache_path, {})
-        if cached and cached.get("fingerprint") == fp["fingerprint"]:
-            latest = {str(k): str(v) for k, v in (cached.get("latest_dates") or {}).items()}
-            return latest, {
-                "enabled": True,
-                "status": "hit",
-                "cache_path": str(cache_path),
-                "files_total": fp["files_total"],
-                "assets_total": len(latest),
-                "fingerprint": fp["fingerprint"],
-            }
+    items = raw_file_stats(files, raw_provider_root)
+    fp = raw_files_fingerprint(files, raw_provider_root, items)
+    cached_meta, cached = ({}, None) if rebuild else read_latest_date_cache(cache_path)
+    if cached is not None and cached_meta.get("fingerprint") == fp["fingerprint"]:
+        latest = table_to_latest_dates(cached)
+        return latest, {
+            "enabled": True,
+            "status": "hit",
+            "cache_path": str(cache_path),
+            "files_total": fp["files_total"],
+            "assets_total": len(latest),
+            "fingerprint": fp["fingerprint"],
+        }
 
-    latest, stats = build_latest_date_index_from_raw(files)
-    payload = {
-        "schema": "q1_daily_delta_latest_date_cache_v1",
-        "generated_at": utc_now_iso(),
-        "raw_provider_root": str(raw_provider_root),
-        **fp,
-        "stats": stats,
-        "latest_dates": latest,
-    }
-    atomic_write_json(cache_path, payload)
+    # A max per asset only grows as files are added, so when every file the cache
+    # was built from is still present and unchanged, fold in just the new files
+    # (in practice the ingest_date= partitions written since the last run).
+    known = {tuple(item) for item in (cached_meta.get("files") or [])}
+    current = set(items)
+    incremental = (
+        cached is not None
+        and bool(known)
+        and known <= current
+        and cached_meta.get("raw_provider_root") == str(raw_provider_root)
+    )
+    if incremental:
+        added = [path for path, item in zip(files, items) if item not in known]
+        delta, stats = scan_latest_dates(added)
+        table = merge_latest_dates([cached, delta])
+        status = "incremental"
+    else:
+        table, stats = scan_latest_dates(files)
+        status = "rebuilt"
+    stats["assets_seen"] = table.num_rows
+    write_latest_date_cache(
+        cache_path,
+        table,
+        {
+            "generated_at": utc_now_iso(),
+            "raw_provider_root": str(raw_provider_root),
+            **fp,
+            "stats": {**stats, "mode": status},
+            "files": sorted(items),
+        },
+    )
+    latest = table_to_latest_dates(table)
     return latest, {
         "enabled": True,
-        "status": "rebuilt",
+        "status": status,
         "cache_path": str(cache_path),
         "files_total": fp["files_total"],
+        "files_scanned": stats["files_scanned"],
         "assets_total": len(latest),
         "fingerprint": fp["fingerprint"],
         "rows_scanned": stats["rows_scanned"],
@@ -440,21 +467,24 @@ def persist_latest_date_cache(
     *,
     status: str,
 ) -> dict[str, Any]:
-    fp = raw_files_fingerprint(files, raw_provider_root)
-    payload = {
-        "schema": "q1_daily_delta_latest_date_cache_v1",
-        "generated_at": utc_now_iso(),
-        "raw_provider_root": str(raw_provider_root),
-        **fp,
-        "stats": {
-            "files_scanned": 0,
-            "rows_scanned": 0,
-            "assets_seen": len(latest_dates),
-            "mode": status,
+    items = raw_file_stats(files, raw_provider_root)
+    fp = raw_files_fingerprint(files, raw_provider_root, items)
+    write_latest_date_cache(
+        cache_path,
+        latest_dates,
+        {
+            "generated_at": utc_now_iso(),
+            "raw_provider_root": str(raw_provider_root),
+            **fp,
+            "stats": {
+                "files_scanned": 0,
+                "rows_scanned": 0,
+                "assets_seen": len(latest_dates),
+                "mode": status,
+            },
+            "files": sorted(items),
         },
-        "latest_dates": latest_dates,
-    }
-    atomic_write_json(cache_path, payload)
+    )
     return {
         "enabled": True,
         "status": status,
@@ -474,6 +504,7 @@ def load_or_build_pack_state_cache(
     registry_pack_sha: dict[str, str] | None = None,
     force_full_scan: bool = False,
     commit_cache: bool = True,
+    pack_store: str = DEFAULT_PACK_STORE,
 ) -> tuple[dict[str, tuple[int, int]], list[str], dict[str, Any]]:
     """
     Returns:
@@ -552,9 +583,9 @@ def load_or_build_pack_state_cache(
             changed: list[str] = []
             missing = 0
             for rel_pack in stat_targets:
-                abs_pack = _history_pack_path(repo_root, rel_pack)
+                abs_pack = _history_pack_path(repo_root, rel_pack, pack_store)
                 try:
-                    st = abs_pack.stat()
+                    st = pack_stat_path(abs_pack, pack_store).stat()
                 except FileNotFoundError:
                     missing += 1
                     changed.append(rel_pack)
@@ -595,9 +626,9 @@ def load_or_build_pack_state_cache(
     changed: list[str] = []
     missing = 0
     for rel_pack in rel_packs:
-        abs_pack = _history_pack_path(repo_root, rel_pack)
+        abs_pack = _history_pack_path(repo_root, rel_pack, pack_store)
         try:
-            st = abs_pack.stat()
+            st = pack_stat_path(abs_pack, pack_store).stat()
         except FileNotFoundError:
             missing += 1
             continue
@@ -802,6 +833,89 @@ def filter_rows_newer_than_latest(
     }
 
 
+def filter_table_newer_than_latest(
+    table: "pa.Table",
+    latest_date_by_asset: dict[str, str],
+    emitted_keys_seen: set[tuple[str, str]],
+    *,
+    max_allowed_date: str,
+) -> tuple["pa.Table", dict[str, Any]]:
+    """filter_rows_newer_than_latest on a raw-bars Arrow table: same checks, order and stats.
+
+    Validation and the latest-date comparison run as Arrow kernels over every row; only the
+    surviving (new) rows reach Python for the in-run (asset_id, date) dedupe.
+    """
+    n = table.num_rows
+
+    def passed(mask: Any) -> Any:
+        return pc.fill_null(mask, False)
+
+    def count(mask: Any) -> int:
+        return int(pc.sum(pc.cast(mask, pa.int64())).as_py() or 0)
+
+    aid = table["asset_id"]
+    d = table["date"]
+    keep = passed(
+        pc.and_(
+            pc.and_(pc.is_valid(aid), pc.not_equal(aid, "")),
+            pc.and_(pc.is_valid(d), pc.not_equal(d, "")),
+        )
+    )
+    dropped: dict[str, int] = {"identity_or_date": n - count(keep)}
+
+    def apply(name: str, mask: Any) -> None:
+        nonlocal keep
+        before = count(keep)
+        keep = pc.and_(keep, passed(mask))
+        dropped[name] = dropped.get(name, 0) + before - count(keep)
+
+    if max_allowed_date:
+        apply("future_date", pc.less_equal(d, max_allowed_date))
+    o, h, lo, c, v = (table[name] for name in ("open_raw", "high_raw", "low_raw", "close_raw", "volume_raw"))
+    apply("ohlc", pc.and_(pc.and_(pc.is_finite(o), pc.is_finite(h)), pc.and_(pc.is_finite(lo), pc.is_finite(c))))
+    apply(
+        "ohlc",
+        pc.and_(
+            pc.and_(pc.and_(pc.greater_equal(o, 0), pc.greater_equal(h, 0)), pc.and_(pc.greater_equal(lo, 0), pc.greater_equal(c, 0))),
+            pc.greater_equal(h, lo),
+        ),
+    )
+    apply("volume", pc.and_(pc.is_finite(v), pc.greater_equal(v, 0)))
+    candidates = table.filter(keep)
+    if candidates.num_rows:
+        assets = pc.unique(candidates["asset_id"])
+        last = pa.array([latest_date_by_asset.get(a) for a in assets.to_pylist()], type=pa.string())
+        last_by_row = last.take(pc.index_in(candidates["asset_id"], value_set=assets))
+        newer = passed(pc.or_kleene(pc.is_null(last_by_row), pc.greater(candidates["date"], last_by_row)))
+        old_or_known = candidates.num_rows - count(newer)
+        candidates = candidates.filter(newer)
+    else:
+        old_or_known = 0
+
+    dup_in_run = 0
+    keep_new = []
+    for key in zip(candidates["asset_id"].to_pylist(), candidates["date"].to_pylist()):
+        if key in emitted_keys_seen:
+            dup_in_run += 1
+            keep_new.append(False)
+            continue
+        emitted_keys_seen.add(key)
+        keep_new.append(True)
+    out = candidates.filter(pa.array(keep_new, type=pa.bool_())) if dup_in_run else candidates
+    invalid = dropped["identity_or_date"] + dropped.get("future_date", 0) + dropped["ohlc"] + dropped["volume"]
+    return out, {
+        "rows_in": n,
+        "rows_out": out.num_rows,
+        "rows_skipped_old_or_known": old_or_known,
+        "rows_skipped_duplicate_in_run": dup_in_run,
+        "rows_invalid": invalid,
+        "rows_future_date": dropped.get("future_date", 0),
+        "rows_invalid_identity_or_date": dropped["identity_or_date"],
+        "rows_invalid_ohlc": dropped["ohlc"],
+        "rows_invalid_volume": dropped["volume"],
+    }
+
+
 def _history_delta_paths(repo_root: Path, rel_pack: str, deltas_root: str) -> list[Path]:
     rel = str(rel_pack or "").strip().replace("\\", "/").lstrip("/")
     root = _resolve_repo_rel(repo_root, deltas_root)
@@ -819,28 +933,17 @@ def iter_history_pack_records(
     rel_pack: str,
     read_history_deltas: bool,
     history_deltas_root: str,
+    pack_store: str = DEFAULT_PACK_STORE,
+    canonical_ids: set[str] | None = None,
 ):
-    with gzip.open(pack_path, "rt", encoding="utf-8") as fh:
-        for line in fh:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                yield json.loads(line)
-            except json.JSONDecodeError:
-                continue
+    # canonical_ids is only a read hint: the arrow store uses it to skip untouched assets,
+    # ndjson-gz still streams the whole pack and callers keep filtering themselves.
+    handle = open_pack(pack_path, pack_store)
+    yield from handle.iter_records(canonical_ids if handle.store == "arrow" else None)
     if not read_history_deltas:
         return
     for delta_path in _history_delta_paths(repo_root, rel_pack, history_deltas_root):
-        with gzip.open(delta_path, "rt", encoding="utf-8") as fh:
-            for line in fh:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    yield json.loads(line)
-                except json.JSONDecodeError:
-                    continue
+        yield from read_ndjson_gz_records(delta_path)
 
 
 def flatten_delta_rows_for_pack(
@@ -856,8 +959,9 @@ def flatten_delta_rows_for_pack(
     repo_root: Path,
     read_history_deltas: bool = False,
     history_deltas_root: str = "mirrors/universe-v7/history-deltas",
-) -> tuple[dict[str, dict[str, list[Any]]], dict[str, Any], dict[str, int], dict[str, str]]:
-    rows_by_class: dict[str, dict[str, list[Any]]] = {}
+    pack_store: str = DEFAULT_PACK_STORE,
+    sink: RawBarsSink,
+) -> tuple[dict[str, Any], dict[str, int], dict[str, str]]:
     per_pack_stats = {
         "records_seen": 0,
         "records_matched": 0,
@@ -869,17 +973,6 @@ def flatten_delta_rows_for_pack(
     seen_assets: set[str] = set()
     emitted_latest_dates: dict[str, str] = {}
 
-    def ensure_bucket(asset_class: str) -> dict[str, list[Any]]:
-        if asset_class in rows_by_class:
-            return rows_by_class[asset_class]
-        rows_by_class[asset_class] = {k: [] for k in [
-            "asset_id", "date", "asset_class", "exchange", "symbol", "provider_symbol",
-            "currency", "country", "provider", "is_trading_day", "data_quality_flag",
-            "source_pack_rel", "open_raw", "high_raw", "low_raw", "close_raw", "volume_raw",
-            "adjusted_close_raw"
-        ]}
-        return rows_by_class[asset_class]
-
     def is_finite(value: object) -> bool:
         try:
             f = float(value)
@@ -893,6 +986,8 @@ def flatten_delta_rows_for_pack(
         rel_pack=rel_pack,
         read_history_deltas=read_history_deltas,
         history_deltas_root=history_deltas_root,
+        pack_store=pack_store,
+        canonical_ids=wanted_assets,
     ):
             per_pack_stats["records_seen"] += 1
             cid = str(rec.get("canonical_id") or "").strip()
@@ -904,7 +999,7 @@ def flatten_delta_rows_for_pack(
             per_pack_stats["records_matched"] += 1
             seen_assets.add(cid)
             asset_class = exporter.sanitize_type_norm(meta.type_norm)
-            out = ensure_bucket(asset_class)
+            out: dict[str, list[Any]] = {name: [] for name in BAR_COLUMNS}
             for bar in rec.get("bars") or []:
                 per_pack_stats["bars_written"] += 1
                 filter_stats["rows_in"] += 1
@@ -951,18 +1046,7 @@ def flatten_delta_rows_for_pack(
                     continue
                 emitted_keys_seen.add(key)
 
-                out["asset_id"].append(meta.asset_id)
                 out["date"].append(d)
-                out["asset_class"].append(asset_class)
-                out["exchange"].append(meta.exchange)
-                out["symbol"].append(meta.symbol)
-                out["provider_symbol"].append(meta.provider_symbol)
-                out["currency"].append(meta.currency)
-                out["country"].append(meta.country)
-                out["provider"].append("EODHD")
-                out["is_trading_day"].append(True)
-                out["data_quality_flag"].append(0)
-                out["source_pack_rel"].append(rel_pack)
                 out["open_raw"].append(o)
                 out["high_raw"].append(h)
                 out["low_raw"].append(l)
@@ -973,6 +1057,7 @@ def flatten_delta_rows_for_pack(
                 prev_latest = emitted_latest_dates.get(meta.asset_id)
                 if prev_latest is None or d > prev_latest:
                     emitted_latest_dates[meta.asset_id] = d
+            sink.add_asset(asset_class, meta, rel_pack, out)
 
     per_pack_stats["assets_emitted"] = len(seen_assets)
     per_pack_stats["missing_targets_in_pack"] = max(0, len(wanted_assets) - len(seen_assets))
@@ -982,36 +1067,65 @@ def flatten_delta_rows_for_pack(
         "rows_invalid_ohlc", "rows_invalid_volume",
     ]:
         filter_stats[key] += 0
-    return rows_by_class, per_pack_stats, dict(filter_stats), emitted_latest_dates
+    return per_pack_stats, dict(filter_stats), emitted_latest_dates
 
 
-def write_parquet_rows(out_path: Path, rows: Dict[str, List], compression: str = "snappy") -> int:
-    if not rows or not rows.get("asset_id"):
-        return 0
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    schema = pa.schema([
-        ("asset_id", pa.string()),
-        ("date", pa.string()),
-        ("asset_class", pa.string()),
-        ("exchange", pa.string()),
-        ("symbol", pa.string()),
-        ("provider_symbol", pa.string()),
-        ("currency", pa.string()),
-        ("country", pa.string()),
-        ("provider", pa.string()),
-        ("is_trading_day", pa.bool_()),
-        ("data_quality_flag", pa.int32()),
-        ("source_pack_rel", pa.string()),
-        ("open_raw", pa.float64()),
-        ("high_raw", pa.float64()),
-        ("low_raw", pa.float64()),
-        ("close_raw", pa.float64()),
-        ("volume_raw", pa.float64()),
-        ("adjusted_close_raw", pa.float64()),
-    ])
-    table = pa.Table.from_pydict(rows, schema=schema)
-    pq.write_table(table, out_path, compression=compression)
-    return table.num_rows
+_WORKER_EXPORTERS: dict[str, Any] = {}
+
+
+def run_delta_pack(task: dict[str, Any], exporter: Any = None) -> dict[str, Any]:
+    """Flatten one pack into ``<out_root>/asset_class=*/delta_<pack_key>.parquet``; also the pool worker entry point.
+
+    ``task`` is plain data (asset metadata as dicts, latest dates limited to the
+    pack's assets) so it pickles without the importlib-loaded exporter module.
+    """
+    if exporter is None:
+        repo_root_key = str(task["repo_root"])
+        if repo_root_key not in _WORKER_EXPORTERS:
+            _WORKER_EXPORTERS[repo_root_key] = _load_exporter_module(Path(repo_root_key))
+        exporter = _WORKER_EXPORTERS[repo_root_key]
+    started = time.time()
+    process_memory_before_kb = read_process_status_kb()
+    out_root = Path(task["out_root"])
+    pack_key = exporter.rel_to_pack_key(task["rel_pack"])
+    sink = RawBarsSink(
+        lambda asset_class: out_root / f"asset_class={asset_class}" / f"delta_{pack_key}.parquet",
+        compression=task["compression"],
+    )
+    pack_emitted_keys_seen: set[tuple[str, str]] = set()
+    try:
+        per_pack_stats, filter_stats_total, emitted_latest_dates = flatten_delta_rows_for_pack(
+            Path(task["pack_path"]),
+            task["rel_pack"],
+            set(task["wanted_assets"]),
+            {cid: exporter.AssetMeta(**meta) for cid, meta in task["asset_meta"].items()},
+            task["latest_date_by_asset"],
+            pack_emitted_keys_seen,
+            max_allowed_date=task["max_allowed_date"],
+            exporter=exporter,
+            repo_root=Path(task["repo_root"]),
+            read_history_deltas=bool(task["read_history_deltas"]),
+            history_deltas_root=task["history_deltas_root"],
+            pack_store=task["pack_store"],
+            sink=sink,
+        )
+        written = sink.close()
+    except BaseException:
+        sink.abort()
+        raise
+    return {
+        "pack_key": pack_key,
+        "duration_sec": round(time.time() - started, 3),
+        "stats": per_pack_stats,
+        "filter_stats": filter_stats_total,
+        "emitted_latest_dates": emitted_latest_dates,
+        "process_memory_before_kb": process_memory_before_kb,
+        "process_memory_after_kb": read_process_status_kb(),
+        "outputs": [
+            {"asset_class": asset_class, "path": str(out_path), "rows": n}
+            for asset_class, out_path, n in written
+        ],
+    }
 
 
 def main(argv: Iterable[str]) -> int:
@@ -1072,6 +1186,7 @@ def main(argv: Iterable[str]) -> int:
             "enabled": bool(args.read_history_deltas),
             "root": str(args.history_deltas_root),
         },
+        "pack_store": args.pack_store,
         "completed_packs": [],
         "failed_packs": {},
         "stats": {
@@ -1106,12 +1221,7 @@ def main(argv: Iterable[str]) -> int:
         "enabled": bool(args.read_history_deltas),
         "root": str(args.history_deltas_root),
     }
-    if requested_workers != effective_workers:
-        print(
-            f"[q1-delta] workers_requested={requested_workers} effective_workers={effective_workers} "
-            "reason=parallel_read_shadow_not_enabled",
-            flush=True,
-        )
+    state["pack_store"] = args.pack_store
 
     def write_run_status(ok: bool | None = None, exit_code: int | None = None, reason: str | None = None, stage: str | None = None, extra: dict[str, Any] | None = None):
         payload = {
@@ -1174,6 +1284,7 @@ def main(argv: Iterable[str]) -> int:
             registry_pack_sha=registry_pack_sha,
             force_full_scan=bool(args.full_scan_packs),
             commit_cache=not bool(args.full_scan_packs),
+            pack_store=args.pack_store,
         )
         selected_packs = changed_packs
         force_packs = _load_force_packs(args)
@@ -1287,140 +1398,184 @@ def main(argv: Iterable[str]) -> int:
         max_emitted_rows = int(args.max_emitted_rows or 0)
 
         # 4) process selected changed packs
-        for idx, rel_pack in enumerate(selected_packs, start=1):
-            if rel_pack in completed_packs:
-                continue
-            wanted_assets = pack_to_assets.get(rel_pack) or set()
-            pack_abs = _history_pack_path(repo_root, rel_pack)
-            try:
-                pack_abs.stat()
-            except FileNotFoundError:
-                failed_packs[rel_pack] = {"error": "pack_missing", "at": utc_now_iso()}
-                state["failed_packs"] = failed_packs
-                state["stats"]["packs_failed"] = len(failed_packs)
-                state["updated_at"] = utc_now_iso()
-                atomic_write_json(state_path, state)
-                continue
+        # Packs run in worker processes when --workers > 1; results are applied in
+        # pack order so the parent stays the single writer of state/manifest and
+        # latest_date_by_asset evolves exactly as in a serial run. That only holds
+        # while every pending asset lives in one pack, otherwise stay serial.
+        pending_packs = [rel_pack for rel_pack in selected_packs if rel_pack not in completed_packs]
+        pack_count_by_asset: dict[str, int] = defaultdict(int)
+        for rel_pack in pending_packs:
+            for aid in pack_to_assets.get(rel_pack) or ():
+                pack_count_by_asset[aid] += 1
+        workers_reason = None
+        if requested_workers > 1 and any(n > 1 for n in pack_count_by_asset.values()):
+            workers_reason = "assets_shared_across_packs"
+        elif requested_workers > 1 and len(pending_packs) <= 1:
+            workers_reason = "single_pending_pack"
+        effective_workers = 1 if workers_reason else requested_workers
+        staging_root = job_root / "staging" if effective_workers > 1 else None
+        reset_staging(staging_root)
+        state["workers"] = {
+            "requested": requested_workers,
+            "effective": effective_workers,
+            "mode": "process_pool_parent_writes" if effective_workers > 1 else "serial_parent_writes",
+        }
+        if workers_reason:
+            state["workers"]["reason"] = workers_reason
+            print(
+                f"[q1-delta] workers_requested={requested_workers} effective_workers={effective_workers} "
+                f"reason={workers_reason}",
+                flush=True,
+            )
 
-            started = time.time()
-            process_memory_before_kb = read_process_status_kb()
-            state["current_pack"] = {
-                "rel_pack": rel_pack,
-                "index": idx,
-                "selected_packs_total": len(selected_packs),
-                "targets": len(wanted_assets),
-                "started_at": utc_now_iso(),
-                "pack_path": str(pack_abs),
-            }
-            state["updated_at"] = utc_now_iso()
-            atomic_write_json(state_path, state)
-            write_run_status(stage="processing_pack", extra={"current_pack": state["current_pack"]})
-            print(f"[q1-delta] [{idx}/{len(selected_packs)}] {rel_pack} targets={len(wanted_assets)}", flush=True)
-            try:
-                pack_emitted_keys_seen: set[tuple[str, str]] = set()
-                rows_by_class, per_pack_stats, filter_stats_total, emitted_latest_dates = flatten_delta_rows_for_pack(
-                    pack_abs,
-                    rel_pack,
-                    wanted_assets,
-                    asset_meta,
-                    latest_date_by_asset,
-                    pack_emitted_keys_seen,
-                    max_allowed_date=str(args.ingest_date),
-                    exporter=exporter,
-                    repo_root=repo_root,
-                    read_history_deltas=bool(args.read_history_deltas),
-                    history_deltas_root=str(args.history_deltas_root),
-                )
-                duration_sec = round(time.time() - started, 3)
-                state["stats"]["bars_rows_scanned_in_selected_packs"] += int(per_pack_stats.get("bars_written", 0))
-                pack_key = exporter.rel_to_pack_key(rel_pack)
-                outputs = []
-
-                for asset_class, rows in rows_by_class.items():
-                    if not rows.get("asset_id"):
-                        continue
-                    for aid in rows["asset_id"]:
-                        emitted_assets.add(aid)
-                    out_path = raw_ingest_root / f"asset_class={asset_class}" / f"delta_{pack_key}.parquet"
-                    n = write_parquet_rows(out_path, rows, compression=args.compression)
-                    if n > 0:
-                        outputs.append({"asset_class": asset_class, "path": str(out_path), "rows": n})
-                for aid, latest_date in emitted_latest_dates.items():
-                    prev_latest = latest_date_by_asset.get(aid)
-                    if prev_latest is None or latest_date > prev_latest:
-                        latest_date_by_asset[aid] = latest_date
-                process_memory_after_kb = read_process_status_kb()
-                update_process_peaks(state["stats"], process_memory_before_kb, process_memory_after_kb)
-                rows_out_total = int(filter_stats_total.get("rows_out", 0))
-                emitted_delta_keys_total += rows_out_total
-
-                event = {
-                    "ts": utc_now_iso(),
+        def iter_pack_tasks():
+            for idx, rel_pack in enumerate(selected_packs, start=1):
+                if rel_pack in completed_packs:
+                    continue
+                wanted_assets = pack_to_assets.get(rel_pack) or set()
+                pack_abs = _history_pack_path(repo_root, rel_pack, args.pack_store)
+                try:
+                    pack_stat_path(pack_abs, args.pack_store).stat()
+                except FileNotFoundError:
+                    failed_packs[rel_pack] = {"error": "pack_missing", "at": utc_now_iso()}
+                    state["failed_packs"] = failed_packs
+                    state["stats"]["packs_failed"] = len(failed_packs)
+                    state["updated_at"] = utc_now_iso()
+                    atomic_write_json(state_path, state)
+                    continue
+
+                yield {
                     "rel_pack": rel_pack,
-                    "pack_key": pack_key,
-                    "duration_sec": duration_sec,
-                    "slow_pack": duration_sec > float(args.slow_pack_warn_sec),
-                    "targets": len(wanted_assets),
-                    "stats": per_pack_stats,
-                    "filter_stats": dict(filter_stats_total),
-                    "dedupe_scope": "pack_local_plus_latest_date_by_asset",
-                    "emitted_delta_keys": rows_out_total,
-                    "process_memory_before_kb": process_memory_before_kb,
-                    "process_memory_after_kb": process_memory_after_kb,
-                    "outputs": outputs,
+                    "index": idx,
+                    "pack_path": str(pack_abs),
+                    "wanted_assets": sorted(wanted_assets),
+                    "asset_meta": {cid: asdict(asset_meta[cid]) for cid in wanted_assets if cid in asset_meta},
+                    "latest_date_by_asset": {cid: latest_date_by_asset[cid] for cid in wanted_assets if cid in latest_date_by_asset},
+                    "out_root": str(staging_root or raw_ingest_root),
+                    "compression": args.compression,
+                    "max_allowed_date": str(args.ingest_date),
+                    "repo_root": str(repo_root),
+                    "read_history_deltas": bool(args.read_history_deltas),
+                    "history_deltas_root": str(args.history_deltas_root),
+                    "pack_store": args.pack_store,
                 }
-                with packs_manifest_path.open("a", encoding="utf-8") as outfh:
-                    outfh.write(json.dumps(event, ensure_ascii=False) + "\n")
-
-                state["stats"]["bars_rows_emitted_delta"] += sum(int(o["rows"]) for o in outputs)
-                state["stats"]["rows_filter_input_total"] += int(filter_stats_total.get("rows_in", 0))
-                state["stats"]["rows_skipped_old_or_known"] += int(filter_stats_total.get("rows_skipped_old_or_known", 0))
-                state["stats"]["rows_skipped_duplicate_in_run"] += int(filter_stats_total.get("rows_skipped_duplicate_in_run", 0))
-                state["stats"]["rows_invalid"] += int(filter_stats_total.get("rows_invalid", 0))
-                state["stats"]["rows_future_date"] += int(filter_stats_total.get("rows_future_date", 0))
-                state["stats"]["rows_invalid_identity_or_date"] += int(filter_stats_total.get("rows_invalid_identity_or_date", 0))
-                state["stats"]["rows_invalid_ohlc"] += int(filter_stats_total.get("rows_invalid_ohlc", 0))
-                state["stats"]["rows_invalid_volume"] += int(filter_stats_total.get("rows_invalid_volume", 0))
-                state["stats"]["assets_emitted_delta"] = len(emitted_assets)
-                failed_packs.pop(rel_pack, None)
-                state["failed_packs"] = failed_packs
-                state["stats"]["packs_failed"] = len(failed_packs)
-                completed_packs.add(rel_pack)
-                state["completed_packs"] = sorted(completed_packs)
-                state["stats"]["packs_done"] = len(selected_pack_set.intersection(completed_packs))
-                if state.get("pack_selection"):
-                    selected_done = len(selected_pack_set.intersection(completed_packs))
-                    state["pack_selection"]["selected_packs_done"] = selected_done
-                    state["pack_selection"]["selected_packs_remaining"] = max(0, len(selected_packs) - selected_done)
-                state.pop("current_pack", None)
-                if duration_sec > float(args.slow_pack_warn_sec):
-                    slow_packs = list(state.get("slow_packs") or [])
-                    slow_packs.append({
-                        "rel_pack": rel_pack,
-                        "duration_sec": duration_sec,
-                        "warn_threshold_sec": float(args.slow_pack_warn_sec),
-                        "completed_at": utc_now_iso(),
-                    })
-                    state["slow_packs"] = slow_packs[-100:]
-                state["updated_at"] = utc_now_iso()
-                atomic_write_json(state_path, state)
 
-                if max_emitted_rows and state["stats"]["bars_rows_emitted_delta"] >= max_emitted_rows:
-                    break
-
-            except KeyboardInterrupt:
-                state.pop("current_pack", None)
-                state["updated_at"] = utc_now_iso()
-                atomic_write_json(state_path, state)
-                write_run_status(ok=False, exit_code=130, reason="interrupted", stage="process_packs")
-                return 130
-            except Exception as exc:
-                failed_packs[rel_pack] = {"error": str(exc), "at": utc_now_iso()}
-                state["failed_packs"] = failed_packs
-                state["stats"]["packs_failed"] = len(failed_packs)
-                state.pop("current_pack", None)
+        pack_fn = run_delta_pack if effective_workers > 1 else partial(run_delta_pack, exporter=exporter)
+        pool_broken: dict[str, Any] | None = None
+        state.pop("pool_broken", None)
+        try:
+            for task, result, error in iter_ordered_results(pack_fn, iter_pack_tasks(), effective_workers):
+                rel_pack = task["rel_pack"]
+                # Set when the result is consumed: with a pool, tasks are generated ahead of the packs being written.
+                state["current_pack"] = {
+                    "rel_pack": rel_pack,
+                    "index": task["index"],
+                    "selected_packs_total": len(selected_packs),
+                    "targets": len(task["wanted_assets"]),
+                    "started_at": utc_now_iso(),
+                    "pack_path": task["pack_path"],
+                }
                 state["updated_at"] = utc_now_iso()
                 atomic_write_json(state_path, state)
+                write_run_status(stage="processing_pack", extra={"current_pack": state["current_pack"]})
+                print(f"[q1-delta] [{task['index']}/{len(selected_packs)}] {rel_pack} targets={len(task['wanted_assets'])}", flush=True)
+                try:
+                    if error is not None:
+                        raise error
+                    per_pack_stats = result["stats"]
+                    filter_stats_total = result["filter_stats"]
+                    emitted_latest_dates = result["emitted_latest_dates"]
+                    duration_sec = result["duration_sec"]
+                    process_memory_before_kb = result["process_memory_before_kb"]
+                    process_memory_after_kb = result["process_memory_after_kb"]
+                    outputs = publish_staged_outputs(result["outputs"], staging_root, raw_ingest_root)
+                    state["stats"]["bars_rows_scanned_in_selected_packs"] += int(per_pack_stats.get("bars_written", 0))
+                    emitted_assets.update(emitted_latest_dates)
+                    for aid, latest_date in emitted_latest_dates.items():
+                        prev_latest = latest_date_by_asset.get(aid)
+                        if prev_latest is None or latest_date > prev_latest:
+                            latest_date_by_asset[aid] = latest_date
+                    update_process_peaks(state["stats"], process_memory_before_kb, process_memory_after_kb)
+                    rows_out_total = int(filter_stats_total.get("rows_out", 0))
+                    emitted_delta_keys_total += rows_out_total
+
+                    event = {
+                        "ts": utc_now_iso(),
+                        "rel_pack": rel_pack,
+                        "pack_key": result["pack_key"],
+                        "duration_sec": duration_sec,
+                        "slow_pack": duration_sec > float(args.slow_pack_warn_sec),
+                        "targets": len(task["wanted_assets"]),
+                        "stats": per_pack_stats,
+                        "filter_stats": dict(filter_stats_total),
+                        "dedupe_scope": "pack_local_plus_latest_date_by_asset",
+                        "emitted_delta_keys": rows_out_total,
+                        "process_memory_before_kb": process_memory_before_kb,
+                        "process_memory_after_kb": process_memory_after_kb,
+                        "outputs": outputs,
+                    }
+                    with packs_manifest_path.open("a", encoding="utf-8") as outfh:
+                        outfh.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+                    state["stats"]["bars_rows_emitted_delta"] += sum(int(o["rows"]) for o in outputs)
+                    state["stats"]["rows_filter_input_total"] += int(filter_stats_total.get("rows_in", 0))
+                    state["stats"]["rows_skipped_old_or_known"] += int(filter_stats_total.get("rows_skipped_old_or_known", 0))
+                    state["stats"]["rows_skipped_duplicate_in_run"] += int(filter_stats_total.get("rows_skipped_duplicate_in_run", 0))
+                    state["stats"]["rows_invalid"] += int(filter_stats_total.get("rows_invalid", 0))
+                    state["stats"]["rows_future_date"] += int(filter_stats_total.get("rows_future_date", 0))
+                    state["stats"]["rows_invalid_identity_or_date"] += int(filter_stats_total.get("rows_invalid_identity_or_date", 0))
+                    state["stats"]["rows_invalid_ohlc"] += int(filter_stats_total.get("rows_invalid_ohlc", 0))
+                    state["stats"]["rows_invalid_volume"] += int(filter_stats_total.get("rows_invalid_volume", 0))
+                    state["stats"]["assets_emitted_delta"] = len(emitted_assets)
+                    failed_packs.pop(rel_pack, None)
+                    state["failed_packs"] = failed_packs
+                    state["stats"]["packs_failed"] = len(failed_packs)
+                    completed_packs.add(rel_pack)
+                    state["completed_packs"] = sorted(completed_packs)
+                    state["stats"]["packs_done"] = len(selected_pack_set.intersection(completed_packs))
+                    if state.get("pack_selection"):
+                        selected_done = len(selected_pack_set.intersection(completed_packs))
+                        state["pack_selection"]["selected_packs_done"] = selected_done
+                        state["pack_selection"]["selected_packs_remaining"] = max(0, len(selected_packs) - selected_done)
+                    state.pop("current_pack", None)
+                    if duration_sec > float(args.slow_pack_warn_sec):
+                        slow_packs = list(state.get("slow_packs") or [])
+                        slow_packs.append({
+                            "rel_pack": rel_pack,
+                            "duration_sec": duration_sec,
+                            "warn_threshold_sec": float(args.slow_pack_warn_sec),
+                            "completed_at": utc_now_iso(),
+                        })
+                        state["slow_packs"] = slow_packs[-100:]
+                    state["updated_at"] = utc_now_iso()
+                    atomic_write_json(state_path, state)
+
+                    if max_emitted_rows and state["stats"]["bars_rows_emitted_delta"] >= max_emitted_rows:
+                        break
+
+                except Exception as exc:
+                    failed_packs[rel_pack] = {"error": str(exc) or type(exc).__name__, "at": utc_now_iso()}
+                    state["failed_packs"] = failed_packs
+                    state["stats"]["packs_failed"] = len(failed_packs)
+                    state.pop("current_pack", None)
+                    broken_now = isinstance(exc, BrokenProcessPool) and pool_broken is None
+                    if broken_now:
+                        # A worker died; the pool fails this pack and every later one, which resume retries.
+                        pool_broken = {"at": utc_now_iso(), "first_failed_pack": rel_pack, "error": str(exc) or type(exc).__name__}
+                        state["pool_broken"] = pool_broken
+                        print(f"[q1-delta] process pool broken at {rel_pack}: {exc}", file=sys.stderr, flush=True)
+                    state["updated_at"] = utc_now_iso()
+                    atomic_write_json(state_path, state)
+                    if broken_now:
+                        write_run_status(reason="process_pool_broken", stage="process_packs", extra={"pool_broken": pool_broken})
+        except KeyboardInterrupt:
+            state.pop("current_pack", None)
+            state["updated_at"] = utc_now_iso()
+            atomic_write_json(state_path, state)
+            write_run_status(ok=False, exit_code=130, reason="interrupted", stage="process_packs")
+            return 130
+        finally:
+            reset_staging(staging_root)
 
         # 5) reconciliation and threshold gates
         def _run_delta(key: str) -> int:
@@ -1530,7 +1685,7 @@ def main(argv: Iterable[str]) -> int:
         reason = "ok"
         if failed_packs:
             exit_code = 1
-            reason = "pack_failures_present"
+            reason = "process_pool_broken" if pool_broken else "pack_failures_present"
         elif threshold_failures:
             exit_code = 6
             reason = "reconciliation_threshold_failed"
@@ -1575,6 +1730,7 @@ def main(argv: Iterable[str]) -> int:
                     registry_pack_sha=registry_pack_sha,
                     force_full_scan=False,
                     commit_cache=True,
+                    pack_store=args.pack_store,
                 )
                 ptr_payload["pack_state_cache_commit"] = committed_pack_cache_meta
             latest_ptr = quant_root / "ops" / "q1_daily_delta_ingest" / "latest_success.json"
@@ -13,6 +13,17 @@ REPO_ROOT = Path(__file__).resolve().parents[2]
 if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
+from scripts.quantlab.feature_rolling_state import (  # noqa: E402
+    ROLLING_STATE_SCHEMA,
+    bootstrap_state,
+    compare_feature_frames,
+    date_capacity,
+    fold_bars,
+    late_bar_assets,
+    read_state,
+    state_features,
+    write_state,
+)
 from scripts.quantlab.q1_common import (  # noqa: E402
     DEFAULT_QUANT_ROOT,
     atomic_write_json,
@@ -35,6 +46,15 @@ def parse_args(argv: Iterable[str]) -> argparse.Namespace:
     p.add_argument("--feature-store-version", default="v4_q1inc")
     p.add_argument("--output-tag", default="")
     p.add_argument("--min-rows-window", type=int, default=200)
+    p.add_argument(
+        "--feature-engine",
+        choices=["rolling_state", "window"],
+        default="rolling_state",
+        help="rolling_state folds new bars into persisted per-asset state; window recomputes from lookback-calendar-days of bars",
+    )
+    p.add_argument("--verify-rolling-state", action="store_true", help="Diff rolling-state features against a full window rebuild")
+    p.add_argument("--verify-rtol", type=float, default=1e-3)
+    p.add_argument("--verify-atol", type=float, default=1e-9)
     p.add_argument("--require-contract-layers", action="store_true", default=True)
     p.add_argument("--skip-require-contract-layers", dest="require_contract_layers", action="store_false")
     p.add_argument("--require-tri-layer", action="store_true", default=True)
@@ -72,6 +92,23 @@ def _read_changed_assets(changed_assets_parquet: Path, include_classes: list[str
     )
 
 
+def _read_delta_min_dates(changed_assets_parquet: Path, include_classes: list[str]) -> dict[str, date]:
+    """Earliest delta bar date per changed asset (``delta_min_date`` of changed_assets.parquet)."""
+    if not changed_assets_parquet.exists():
+        return {}
+    df = pl.read_parquet(changed_assets_parquet)
+    if df.is_empty() or "delta_min_date" not in df.columns:
+        return {}
+    df = (
+        df.filter(pl.col("asset_class").str.to_lowercase().is_in(include_classes))
+        .select("asset_id", pl.col("delta_min_date").str.strptime(pl.Date, strict=False))
+        .drop_nulls()
+        .group_by("asset_id")
+        .agg(pl.col("delta_min_date").min())
+    )
+    return dict(zip(df["asset_id"].to_list(), df["delta_min_date"].to_list()))
+
+
 def _validate_data_truth(
     snap_manifest: dict[str, Any],
     *,
@@ -187,134 +224,8 @@ def _validate_data_truth(
     }
 
 
-def main(argv: Iterable[str]) -> int:
-    args = parse_args(argv)
-    quant_root = Path(args.quant_root).resolve()
-    include_classes = [x.strip().lower() for x in args.asset_classes.split(",") if x.strip()]
-    include_set = set(include_classes)
-    inc_manifest_path = _resolve_increment_manifest(quant_root, args.increment_manifest).resolve()
-    if not inc_manifest_path.exists():
-        raise SystemExit(f"FATAL: incremental snapshot manifest not found: {inc_manifest_path}")
-    inc_manifest = read_json(inc_manifest_path)
-    ingest_date = str(inc_manifest.get("ingest_date") or "")
-    if not ingest_date:
-        raise SystemExit("FATAL: ingest_date missing in incremental snapshot manifest")
-
-    if args.snapshot_id:
-        snap_dir = quant_root / "data" / "snapshots" / f"snapshot_id={args.snapshot_id}"
-    else:
-        snap_id = str(inc_manifest.get("snapshot_id") or "")
-        snap_dir = (quant_root / "data" / "snapshots" / f"snapshot_id={snap_id}") if snap_id else latest_materialized_snapshot_dir(quant_root)
-        if not snap_dir.exists():
-            snap_dir = latest_materialized_snapshot_dir(quant_root)
-    if not snap_dir.exists():
-        raise SystemExit(f"FATAL: snapshot not found: {snap_dir}")
-
-    snap_manifest = read_json(snap_dir / "snapshot_manifest.json")
-    snapshot_id = str(snap_manifest.get("snapshot_id") or snap_dir.name.split("=", 1)[-1])
-    asof_date = parse_iso_date(str(snap_manifest.get("asof_date") or date.today().isoformat()))
-    bars_root_value = ((snap_manifest.get("artifacts") or {}).get("bars_dataset_root") or "")
-    if not bars_root_value:
-        raise SystemExit("FATAL: bars_dataset_root missing in snapshot manifest")
-    bars_root = Path(str(bars_root_value))
-    if not bars_root.exists():
-        raise SystemExit(f"FATAL: bars_dataset_root not found: {bars_root}")
-
-    changed_assets_path = Path(str((inc_manifest.get("artifacts") or {}).get("changed_assets_parquet") or ""))
-    changed_assets = _read_changed_assets(changed_assets_path, include_classes)
-
-    run_id = f"q1featinc_{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}"
-    run_root = quant_root / "runs" / f"run_id={run_id}"
-    run_root.mkdir(parents=True, exist_ok=True)
-    run_status_path = run_root / "q1_incremental_feature_update_run_status.json"
-
-    tag = args.output_tag or f"delta_{ingest_date}"
-    out_dir = (
-        quant_root
-        / "features"
-        / "store"
-        / f"feature_store_version={args.feature_store_version}"
-        / f"asof_date={asof_date.isoformat()}"
-    )
-    out_dir.mkdir(parents=True, exist_ok=True)
-    manifest_path = out_dir / f"feature_manifest.{tag}.json"
-
-    def write_status(stage: str, ok=None, exit_code=None, reason=None, extra: dict[str, Any] | None = None):
-        atomic_write_json(
-            run_status_path,
-            {
-                "schema": "quantlab_q1_incremental_feature_update_run_status_v1",
-                "generated_at": utc_now_iso(),
-                "run_id": run_id,
-                "ok": ok,
-                "exit_code": exit_code,
-                "reason": reason,
-                "stage": stage,
-                "snapshot_id": snapshot_id,
-                "ingest_date": ingest_date,
-                "paths": {
-                    "increment_manifest": str(inc_manifest_path),
-                    "snapshot_manifest": str(snap_dir / 'snapshot_manifest.json'),
-                    "feature_root": str(out_dir),
-                    "feature_manifest": str(manifest_path),
-                },
-                "extra": extra or {},
-            },
-        )
-
-    data_truth_validation = _validate_data_truth(
-        snap_manifest,
-        include_classes=include_classes,
-        asof_date=asof_date,
-        require_contract_layers=bool(args.require_contract_layers),
-        require_tri_layer=bool(args.require_tri_layer),
-    )
-    write_status("data_truth_precheck", extra={"data_truth": data_truth_validation})
-    if not bool(data_truth_validation.get("ok")):
-        write_status(
-            "data_truth_precheck_failed",
-            ok=False,
-            exit_code=2,
-            reason="data_truth_precheck_failed",
-            extra={"data_truth": data_truth_validation},
-        )
-        print(f"run_id={run_id}")
-        print("reason=data_truth_precheck_failed")
-        print(f"errors={','.join(data_truth_validation.get('errors') or [])}")
-        return 2
-
-    write_status("bootstrap", extra={"changed_assets_total": len(changed_assets)})
-    if not changed_assets:
-        manifest = {
-            "schema": "quantlab_q1_incremental_feature_manifest_v1",
-            "generated_at": utc_now_iso(),
-            "run_id": run_id,
-            "snapshot_id": snapshot_id,
-            "ingest_date": ingest_date,
-            "asof_date": asof_date.isoformat(),
-            "feature_store_version": args.feature_store_version,
-            "mode": "incremental_latest_only_noop",
-            "counts": {"changed_assets_total": 0, "feature_rows_total": 0, "files_total": 0},
-            "artifacts": {"files": []},
-            "inputs": {"increment_manifest": str(inc_manifest_path)},
-            "data_truth_validation": data_truth_validation,
-            "reconciliation": {"changed_assets_total": 0, "feature_rows_total": 0, "ok": True},
-        }
-        atomic_write_json(manifest_path, manifest)
-        latest_ptr = quant_root / "ops" / "q1_incremental_feature_update" / "latest_success.json"
-        atomic_write_json(latest_ptr, {"schema": "quantlab_q1_incremental_feature_update_latest_success_v1", "updated_at": utc_now_iso(), "run_id": run_id, "manifest_path": str(manifest_path), "run_status": str(run_status_path), "counts": manifest["counts"]})
-        write_status("completed", ok=True, exit_code=0, reason="ok_noop", extra={"manifest": str(manifest_path)})
-        print(f"run_id={run_id}")
-        print("changed_assets_total=0")
-        print(f"manifest={manifest_path}")
-        return 0
-
-    start_date = (asof_date - timedelta(days=args.lookback_calendar_days)).isoformat()
-    asof_s = asof_date.isoformat()
-    bars_glob = str(bars_root / "**" / "*.parquet")
-
-    # Build feature expressions (mirrors Q1 minimal latest-only, but restricted to changed assets)
-    lf = (
+def _scan_bars(bars_glob: str, include_classes: list[str], asset_ids: list[str], start_date: str, asof_s: str) -> pl.LazyFrame:
+    return (
         pl.scan_parquet(bars_glob, hive_partitioning=True)
         .with_columns(
             [
@@ -328,12 +239,15 @@ def main(argv: Iterable[str]) -> int:
             ]
         )
         .filter(pl.col("asset_class").is_in(include_classes))
-        .filter(pl.col("asset_id").is_in(changed_assets))
+        .filter(pl.col("asset_id").is_in(asset_ids))
         .filter(pl.col("date") >= pl.lit(start_date).str.strptime(pl.Date))
         .filter(pl.col("date") < pl.lit(asof_s).str.strptime(pl.Date))
         .sort(["asset_id", "date"])
     )
 
+
+def _window_features(lf: pl.LazyFrame, asof_s: str, min_rows_window: int) -> pl.LazyFrame:
+    """Latest-only features recomputed from the full lookback window (mirrors Q1 minimal latest-only)."""
     prev_close = pl.col("close_raw").shift(1).over("asset_id")
     delta = (pl.col("close_raw") - prev_close)
     gain = pl.when(delta > 0).then(delta).otherwise(0.0)
@@ -433,7 +347,7 @@ def main(argv: Iterable[str]) -> int:
             ]
         )
         .filter(pl.col("date") == pl.col("_asset_latest_date"))
-        .filter(pl.col("_rows_in_window") >= int(args.min_rows_window))
+        .filter(pl.col("_rows_in_window") >= int(min_rows_window))
         .select(
             [
                 pl.col("asset_id"),
@@ -471,6 +385,238 @@ def main(argv: Iterable[str]) -> int:
             ]
         )
     )
+    return feat
+
+
+def _rolling_state_features(
+    *,
+    state_path: Path,
+    bars_glob: str,
+    include_classes: list[str],
+    changed_assets: list[str],
+    asof_date: date,
+    lookback_calendar_days: int,
+    min_rows_window: int,
+    delta_min_dates: dict[str, date] | None = None,
+) -> tuple[pl.DataFrame, pl.DataFrame, dict[str, Any]]:
+    """Fold new bars of changed assets into the persisted rolling state.
+
+    Assets whose state ends inside the lookback window and before ``asof_date``
+    resume from it; the rest are bootstrapped from the window. So are resumable
+    assets with late bars: a delta starting on or before the state's
+    ``last_date`` (``delta_min_dates``) or a scanned bar at or before it that the
+    state never folded. Returns the feature rows, the full updated state and run stats.
+    """
+    capacity = date_capacity(lookback_calendar_days)
+    start = asof_date - timedelta(days=lookback_calendar_days)
+    state = read_state(state_path, capacity=capacity)
+    prior = None
+    late_ids: set[str] = set()
+    if state is not None:
+        prior = state.filter(
+            pl.col("asset_id").is_in(changed_assets) & (pl.col("last_date") >= start) & (pl.col("last_date") < asof_date)
+        )
+        if delta_min_dates:
+            min_dates = pl.DataFrame(
+                {"asset_id": list(delta_min_dates), "_delta_min": list(delta_min_dates.values())},
+                schema={"asset_id": pl.Utf8, "_delta_min": pl.Date},
+            )
+            late_ids = set(prior.join(min_dates, on="asset_id").filter(pl.col("_delta_min") <= pl.col("last_date"))["asset_id"].to_list())
+            prior = prior.filter(~pl.col("asset_id").is_in(sorted(late_ids)))
+    resumed_ids = set(prior["asset_id"].to_list()) if prior is not None else set()
+    bootstrap_ids = [asset_id for asset_id in changed_assets if asset_id not in resumed_ids]
+    scan_start = start if bootstrap_ids or not resumed_ids else prior["last_date"].min() + timedelta(days=1)
+    bars = _scan_bars(bars_glob, include_classes, changed_assets, scan_start.isoformat(), asof_date.isoformat()).collect(engine="streaming")
+    gap_ids = late_bar_assets(prior, bars) if resumed_ids else []
+    if gap_ids:
+        late_ids.update(gap_ids)
+        resumed_ids.difference_update(gap_ids)
+        prior = prior.filter(~pl.col("asset_id").is_in(gap_ids))
+        bootstrap_ids.extend(gap_ids)
+        if scan_start > start:
+            window = _scan_bars(bars_glob, include_classes, gap_ids, start.isoformat(), asof_date.isoformat()).collect(engine="streaming")
+            bars = pl.concat([bars.filter(~pl.col("asset_id").is_in(gap_ids)), window]).sort(["asset_id", "date"])
+    resumed = fold_bars(prior, bars.filter(pl.col("asset_id").is_in(list(resumed_ids))), capacity=capacity) if resumed_ids else None
+    bootstrapped = bootstrap_state(bars.filter(pl.col("asset_id").is_in(bootstrap_ids) & (pl.col("date") >= start)), capacity=capacity)
+    updated = pl.concat([part for part in (resumed, bootstrapped) if part is not None])
+    features = state_features(updated, asof_date=asof_date, lookback_calendar_days=lookback_calendar_days, min_rows_window=min_rows_window)
+    if state is not None:
+        updated = pl.concat([state.filter(~pl.col("asset_id").is_in(updated["asset_id"].implode())), updated])
+    stats = {
+        "schema": ROLLING_STATE_SCHEMA,
+        "state_path": str(state_path),
+        "state_found": state is not None,
+        "assets_resumed": len(resumed_ids),
+        "assets_bootstrapped": int(bootstrapped.height),
+        "assets_rebootstrapped_late_bars": len(late_ids),
+        "bars_scanned": int(bars.height),
+        "scan_start_date": scan_start.isoformat(),
+        "state_assets_total": int(updated.height),
+    }
+    return features, updated, stats
+
+
+def main(argv: Iterable[str]) -> int:
+    args = parse_args(argv)
+    quant_root = Path(args.quant_root).resolve()
+    include_classes = [x.strip().lower() for x in args.asset_classes.split(",") if x.strip()]
+    include_set = set(include_classes)
+    inc_manifest_path = _resolve_increment_manifest(quant_root, args.increment_manifest).resolve()
+    if not inc_manifest_path.exists():
+        raise SystemExit(f"FATAL: incremental snapshot manifest not found: {inc_manifest_path}")
+    inc_manifest = read_json(inc_manifest_path)
+    ingest_date = str(inc_manifest.get("ingest_date") or "")
+    if not ingest_date:
+        raise SystemExit("FATAL: ingest_date missing in incremental snapshot manifest")
+
+    if args.snapshot_id:
+        snap_dir = quant_root / "data" / "snapshots" / f"snapshot_id={args.snapshot_id}"
+    else:
+        snap_id = str(inc_manifest.get("snapshot_id") or "")
+        snap_dir = (quant_root / "data" / "snapshots" / f"snapshot_id={snap_id}") if snap_id else latest_materialized_snapshot_dir(quant_root)
+        if not snap_dir.exists():
+            snap_dir = latest_materialized_snapshot_dir(quant_root)
+    if not snap_dir.exists():
+        raise SystemExit(f"FATAL: snapshot not found: {snap_dir}")
+
+    snap_manifest = read_json(snap_dir / "snapshot_manifest.json")
+    snapshot_id = str(snap_manifest.get("snapshot_id") or snap_dir.name.split("=", 1)[-1])
+    asof_date = parse_iso_date(str(snap_manifest.get("asof_date") or date.today().isoformat()))
+    bars_root_value = ((snap_manifest.get("artifacts") or {}).get("bars_dataset_root") or "")
+    if not bars_root_value:
+        raise SystemExit("FATAL: bars_dataset_root missing in snapshot manifest")
+    bars_root = Path(str(bars_root_value))
+    if not bars_root.exists():
+        raise SystemExit(f"FATAL: bars_dataset_root not found: {bars_root}")
+
+    changed_assets_path = Path(str((inc_manifest.get("artifacts") or {}).get("changed_assets_parquet") or ""))
+    changed_assets = _read_changed_assets(changed_assets_path, include_classes)
+
+    run_id = f"q1featinc_{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}"
+    run_root = quant_root / "runs" / f"run_id={run_id}"
+    run_root.mkdir(parents=True, exist_ok=True)
+    run_status_path = run_root / "q1_incremental_feature_update_run_status.json"
+
+    tag = args.output_tag or f"delta_{ingest_date}"
+    out_dir = (
+        quant_root
+        / "features"
+        / "store"
+        / f"feature_store_version={args.feature_store_version}"
+        / f"asof_date={asof_date.isoformat()}"
+    )
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / f"feature_manifest.{tag}.json"
+
+    def write_status(stage: str, ok=None, exit_code=None, reason=None, extra: dict[str, Any] | None = None):
+        atomic_write_json(
+            run_status_path,
+            {
+                "schema": "quantlab_q1_incremental_feature_update_run_status_v1",
+                "generated_at": utc_now_iso(),
+                "run_id": run_id,
+                "ok": ok,
+                "exit_code": exit_code,
+                "reason": reason,
+                "stage": stage,
+                "snapshot_id": snapshot_id,
+                "ingest_date": ingest_date,
+                "paths": {
+                    "increment_manifest": str(inc_manifest_path),
+                    "snapshot_manifest": str(snap_dir / 'snapshot_manifest.json'),
+                    "feature_root": str(out_dir),
+                    "feature_manifest": str(manifest_path),
+                },
+                "extra": extra or {},
+            },
+        )
+
+    data_truth_validation = _validate_data_truth(
+        snap_manifest,
+        include_classes=include_classes,
+        asof_date=asof_date,
+        require_contract_layers=bool(args.require_contract_layers),
+        require_tri_layer=bool(args.require_tri_layer),
+    )
+    write_status("data_truth_precheck", extra={"data_truth": data_truth_validation})
+    if not bool(data_truth_validation.get("ok")):
+        write_status(
+            "data_truth_precheck_failed",
+            ok=False,
+            exit_code=2,
+            reason="data_truth_precheck_failed",
+            extra={"data_truth": data_truth_validation},
+        )
+        print(f"run_id={run_id}")
+        print("reason=data_truth_precheck_failed")
+        print(f"errors={','.join(data_truth_validation.get('errors') or [])}")
+        return 2
+
+    write_status("bootstrap", extra={"changed_assets_total": len(changed_assets)})
+    if not changed_assets:
+        manifest = {
+            "schema": "quantlab_q1_incremental_feature_manifest_v1",
+            "generated_at": utc_now_iso(),
+            "run_id": run_id,
+            "snapshot_id": snapshot_id,
+            "ingest_date": ingest_date,
+            "asof_date": asof_date.isoformat(),
+            "feature_store_version": args.feature_store_version,
+            "mode": "incremental_latest_only_noop",
+            "counts": {"changed_assets_total": 0, "feature_rows_total": 0, "files_total": 0},
+            "artifacts": {"files": []},
+            "inputs": {"increment_manifest": str(inc_manifest_path)},
+            "data_truth_validation": data_truth_validation,
+            "reconciliation": {"changed_assets_total": 0, "feature_rows_total": 0, "ok": True},
+        }
+        atomic_write_json(manifest_path, manifest)
+        latest_ptr = quant_root / "ops" / "q1_incremental_feature_update" / "latest_success.json"
+        atomic_write_json(latest_ptr, {"schema": "quantlab_q1_incremental_feature_update_latest_success_v1", "updated_at": utc_now_iso(), "run_id": run_id, "manifest_path": str(manifest_path), "run_status": str(run_status_path), "counts": manifest["counts"]})
+        write_status("completed", ok=True, exit_code=0, reason="ok_noop", extra={"manifest": str(manifest_path)})
+        print(f"run_id={run_id}")
+        print("changed_assets_total=0")
+        print(f"manifest={manifest_path}")
+        return 0
+
+    start_date = (asof_date - timedelta(days=args.lookback_calendar_days)).isoformat()
+    asof_s = asof_date.isoformat()
+    bars_glob = str(bars_root / "**" / "*.parquet")
+
+    rolling_state: dict[str, Any] = {"enabled": args.feature_engine == "rolling_state"}
+    new_state: pl.DataFrame | None = None
+    state_path = quant_root / "features" / "state" / f"feature_store_version={args.feature_store_version}" / "rolling_state.parquet"
+    if args.feature_engine == "rolling_state":
+        features_df, new_state, state_stats = _rolling_state_features(
+            state_path=state_path,
+            bars_glob=bars_glob,
+            include_classes=include_classes,
+            changed_assets=changed_assets,
+            asof_date=asof_date,
+            lookback_calendar_days=int(args.lookback_calendar_days),
+            min_rows_window=int(args.min_rows_window),
+            delta_min_dates=_read_delta_min_dates(changed_assets_path, include_classes),
+        )
+        rolling_state.update(state_stats)
+        feat = features_df.lazy()
+        if args.verify_rolling_state:
+            rebuilt = _window_features(
+                _scan_bars(bars_glob, include_classes, changed_assets, start_date, asof_s), asof_s, int(args.min_rows_window)
+            ).collect(engine="streaming")
+            verification = compare_feature_frames(features_df, rebuilt, rtol=float(args.verify_rtol), atol=float(args.verify_atol))
+            rolling_state["verification"] = verification
+            if not verification["ok"]:
+                write_status(
+                    "rolling_state_verification_failed",
+                    ok=False,
+                    exit_code=2,
+                    reason="rolling_state_verification_failed",
+                    extra={"rolling_state": rolling_state},
+                )
+                print(f"run_id={run_id}")
+                print("reason=rolling_state_verification_failed")
+                return 2
+    else:
+        feat = _window_features(_scan_bars(bars_glob, include_classes, changed_assets, start_date, asof_s), asof_s, int(args.min_rows_window))
 
     row_counts: dict[str, int] = {}
     file_paths: list[str] = []
@@ -487,6 +633,9 @@ def main(argv: Iterable[str]) -> int:
         changed_assets_with_features += cls_df.select("asset_id").unique().height
         file_paths.append(str(fp))
 
+    if new_state is not None:
+        write_state(state_path, new_state)
+
     changed_assets_total = len(changed_assets)
     feature_rows_total = int(sum(row_counts.values()))
     reconciliation = {
@@ -515,6 +664,7 @@ def main(argv: Iterable[str]) -> int:
             "asset_classes": include_classes,
             "lookback_calendar_days": int(args.lookback_calendar_days),
             "min_rows_window": int(args.min_rows_window),
+            "feature_engine": args.feature_engine,
             "output_tag": tag,
             "require_contract_layers": bool(args.require_contract_layers),
             "require_tri_layer": bool(args.require_tri_layer),
@@ -532,6 +682,7 @@ def main(argv: Iterable[str]) -> int:
             "files": file_paths,
         },
         "reconciliation": reconciliation,
+        "rolling_state": rolling_state,
     }
     atomic_write_json(manifest_path, manifest)
     manifest.setdefault("hashes", {})
@@ -41,6 +41,15 @@ def parse_args(argv: Iterable[str]) -> argparse.Namespace:
         default="live=1.0,live_alt_1=0.75,live_alt_2=0.50,shadow=0.35",
         help="Comma-separated slot weights for slot_blend mode, e.g. live=1.0,shadow=0.3",
     )
+    p.add_argument(
+        "--slot-blend-variant",
+        action="append",
+        default=[],
+        help=(
+            "Repeatable NAME@SLOT_BLEND[@STATE_MULTIPLIERS] extra slot-blend book built from the same scoring frame, "
+            "e.g. live_only@live=1.0; written under artifacts/variants/NAME and never promoted to ops/latest"
+        ),
+    )
     p.add_argument("--slot-blend-max-candidates", type=int, default=4)
     p.add_argument(
         "--registry-state-multipliers",
@@ -186,6 +195,22 @@ def _parse_slot_blend(spec: str) -> list[tuple[str, float]]:
     return [(s, dedup[s]) for s in dedup]
 
 
+def _parse_blend_variants(specs: Iterable[str], default_state_multipliers: str) -> dict[str, tuple[str, str]]:
+    """``NAME@SLOT_BLEND[@STATE_MULTIPLIERS]`` specs as build_blend_books variants, in CLI order."""
+    out: dict[str, tuple[str, str]] = {}
+    for spec in specs:
+        parts = [x.strip() for x in str(spec or "").split("@")]
+        name = parts[0] if parts else ""
+        if len(parts) not in (2, 3) or not name or not parts[1]:
+            raise SystemExit(f"FATAL: invalid --slot-blend-variant {spec!r} (expected NAME@SLOT_BLEND[@STATE_MULTIPLIERS])")
+        if not all(ch.isalnum() or ch in "_.-" for ch in name) or name.startswith("."):
+            raise SystemExit(f"FATAL: invalid --slot-blend-variant name {name!r}")
+        if name in out:
+            raise SystemExit(f"FATAL: duplicate --slot-blend-variant name {name!r}")
+        out[name] = (parts[1], parts[2] if len(parts) == 3 and parts[2] else str(default_state_multipliers or ""))
+    return out
+
+
 def _parse_state_multipliers(spec: str) -> dict[str, float]:
     out: dict[str, float] = {}
     for tok in str(spec or "").split(","):
@@ -301,6 +326,47 @@ def _extract_registry_candidates_for_blend(
     return dedup_rows
 
 
+def _resolve_blend_candidates(
+    registry_report: dict[str, Any],
+    *,
+    slot_blend: str,
+    state_multipliers: str,
+    min_effective_weight: float,
+    max_candidates: int,
+    require_live_like: bool,
+    live_like_states: set[str],
+) -> tuple[list[dict[str, Any]], float, list[str]]:
+    """Supported blend candidates for one slot-blend spec, their total effective weight and policy warnings."""
+    blend_candidates = _extract_registry_candidates_for_blend(
+        registry_report,
+        slot_weights=_parse_slot_blend(slot_blend),
+        state_multipliers=_parse_state_multipliers(state_multipliers),
+        min_effective_weight=float(min_effective_weight),
+        max_candidates=int(max_candidates),
+    )
+    supported_blend: list[dict[str, Any]] = []
+    for bc in blend_candidates:
+        cid = str(bc.get("candidate_id") or "")
+        expr_info = _candidate_expr(cid)
+        if expr_info is None:
+            continue
+        supported_blend.append(
+            {
+                **bc,
+                "family": str(expr_info[0] or bc.get("family") or ""),
+            }
+        )
+    blend_candidates = supported_blend
+    warnings: list[str] = []
+    if require_live_like:
+        has_live_like = any(str(x.get("state") or "").lower() in live_like_states for x in blend_candidates)
+        if not has_live_like:
+            warnings.append("SLOT_BLEND_NO_LIVE_LIKE_STATE_FALLBACK_TO_SINGLE")
+            blend_candidates = []
+    blend_weight_total = float(sum(float(x.get("effective_slot_weight") or 0.0) for x in blend_candidates))
+    return blend_candidates, blend_weight_total, warnings
+
+
 def _extract_stageb_candidate(stageb_report: dict[str, Any]) -> tuple[str, str]:
     artifacts = stageb_report.get("artifacts") or {}
     survivors_path = Path(str(artifacts.get("survivors_B_q1") or ""))
@@ -459,6 +525,60 @@ def _feature_files(feature_root: Path, asof_date: str, asset_classes: list[str],
     return out
 
 
+def _load_feature_frame(files: list[Path], *, asof_date: str, asset_classes: list[str], min_adv_dollar: float) -> pl.DataFrame:
+    required_cols = [
+        "asof_date",
+        "asset_id",
+        "asset_class",
+        "close_raw",
+        "sma_200",
+        "adv20_dollar",
+        "ret_20d",
+        "ret_5d",
+        "rsi_14",
+        "macd_hist",
+        "atr_pct_14",
+        "ewma_vol_20",
+        "boll_z_20",
+    ]
+    df = pl.scan_parquet([str(x) for x in files]).select([pl.col(c) for c in required_cols]).collect(engine="streaming")
+    df = df.with_columns(
+        [
+            pl.col("asset_id").cast(pl.Utf8),
+            pl.col("asset_class").cast(pl.Utf8).str.to_lowercase(),
+            pl.col("asof_date").cast(pl.Utf8),
+            pl.col("close_raw").cast(pl.Float64),
+            pl.col("sma_200").cast(pl.Float64),
+            pl.col("adv20_dollar").cast(pl.Float64),
+            pl.col("ret_20d").cast(pl.Float64),
+            pl.col("ret_5d").cast(pl.Float64),
+            pl.col("rsi_14").cast(pl.Float64),
+            pl.col("macd_hist").cast(pl.Float64),
+            pl.col("atr_pct_14").cast(pl.Float64),
+            pl.col("ewma_vol_20").cast(pl.Float64),
+            pl.col("boll_z_20").cast(pl.Float64),
+        ]
+    )
+    df = df.filter(pl.col("asof_date") == asof_date).filter(pl.col("asset_class").is_in(asset_classes))
+    df = df.filter((pl.col("close_raw") > 0) & (pl.col("adv20_dollar") >= float(min_adv_dollar)))
+    df = df.drop_nulls(
+        [
+            "close_raw",
+            "sma_200",
+            "adv20_dollar",
+            "ret_20d",
+            "ret_5d",
+            "rsi_14",
+            "macd_hist",
+            "atr_pct_14",
+            "ewma_vol_20",
+            "boll_z_20",
+        ]
+    )
+    # Keep one deterministic row per asset if duplicated by historical run tags.
+    return df.sort(["asset_id", "adv20_dollar"], descending=[False, True]).unique(subset=["asset_id"], keep="first")
+
+
 def _apply_family_pick_cap(df: pl.DataFrame, *, max_rows: int, cap_per_family: int, side_label: str) -> tuple[pl.DataFrame, list[str]]:
     max_rows = max(0, int(max_rows))
     cap_per_family = max(0, int(cap_per_family))
@@ -466,25 +586,22 @@ def _apply_family_pick_cap(df: pl.DataFrame, *, max_rows: int, cap_per_family: i
         return df.head(0), []
     if cap_per_family <= 0 or "family" not in df.columns:
         return df.head(max_rows), []
-    picked: list[dict[str, Any]] = []
-    fam_counts: dict[str, int] = {}
-    skipped_due_cap = 0
-    for row in df.to_dicts():
-        fam = str(row.get("family") or "")
-        used = int(fam_counts.get(fam, 0))
-        if used >= cap_per_family:
-            skipped_due_cap += 1
-            continue
-        picked.append(row)
-        fam_counts[fam] = used + 1
-        if len(picked) >= max_rows:
-            break
+    # Rows are ranked within their family in frame order; a row survives the cap
+    # while its family rank is <= cap. Rows are only "skipped" if they come before
+    # the max_rows-th surviving row, i.e. while picking was still going on.
+    family_key = pl.col("family").cast(pl.Utf8).fill_null("")
+    within_cap = family_key.cum_count().over(family_key) <= cap_per_family
+    flags = df.select(within_cap.alias("_within_cap")).with_columns(
+        (pl.col("_within_cap").cast(pl.Int64).cum_sum().shift(1, fill_value=0) < max_rows).alias("_visited")
+    )
+    picked = df.filter(flags.get_column("_within_cap")).head(max_rows)
+    skipped_due_cap = int(flags.select((pl.col("_visited") & ~pl.col("_within_cap")).sum()).item())
     warnings: list[str] = []
     if skipped_due_cap > 0:
         warnings.append(
-            f"FAMILY_CAP_APPLIED:{side_label}:cap={cap_per_family}:skipped={skipped_due_cap}:picked={len(picked)}"
+            f"FAMILY_CAP_APPLIED:{side_label}:cap={cap_per_family}:skipped={skipped_due_cap}:picked={picked.height}"
         )
-    return pl.DataFrame(picked) if picked else df.head(0), warnings
+    return picked, warnings
 
 
 def _candidate_expr(candidate_id: str) -> tuple[str, pl.Expr] | None:
@@ -553,6 +670,27 @@ def _prepare_scoring_frame(df: pl.DataFrame) -> pl.DataFrame:
     return out
 
 
+def _blend_signal_exprs(blend_candidates: list[dict[str, Any]], blend_weight_total: float) -> tuple[list[pl.Expr], pl.Expr | None]:
+    """Per-candidate ``_sig_<idx>_<cid>`` columns and the weighted blend over them (None if nothing is supported)."""
+    signal_columns: list[pl.Expr] = []
+    blend_expr_terms: list[pl.Expr] = []
+    for idx, bc in enumerate(blend_candidates):
+        cid = str(bc.get("candidate_id") or "")
+        expr_info_bc = _candidate_expr(cid)
+        if expr_info_bc is None:
+            continue
+        alias = f"_sig_{idx}_{cid}"
+        signal_columns.append(expr_info_bc[1].alias(alias))
+        w = float(bc.get("effective_slot_weight") or 0.0) / float(blend_weight_total)
+        blend_expr_terms.append(pl.col(alias) * float(w))
+    if not blend_expr_terms:
+        return signal_columns, None
+    blend_expr = blend_expr_terms[0]
+    for e in blend_expr_terms[1:]:
+        blend_expr = blend_expr + e
+    return signal_columns, blend_expr
+
+
 def _build_side_positions(
     df: pl.DataFrame,
     *,
@@ -585,19 +723,147 @@ def _build_side_positions(
                 * liq_component.pow(float(max(0.0, alpha_liq)))
             ).alias("_raw_weight")
         )
-    raw_sum = float(raw.select(pl.col("_raw_weight").sum()).item() or 0.0)
-    if raw_sum <= 0:
-        raw = raw.with_columns(pl.lit(1.0).alias("_raw_weight"))
-        raw_sum = float(raw.height)
+    # Non-positive raw mass falls back to equal weights.
+    raw_sum = pl.col("_raw_weight").sum()
     sign = 1.0 if side == "LONG" else -1.0
     return raw.with_columns(
         [
             pl.lit(side).alias("side"),
-            (pl.col("_raw_weight") / float(raw_sum) * float(sign)).alias("target_weight_raw"),
+            (
+                pl.when(raw_sum <= 0)
+                .then(pl.lit(1.0) / pl.len().cast(pl.Float64))
+                .otherwise(pl.col("_raw_weight") / raw_sum)
+                * float(sign)
+            ).alias("target_weight_raw"),
         ]
     ).drop(["_row_idx", "_raw_weight"])
 
 
+def _build_books(
+    scored: pl.DataFrame,
+    *,
+    top_n_long: int,
+    top_n_short: int,
+    max_long_per_family: int,
+    max_short_per_family: int,
+    weighting_mode: str,
+    alpha_score: float,
+    alpha_invvol: float,
+    alpha_liq: float,
+) -> tuple[pl.DataFrame, list[str], int, int]:
+    """Long/short books (``target_weight_raw``) from a frame with ``signal_score``; returns positions, warnings, n_long, n_short."""
+    long_df, long_family_cap_warnings = _apply_family_pick_cap(
+        scored.sort("signal_score", descending=True),
+        max_rows=max(0, int(top_n_long)),
+        cap_per_family=int(max_long_per_family),
+        side_label="LONG",
+    )
+    short_df, short_family_cap_warnings = _apply_family_pick_cap(
+        scored.sort("signal_score"),
+        max_rows=max(0, int(top_n_short)),
+        cap_per_family=int(max_short_per_family),
+        side_label="SHORT",
+    )
+    if short_df.height > 0 and long_df.height > 0:
+        short_df = short_df.filter(~pl.col("asset_id").is_in(long_df.get_column("asset_id").to_list()))
+    side_kwargs = {
+        "weighting_mode": weighting_mode,
+        "alpha_score": alpha_score,
+        "alpha_invvol": alpha_invvol,
+        "alpha_liq": alpha_liq,
+    }
+    long_pos = _build_side_positions(long_df, side="LONG", **side_kwargs)
+    short_pos = _build_side_positions(short_df, side="SHORT", **side_kwargs)
+    positions = pl.concat([long_pos, short_pos], how="diagonal") if short_pos.height else long_pos
+    return positions, long_family_cap_warnings + short_family_cap_warnings, int(long_df.height), int(short_df.height)
+
+
+def _scale_positions(positions: pl.DataFrame, *, target_gross: float, max_position_weight: float) -> pl.DataFrame:
+    gross_raw = pl.col("target_weight_raw").abs().sum()
+    scale = pl.when(gross_raw > 1e-12).then(pl.lit(float(target_gross)) / gross_raw).otherwise(pl.lit(1.0))
+    return positions.with_columns(
+        (pl.col("target_weight_raw") * scale)
+        .clip(lower_bound=-float(max_position_weight), upper_bound=float(max_position_weight))
+        .alias("target_weight")
+    )
+
+
+def build_blend_books(
+    scored: pl.DataFrame,
+    registry_report: dict[str, Any],
+    variants: dict[str, tuple[str, str]],
+    *,
+    min_effective_weight: float = 0.01,
+    max_candidates: int = 4,
+    require_live_like: bool = True,
+    live_like_states: set[str] | None = None,
+    target_gross: float = 1.0,
+    max_position_weight: float = 0.08,
+    **book_kwargs: Any,
+) -> dict[str, dict[str, Any]]:
+    """Books for many slot-blend variants from one ``_prepare_scoring_frame`` output.
+
+    ``variants`` maps a name to (registry slot-blend spec, state-multiplier spec),
+    the same strings as --registry-slot-blend / --registry-state-multipliers.
+    Candidate signals are evaluated once for the union of all variants, and all
+    blend scores are added in a single ``with_columns``; only the per-variant
+    sort/cap/weighting runs per variant. ``book_kwargs`` are ``_build_books``
+    keywords. Variants without a usable blend get ``positions=None``.
+    """
+    states = live_like_states or {"live", "live_hold"}
+    resolved: dict[str, tuple[list[dict[str, Any]], float, list[str]]] = {}
+    signal_exprs: dict[str, pl.Expr] = {}
+    score_exprs: list[pl.Expr] = []
+    score_columns: dict[str, str] = {}
+    for idx, (name, (slot_blend, state_multipliers)) in enumerate(variants.items()):
+        candidates, weight_total, warnings = _resolve_blend_candidates(
+            registry_report,
+            slot_blend=slot_blend,
+            state_multipliers=state_multipliers,
+            min_effective_weight=min_effective_weight,
+            max_candidates=max_candidates,
+            require_live_like=require_live_like,
+            live_like_states=states,
+        )
+        resolved[name] = (candidates, weight_total, warnings)
+        if not candidates or weight_total <= 0:
+            continue
+        terms = []
+        for bc in candidates:
+            cid = str(bc.get("candidate_id") or "")
+            signal_exprs.setdefault(cid, _candidate_expr(cid)[1].alias(f"_sig_{cid}"))
+            terms.append(pl.col(f"_sig_{cid}") * float(float(bc.get("effective_slot_weight") or 0.0) / float(weight_total)))
+        score = terms[0]
+        for term in terms[1:]:
+            score = score + term
+        score_columns[name] = f"_score_{idx}"
+        score_exprs.append(score.alias(score_columns[name]))
+    frame = scored.with_columns(list(signal_exprs.values())).with_columns(score_exprs)
+    base_columns = scored.columns
+
+    out: dict[str, dict[str, Any]] = {}
+    for name, (candidates, weight_total, warnings) in resolved.items():
+        result: dict[str, Any] = {
+            "candidates": candidates,
+            "blend_weight_total": weight_total,
+            "warnings": list(warnings),
+            "positions": None,
+            "n_long": 0,
+            "n_short": 0,
+        }
+        if name in score_columns:
+            variant = frame.select(base_columns + [pl.col(score_columns[name]).alias("signal_score")]).drop_nulls(["signal_score"])
+            positions, cap_warnings, n_long, n_short = _build_books(variant, **book_kwargs)
+            result.update(
+                positions=_scale_positions(positions, target_gross=target_gross, max_position_weight=max_position_weight),
+                n_long=n_long,
+                n_short=n_short,
+            )
+            result["warnings"].extend(cap_warnings)
+        out[name] = result
+    return out
+
+
 def _current_positions(path: Path) -> pl.DataFrame:
     empty = pl.DataFrame(
         {
@@ -621,6 +887,7 @@ def _current_positions(path: Path) -> pl.DataFrame:
 
 def main(argv: Iterable[str]) -> int:
     args = parse_args(argv)
+    blend_variants = _parse_blend_variants(args.slot_blend_variant, str(args.registry_state_multipliers or ""))
     v4_final_profile = bool(args.v4_final_profile)
     if v4_final_profile:
         if int(args.max_long_per_family) <= 0:
@@ -664,36 +931,16 @@ def main(argv: Iterable[str]) -> int:
         slot_blend_live_like_states = {"live", "live_hold"}
     if not candidate_id and args.candidate_selection_source in {"registry_then_stageb", "registry_only"} and registry_report:
         if str(args.candidate_selection_mode) == "slot_blend":
-            slot_weights = _parse_slot_blend(str(args.registry_slot_blend or ""))
-            state_multipliers = _parse_state_multipliers(str(args.registry_state_multipliers or ""))
-            blend_candidates = _extract_registry_candidates_for_blend(
+            blend_candidates, blend_weight_total, resolve_warnings = _resolve_blend_candidates(
                 registry_report,
-                slot_weights=slot_weights,
-                state_multipliers=state_multipliers,
+                slot_blend=str(args.registry_slot_blend or ""),
+                state_multipliers=str(args.registry_state_multipliers or ""),
                 min_effective_weight=float(args.slot_blend_min_effective_weight),
                 max_candidates=int(args.slot_blend_max_candidates),
+                require_live_like=bool(args.slot_blend_require_live_like),
+                live_like_states=slot_blend_live_like_states,
             )
-            supported_blend: list[dict[str, Any]] = []
-            for bc in blend_candidates:
-                cid = str(bc.get("candidate_id") or "")
-                expr_info = _candidate_expr(cid)
-                if expr_info is None:
-                    continue
-                supported_blend.append(
-                    {
-                        **bc,
-                        "family": str(expr_info[0] or bc.get("family") or ""),
-                    }
-                )
-            blend_candidates = supported_blend
-            if bool(args.slot_blend_require_live_like):
-                has_live_like = any(
-                    str(x.get("state") or "").lower() in slot_blend_live_like_states for x in blend_candidates
-                )
-                if not has_live_like:
-                    blend_selection_warnings.append("SLOT_BLEND_NO_LIVE_LIKE_STATE_FALLBACK_TO_SINGLE")
-                    blend_candidates = []
-            blend_weight_total = float(sum(float(x.get("effective_slot_weight") or 0.0) for x in blend_candidates))
+            blend_selection_warnings.extend(resolve_warnings)
             if blend_candidates and blend_weight_total > 0:
                 candidate_source = "registry_slot_blend"
                 candidate_family = "BLEND"
@@ -834,78 +1081,17 @@ def main(argv: Iterable[str]) -> int:
     if not files:
         raise SystemExit(f"FATAL: no feature files for asof_date={asof_date} part_glob={part_glob}")
 
-    required_cols = [
-        "asof_date",
-        "asset_id",
-        "asset_class",
-        "close_raw",
-        "sma_200",
-        "adv20_dollar",
-        "ret_20d",
-        "ret_5d",
-        "rsi_14",
-        "macd_hist",
-        "atr_pct_14",
-        "ewma_vol_20",
-        "boll_z_20",
-    ]
-    df = pl.scan_parquet([str(x) for x in files]).select([pl.col(c) for c in required_cols]).collect(engine="streaming")
-    df = df.with_columns(
-        [
-            pl.col("asset_id").cast(pl.Utf8),
-            pl.col("asset_class").cast(pl.Utf8).str.to_lowercase(),
-            pl.col("asof_date").cast(pl.Utf8),
-            pl.col("close_raw").cast(pl.Float64),
-            pl.col("sma_200").cast(pl.Float64),
-            pl.col("adv20_dollar").cast(pl.Float64),
-            pl.col("ret_20d").cast(pl.Float64),
-            pl.col("ret_5d").cast(pl.Float64),
-            pl.col("rsi_14").cast(pl.Float64),
-            pl.col("macd_hist").cast(pl.Float64),
-            pl.col("atr_pct_14").cast(pl.Float64),
-            pl.col("ewma_vol_20").cast(pl.Float64),
-            pl.col("boll_z_20").cast(pl.Float64),
-        ]
-    )
-    df = df.filter(pl.col("asof_date") == asof_date).filter(pl.col("asset_class").is_in(asset_classes))
-    df = df.filter((pl.col("close_raw") > 0) & (pl.col("adv20_dollar") >= float(args.min_adv_dollar)))
-    df = df.drop_nulls(
-        [
-            "close_raw",
-            "sma_200",
-            "adv20_dollar",
-            "ret_20d",
-            "ret_5d",
-            "rsi_14",
-            "macd_hist",
-            "atr_pct_14",
-            "ewma_vol_20",
-            "boll_z_20",
-        ]
-    )
-    # Keep one deterministic row per asset if duplicated by historical run tags.
-    df = df.sort(["asset_id", "adv20_dollar"], descending=[False, True]).unique(subset=["asset_id"], keep="first")
+    df = _load_feature_frame(files, asof_date=asof_date, asset_classes=asset_classes, min_adv_dollar=float(args.min_adv_dollar))
     if df.is_empty():
         raise SystemExit("FATAL: no eligible assets after filtering")
 
     scored = _prepare_scoring_frame(df)
+    variant_base = scored
     if blend_candidates and blend_weight_total > 0:
-        blend_expr_terms: list[pl.Expr] = []
-        for idx, bc in enumerate(blend_candidates):
-            cid = str(bc.get("candidate_id") or "")
-            expr_info_bc = _candidate_expr(cid)
-            if expr_info_bc is None:
-                continue
-            alias = f"_sig_{idx}_{cid}"
-            scored = scored.with_columns(expr_info_bc[1].alias(alias))
-            w = float(bc.get("effective_slot_weight") or 0.0) / float(blend_weight_total)
-            blend_expr_terms.append(pl.col(alias) * float(w))
-        if not blend_expr_terms:
+        signal_columns, blend_expr = _blend_signal_exprs(blend_candidates, blend_weight_total)
+        if blend_expr is None:
             raise SystemExit("FATAL: slot_blend resolved no supported candidate expressions")
-        blend_expr = blend_expr_terms[0]
-        for e in blend_expr_terms[1:]:
-            blend_expr = blend_expr + e
-        scored = scored.with_columns(blend_expr.alias("signal_score"))
+        scored = scored.with_columns(signal_columns).with_columns(blend_expr.alias("signal_score"))
     else:
         if expr_info is None:
             raise SystemExit("FATAL: candidate expression missing in single mode")
@@ -914,53 +1100,19 @@ def main(argv: Iterable[str]) -> int:
     if scored.is_empty():
         raise SystemExit("FATAL: no scored assets")
 
-    n_long_target = max(0, int(top_n_long_effective))
-    n_short_target = max(0, int(top_n_short_effective)) if bool(allow_shorts_effective) else 0
-    long_sorted = scored.sort("signal_score", descending=True)
-    long_df, long_family_cap_warnings = _apply_family_pick_cap(
-        long_sorted,
-        max_rows=n_long_target,
-        cap_per_family=int(args.max_long_per_family),
-        side_label="LONG",
-    )
-    short_sorted = scored.sort("signal_score")
-    short_df, short_family_cap_warnings = _apply_family_pick_cap(
-        short_sorted,
-        max_rows=n_short_target,
-        cap_per_family=int(args.max_short_per_family),
-        side_label="SHORT",
-    )
-    if short_df.height > 0 and long_df.height > 0:
-        long_ids = set(str(x) for x in long_df.get_column("asset_id").to_list())
-        short_df = short_df.filter(~pl.col("asset_id").is_in(sorted(long_ids)))
-    n_long = int(long_df.height)
-    n_short = int(short_df.height)
-
-    long_pos = _build_side_positions(
-        long_df,
-        side="LONG",
-        weighting_mode=weighting_mode_effective,
-        alpha_score=weight_alpha_score_effective,
-        alpha_invvol=weight_alpha_invvol_effective,
-        alpha_liq=weight_alpha_liq_effective,
-    )
-    short_pos = _build_side_positions(
-        short_df,
-        side="SHORT",
-        weighting_mode=weighting_mode_effective,
-        alpha_score=weight_alpha_score_effective,
-        alpha_invvol=weight_alpha_invvol_effective,
-        alpha_liq=weight_alpha_liq_effective,
-    )
-    positions = pl.concat([long_pos, short_pos], how="diagonal") if short_pos.height else long_pos
-
-    gross_raw = float(positions.select(pl.col("target_weight_raw").abs().sum()).item() or 0.0) if positions.height else 0.0
-    gross_target = float(target_gross_effective)
-    scale = (gross_target / gross_raw) if gross_raw > 1e-12 else 1.0
-    positions = positions.with_columns(
-        (pl.col("target_weight_raw") * float(scale))
-        .clip(lower_bound=-float(max_position_weight_effective), upper_bound=float(max_position_weight_effective))
-        .alias("target_weight")
+    book_kwargs = {
+        "top_n_long": int(top_n_long_effective),
+        "top_n_short": int(top_n_short_effective) if bool(allow_shorts_effective) else 0,
+        "max_long_per_family": int(args.max_long_per_family),
+        "max_short_per_family": int(args.max_short_per_family),
+        "weighting_mode": weighting_mode_effective,
+        "alpha_score": weight_alpha_score_effective,
+        "alpha_invvol": weight_alpha_invvol_effective,
+        "alpha_liq": weight_alpha_liq_effective,
+    }
+    positions, family_cap_warnings, n_long, n_short = _build_books(scored, **book_kwargs)
+    positions = _scale_positions(
+        positions, target_gross=float(target_gross_effective), max_position_weight=float(max_position_weight_effective)
     )
 
     gross = float(positions.select(pl.col("target_weight").abs().sum()).item() or 0.0) if positions.height else 0.0
@@ -1018,8 +1170,7 @@ def main(argv: Iterable[str]) -> int:
 
     failures: list[str] = []
     warnings: list[str] = []
-    warnings.extend(long_family_cap_warnings)
-    warnings.extend(short_family_cap_warnings)
+    warnings.extend(family_cap_warnings)
     warnings.extend([f"SLOT_BLEND_POLICY:{x}" for x in blend_selection_warnings])
     warnings.extend(slot_consistency_warnings)
     failures.extend(slot_consistency_failures)
@@ -1130,6 +1281,55 @@ def main(argv: Iterable[str]) -> int:
     positions.write_parquet(positions_path)
     orders.write_parquet(orders_path)
 
+    variant_reports: dict[str, dict[str, Any]] = {}
+    if blend_variants:
+        if not registry_report:
+            warnings.append("SLOT_BLEND_VARIANTS_SKIPPED:registry_report_missing")
+        variant_books = (
+            build_blend_books(
+                variant_base,
+                registry_report,
+                blend_variants,
+                min_effective_weight=float(args.slot_blend_min_effective_weight),
+                max_candidates=int(args.slot_blend_max_candidates),
+                require_live_like=bool(args.slot_blend_require_live_like),
+                live_like_states=slot_blend_live_like_states,
+                target_gross=float(target_gross_effective),
+                max_position_weight=float(max_position_weight_effective),
+                **book_kwargs,
+            )
+            if registry_report
+            else {}
+        )
+        for name, book in variant_books.items():
+            variant_positions = book["positions"]
+            entry: dict[str, Any] = {
+                "registry_slot_blend": blend_variants[name][0],
+                "registry_state_multipliers": blend_variants[name][1],
+                "candidate_ids": [str(x.get("candidate_id") or "") for x in book["candidates"]],
+                "blend_weight_total": float(book["blend_weight_total"]),
+                "warnings": list(book["warnings"]),
+                "long_positions_total": int(book["n_long"]),
+                "short_positions_total": int(book["n_short"]),
+                "positions_total": 0,
+                "gross_exposure": 0.0,
+                "net_exposure": 0.0,
+                "positions_parquet": "",
+                "positions_hash": "",
+            }
+            if variant_positions is not None:
+                variant_path = artifacts_dir / "variants" / name / "portfolio_positions.parquet"
+                variant_path.parent.mkdir(parents=True, exist_ok=True)
+                variant_positions.write_parquet(variant_path)
+                entry.update(
+                    positions_total=int(variant_positions.height),
+                    gross_exposure=float(variant_positions.get_column("target_weight").abs().sum() or 0.0),
+                    net_exposure=float(variant_positions.get_column("target_weight").sum() or 0.0),
+                    positions_parquet=str(variant_path),
+                    positions_hash=stable_hash_file(variant_path),
+                )
+            variant_reports[name] = entry
+
     ops_root = quant_root / "ops" / "portfolio_q1"
     ops_root.mkdir(parents=True, exist_ok=True)
     latest_report_path = ops_root / "latest_report.json"
@@ -1196,6 +1396,7 @@ def main(argv: Iterable[str]) -> int:
             },
             "slot_consistency": slot_consistency_details,
         },
+        "blend_variants": variant_reports,
         "inputs": {
             "feature_store_version": str(args.feature_store_version),
             "asset_classes": asset_classes,
@@ -2,13 +2,10 @@
 from __future__ import annotations
 
 import argparse
-import itertools
 import math
-import random
 import sys
 from datetime import date
 from pathlib import Path
-from statistics import NormalDist
 from typing import Iterable
 
 import polars as pl
@@ -17,9 +14,11 @@ REPO_ROOT = Path(__file__).resolve().parents[2]
 if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
+from scripts.quantlab.cpcv_paths import CpcvPathEngine  # noqa: E402
 from scripts.quantlab.q1_common import DEFAULT_QUANT_ROOT, atomic_write_json, read_json, stable_hash_file, utc_now_iso  # noqa: E402
+from scripts.quantlab.stageb_stats import sharpe_stats_by_candidate  # noqa: E402
 
-_NORM = NormalDist()
+_CPCV_ENGINE = CpcvPathEngine()
 
 
 def parse_args(argv: Iterable[str]) -> argparse.Namespace:
@@ -160,101 +159,6 @@ def _psr_proxy(sharpes: list[float]) -> float:
     return float(max(0.0, min(1.0, _norm_cdf(z))))
 
 
-def _seed_from_key(key: str) -> int:
-    # Deterministic small seed derived from string content (portable across runs).
-    acc = 2166136261
-    for ch in key:
-        acc ^= ord(ch)
-        acc = (acc * 16777619) & 0xFFFFFFFF
-    return int(acc or 1)
-
-
-def _mean_std(values: list[float]) -> tuple[float, float]:
-    n = len(values)
-    if n <= 0:
-        return 0.0, 0.0
-    m = float(sum(values) / n)
-    if n <= 1:
-        return m, 0.0
-    var = sum((x - m) ** 2 for x in values) / max(1, n - 1)
-    return m, float(math.sqrt(max(var, 1e-12)))
-
-
-def _sample_skewness(values: list[float], mean: float, sd: float) -> float:
-    n = len(values)
-    if n < 3 or sd <= 1e-12:
-        return 0.0
-    num = sum(((x - mean) / sd) ** 3 for x in values)
-    return float((n / ((n - 1) * (n - 2))) * num)
-
-
-def _sample_excess_kurtosis(values: list[float], mean: float, sd: float) -> float:
-    n = len(values)
-    if n < 4 or sd <= 1e-12:
-        return 0.0
-    z4 = sum(((x - mean) / sd) ** 4 for x in values)
-    term1 = (n * (n + 1) * z4) / ((n - 1) * (n - 2) * (n - 3))
-    term2 = (3 * ((n - 1) ** 2)) / ((n - 2) * (n - 3))
-    return float(term1 - term2)
-
-
-def _psr_strict(sharpes: list[float], sr_benchmark: float = 0.0) -> float:
-    n = len(sharpes)
-    if n <= 0:
-        return 0.0
-    if n == 1:
-        return 1.0 if float(sharpes[0]) > sr_benchmark else 0.0
-    sr_hat, sd = _mean_std(sharpes)
-    if sd <= 1e-12:
-        return 1.0 if sr_hat > sr_benchmark else 0.0
-    skew = _sample_skewness(sharpes, sr_hat, sd)
-    ex_kurt = _sample_excess_kurtosis(sharpes, sr_hat, sd)
-    # Bailey-style PSR denominator: sqrt(1 - skew*SR + ((kurtosis-1)/4)*SR^2).
-    # With excess kurtosis: (kurtosis-1) = ex_kurt + 2.
-    denom_term = 1.0 - skew * sr_hat + 0.25 * (ex_kurt + 2.0) * (sr_hat ** 2)
-    denom = math.sqrt(max(denom_term, 1e-12))
-    z = (sr_hat - float(sr_benchmark)) * math.sqrt(max(1, n - 1)) / denom
-    return float(max(0.0, min(1.0, _NORM.cdf(z))))
-
-
-def _expected_max_sr_proxy(sharpes: list[float], trials_total: int) -> float:
-    if len(sharpes) <= 1:
-        return 0.0
-    _, sd = _mean_std(sharpes)
-    if sd <= 1e-12:
-        return 0.0
-    # DSR benchmark should be based on estimator uncertainty (SE), not raw fold dispersion.
-    se = sd / math.sqrt(max(1, len(sharpes)))
-    n_trials = max(2, int(trials_total))
-    euler_gamma = 0.5772156649
-    z1 = _NORM.inv_cdf(1.0 - (1.0 / n_trials))
-    z2 = _NORM.inv_cdf(1.0 - (1.0 / (n_trials * math.e)))
-    return float(se * (((1.0 - euler_gamma) * z1) + (euler_gamma * z2)))
-
-
-def _dsr_strict(sharpes: list[float], trials_total: int) -> tuple[float, float]:
-    sr_star = _expected_max_sr_proxy(sharpes, trials_total=trials_total)
-    dsr = _psr_strict(sharpes, sr_benchmark=sr_star)
-    return dsr, sr_star
-
-
-def _psr_bootstrap_proxy(sharpes: list[float], *, resamples: int, seed_key: str) -> float:
-    n = len(sharpes)
-    if n <= 0:
-        return 0.0
-    if n == 1:
-        return 1.0 if float(sharpes[0]) > 0 else 0.0
-    rnd = random.Random(_seed_from_key(seed_key))
-    pos = 0
-    vals = [float(x) for x in sharpes]
-    rs_n = max(32, int(resamples))
-    for _ in range(rs_n):
-        sample = [vals[rnd.randrange(n)] for _ in range(n)]
-        if (sum(sample) / n) > 0:
-            pos += 1
-    return float(pos / rs_n)
-
-
 def _dsr_proxy(psr_proxy: float, candidate_count: int, baseline: int | None = None) -> float:
     # Simple multiple-testing penalty proxy. Conservative but deterministic.
     if baseline is None:
@@ -380,52 +284,11 @@ def _tail_mean(sorted_values: list[float], q: float) -> float:
     return float(sum(sorted_values[:k]) / k)
 
 
-def _has_adjacent_indices(indices: tuple[int, ...]) -> bool:
-    if len(indices) <= 1:
-        return False
-    prev = indices[0]
-    for curr in indices[1:]:
-        if (curr - prev) <= 1:
-            return True
-        prev = curr
-    return False
-
-
-def _calendar_gap_days(a_start: date, a_end: date, b_start: date, b_end: date) -> int:
-    if a_end < b_start:
-        return int((b_start - a_end).days - 1)
-    if b_end < a_start:
-        return int((a_start - b_end).days - 1)
-    return -1
-
-
-def _combo_temporally_valid(
-    indices: tuple[int, ...],
-    fold_windows: list[dict | None],
-    *,
-    min_test_gap_days: int,
-    min_embargo_gap_days: int,
-) -> bool:
-    if len(indices) <= 1:
-        return True
-    for i_pos in range(len(indices)):
-        wi = fold_windows[indices[i_pos]] if indices[i_pos] < len(fold_windows) else None
-        if wi is None:
-            return False
-        for j_pos in range(i_pos + 1, len(indices)):
-            wj = fold_windows[indices[j_pos]] if indices[j_pos] < len(fold_windows) else None
-            if wj is None:
-                return False
-            gap = _calendar_gap_days(wi["test_start"], wi["test_end"], wj["test_start"], wj["test_end"])
-            if gap < 0:
-                return False
-            required_gap = max(
-                int(min_test_gap_days),
-                int(max(int(wi.get("embargo_days") or 0), int(wj.get("embargo_days") or 0)) + int(min_embargo_gap_days)),
-            )
-            if gap < required_gap:
-                return False
-    return True
+def _sorted_fold_rows(extra: dict | None, fold_order: dict[str, int]) -> list[dict]:
+    return sorted(
+        list((extra or {}).get("fold_rows") or []),
+        key=lambda fr: (fold_order.get(str(fr.get("fold_id") or ""), 10**9), str(fr.get("fold_id") or "")),
+    )
 
 
 def _cpcv_light_metrics(
@@ -438,8 +301,12 @@ def _cpcv_light_metrics(
     min_test_gap_days: int = 5,
     min_embargo_gap_days: int = 1,
     relaxation_mode: str = "allow",
+    engine: CpcvPathEngine | None = None,
+    path_values: list[float] | None = None,
 ) -> dict:
     # Q1-light proxy: evaluate combinations from min_combo_size to n-1 on fold metrics.
+    # Valid combinations come from the per-layout cache; path_values may be precomputed
+    # for many candidates at once (see CpcvPathEngine.path_means_by_candidate).
     n = len(sharpes)
     if n <= 1:
         val = sharpes[0] if sharpes else 0.0
@@ -464,75 +331,30 @@ def _cpcv_light_metrics(
             "effective_path_ratio": 1.0 if sharpes else 0.0,
             "temporal_filter_applied": bool(temporal_filter and bool(fold_windows)),
         }
-    requested_min_combo_size = max(1, int(min_combo_size))
-    combo_sizes = list(range(requested_min_combo_size, n))
-    if not combo_sizes:
-        # Never silently fall back to single-fold proxies when a stricter minimum combo
-        # size was requested; use the strongest feasible size for current fold count.
-        combo_sizes = [max(1, n - 1)]
-    requested_combo_sizes = list(combo_sizes)
-    policy_relaxations: list[str] = []
-
-    def _eval_combo_policy(*, combo_sizes_eval: list[int], skip_adjacent_eval: bool, temporal_filter_eval: bool) -> dict:
-        vals_eval: list[float] = []
-        combos_considered_eval = 0
-        combos_skipped_adjacent_eval = 0
-        combos_skipped_temporal_eval = 0
-        for k in combo_sizes_eval:
-            for idxs in itertools.combinations(range(n), k):
-                combos_considered_eval += 1
-                if skip_adjacent_eval and _has_adjacent_indices(idxs):
-                    combos_skipped_adjacent_eval += 1
-                    continue
-                if temporal_filter_eval and fold_windows:
-                    if not _combo_temporally_valid(
-                        idxs,
-                        fold_windows,
-                        min_test_gap_days=max(0, int(min_test_gap_days)),
-                        min_embargo_gap_days=max(0, int(min_embargo_gap_days)),
-                    ):
-                        combos_skipped_temporal_eval += 1
-                        continue
-                avg = sum(sharpes[i] for i in idxs) / len(idxs)
-                vals_eval.append(float(avg))
-        return {
-            "vals": vals_eval,
-            "combos_considered_total": int(combos_considered_eval),
-            "combos_skipped_adjacent_total": int(combos_skipped_adjacent_eval),
-            "combos_skipped_temporal_total": int(combos_skipped_temporal_eval),
-            "combos_effective_total": int(len(vals_eval)),
-        }
-
-    used_skip_adjacent = bool(skip_adjacent_folds)
-    used_temporal_filter = bool(temporal_filter)
-    relax_mode = str(relaxation_mode or "allow")
-    policy_eval = _eval_combo_policy(
-        combo_sizes_eval=combo_sizes,
-        skip_adjacent_eval=used_skip_adjacent,
-        temporal_filter_eval=used_temporal_filter,
+    engine = engine or _CPCV_ENGINE
+    layout = engine.layout(
+        n,
+        fold_windows=fold_windows,
+        min_combo_size=min_combo_size,
+        skip_adjacent_folds=skip_adjacent_folds,
+        temporal_filter=temporal_filter,
+        min_test_gap_days=min_test_gap_days,
+        min_embargo_gap_days=min_embargo_gap_days,
+        relaxation_mode=relaxation_mode,
     )
-    if relax_mode == "allow" and policy_eval["combos_effective_total"] <= 0 and used_skip_adjacent:
-        used_skip_adjacent = False
-        policy_relaxations.append("disable_skip_adjacent_when_no_effective_paths")
-        policy_eval = _eval_combo_policy(
-            combo_sizes_eval=combo_sizes,
-            skip_adjacent_eval=used_skip_adjacent,
-            temporal_filter_eval=used_temporal_filter,
-        )
-    if relax_mode == "allow" and policy_eval["combos_effective_total"] <= 0 and used_temporal_filter:
-        used_temporal_filter = False
-        policy_relaxations.append("disable_temporal_filter_when_no_effective_paths")
-        policy_eval = _eval_combo_policy(
-            combo_sizes_eval=combo_sizes,
-            skip_adjacent_eval=used_skip_adjacent,
-            temporal_filter_eval=used_temporal_filter,
-        )
-
-    vals = list(policy_eval["vals"])
-    combos_considered = int(policy_eval["combos_considered_total"])
-    combos_skipped_adjacent = int(policy_eval["combos_skipped_adjacent_total"])
-    combos_skipped_temporal = int(policy_eval["combos_skipped_temporal_total"])
-    effective_paths = int(policy_eval["combos_effective_total"])
+    combo_sizes = list(layout.combo_sizes)
+    requested_combo_sizes = list(layout.requested_combo_sizes)
+    policy_relaxations = list(layout.policy_relaxations)
+    used_skip_adjacent = layout.used_skip_adjacent
+    used_temporal_filter = layout.used_temporal_filter
+    relax_mode = str(relaxation_mode or "allow")
+    if path_values is None:
+        path_values = engine.path_means(layout, sharpes)[:, 0].tolist()
+    vals = [float(v) for v in path_values]
+    combos_considered = int(layout.combos_considered_total)
+    combos_skipped_adjacent = int(layout.combos_skipped_adjacent_total)
+    combos_skipped_temporal = int(layout.combos_skipped_temporal_total)
+    effective_paths = int(layout.combos_effective_total)
     fallback_to_mean_path = False
     if not vals and relax_mode == "allow":
         vals = [sum(sharpes) / n]
@@ -735,13 +557,46 @@ def main(argv: Iterable[str]) -> int:
     rows = []
     stress_rows = []
     temporal_filter_on = bool(args.cpcv_light_temporal_filter)
-    for row in eval_candidates.to_dicts():
-        cid = str(row.get("candidate_id") or "")
-        extra = per_candidate.get(cid) or {"fold_rows": []}
-        fold_rows = sorted(
-            list(extra.get("fold_rows") or []),
-            key=lambda fr: (fold_order.get(str(fr.get("fold_id") or ""), 10**9), str(fr.get("fold_id") or "")),
+    cpcv_policy = {
+        "min_combo_size": max(1, int(args.cpcv_light_min_combo_size)),
+        "skip_adjacent_folds": bool(args.cpcv_light_skip_adjacent_folds),
+        "temporal_filter": temporal_filter_on,
+        "min_test_gap_days": max(0, int(args.cpcv_light_min_test_gap_days)),
+        "min_embargo_gap_days": max(0, int(args.cpcv_light_min_embargo_gap_days)),
+        "relaxation_mode": str(args.cpcv_light_relaxation_mode),
+    }
+    eval_rows = eval_candidates.to_dicts()
+    fold_rows_by_cid = {
+        str(row.get("candidate_id") or ""): _sorted_fold_rows(per_candidate.get(str(row.get("candidate_id") or "")), fold_order)
+        for row in eval_rows
+    }
+    fold_inputs = {
+        cid: (
+            [float(fr.get("sharpe") or 0.0) for fr in fold_rows],
+            [fold_windows_by_id.get(str(fr.get("fold_id") or "")) for fr in fold_rows],
         )
+        for cid, fold_rows in fold_rows_by_cid.items()
+    }
+    # All CPCV path means in one gather per shared fold layout instead of per candidate.
+    cpcv_path_values = _CPCV_ENGINE.path_means_by_candidate(fold_inputs, **cpcv_policy)
+    cpcv_by_cid = {
+        cid: _cpcv_light_metrics(sharpes, fold_windows=windows, path_values=cpcv_path_values.get(cid), **cpcv_policy)
+        for cid, (sharpes, windows) in fold_inputs.items()
+    }
+    # PSR/DSR/bootstrap statistics for all candidates as candidates x folds matrices.
+    fold_stats = sharpe_stats_by_candidate(
+        {cid: sharpes for cid, (sharpes, _) in fold_inputs.items()},
+        trials_total=dsr_trials_total,
+        bootstrap_resamples=max(32, int(args.bootstrap_resamples)),
+        seed_key=lambda cid: f"{stage_a_run_id}:{cid}:psr_boot",
+    )
+    cpcv_stats = sharpe_stats_by_candidate(
+        {cid: [float(x) for x in (cpcv.get("path_sharpes") or [])] for cid, cpcv in cpcv_by_cid.items()},
+        trials_total={cid: max(int(cand_count), int(cpcv.get("paths_total") or 0), 2) for cid, cpcv in cpcv_by_cid.items()},
+    )
+    for row in eval_rows:
+        cid = str(row.get("candidate_id") or "")
+        fold_rows = fold_rows_by_cid[cid]
         fold_ids = [str(fr.get("fold_id") or "") for fr in fold_rows]
         fold_sharpes = [float(fr.get("sharpe") or 0.0) for fr in fold_rows]
         fold_ics = [float(fr.get("ic_5d") or 0.0) for fr in fold_rows]
@@ -756,24 +611,11 @@ def main(argv: Iterable[str]) -> int:
         temporal_meta_missing = sum(1 for fw in fold_windows if fw is None)
         psr = _psr_proxy(fold_sharpes)
         dsr = _dsr_proxy(psr, cand_count)
-        psr_strict = _psr_strict(fold_sharpes, sr_benchmark=0.0)
-        dsr_strict, sr_star_trials_proxy = _dsr_strict(fold_sharpes, trials_total=dsr_trials_total)
-        psr_boot = _psr_bootstrap_proxy(
-            fold_sharpes,
-            resamples=max(32, int(args.bootstrap_resamples)),
-            seed_key=f"{stage_a_run_id}:{cid}:psr_boot",
-        )
+        psr_strict = fold_stats[cid]["psr_strict"]
+        dsr_strict, sr_star_trials_proxy = fold_stats[cid]["dsr_strict"], fold_stats[cid]["sr_star"]
+        psr_boot = fold_stats[cid]["psr_bootstrap"]
         dsr_boot = _dsr_proxy(psr_boot, cand_count)
-        cpcv = _cpcv_light_metrics(
-            fold_sharpes,
-            fold_windows=fold_windows,
-            min_combo_size=max(1, int(args.cpcv_light_min_combo_size)),
-            skip_adjacent_folds=bool(args.cpcv_light_skip_adjacent_folds),
-            temporal_filter=temporal_filter_on,
-            min_test_gap_days=max(0, int(args.cpcv_light_min_test_gap_days)),
-            min_embargo_gap_days=max(0, int(args.cpcv_light_min_embargo_gap_days)),
-            relaxation_mode=str(args.cpcv_light_relaxation_mode),
-        )
+        cpcv = cpcv_by_cid[cid]
         # For feasible_min mode, cap each requirement by its own measurable ceiling
         # (effective paths, total paths, and combos considered respectively). This
         # avoids impossible strict requirements when temporal/adjacency filters
@@ -822,12 +664,8 @@ def main(argv: Iterable[str]) -> int:
                 )
             )
         )
-        cpcv_path_sharpes = [float(x) for x in (cpcv.get("path_sharpes") or [])]
-        cpcv_trials_total = max(int(cand_count), int(cpcv.get("paths_total") or 0), 2)
-        psr_cpcv_strict = _psr_strict(cpcv_path_sharpes, sr_benchmark=0.0) if cpcv_path_sharpes else 0.0
-        dsr_cpcv_strict, sr_star_cpcv_trials_proxy = (
-            _dsr_strict(cpcv_path_sharpes, trials_total=cpcv_trials_total) if cpcv_path_sharpes else (0.0, 0.0)
-        )
+        psr_cpcv_strict = cpcv_stats[cid]["psr_strict"]
+        dsr_cpcv_strict, sr_star_cpcv_trials_proxy = cpcv_stats[cid]["dsr_strict"], cpcv_stats[cid]["sr_star"]
         stress = _stress_lite_metrics(fold_sharpes, fold_turnovers, fold_maxdds, fold_spreads)
         rows.append(
             {
@@ -1381,6 +1219,7 @@ def main(argv: Iterable[str]) -> int:
             "folds": fold_summary.to_dicts(),
         },
         "fold_policy_validation": fold_policy_validation,
+        "cpcv_light_engine": {**_CPCV_ENGINE.stats(), "candidates_batched_total": len(cpcv_path_values)},
         "stress_lite_summary": {
             "scenarios_total": int(stress_df.get_column("scenario_id").n_unique() if stress_df.height else 0),
             "rows_total": int(stress_df.height),
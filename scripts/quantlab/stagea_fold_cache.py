@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""On-disk cache of Stage A fold train statistics and standardized test frames.
+
+An entry is keyed by a content hash of the fold's panel rows (per as-of date,
+so it survives panel rebuilds and shifting as-of windows), the train/test date
+windows and the feature-set version. It holds the train mean/std per feature as
+JSON and the standardized test frame as Arrow IPC, so reruns over other
+candidate profiles, top-liquid sizes or overnight sweep dates that land on the
+same fold skip the train scan and the z-scoring. The cache is bounded by
+``max_bytes``: a store that pushes it over budget evicts least-recently-used
+entries (mtime, bumped on every hit) down to 90% of the budget.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Iterable
+
+import polars as pl
+
+FOLD_CACHE_SCHEMA = "quantlab_stagea_fold_cache_v1"
+DEFAULT_FOLD_CACHE_MAX_MB = float(os.environ.get("RV_STAGEA_FOLD_CACHE_MAX_MB", "4096") or "0")
+
+
+def date_content_hashes(df: pl.DataFrame, date_col: str) -> dict[str, str]:
+    """sha256 per date over the sorted row hashes of every column (row order does not matter)."""
+    cols = sorted(df.columns)
+    hashed = df.select(pl.col(date_col).cast(pl.Utf8).alias("_d"), df.select(cols).hash_rows().alias("_h"))
+    out: dict[str, str] = {}
+    for part in hashed.sort(["_d", "_h"]).partition_by("_d", maintain_order=True):
+        h = hashlib.sha256(",".join(cols).encode("utf-8"))
+        h.update(part["_h"].to_numpy().tobytes())
+        out[str(part["_d"][0])] = h.hexdigest()
+    return out
+
+
+def fold_cache_key(date_hashes: dict[str, str], train_dates: Iterable[str], test_dates: Iterable[str], feature_set: str) -> str:
+    payload = {
+        "schema": FOLD_CACHE_SCHEMA,
+        "polars": pl.__version__,
+        "feature_set": feature_set,
+        "train": [[d, date_hashes.get(d, "")] for d in sorted(train_dates)],
+        "test": [[d, date_hashes.get(d, "")] for d in sorted(test_dates)],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+class FoldCache:
+    def __init__(self, root: Path, *, max_bytes: int = int(DEFAULT_FOLD_CACHE_MAX_MB * 1024 * 1024)) -> None:
+        self.root = Path(root)
+        self.max_bytes = max(0, int(max_bytes))
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._approx_bytes: int | None = None
+
+    def _paths(self, key: str) -> tuple[Path, Path]:
+        base = self.root / key[:2]
+        return base / f"{key}.json", base / f"{key}.arrow"
+
+    def load(self, key: str) -> tuple[dict[str, Any], pl.DataFrame] | None:
+        meta_path, frame_path = self._paths(key)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            frame = pl.read_ipc(frame_path).rechunk()
+        except (OSError, ValueError, pl.exceptions.PolarsError):
+            self.misses += 1
+            return None
+        if meta.get("schema") != FOLD_CACHE_SCHEMA or meta.get("key") != key:
+            self.misses += 1
+            return None
+        meta["train_stats"] = {name: (float(v[0]), float(v[1])) for name, v in (meta.get("train_stats") or {}).items()}
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+        self.hits += 1
+        return meta, frame
+
+    def store(self, key: str, train_stats: dict[str, tuple[float, float]], test_frame: pl.DataFrame, **meta: Any) -> None:
+        meta_path, frame_path = self._paths(key)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        suffix = f".{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        tmp_frame = frame_path.with_name(frame_path.name + suffix)
+        test_frame.write_ipc(tmp_frame, compression="zstd")
+        tmp_frame.replace(frame_path)
+        payload = {"schema": FOLD_CACHE_SCHEMA, "key": key, "train_stats": {k: list(v) for k, v in train_stats.items()}, **meta}
+        tmp_meta = meta_path.with_name(meta_path.name + suffix)
+        tmp_meta.write_text(json.dumps(payload, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        tmp_meta.replace(meta_path)
+        if self.max_bytes <= 0:
+            return
+        if self._approx_bytes is None:
+            self._approx_bytes = sum(size for _, _, size in self._entries())
+        else:
+            self._approx_bytes += frame_path.stat().st_size + meta_path.stat().st_size
+        if self._approx_bytes > self.max_bytes:
+            self.evict()
+
+    def _entries(self) -> list[tuple[float, str, int]]:
+        """(last-use mtime, key, bytes) per entry; the meta file's mtime marks the last hit."""
+        out = []
+        for meta_path in self.root.glob("*/*.json"):
+            frame_path = meta_path.with_suffix(".arrow")
+            try:
+                mtime = meta_path.stat().st_mtime
+                size = meta_path.stat().st_size + (frame_path.stat().st_size if frame_path.exists() else 0)
+            except OSError:
+                continue
+            out.append((mtime, meta_path.stem, size))
+        return out
+
+    def evict(self) -> dict[str, int]:
+        """Drop least-recently-used entries until the cache fits in 90% of max_bytes."""
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        for _, key, size in entries:
+            if total <= target:
+                break
+            for path in self._paths(key):
+                path.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+        self.evicted += evicted
+        self._approx_bytes = total
+        return {"evicted_entries": evicted, "bytes_after": total}
+
+    def stats(self) -> dict[str, Any]:
+        return {"root": str(self.root), "hits": self.hits, "misses": self.misses, "evicted": self.evicted, "max_bytes": self.max_bytes}
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""Batched Stage B sharpe statistics (PSR/DSR, higher moments, bootstrap PSR).
+
+Every function takes a candidates x folds sharpe matrix whose rows share one
+fold count; ``sharpe_stats_by_candidate`` groups ragged inputs by length. The
+arithmetic follows the per-candidate list formulas step by step (left-to-right
+fold sums, the same operation order). Cubes and fourth powers are explicit
+products rather than ``**``: NumPy's SIMD ``pow`` kernels depend on the host
+CPU, products do not. Skew/kurtosis (and so PSR/DSR) may therefore differ from
+the libm-based list formulas in the last ulp, but are identical on every host.
+
+The bootstrap keeps the per-candidate seed: each candidate's Mersenne Twister
+state comes from ``random.Random(seed_from_key(key))`` and is replayed through
+NumPy's MT19937, drawing the same resample indices ``randrange`` would.
+"""
+from __future__ import annotations
+
+import math
+import random
+from statistics import NormalDist
+from typing import Any, Callable
+
+import numpy as np
+
+NORM = NormalDist()
+EULER_GAMMA = 0.5772156649
+SD_FLOOR = 1e-12
+
+
+def seed_from_key(key: str) -> int:
+    # Deterministic small seed derived from string content (portable across runs).
+    acc = 2166136261
+    for ch in key:
+        acc ^= ord(ch)
+        acc = (acc * 16777619) & 0xFFFFFFFF
+    return int(acc or 1)
+
+
+def _as_matrix(sharpes: Any) -> np.ndarray:
+    values = np.asarray(sharpes, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[None, :]
+    return values
+
+
+def _row_sum(values: np.ndarray) -> np.ndarray:
+    acc = np.zeros(values.shape[0], dtype=np.float64)
+    for j in range(values.shape[1]):
+        acc += values[:, j]
+    return acc
+
+
+def mean_std(sharpes: Any) -> tuple[np.ndarray, np.ndarray]:
+    """Row mean and sample std (variance floored at 1e-12; std 0.0 below two folds)."""
+    values = _as_matrix(sharpes)
+    n = values.shape[1]
+    rows = values.shape[0]
+    if n <= 0:
+        return np.zeros(rows), np.zeros(rows)
+    mean = _row_sum(values) / n
+    if n <= 1:
+        return mean, np.zeros(rows)
+    dev = values - mean[:, None]
+    var = _row_sum(dev * dev) / max(1, n - 1)
+    return mean, np.sqrt(np.maximum(var, SD_FLOOR))
+
+
+def sample_skewness(sharpes: Any, mean: np.ndarray, sd: np.ndarray) -> np.ndarray:
+    values = _as_matrix(sharpes)
+    n = values.shape[1]
+    if n < 3:
+        return np.zeros(values.shape[0])
+    safe_sd = np.where(sd <= SD_FLOOR, 1.0, sd)
+    z = (values - mean[:, None]) / safe_sd[:, None]
+    num = _row_sum(z * z * z)
+    return np.where(sd <= SD_FLOOR, 0.0, (n / ((n - 1) * (n - 2))) * num)
+
+
+def sample_excess_kurtosis(sharpes: Any, mean: np.ndarray, sd: np.ndarray) -> np.ndarray:
+    values = _as_matrix(sharpes)
+    n = values.shape[1]
+    if n < 4:
+        return np.zeros(values.shape[0])
+    safe_sd = np.where(sd <= SD_FLOOR, 1.0, sd)
+    z = (values - mean[:, None]) / safe_sd[:, None]
+    z2 = z * z
+    z4 = _row_sum(z2 * z2)
+    term1 = (n * (n + 1) * z4) / ((n - 1) * (n - 2) * (n - 3))
+    term2 = (3 * ((n - 1) ** 2)) / ((n - 2) * (n - 3))
+    return np.where(sd <= SD_FLOOR, 0.0, term1 - term2)
+
+
+def _norm_cdf(z: np.ndarray) -> np.ndarray:
+    return np.array([NORM.cdf(float(v)) for v in z], dtype=np.float64)
+
+
+def psr_strict(sharpes: Any, sr_benchmark: Any = 0.0) -> np.ndarray:
+    """Probabilistic Sharpe ratio per row with the skew/kurtosis-adjusted denominator."""
+    values = _as_matrix(sharpes)
+    rows, n = values.shape
+    bench = np.broadcast_to(np.asarray(sr_benchmark, dtype=np.float64), (rows,))
+    if n <= 0:
+        return np.zeros(rows)
+    if n == 1:
+        return np.where(values[:, 0] > bench, 1.0, 0.0)
+    sr_hat, sd = mean_std(values)
+    skew = sample_skewness(values, sr_hat, sd)
+    ex_kurt = sample_excess_kurtosis(values, sr_hat, sd)
+    # Bailey-style PSR denominator: sqrt(1 - skew*SR + ((kurtosis-1)/4)*SR^2).
+    # With excess kurtosis: (kurtosis-1) = ex_kurt + 2.
+    denom_term = 1.0 - skew * sr_hat + 0.25 * (ex_kurt + 2.0) * (sr_hat * sr_hat)
+    denom = np.sqrt(np.maximum(denom_term, SD_FLOOR))
+    z = (sr_hat - bench) * math.sqrt(max(1, n - 1)) / denom
+    psr = np.clip(_norm_cdf(z), 0.0, 1.0)
+    return np.where(sd <= SD_FLOOR, np.where(sr_hat > bench, 1.0, 0.0), psr)
+
+
+def _expected_max_factor(trials_total: int) -> float:
+    n_trials = max(2, int(trials_total))
+    z1 = NORM.inv_cdf(1.0 - (1.0 / n_trials))
+    z2 = NORM.inv_cdf(1.0 - (1.0 / (n_trials * math.e)))
+    return ((1.0 - EULER_GAMMA) * z1) + (EULER_GAMMA * z2)
+
+
+def expected_max_sr(sharpes: Any, trials_total: Any) -> np.ndarray:
+    """Expected maximum SR under the null across ``trials_total`` trials (scalar or per row)."""
+    values = _as_matrix(sharpes)
+    rows, n = values.shape
+    if n <= 1:
+        return np.zeros(rows)
+    _, sd = mean_std(values)
+    # DSR benchmark should be based on estimator uncertainty (SE), not raw fold dispersion.
+    se = sd / math.sqrt(max(1, n))
+    trials = np.broadcast_to(np.asarray(trials_total, dtype=np.int64), (rows,))
+    factors = {int(t): _expected_max_factor(int(t)) for t in np.unique(trials)}
+    factor = np.array([factors[int(t)] for t in trials], dtype=np.float64)
+    return np.where(sd <= SD_FLOOR, 0.0, se * factor)
+
+
+def dsr_strict(sharpes: Any, trials_total: Any) -> tuple[np.ndarray, np.ndarray]:
+    """Deflated Sharpe ratio per row and the SR* benchmark it was deflated against."""
+    sr_star = expected_max_sr(sharpes, trials_total)
+    return psr_strict(sharpes, sr_benchmark=sr_star), sr_star
+
+
+def _randbelow_stream(seed: int, n: int, count: int) -> np.ndarray:
+    # random.Random(seed).randrange(n) repeated ``count`` times: top k bits of each
+    # 32-bit MT output, rejecting values >= n.
+    version, internal, _ = random.Random(seed).getstate()
+    bit_gen = np.random.MT19937()
+    bit_gen.state = {
+        "bit_generator": "MT19937",
+        "state": {"key": np.array(internal[:-1], dtype=np.uint32), "pos": int(internal[-1])},
+    }
+    shift = 32 - int(n).bit_length()
+    out = np.empty(0, dtype=np.int64)
+    while out.size < count:
+        need = count - out.size
+        draws = (bit_gen.random_raw(need + need // 2 + 16) >> shift).astype(np.int64)
+        out = np.concatenate([out, draws[draws < n][:need]])
+    return out
+
+
+def psr_bootstrap(sharpes: Any, *, resamples: int, seed_keys: list[str]) -> np.ndarray:
+    """Share of bootstrap resamples (with replacement) whose mean sharpe is positive."""
+    values = _as_matrix(sharpes)
+    rows, n = values.shape
+    if n <= 0:
+        return np.zeros(rows)
+    if n == 1:
+        return np.where(values[:, 0] > 0, 1.0, 0.0)
+    rs_n = max(32, int(resamples))
+    out = np.empty(rows, dtype=np.float64)
+    for i in range(rows):
+        idx = _randbelow_stream(seed_from_key(seed_keys[i]), n, rs_n * n).reshape(rs_n, n)
+        sample_means = _row_sum(values[i][idx]) / n
+        out[i] = int((sample_means > 0).sum()) / rs_n
+    return out
+
+
+def sharpe_stats_by_candidate(
+    sharpes_by_key: dict[str, list[float]],
+    *,
+    trials_total: int | dict[str, int],
+    bootstrap_resamples: int | None = None,
+    seed_key: Callable[[str], str] | None = None,
+) -> dict[str, dict[str, float]]:
+    """PSR, DSR, SR*, skew, excess kurtosis and (optionally) bootstrap PSR per key.
+
+    Keys are batched by fold count. ``seed_key`` maps a key to its bootstrap seed
+    string and is required when ``bootstrap_resamples`` is given.
+    """
+    by_len: dict[int, list[str]] = {}
+    for key, values in sharpes_by_key.items():
+        by_len.setdefault(len(values), []).append(key)
+    out: dict[str, dict[str, float]] = {}
+    for n, keys in by_len.items():
+        matrix = np.array([sharpes_by_key[k] for k in keys], dtype=np.float64).reshape(len(keys), n)
+        trials = trials_total if isinstance(trials_total, int) else [int(trials_total[k]) for k in keys]
+        mean, sd = mean_std(matrix)
+        skew = sample_skewness(matrix, mean, sd)
+        ex_kurt = sample_excess_kurtosis(matrix, mean, sd)
+        psr = psr_strict(matrix)
+        dsr, sr_star = dsr_strict(matrix, trials)
+        boot = None
+        if bootstrap_resamples is not None:
+            boot = psr_bootstrap(matrix, resamples=bootstrap_resamples, seed_keys=[seed_key(k) for k in keys])
+        for i, key in enumerate(keys):
+            out[key] = {
+                "psr_strict": float(psr[i]),
+                "dsr_strict": float(dsr[i]),
+                "sr_star": float(sr_star[i]),
+                "skew": float(skew[i]),
+                "excess_kurtosis": float(ex_kurt[i]),
+            }
+            if boot is not None:
+                out[key]["psr_bootstrap"] = float(boot[i])
+    return out
@@ -0,0 +1,41 @@
+import hashlib
+import tempfile
+import unittest
+from pathlib import Path
+
+import polars as pl
+
+from scripts.breakout_compute.lib.asset_buckets import BucketIndex, stable_bucket
+
+
+def _sha_bucket(asset_id, bucket_count):
+    return int.from_bytes(hashlib.sha256(asset_id.encode("utf-8")).digest()[:8], "big") % bucket_count
+
+
+class BucketIndexTest(unittest.TestCase):
+    def test_assign_matches_per_row_sha256_buckets(self):
+        ids = ["US:AAPL", "US:MSFT", "XETRA:SAP", "", "LSE:ÄÖÜ", "US:AAPL"] + [f"US:T{i}" for i in range(500)]
+        df = pl.DataFrame({"asset_id": ids + [None], "close": list(range(len(ids) + 1))})
+        index = BucketIndex(128)
+        got = index.assign(df)
+        self.assertEqual(got["_bucket"].dtype, pl.Int64)
+        self.assertEqual(got["_bucket"].to_list(), [_sha_bucket(value or "", 128) for value in ids + [None]])
+        self.assertEqual(got["_bucket"][0], stable_bucket("US:AAPL", 128))
+        self.assertEqual(index.hashed, len(set(ids)))
+
+    def test_persisted_index_is_reused_per_bucket_count(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "state" / "bucket_index.parquet"
+            index = BucketIndex(64)
+            index.assign(pl.DataFrame({"asset_id": ["US:A", "US:B"]}))
+            index.save(path)
+            reloaded = BucketIndex.load(path, 64)
+            got = reloaded.assign(pl.DataFrame({"asset_id": ["US:B", "US:A", "US:C"]}))
+            self.assertEqual(got["_bucket"].to_list(), [_sha_bucket(v, 64) for v in ["US:B", "US:A", "US:C"]])
+            self.assertEqual(reloaded.hashed, 1)
+            self.assertEqual(BucketIndex.load(path, 128).mapping, {})
+            self.assertEqual(BucketIndex.load(Path(tmp) / "missing.parquet", 64).mapping, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
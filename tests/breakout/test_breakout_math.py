@@ -1,9 +1,34 @@
+import random
 import unittest
 
+import numpy as np
+
 from scripts.breakout_compute.lib.breakout_math import (
+    absorption_vol_ratio,
+    cluster_support_zone,
+    clv_series,
+    cmf_series,
     compute_component_scores,
+    count_failed_lows,
+    detect_pivots,
     first_touch_outcome,
+    obv_higher_low,
     stable_event_id,
+    trend_slope,
+)
+from scripts.breakout_compute.lib.breakout_math_batch import (
+    absorption_vol_ratio_batch,
+    cluster_support_zone_batch,
+    clv_series_batch,
+    cmf_series_batch,
+    count_failed_lows_batch,
+    detect_pivots_batch,
+    first_touch_outcome_batch,
+    first_touch_record,
+    obv_higher_low_batch,
+    pack_rows,
+    support_zone_record,
+    trend_slope_batch,
 )
 
 
@@ -64,5 +89,134 @@ class BreakoutMathTest(unittest.TestCase):
         self.assertFalse(out["target_hit"])
 
 
+
+def _random_series(rng, n, *, null_rate):
+    out = {"open": [], "high": [], "low": [], "close": [], "volume": []}
+    price = rng.uniform(5, 200)
+    for _ in range(n):
+        price = max(0.5, price * (1 + rng.gauss(0, 0.02)))
+        open_ = round(price * (1 + rng.gauss(0, 0.01)), 2)
+        close = round(price, 2)
+        high = round(max(open_, close) * (1 + abs(rng.gauss(0, 0.01))), 2)
+        low = round(min(open_, close) * (1 - abs(rng.gauss(0, 0.01))), 2)
+        if rng.random() < 0.05:
+            high = low = open_ = close
+        for key, value in (("open", open_), ("high", high), ("low", low), ("close", close), ("volume", float(rng.randint(0, 10**6)))):
+            out[key].append(None if rng.random() < null_rate else value)
+    return out
+
+
+def _pack(series_list, key, align="right", width=None):
+    flat = [np.nan if v is None else v for s in series_list for v in s[key]]
+    return pack_rows(np.array(flat, dtype=np.float64), [len(s[key]) for s in series_list], width=width, align=align)
+
+
+def _as_list(row, n):
+    return [None if np.isnan(v) else float(v) for v in row[len(row) - n:]]
+
+
+class BreakoutMathBatchEquivalenceTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        rng = random.Random(42)
+        lengths = [0, 1, 2, 5, 6, 7, 12, 40, 64, 65, 66, 130] + [rng.randint(20, 260) for _ in range(40)]
+        cls.series = [_random_series(rng, n, null_rate=rng.choice([0.0, 0.03, 0.15])) for n in lengths]
+        cls.lengths = np.array(lengths)
+        cls.mats = {key: _pack(cls.series, key, width=270) for key in ("open", "high", "low", "close", "volume")}
+
+    def test_pivots_zone_and_failed_lows_match_scalar(self):
+        m = self.mats
+        pivot_high, pivot_low = detect_pivots_batch(m["high"], m["low"], lengths=self.lengths)
+        atr_pct = np.array([0.0, 0.01, 0.04, 0.08] * 13)[: len(self.series)]
+        lookback = np.minimum(120, self.lengths)
+        zone = cluster_support_zone_batch(pivot_low, atr_pct, lookback=lookback, lengths=self.lengths)
+        failed = count_failed_lows_batch(m["low"], m["close"], pivot_low, lookback=80)
+        for k, s in enumerate(self.series):
+            n = len(s["close"])
+            ref_high, ref_low = detect_pivots(s["high"], s["low"])
+            self.assertEqual(_as_list(pivot_high[k], n) if n else [], ref_high)
+            self.assertEqual(_as_list(pivot_low[k], n) if n else [], ref_low)
+            ref_zone = cluster_support_zone(ref_low, atr_pct=float(atr_pct[k]), lookback=int(lookback[k]))
+            self.assertEqual(support_zone_record(zone, k), ref_zone)
+            self.assertEqual(int(failed[k]), count_failed_lows(s["low"], s["close"], ref_low, lookback=80))
+        self.assertGreater(int(zone["detected"].sum()), 5)
+
+    def test_volume_and_trend_primitives_match_scalar(self):
+        m = self.mats
+        clv = clv_series_batch(m["high"], m["low"], m["close"], lengths=self.lengths)
+        cmf = cmf_series_batch(m["high"], m["low"], m["close"], m["volume"], window=20, lengths=self.lengths)
+        slope = trend_slope_batch(clv, lookback=20)
+        close_slope = trend_slope_batch(m["close"], lookback=30)
+        obv = obv_higher_low_batch(m["close"], m["volume"], lookback=60, lengths=self.lengths)
+        absorption = absorption_vol_ratio_batch(m["open"], m["close"], m["volume"], window=40)
+        for k, s in enumerate(self.series):
+            n = len(s["close"])
+            ref_clv = clv_series(s["high"], s["low"], s["close"])
+            self.assertEqual(_as_list(clv[k], n) if n else [], ref_clv)
+            ref_cmf = cmf_series(s["high"], s["low"], s["close"], s["volume"], window=20)
+            self.assertEqual(_as_list(cmf[k], n) if n else [], ref_cmf)
+            self.assertEqual(float(slope[k]), trend_slope(ref_clv, lookback=20))
+            self.assertEqual(float(close_slope[k]), trend_slope(s["close"], lookback=30))
+            self.assertEqual(bool(obv[k]), obv_higher_low(s["close"], s["volume"], lookback=60))
+            self.assertEqual(float(absorption[k]), absorption_vol_ratio(s["open"], s["close"], s["volume"], window=40))
+
+    def test_cmf_batch_is_quiet_on_non_finite_volume(self):
+        highs, lows, closes = np.array([[11.0, 12.0]]), np.array([[9.0, 8.0]]), np.array([[10.0, 11.0]])
+        volumes = np.array([[np.inf, 100.0]])
+        with np.errstate(all="raise"):
+            cmf = cmf_series_batch(highs, lows, closes, volumes, window=2)
+        self.assertEqual(cmf.shape, (1, 2))
+
+    def test_first_touch_outcome_matches_scalar(self):
+        rng = random.Random(7)
+        forwards, entries, atrs = [], [], []
+        for _ in range(200):
+            entry = rng.uniform(10, 100)
+            atr = rng.choice([0.0, rng.uniform(0.1, 3.0), rng.uniform(0.1, 3.0)])
+            bars = []
+            for _ in range(rng.choice([0, 1, 4, 12, 25])):
+                close = entry * (1 + rng.gauss(0, 0.03))
+                bar = {
+                    "open_raw": close * (1 + rng.gauss(0, 0.02)),
+                    "high_raw": close * (1 + abs(rng.gauss(0, 0.02))),
+                    "low_raw": close * (1 - abs(rng.gauss(0, 0.02))),
+                    "close_raw": close,
+                }
+                for key in bar:
+                    roll = rng.random()
+                    bar[key] = None if roll < 0.05 else 0.0 if roll < 0.08 else bar[key]
+                bars.append(bar)
+            forwards.append(bars)
+            entries.append(entry)
+            atrs.append(atr)
+        series = [{key: [bar[key] for bar in bars] for key in ("open_raw", "high_raw", "low_raw", "close_raw")} for bars in forwards]
+        mats = {key: _pack(series, key, align="left", width=25) for key in series[0]}
+        for horizon in (1, 5, 20):
+            out = first_touch_outcome_batch(
+                mats["high_raw"],
+                mats["low_raw"],
+                mats["open_raw"],
+                mats["close_raw"],
+                entry_price=np.array(entries),
+                atr=np.array(atrs),
+                horizon=horizon,
+                target_atr=2.0,
+                stop_atr=1.0,
+                gap_event_threshold_atr=0.5,
+                lengths=[len(bars) for bars in forwards],
+            )
+            for k, bars in enumerate(forwards):
+                ref = first_touch_outcome(
+                    bars,
+                    entry_price=entries[k],
+                    atr=atrs[k],
+                    horizon=horizon,
+                    target_atr=2.0,
+                    stop_atr=1.0,
+                    gap_event_threshold_atr=0.5,
+                )
+                self.assertEqual(first_touch_record(out, k), ref)
+
+
 if __name__ == "__main__":
     unittest.main()
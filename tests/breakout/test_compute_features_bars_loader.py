@@ -0,0 +1,89 @@
+import tempfile
+import unittest
+from datetime import date
+from pathlib import Path
+
+import polars as pl
+
+from scripts.breakout_compute.compute_features import _bars_file_catalog, _load_filtered_bars_df
+from scripts.quantlab.q1_common import read_json
+
+
+def _bars(asset_ids, dates, *, close, date_as_text=False, int_volume=False):
+    rows = [
+        {
+            "asset_id": aid,
+            "date": d.isoformat() if date_as_text else d,
+            "asset_class": "STOCK",
+            "open": close,
+            "high": close,
+            "low": close,
+            "close": close,
+            "volume": 10 if int_volume else 10.0,
+        }
+        for aid in asset_ids
+        for d in dates
+    ]
+    return pl.DataFrame(rows)
+
+
+class BarsLoaderTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name) / "bars"
+        stock = self.root / "asset_class=stock"
+        delta = self.root / "ingest_date=2026-03-10" / "asset_class=stock"
+        stock.mkdir(parents=True)
+        delta.mkdir(parents=True)
+        _bars(["US:A", "US:B"], [date(2026, 3, 5), date(2026, 3, 9)], close=1.0).write_parquet(stock / "part_001.parquet")
+        _bars(["US:C"], [date(2026, 3, 9)], close=2.0, date_as_text=True, int_volume=True).write_parquet(stock / "part_002.parquet")
+        _bars(["US:A"], [date(2026, 3, 9), date(2026, 3, 10)], close=3.0, date_as_text=True).write_parquet(delta / "delta_001.parquet")
+        (stock / "part_999.parquet").write_bytes(b"truncated")
+        self.config = {"input": {"lookback_calendar_days": 30, "history_pattern_bars": 5}}
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _load(self, asset_ids, catalog):
+        bars, paths, _ = _load_filtered_bars_df(
+            bars_root=self.root,
+            universe_df=pl.DataFrame({"asset_id": asset_ids}),
+            asof_date=date(2026, 3, 10),
+            feature_config=self.config,
+            bars_catalog=catalog,
+        )
+        self.assertEqual(len(paths), 4)
+        return bars
+
+    def test_single_scan_unifies_schemas_and_keeps_last_resolved_file(self):
+        # ingest_date=* files resolve before asset_class=* ones, so part_001 wins the 03-09 duplicate.
+        bars = self._load(["US:A", "US:C"], _bars_file_catalog(self.root))
+        self.assertEqual(
+            bars.select(["asset_id", "date", "close_raw", "bar_asset_class"]).rows(),
+            [
+                ("US:A", date(2026, 3, 5), 1.0, "stock"),
+                ("US:A", date(2026, 3, 9), 1.0, "stock"),
+                ("US:A", date(2026, 3, 10), 3.0, "stock"),
+                ("US:C", date(2026, 3, 9), 2.0, "stock"),
+            ],
+        )
+        self.assertEqual(bars["volume_raw"].dtype, pl.Float64)
+
+    def test_asset_file_index_skips_unrelated_files(self):
+        index_path = Path(self._tmp.name) / "index.json"
+        catalog = _bars_file_catalog(self.root, index_path=index_path)
+        index = read_json(index_path)
+        self.assertEqual(sorted(index["asset_sets"].values()), [["US:A"], ["US:A", "US:B"], ["US:C"]])
+        self.assertIsNone(index["files"][str(self.root / "asset_class=stock" / "part_999.parquet")]["dtypes"])
+        mtime = index_path.stat().st_mtime_ns
+        self.assertEqual(_bars_file_catalog(self.root, index_path=index_path)["files"], catalog["files"])
+        self.assertEqual(index_path.stat().st_mtime_ns, mtime)
+
+        # Files without US:C are never opened: corrupting them does not matter.
+        (self.root / "asset_class=stock" / "part_001.parquet").write_bytes(b"x" * 10)
+        bars = self._load(["US:C"], catalog)
+        self.assertEqual(bars["asset_id"].to_list(), ["US:C"])
+
+
+if __name__ == "__main__":
+    unittest.main()
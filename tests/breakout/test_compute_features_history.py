@@ -0,0 +1,100 @@
+import random
+import unittest
+from datetime import date, timedelta
+
+import polars as pl
+from polars.testing import assert_frame_equal
+
+from scripts.breakout_compute.compute_features import _compute_history_features, _history_feature_row
+
+
+def _asset_bars(rng, asset_id, n, *, null_rate=0.0, flat_rate=0.0, zero_high_rate=0.0):
+    rows = []
+    price = rng.uniform(5, 200)
+    day = date(2025, 1, 1)
+    for _ in range(n):
+        price = max(0.5, price * (1 + rng.gauss(0, 0.02)))
+        open_ = price * (1 + rng.gauss(0, 0.01))
+        high = max(open_, price) * (1 + abs(rng.gauss(0, 0.01)))
+        low = min(open_, price) * (1 - abs(rng.gauss(0, 0.01)))
+        if rng.random() < flat_rate:
+            high = low = open_ = price
+        row = {
+            "asset_id": asset_id,
+            "date": day,
+            "open_raw": round(open_, 4),
+            "high_raw": 0.0 if rng.random() < zero_high_rate else round(high, 4),
+            "low_raw": round(low, 4),
+            "close_raw": round(price, 4),
+            "volume_raw": float(rng.randint(0, 5_000_000)),
+        }
+        for key in ("open_raw", "high_raw", "low_raw", "close_raw", "volume_raw"):
+            if rng.random() < null_rate:
+                row[key] = None
+        rows.append(row)
+        day += timedelta(days=1)
+    return rows
+
+
+def _reference(bars_df, asset_ids, history_bars):
+    history_df = (
+        bars_df.filter(pl.col("asset_id").is_in(asset_ids))
+        .sort(["asset_id", "date"])
+        .group_by("asset_id", maintain_order=True)
+        .tail(history_bars)
+    )
+    rows = [
+        _history_feature_row(
+            aid[0],
+            g["open_raw"].to_list(),
+            g["high_raw"].to_list(),
+            g["low_raw"].to_list(),
+            g["close_raw"].to_list(),
+            g["volume_raw"].to_list(),
+        )
+        for aid, g in history_df.group_by("asset_id", maintain_order=True)
+    ]
+    return pl.DataFrame(rows)
+
+
+class HistoryFeatureKernelTest(unittest.TestCase):
+    def test_batched_kernel_matches_scalar_reference_exactly(self):
+        rng = random.Random(1234)
+        rows = []
+        specs = [
+            ("US:SHORT", 12, {}),
+            ("US:EDGE59", 59, {}),
+            ("US:EDGE60", 60, {}),
+            ("US:EDGE64", 64, {}),
+            ("US:EDGE65", 65, {}),
+            ("US:MID", 140, {"flat_rate": 0.1}),
+            ("US:GAPPY", 300, {"null_rate": 0.05}),
+            ("US:ZEROHIGH", 200, {"zero_high_rate": 0.2}),
+            ("US:LONG", 420, {}),
+        ]
+        for i in range(40):
+            specs.append((f"EU:R{i:02d}", rng.randint(55, 360), {"null_rate": rng.choice([0.0, 0.02])}))
+        for asset_id, n, kwargs in specs:
+            rows.extend(_asset_bars(rng, asset_id, n, **kwargs))
+        nan_rows = _asset_bars(rng, "US:NAN", 90)
+        nan_rows[40]["close_raw"] = float("nan")
+        rows.extend(nan_rows)
+        bars_df = pl.DataFrame(rows, schema_overrides={"date": pl.Date}).sample(fraction=1.0, shuffle=True, seed=7)
+        asset_ids = sorted({r["asset_id"] for r in rows})
+
+        got = _compute_history_features(bars_df=bars_df, asset_ids=asset_ids, history_bars=300)
+        want = _reference(bars_df, asset_ids, 300)
+        assert_frame_equal(got, want, check_exact=True)
+        self.assertGreater(got["support_zone_detected"].sum(), 0)
+        self.assertGreater(got["failed_low_count"].sum(), 0)
+
+    def test_short_histories_only(self):
+        rng = random.Random(5)
+        bars_df = pl.DataFrame(_asset_bars(rng, "US:A", 30) + _asset_bars(rng, "US:B", 10))
+        got = _compute_history_features(bars_df=bars_df, asset_ids=["US:A", "US:B"], history_bars=300)
+        self.assertEqual(got.columns, ["asset_id", "history_bars_used", "support_zone_detected"])
+        self.assertEqual(got["history_bars_used"].to_list(), [30, 10])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import random
+import unittest
+from datetime import date, timedelta
+
+import polars as pl
+
+from scripts.breakout_compute.evaluate_outcomes import evaluate_outcome_frames
+from scripts.breakout_compute.lib.breakout_math import first_touch_outcome
+
+HORIZONS = [1, 5, 20]
+
+
+def _fixture(seed):
+    rng = random.Random(seed)
+    bars = []
+    signals = []
+    for i in range(150):
+        asset_id = f"US:S{i:03d}"
+        price = rng.uniform(5, 100)
+        for j in range(rng.choice([0, 1, 3, 10, 25])):
+            price *= 1 + rng.gauss(0, 0.03)
+            open_ = price * (1 + rng.gauss(0, 0.02))
+            row = {
+                "asset_id": asset_id,
+                "date": date(2026, 3, 3) + timedelta(days=j),
+                "open_raw": open_,
+                "high_raw": max(open_, price) * 1.01,
+                "low_raw": min(open_, price) * 0.99,
+                "close_raw": price,
+            }
+            for key in ("open_raw", "high_raw", "low_raw", "close_raw"):
+                roll = rng.random()
+                if roll < 0.03:
+                    row[key] = None
+                elif roll < 0.04:
+                    row[key] = 0.0
+            if i % 37 == 5 and j == 2:
+                row["high_raw"] = float("nan")
+            bars.append(row)
+        atr = rng.choice([None, 0.0, float("nan"), rng.uniform(0.2, 3), rng.uniform(0.2, 3)])
+        signals.append({"asset_id": asset_id, "event_id": f"e{i}", "close": rng.choice([None, 0.0, price]), "atr14": atr})
+    signals.append({"asset_id": "US:NONE", "event_id": "none", "close": 10.0, "atr14": 1.0})
+    return pl.DataFrame(signals), pl.DataFrame(bars, schema_overrides={"date": pl.Date}).sort(["asset_id", "date"])
+
+
+def _reference(signals, bars, horizon):
+    by_asset = {str(part["asset_id"][0]): part.to_dicts() for part in bars.partition_by("asset_id", maintain_order=True)}
+    rows = []
+    for signal in signals.to_dicts():
+        forward = by_asset.get(signal["asset_id"], [])[: max(HORIZONS)]
+        entry = float((forward[0].get("open_raw") if forward else None) or signal.get("close") or 0.0)
+        atr = float(signal.get("atr14") or 0.0)
+        if atr <= 0 or entry <= 0:
+            forward = []
+            atr = max(atr, 1.0)
+        result = first_touch_outcome(
+            forward, entry_price=entry, atr=atr, horizon=horizon, target_atr=2.0, stop_atr=1.0, gap_event_threshold_atr=0.5
+        )
+        rows.append({"event_id": signal["event_id"], "entry_price": entry, "target_price": entry + atr * 2.0, **result})
+    return rows
+
+
+class EvaluateOutcomeFramesTest(unittest.TestCase):
+    def test_all_horizons_match_scalar_reference(self):
+        signals, bars = _fixture(11)
+        frames = evaluate_outcome_frames(
+            signals, bars, signal_date="2026-03-02", horizons=HORIZONS, target_atr=2.0, stop_atr=1.0, gap_threshold=0.5
+        )
+        for horizon in HORIZONS:
+            got = frames[horizon]
+            self.assertEqual(got["horizon"].unique().to_list(), [horizon])
+            self.assertEqual(got["benchmark_adjusted_return"].dtype, pl.Null)
+            want = _reference(signals, bars, horizon)
+            for row, expected in zip(got.to_dicts(), want):
+                for key, value in expected.items():
+                    if isinstance(value, float) and value != value:
+                        self.assertNotEqual(row[key], row[key], (horizon, expected["event_id"], key))
+                    else:
+                        self.assertEqual(row[key], value, (horizon, expected["event_id"], key))
+        self.assertGreater(frames[20]["gap_event"].sum(), 0)
+        self.assertEqual(set(frames[20]["first_touch"]), {"missing_forward_data", "time", "target", "stop"})
+
+    def test_no_horizons_yields_no_frames(self):
+        signals, bars = _fixture(3)
+        frames = evaluate_outcome_frames(
+            signals, bars, signal_date="2026-03-02", horizons=[], target_atr=2.0, stop_atr=1.0, gap_threshold=0.5
+        )
+        self.assertEqual(frames, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
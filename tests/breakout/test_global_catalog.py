@@ -0,0 +1,166 @@
+import importlib.util
+import json
+import random
+import tempfile
+import unittest
+from datetime import date, timedelta
+from pathlib import Path
+
+import duckdb
+import polars as pl
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+ASSETS = 6
+SESSIONS = ["2026-03-02", "2026-03-03"]
+
+
+def _load(name, filename):
+    spec = importlib.util.spec_from_file_location(name, REPO_ROOT / "scripts" / "breakout-v12" / filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _bars(days, end):
+    rng = random.Random(11)
+    rows = []
+    for i in range(ASSETS):
+        price = rng.uniform(5, 100)
+        for j in range(days):
+            price *= 1 + rng.gauss(0, 0.02)
+            rows.append(
+                {
+                    "asset_id": f"US:C{i:02d}",
+                    "date": (end - timedelta(days=days - 1 - j)).isoformat(),
+                    "asset_class": "stock",
+                    "open_raw": price,
+                    "high_raw": price * 1.01,
+                    "low_raw": price * 0.99,
+                    "close_raw": price,
+                    "volume_raw": float(rng.randint(10**5, 10**6)),
+                }
+            )
+    return pl.DataFrame(rows)
+
+
+def _final(con, as_of, score_sql, extra=""):
+    con.execute(
+        "CREATE OR REPLACE TEMP TABLE final AS SELECT 'US:A' AS asset_id, DATE '" + as_of + "' AS as_of, "
+        "'tech' AS sector, 0.5 AS sector_breadth_score, 0.4 AS market_regime_score, 1.2 AS rvol20, 0.1 AS ret_63d, "
+        "0.03 AS atr_pct_14, " + score_sql + " AS final_signal_score" + extra
+    )
+
+
+class GlobalCatalogTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.local = _load("compute_local_daily", "compute-local-daily.py")
+        self.global_ = _load("compute_global_daily", "compute-global-daily.py")
+        self.bench = _load("benchmark_global_catalog", "benchmark-global-catalog.py")
+        self.catalog = self.root / "catalog.duckdb"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _run_session(self, bars, as_of, last_good):
+        delta_root = self.root / "delta"
+        (delta_root / f"date={as_of}").mkdir(parents=True, exist_ok=True)
+        bars.filter(pl.col("date") == as_of).write_parquet(delta_root / f"date={as_of}" / "bucket=000.parquet")
+        candidate = self.root / f"candidate_{as_of}"
+        self.local.main([
+            "--as-of", as_of, "--candidate-root", str(candidate), "--last-good-root", str(last_good),
+            "--daily-delta-root", str(delta_root), "--bucket-count", "1", "--tail-bars", "120",
+        ])
+        self.global_.main(["--as-of", as_of, "--candidate-root", str(candidate), "--catalog-db", str(self.catalog)])
+        return candidate
+
+    def _snapshot(self):
+        con = duckdb.connect(str(self.catalog), read_only=True)
+        try:
+            return {
+                "scored": con.execute("SELECT catalog_as_of, count(*), count(DISTINCT asset_id) FROM scored_daily GROUP BY 1 ORDER BY 1").fetchall(),
+                "sector": con.execute("SELECT * FROM sector_daily ORDER BY ALL").fetchall(),
+                "regime": con.execute("SELECT * FROM regime_daily ORDER BY ALL").fetchall(),
+            }
+        finally:
+            con.close()
+
+    def test_two_sessions_are_keyed_by_run_as_of_and_reruns_are_idempotent(self):
+        bars = _bars(90, date.fromisoformat(SESSIONS[-1]))
+        seed = self.root / "seed"
+        (seed / "state" / "tail-bars").mkdir(parents=True)
+        bars.filter(pl.col("date") < SESSIONS[0]).write_parquet(seed / "state" / "tail-bars" / "bucket=000.parquet")
+
+        first = self._run_session(bars, SESSIONS[0], seed)
+        self._run_session(bars, SESSIONS[1], first)
+        snapshot = self._snapshot()
+        self.assertEqual(snapshot["scored"], [(SESSIONS[0], ASSETS, ASSETS), (SESSIONS[1], ASSETS, ASSETS)])
+        self.assertEqual(sorted({str(row[0])[:10] for row in snapshot["sector"]}), SESSIONS)
+        self.assertEqual(sorted({str(row[0])[:10] for row in snapshot["regime"]}), SESSIONS)
+
+        self._run_session(bars, SESSIONS[1], first)
+        self.assertEqual(self._snapshot(), snapshot)
+
+    def test_schema_drift_adds_columns_and_rejects_type_changes(self):
+        con = duckdb.connect()
+        _final(con, "2026-03-02", "1.5")
+        self.assertEqual(self.global_.update_catalog(con, "2026-03-02", 5)["scored_rows"], 1)
+        _final(con, "2026-03-03", "2.5", ", 7 AS extra")
+        result = self.global_.update_catalog(con, "2026-03-03", 5)
+        self.assertEqual((result["sessions"], result["scored_rows"], result["columns_added"]), (2, 2, ["extra"]))
+        self.assertEqual(con.execute("SELECT catalog_as_of, extra FROM scored_daily ORDER BY 1").fetchall(), [("2026-03-02", None), ("2026-03-03", 7)])
+
+        _final(con, "2026-03-04", "'x'")
+        with self.assertRaisesRegex(SystemExit, "column types changed: final_signal_score"):
+            self.global_.update_catalog(con, "2026-03-04", 5)
+        self.assertEqual(con.execute("SELECT count(*) FROM scored_daily").fetchone()[0], 2)
+        con.close()
+
+    def test_window_percentiles_rank_only_the_new_session(self):
+        con = duckdb.connect()
+        con.execute("CREATE VIEW asset_window_percentiles AS SELECT 1 AS legacy")
+        for as_of, score in (("2026-03-02", "1.5"), ("2026-03-03", "2.5"), ("2026-03-04", "2.0")):
+            _final(con, as_of, score)
+            self.global_.update_catalog(con, as_of, 2)
+        rows = con.execute(
+            "SELECT catalog_as_of, window_sessions, score_window_percentile FROM asset_window_percentiles ORDER BY 1"
+        ).fetchall()
+        # 2026-03-02 was trimmed; 2026-03-03 keeps the percentile it was archived with.
+        self.assertEqual(rows, [("2026-03-03", 2, 1.0), ("2026-03-04", 2, 0.5)])
+        con.close()
+
+    def test_window_percentiles_skip_null_history(self):
+        con = duckdb.connect()
+        for as_of, score in (("2026-03-02", "CAST(NULL AS DECIMAL(2,1))"), ("2026-03-03", "1.0"), ("2026-03-04", "2.0")):
+            _final(con, as_of, score)
+            self.global_.update_catalog(con, as_of, 5)
+        rows = con.execute(
+            "SELECT catalog_as_of, window_sessions, score_window_percentile FROM asset_window_percentiles ORDER BY 1"
+        ).fetchall()
+        self.assertEqual(rows, [("2026-03-02", 1, None), ("2026-03-03", 2, 1.0), ("2026-03-04", 3, 1.0)])
+        con.close()
+
+    def test_warm_run_scores_from_cached_metadata(self):
+        bars = _bars(90, date.fromisoformat(SESSIONS[0]))
+        seed = self.root / "seed"
+        (seed / "state" / "tail-bars").mkdir(parents=True)
+        bars.filter(pl.col("date") < SESSIONS[0]).write_parquet(seed / "state" / "tail-bars" / "bucket=000.parquet")
+        candidate = self._run_session(bars, SESSIONS[0], seed)
+        metadata = self.root / "meta.parquet"
+        pl.DataFrame(
+            [{"asset_id": f"US:C{i:02d}", "symbol": f"C{i:02d}", "name": f"Co {i}", "exchange": "US", "sector": ["tech", "energy"][i % 2], "asset_class": "stock"} for i in range(ASSETS)]
+        ).write_parquet(metadata)
+
+        report = self.root / "bench.json"
+        self.bench.main(["--as-of", SESSIONS[0], "--candidate-root", str(candidate), "--metadata-parquet", str(metadata), "--runs", "2", "--output", str(report)])
+        payload = json.loads(report.read_text())
+        self.assertTrue(payload["scores_identical"])
+        self.assertEqual(
+            [(run["mode"], run["metadata_refreshed"]) for run in payload["runs"]],
+            [("memory", None), ("memory", None), ("catalog_cold", True), ("catalog_warm", False), ("catalog_warm", False)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
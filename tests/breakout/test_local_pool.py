@@ -0,0 +1,117 @@
+import json
+import random
+import subprocess
+import sys
+import tempfile
+import unittest
+from datetime import date, timedelta
+from pathlib import Path
+
+import polars as pl
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+SCRIPT = REPO_ROOT / "scripts" / "breakout-v12" / "compute-local-daily.py"
+BUCKETS = 3
+AS_OF = "2026-03-02"
+VOLATILE_ENTRY_KEYS = {"wall_sec", "peak_rss_mb", "pid"}
+
+
+def _bars(days):
+    rng = random.Random(5)
+    end = date.fromisoformat(AS_OF)
+    rows = []
+    for i in range(9):
+        price = rng.uniform(5, 100)
+        for j in range(days):
+            price *= 1 + rng.gauss(0, 0.02)
+            rows.append(
+                {
+                    "asset_id": f"US:L{i:02d}",
+                    "date": (end - timedelta(days=days - 1 - j)).isoformat(),
+                    "asset_class": "stock",
+                    "open_raw": price,
+                    "high_raw": price * 1.01,
+                    "low_raw": price * 0.99,
+                    "close_raw": price,
+                    "volume_raw": float(rng.randint(10**5, 10**6)),
+                    "bucket": i % BUCKETS,
+                }
+            )
+    return pl.DataFrame(rows)
+
+
+def _stable_manifest(path):
+    manifest = json.loads(path.read_text(encoding="utf-8"))
+    manifest.pop("generated_at")
+    manifest.pop("pool")
+    manifest["buckets"] = [{k: v for k, v in entry.items() if k not in VOLATILE_ENTRY_KEYS} for entry in manifest["buckets"]]
+    return manifest
+
+
+class LocalPoolTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        bars = _bars(80)
+        seed_tail = self.root / "seed" / "state" / "tail-bars"
+        delta = self.root / "delta" / f"date={AS_OF}"
+        seed_tail.mkdir(parents=True)
+        delta.mkdir(parents=True)
+        for bucket in range(BUCKETS):
+            part = bars.filter(pl.col("bucket") == bucket).drop("bucket")
+            part.filter(pl.col("date") < AS_OF).write_parquet(seed_tail / f"bucket={bucket:03d}.parquet")
+            part.filter(pl.col("date") == AS_OF).write_parquet(delta / f"bucket={bucket:03d}.parquet")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _run(self, name, *extra):
+        candidate = self.root / name
+        subprocess.run(
+            [
+                sys.executable, str(SCRIPT), "--as-of", AS_OF, "--candidate-root", str(candidate),
+                "--last-good-root", str(self.root / "seed"), "--daily-delta-root", str(self.root / "delta"),
+                "--bucket-count", str(BUCKETS), "--tail-bars", "60", *extra,
+            ],
+            check=True,
+            capture_output=True,
+            cwd=REPO_ROOT,
+        )
+        return candidate
+
+    def _outputs(self, candidate):
+        return {
+            str(path.relative_to(candidate)): path.read_bytes()
+            for path in sorted(candidate.rglob("bucket=*.parquet"))
+        }
+
+    def test_pool_matches_serial_and_single_bucket_rerun_merges(self):
+        serial = self._run("serial", "--workers", "1")
+        pooled = self._run("pooled", "--workers", str(BUCKETS), "--max-rss-mb", "100000")
+        manifest = Path("local") / f"date={AS_OF}" / "local_manifest.json"
+
+        self.assertEqual(len(self._outputs(serial)), 2 * BUCKETS)
+        self.assertEqual(self._outputs(pooled), self._outputs(serial))
+        stable = _stable_manifest(serial / manifest)
+        self.assertEqual(
+            json.loads(json.dumps(_stable_manifest(pooled / manifest)).replace(str(pooled), str(serial))),
+            stable,
+        )
+        self.assertEqual(json.loads((pooled / manifest).read_text())["pool"]["workers"], BUCKETS)
+
+        self._run("pooled", "--bucket", "1")
+        merged = _stable_manifest(pooled / manifest)
+        self.assertEqual([entry["bucket"] for entry in merged["buckets"]], list(range(BUCKETS)))
+        self.assertEqual(
+            json.loads(json.dumps(merged).replace(str(pooled), str(serial))),
+            stable,
+        )
+
+    def test_tight_rss_budget_keeps_one_bucket_in_flight(self):
+        candidate = self._run("capped", "--workers", str(BUCKETS), "--max-rss-mb", "1")
+        pool = json.loads((candidate / "local" / f"date={AS_OF}" / "local_manifest.json").read_text())["pool"]
+        self.assertEqual((pool["workers"], pool["max_in_flight"]), (BUCKETS, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
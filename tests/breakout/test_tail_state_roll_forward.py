@@ -0,0 +1,116 @@
+import importlib.util
+import json
+import random
+import tempfile
+import unittest
+from datetime import date, timedelta
+from pathlib import Path
+
+import polars as pl
+
+from scripts.breakout_compute.lib.asset_buckets import BucketIndex
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+BUCKETS = 4
+TAIL_BARS = 20
+
+
+def _load_build_tail_state():
+    spec = importlib.util.spec_from_file_location("build_tail_state", REPO_ROOT / "scripts" / "breakout-v12" / "build-tail-state.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _bars(days):
+    rng = random.Random(7)
+    rows = []
+    for i in range(16):
+        price = rng.uniform(5, 100)
+        start = date(2026, 1, 1) + timedelta(days=rng.randint(0, 10))
+        for j in range(days):
+            day = start + timedelta(days=j)
+            price *= 1 + rng.gauss(0, 0.02)
+            rows.append(
+                {
+                    "asset_id": f"US:T{i:02d}",
+                    "date": day.isoformat(),
+                    "asset_class": "stock",
+                    "open_raw": price,
+                    "high_raw": price * 1.01,
+                    "low_raw": price * 0.99,
+                    "close_raw": price,
+                    "volume_raw": float(rng.randint(1, 10**6)),
+                }
+            )
+    return pl.DataFrame(rows)
+
+
+def _write_delta(root, as_of, rows):
+    date_root = root / f"date={as_of}"
+    date_root.mkdir(parents=True)
+    rows = BucketIndex(BUCKETS).assign(rows)
+    buckets = []
+    for bucket in range(BUCKETS):
+        path = date_root / f"bucket={bucket:03d}.parquet"
+        part = rows.filter(pl.col("_bucket") == bucket).drop("_bucket")
+        part.write_parquet(path)
+        buckets.append({"bucket": bucket, "path": str(path), "rows": part.height})
+    manifest = {"as_of": as_of, "bucket_count": BUCKETS, "buckets": buckets}
+    (date_root / "daily_delta_manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+
+
+class TailStateRollForwardTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.module = _load_build_tail_state()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _backfill(self, name, bars, as_of):
+        history = self.root / f"{name}_history"
+        history.mkdir()
+        bars.write_parquet(history / "bars.parquet")
+        out = self.root / name
+        args = ["--history-root", str(history), "--output-root", str(out), "--as-of", as_of]
+        self.module.main(args + ["--bucket-count", str(BUCKETS), "--tail-bars", str(TAIL_BARS)])
+        return out
+
+    def _roll(self, out, delta_root, as_of):
+        args = ["--roll-forward-delta-root", str(delta_root), "--output-root", str(out), "--as-of", as_of]
+        self.module.main(args + ["--bucket-count", str(BUCKETS), "--tail-bars", str(TAIL_BARS)])
+        return json.loads((out / "state" / "state_manifest.json").read_text(encoding="utf-8"))
+
+    def test_roll_forward_matches_backfill_and_chains_lineage(self):
+        bars = _bars(40)
+        cutoff = "2026-02-12"
+        rolled = self._backfill("rolled", bars.filter(pl.col("date") < cutoff), "2026-02-11")
+        first_hash = json.loads((rolled / "state" / "state_manifest.json").read_text(encoding="utf-8"))["lineage"]["hash"]
+
+        delta = bars.filter(pl.col("date") == cutoff).head(5)
+        _write_delta(self.root / "delta", cutoff, delta)
+        manifest = self._roll(rolled, self.root / "delta", cutoff)
+        rebuilt = self._backfill("rebuilt", pl.concat([bars.filter(pl.col("date") < cutoff), delta]), cutoff)
+
+        touched = set(BucketIndex(BUCKETS).assign(delta)["_bucket"].to_list())
+        self.assertEqual(set(manifest["lineage"]["buckets_written"]), touched)
+        self.assertEqual(manifest["lineage"]["previous_hash"], first_hash)
+        self.assertEqual([link["mode"] for link in manifest["lineage_chain"]], ["backfill", "roll_forward"])
+        for bucket in range(BUCKETS):
+            name = f"bucket={bucket:03d}.parquet"
+            got = pl.read_parquet(rolled / "state" / "tail-bars" / name)
+            self.assertTrue(got.equals(pl.read_parquet(rebuilt / "state" / "tail-bars" / name)), name)
+        self.assertEqual(manifest["counts"]["rows"], sum(entry["rows"] for entry in manifest["buckets"]))
+
+        again = self._roll(rolled, self.root / "delta", cutoff)
+        self.assertEqual(again["lineage"]["buckets_written"], [])
+        self.assertEqual(again["lineage"]["previous_hash"], manifest["lineage"]["hash"])
+        _write_delta(self.root / "delta", "2026-02-01", delta)
+        with self.assertRaisesRegex(SystemExit, "before tail-state as-of"):
+            self._roll(rolled, self.root / "delta", "2026-02-01")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import pyarrow.parquet as pq
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+SCRIPT = REPO_ROOT / "scripts" / "hist-probs" / "export_profiles_to_parquet.py"
+
+
+def _load_exporter():
+    spec = importlib.util.spec_from_file_location("export_profiles_to_parquet", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _profile(ticker, latest="2026-03-20", events=2):
+    metrics = {"n": 10, "avg_return": 0.01, "median_return": 0.0, "std_return": 0.1, "win_rate": 0.5, "max_drawdown": -0.2, "mae": -0.03, "mfe": 0.04}
+    return {
+        "ticker": ticker,
+        "computed_at": "2026-03-26T08:28:36.483Z",
+        "bars_count": 100,
+        "latest_date": latest,
+        "events": {f"event_{i}": {"h5d": metrics, "h10d": metrics} for i in range(events)},
+    }
+
+
+class ExportProfilesToParquetTest(unittest.TestCase):
+    def setUp(self):
+        self.exporter = _load_exporter()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.input = self.root / "in"
+        (self.input / "AA").mkdir(parents=True)
+        (self.input / "MS").mkdir()
+        (self.input / "run-summary.json").write_text(json.dumps({"tickers_total": 2}))
+        (self.input / "AAPL.json").write_text(json.dumps(_profile("AAPL", latest="2025-01-02")))
+        (self.input / "AA" / "AAPL.json").write_text(json.dumps(_profile("AAPL")))
+        (self.input / "MS" / "MSFT.json").write_text(json.dumps(_profile("MSFT", events=1)))
+        (self.input / "IBM.json").write_text(json.dumps({"events": {}, "ticker": "IBM"}))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _run(self, *extra):
+        argv = ["export_profiles_to_parquet.py", "--input-root", str(self.input), "--output-root", str(self.root / "out"), "--workers", "1", *extra]
+        old_argv, sys.argv = sys.argv, argv
+        try:
+            self.assertEqual(self.exporter.main(), 0)
+        finally:
+            sys.argv = old_argv
+        return json.loads((self.root / "out" / "manifest.json").read_text())
+
+    def _rows(self):
+        rows = []
+        for path in sorted((self.root / "out").glob("symbol_prefix=*/part.parquet")):
+            rows.extend(pq.read_table(path).to_pylist())
+        return rows
+
+    def test_picks_sharded_profile_and_skips_non_profiles(self):
+        sources = self.exporter.pick_profile_sources(self.input, None, None)
+        self.assertEqual(sorted(sources), ["AAPL", "IBM", "MSFT"])
+        self.assertEqual(sources["AAPL"][0][0], str(self.input / "AA" / "AAPL.json"))
+        manifest = self._run()
+        self.assertEqual((manifest["profiles"], manifest["empty_profiles"], manifest["rows"]), (3, 1, 6))
+        rows = self._rows()
+        self.assertEqual({row["latest_date"] for row in rows if row["ticker"] == "AAPL"}, {"2026-03-20"})
+        self.assertEqual([row["horizon"] for row in rows if row["ticker"] == "MSFT"], ["10d", "5d"])
+
+    def test_incremental_run_reparses_only_changed_profiles(self):
+        self._run()
+        msft = self.input / "MS" / "MSFT.json"
+        msft.write_text(json.dumps(_profile("MSFT", latest="2026-04-01", events=3)))
+        os.utime(msft, ns=(msft.stat().st_atime_ns, msft.stat().st_mtime_ns + 1_000_000))
+        (self.input / "IBM.json").unlink()
+        manifest = self._run()
+        self.assertTrue(manifest["incremental"])
+        self.assertEqual((manifest["profiles_parsed"], manifest["profiles_unchanged"], manifest["profiles_removed"]), (1, 1, 1))
+        self.assertEqual(manifest["written_files"], [str(self.root / "out" / "symbol_prefix=MS" / "part.parquet")])
+        rows = self._rows()
+        self.assertEqual(len(rows), 10)
+        self.assertEqual({row["latest_date"] for row in rows if row["ticker"] == "MSFT"}, {"2026-04-01"})
+        self.assertEqual(self._run()["profiles_parsed"], 0)
+
+    def test_missing_prefix_file_is_re_exported_whole(self):
+        (self.input / "AA" / "AAL.json").write_text(json.dumps(_profile("AAL", events=1)))
+        self._run()
+        before = self._rows()
+        (self.root / "out" / "symbol_prefix=AA" / "part.parquet").unlink()
+
+        manifest = self._run("--tickers", "AAL")
+        self.assertEqual(manifest["prefixes_missing_rebuilt"], ["AA"])
+        self.assertEqual(manifest["profiles_parsed"], 2)
+        self.assertEqual(self._rows(), before)
+
+        (self.root / "out" / "symbol_prefix=AA" / "part.parquet").unlink()
+        aal = self.input / "AA" / "AAL.json"
+        aal.write_text(json.dumps(_profile("AAL", latest="2026-04-01", events=1)))
+        os.utime(aal, ns=(aal.stat().st_atime_ns, aal.stat().st_mtime_ns + 1_000_000))
+        manifest = self._run()
+        self.assertEqual(manifest["prefixes_missing_rebuilt"], ["AA"])
+        rows = self._rows()
+        self.assertEqual(sorted({row["ticker"] for row in rows}), ["AAL", "AAPL", "MSFT"])
+        self.assertEqual({row["latest_date"] for row in rows if row["ticker"] == "AAL"}, {"2026-04-01"})
+        self.assertEqual(self._run()["prefixes_missing_rebuilt"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
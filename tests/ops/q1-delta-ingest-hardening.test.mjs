@@ -62,7 +62,7 @@ test('q1 runner does not publish success before completion and protects full-sca
   assert.match(content, /--force-pack-file/);
   assert.match(content, /def _load_force_packs/);
   assert.match(content, /def flatten_delta_rows_for_pack/);
-  assert.match(content, /rows_by_class, per_pack_stats, filter_stats_total, emitted_latest_dates = flatten_delta_rows_for_pack/);
+  assert.match(content, /per_pack_stats, filter_stats_total, emitted_latest_dates = flatten_delta_rows_for_pack/);
   assert.match(content, /state\["pack_selection"\]/);
   assert.match(content, /commit_cache=not bool\(args\.full_scan_packs\)/);
   assert.match(content, /resume_incomplete_full_scan/);
@@ -0,0 +1,244 @@
+import asyncio
+import gzip
+import json
+import os
+import threading
+import time
+import unittest
+import urllib.error
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from scripts.quantlab import async_http_fetch
+from scripts.quantlab.async_http_fetch import (
+    AsyncFetchEngine,
+    BackgroundFetchEngine,
+    TokenBucket,
+    backoff_delay,
+    close_shared_fetch_engine,
+    parse_retry_after,
+    shared_fetch_engine,
+    shared_fetch_stats,
+)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *_args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        server.hits[self.path] = server.hits.get(self.path, 0) + 1
+        server.client_ports.add(self.client_address[1])
+        hits = server.hits[self.path]
+        if self.path.startswith("http://"):
+            self._send(200, json.dumps({"proxied": self.path, "auth": self.headers.get("Proxy-Authorization")}).encode())
+        elif self.path.startswith("/ok"):
+            self._send(200, json.dumps({"path": self.path}).encode(), {"Content-Type": "application/json"})
+        elif self.path == "/throttled":
+            if hits == 1:
+                self._send(429, b"slow down", {"Retry-After": "0.2"})
+            else:
+                self._send(200, b'{"ok": true}')
+        elif self.path == "/flaky":
+            self._send(503 if hits < 3 else 200, b'{"hits": %d}' % hits)
+        elif self.path == "/broken":
+            self._send(500, b"nope")
+        elif self.path == "/moved":
+            self._send(301, b"", {"Location": "/ok/moved"})
+        elif self.path == "/loop":
+            self._send(302, b"", {"Location": "/loop"})
+        elif self.path == "/offsite":
+            self._send(307, b"", {"Location": "http://other.example.test/ok"})
+        elif self.path == "/missing":
+            self._send(404, b'{"error": "missing"}')
+        elif self.path == "/gzip-chunked":
+            payload = gzip.compress(b'{"compressed": true}')
+            self.send_response(200)
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for part in (payload[:5], payload[5:]):
+                self.wfile.write(b"%x\r\n" % len(part) + part + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+
+class AsyncHttpFetchTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+        cls.server.hits = {}
+        cls.server.client_ports = set()
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.hits.clear()
+        self.server.client_ports.clear()
+
+    def _engine(self, **kwargs):
+        kwargs.setdefault("backoff_base_sec", 0.01)
+        kwargs.setdefault("backoff_max_sec", 0.05)
+        kwargs.setdefault("seed", 7)
+        kwargs.setdefault("trust_env", False)
+        return AsyncFetchEngine(**kwargs)
+
+    def test_keep_alive_reuses_one_connection(self):
+        async def run():
+            engine = self._engine(max_connections_per_host=1)
+            results = [await engine.fetch(f"{self.base}/ok/{i}") for i in range(5)]
+            await engine.aclose()
+            return engine, results
+
+        engine, results = asyncio.run(run())
+        self.assertEqual([r.json()["path"] for r in results], [f"/ok/{i}" for i in range(5)])
+        self.assertEqual(engine.stats.connections_opened, 1)
+        self.assertEqual(engine.stats.connections_reused, 4)
+        self.assertEqual(len(self.server.client_ports), 1)
+
+    def test_http_proxy_from_environment(self):
+        proxy = f"http://user:pw@127.0.0.1:{self.server.server_address[1]}"
+
+        async def run(no_proxy):
+            with mock.patch.dict(os.environ, {"HTTP_PROXY": proxy, "NO_PROXY": no_proxy}):
+                engine = self._engine(trust_env=True)
+            result = await engine.fetch("http://quotes.example.test/ok/x?s=1")
+            await engine.aclose()
+            return result
+
+        body = asyncio.run(run("")).json()
+        self.assertEqual(body["proxied"], "http://quotes.example.test/ok/x?s=1")
+        self.assertEqual(body["auth"], "Basic dXNlcjpwdw==")
+        with self.assertRaises(OSError):
+            asyncio.run(run("example.test"))
+
+    def test_429_respects_retry_after(self):
+        async def run():
+            engine = self._engine()
+            started = time.monotonic()
+            result = await engine.fetch(f"{self.base}/throttled")
+            return engine, result, time.monotonic() - started
+
+        engine, result, elapsed = asyncio.run(run())
+        self.assertEqual(result.status, 200)
+        self.assertEqual(result.attempts, 2)
+        self.assertEqual(engine.stats.throttled_429, 1)
+        self.assertGreaterEqual(elapsed, 0.19)
+
+    def test_transient_5xx_retried_then_http_error_when_exhausted(self):
+        async def run():
+            engine = self._engine(max_retries=3)
+            ok = await engine.fetch(f"{self.base}/flaky")
+            with self.assertRaises(urllib.error.HTTPError) as ctx:
+                await engine.fetch(f"{self.base}/broken")
+            return ok, ctx.exception
+
+        ok, err = asyncio.run(run())
+        self.assertEqual(ok.attempts, 3)
+        self.assertEqual(err.code, 500)
+        self.assertEqual(self.server.hits["/broken"], 3)
+
+    def test_non_retryable_status_is_returned_once(self):
+        async def run():
+            engine = self._engine(max_retries=5)
+            return await engine.fetch(f"{self.base}/missing", raise_for_status=False)
+
+        result = asyncio.run(run())
+        self.assertEqual(result.status, 404)
+        self.assertEqual(result.attempts, 1)
+        self.assertEqual(self.server.hits["/missing"], 1)
+
+    def test_redirects_are_followed_within_bounds(self):
+        async def run():
+            engine = self._engine(max_redirects=3)
+            moved = await engine.fetch(f"{self.base}/moved")
+            with self.assertRaises(urllib.error.HTTPError) as loop:
+                await engine.fetch(f"{self.base}/loop")
+            with self.assertRaises(urllib.error.HTTPError) as offsite:
+                await engine.fetch(f"{self.base}/offsite")
+            await engine.aclose()
+            return moved, loop.exception, offsite.exception
+
+        moved, loop, offsite = asyncio.run(run())
+        self.assertEqual((moved.status, moved.url), (200, f"{self.base}/ok/moved"))
+        self.assertEqual(moved.json()["path"], "/ok/moved")
+        self.assertEqual(loop.code, 302)
+        self.assertEqual(self.server.hits["/loop"], 4)
+        # A cross-origin hop to plain http is not followed.
+        self.assertEqual(offsite.code, 307)
+
+    def test_chunked_gzip_body_is_decoded(self):
+        async def run():
+            return await self._engine().fetch(f"{self.base}/gzip-chunked")
+
+        self.assertEqual(asyncio.run(run()).json(), {"compressed": True})
+
+    def test_background_engine_serves_threaded_callers(self):
+        engine = BackgroundFetchEngine(max_connections_per_host=2, seed=1)
+        try:
+            results = []
+            threads = [
+                threading.Thread(target=lambda i=i: results.append(engine.fetch_json(f"{self.base}/ok/t{i}")[0]))
+                for i in range(6)
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            engine.close()
+        self.assertEqual(sorted(r["path"] for r in results), sorted(f"/ok/t{i}" for i in range(6)))
+        self.assertLessEqual(engine.stats.connections_opened, 2)
+
+    def test_shared_stats_do_not_start_an_engine(self):
+        close_shared_fetch_engine()
+        self.assertEqual(shared_fetch_stats()["requests"], 0)
+        self.assertIsNone(async_http_fetch._SHARED_ENGINE)
+        self.assertEqual(close_shared_fetch_engine()["requests"], 0)
+
+        shared_fetch_engine().fetch(f"{self.base}/ok/shared")
+        self.assertEqual(shared_fetch_stats()["requests"], 1)
+        self.assertEqual(close_shared_fetch_engine()["requests"], 1)
+        self.assertIsNone(async_http_fetch._SHARED_ENGINE)
+
+
+class LimiterAndBackoffTest(unittest.TestCase):
+    def test_token_bucket_paces_after_burst(self):
+        async def run():
+            bucket = TokenBucket(rate_per_sec=20, burst=2)
+            started = time.monotonic()
+            for _ in range(6):
+                await bucket.acquire()
+            return time.monotonic() - started
+
+        self.assertGreaterEqual(asyncio.run(run()), 0.18)
+
+    def test_backoff_is_capped_and_jittered(self):
+        delays = [backoff_delay(attempt, base_sec=1.0, max_sec=4.0) for attempt in range(1, 8)]
+        self.assertTrue(all(0 < d <= 4.0 for d in delays))
+        self.assertGreaterEqual(delays[-1], 2.0)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("3"), 3.0)
+        self.assertIsNone(parse_retry_after(""))
+        self.assertAlmostEqual(parse_retry_after("Thu, 01 Jan 1970 00:01:40 GMT", now=40.0), 60.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import itertools
+import random
+import unittest
+from datetime import date, timedelta
+
+from scripts.quantlab.cpcv_paths import CpcvPathEngine
+
+
+def _reference(sharpes, windows, min_combo_size, skip_adjacent, temporal, test_gap, embargo_gap):
+    n = len(sharpes)
+
+    def valid_pair(i, j):
+        wi, wj = windows[i], windows[j]
+        if wi is None or wj is None:
+            return False
+        if wi["test_end"] < wj["test_start"]:
+            gap = (wj["test_start"] - wi["test_end"]).days - 1
+        elif wj["test_end"] < wi["test_start"]:
+            gap = (wi["test_start"] - wj["test_end"]).days - 1
+        else:
+            return False
+        return gap >= max(test_gap, max(wi["embargo_days"], wj["embargo_days"]) + embargo_gap)
+
+    paths = []
+    for k in list(range(min_combo_size, n)) or [max(1, n - 1)]:
+        for combo in itertools.combinations(range(n), k):
+            if skip_adjacent and any(b - a <= 1 for a, b in zip(combo, combo[1:])):
+                continue
+            if temporal and windows and not all(valid_pair(a, b) for a, b in itertools.combinations(combo, 2)):
+                continue
+            total = 0.0
+            for i in combo:
+                total += sharpes[i]
+            paths.append(total / k)
+    return paths
+
+
+def _windows(rng, n):
+    out = []
+    for _ in range(n):
+        start = date(2025, 1, 1) + timedelta(days=rng.randint(0, 300))
+        out.append({"test_start": start, "test_end": start + timedelta(days=rng.randint(5, 40)), "embargo_days": rng.randint(0, 5)})
+    return out
+
+
+class CpcvPathEngineTest(unittest.TestCase):
+    def test_matches_itertools_enumeration(self):
+        rng = random.Random(11)
+        engine = CpcvPathEngine()
+        for _ in range(200):
+            n = rng.randint(2, 8)
+            windows = _windows(rng, n)
+            sharpes = [rng.gauss(0, 1) for _ in range(n)]
+            policy = dict(
+                min_combo_size=rng.randint(1, 3),
+                skip_adjacent_folds=rng.random() < 0.5,
+                temporal_filter=rng.random() < 0.7,
+                min_test_gap_days=rng.randint(0, 10),
+                min_embargo_gap_days=rng.randint(0, 3),
+                relaxation_mode="strict_fail",
+            )
+            layout = engine.layout(n, fold_windows=windows, **policy)
+            expected = _reference(
+                sharpes,
+                windows,
+                policy["min_combo_size"],
+                policy["skip_adjacent_folds"],
+                policy["temporal_filter"],
+                policy["min_test_gap_days"],
+                policy["min_embargo_gap_days"],
+            )
+            self.assertEqual(engine.path_means(layout, sharpes)[:, 0].tolist(), expected)
+            self.assertEqual(layout.combos_effective_total, len(expected))
+
+    def test_relaxation_ladder_and_layout_cache(self):
+        engine = CpcvPathEngine()
+        overlapping = [{"test_start": date(2025, 1, 1), "test_end": date(2025, 3, 1), "embargo_days": 0}] * 3
+        kwargs = dict(fold_windows=overlapping, min_combo_size=2, skip_adjacent_folds=True, temporal_filter=True, min_test_gap_days=0, min_embargo_gap_days=0)
+        relaxed = engine.layout(3, relaxation_mode="allow", **kwargs)
+        self.assertEqual(
+            relaxed.policy_relaxations,
+            ["disable_skip_adjacent_when_no_effective_paths", "disable_temporal_filter_when_no_effective_paths"],
+        )
+        self.assertFalse(relaxed.used_skip_adjacent or relaxed.used_temporal_filter)
+        self.assertEqual(relaxed.combos_effective_total, 3)
+        strict = engine.layout(3, relaxation_mode="strict_fail", **kwargs)
+        self.assertEqual(strict.combos_effective_total, 0)
+        self.assertIs(engine.layout(3, relaxation_mode="allow", **kwargs), relaxed)
+        self.assertEqual(engine.stats(), {"layouts_cached": 2, "layout_builds": 2})
+
+    def test_batched_candidates_share_layout(self):
+        engine = CpcvPathEngine()
+        windows = _windows(random.Random(3), 5)
+        policy = dict(min_combo_size=2, skip_adjacent_folds=False, temporal_filter=False, min_test_gap_days=0, min_embargo_gap_days=0, relaxation_mode="allow")
+        folds = {f"c{i}": ([0.1 * i + j for j in range(5)], windows) for i in range(4)}
+        folds["single"] = ([0.5], windows[:1])
+        out = engine.path_means_by_candidate(folds, **policy)
+        self.assertNotIn("single", out)
+        for cid, (sharpes, _) in folds.items():
+            if cid != "single":
+                self.assertEqual(out[cid], _reference(sharpes, windows, 2, False, False, 0, 0))
+        self.assertEqual(engine.layout_builds, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
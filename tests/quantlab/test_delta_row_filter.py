@@ -0,0 +1,57 @@
+import unittest
+
+import pyarrow as pa
+
+from scripts.quantlab.raw_bars_writer import RAW_BARS_SCHEMA
+from scripts.quantlab.run_daily_delta_ingest_q1 import filter_rows_newer_than_latest, filter_table_newer_than_latest
+
+
+def _row(asset_id, date, o=10.0, h=11.0, l=9.0, c=10.5, v=100.0):
+    return {"asset_id": asset_id, "date": date, "open_raw": o, "high_raw": h, "low_raw": l, "close_raw": c, "volume_raw": v}
+
+
+ROWS = [
+    _row("US:A", "2026-03-02"),
+    _row("US:A", "2026-03-03"),
+    _row("US:A", "2026-03-03"),
+    _row("US:A", "2026-03-09"),
+    _row("US:B", "2026-03-01"),
+    _row("US:B", "2026-03-04", v=None),
+    _row("US:B", "2026-03-05", h=8.0),
+    _row("US:C", "2026-03-04", c=float("nan")),
+    _row("US:C", "2026-03-04", v=-1.0),
+    _row("US:C", "2026-03-05", o=-1.0),
+    _row("", "2026-03-04"),
+    _row("US:D", None),
+    _row("US:D", "2026-03-04"),
+]
+
+
+class DeltaRowFilterTest(unittest.TestCase):
+    def _columns(self):
+        return {name: [r.get(name) for r in ROWS] for name in RAW_BARS_SCHEMA.names}
+
+    def test_table_filter_matches_list_filter(self):
+        latest = {"US:A": "2026-03-02", "US:B": "2026-03-02"}
+        list_seen = {("US:D", "2026-03-04")}
+        table_seen = set(list_seen)
+        rows, list_stats = filter_rows_newer_than_latest(self._columns(), latest, list_seen, max_allowed_date="2026-03-06")
+        table, table_stats = filter_table_newer_than_latest(
+            pa.Table.from_pydict(self._columns(), schema=RAW_BARS_SCHEMA), latest, table_seen, max_allowed_date="2026-03-06"
+        )
+        self.assertEqual(table_stats, list_stats)
+        self.assertEqual(table.to_pydict(), rows)
+        self.assertEqual(table_seen, list_seen)
+        self.assertEqual(list(zip(rows["asset_id"], rows["date"])), [("US:A", "2026-03-03")])
+        self.assertEqual(
+            (table_stats["rows_invalid_ohlc"], table_stats["rows_invalid_volume"], table_stats["rows_future_date"]),
+            (3, 2, 1),
+        )
+
+    def test_empty_table(self):
+        table, stats = filter_table_newer_than_latest(RAW_BARS_SCHEMA.empty_table(), {}, set(), max_allowed_date="2026-03-06")
+        self.assertEqual((table.num_rows, stats["rows_in"], stats["rows_out"]), (0, 0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
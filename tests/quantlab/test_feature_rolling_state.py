@@ -0,0 +1,133 @@
+import random
+import tempfile
+import unittest
+from datetime import date, timedelta
+from pathlib import Path
+
+import polars as pl
+
+from scripts.quantlab.feature_rolling_state import (
+    compare_feature_frames,
+    date_capacity,
+    late_bar_assets,
+    read_state,
+    write_state,
+)
+from scripts.quantlab.run_incremental_feature_update_q1 import _rolling_state_features, _scan_bars, _window_features
+
+ASSETS = [f"US:A{i:02d}" for i in range(12)]
+
+
+def _write_bars(root: Path) -> str:
+    rng = random.Random(3)
+    rows = []
+    for k, asset_id in enumerate(ASSETS):
+        price = rng.uniform(5, 200)
+        day = date(2024, 9, 1) + timedelta(days=rng.randint(0, 150))
+        while day < date(2026, 3, 20):
+            if day.weekday() < 5 and rng.random() > 0.02:
+                price *= 1 + rng.gauss(0, 0.02)
+                open_ = price * (1 + rng.gauss(0, 0.01))
+                rows.append(
+                    {
+                        "asset_id": asset_id,
+                        "date": day.isoformat(),
+                        "open_raw": open_,
+                        "high_raw": max(open_, price) * 1.01,
+                        "low_raw": min(open_, price) * 0.99,
+                        "close_raw": None if k == 3 and rng.random() < 0.02 else price,
+                        "volume_raw": float(rng.randint(0, 10**6)),
+                    }
+                )
+            day += timedelta(days=1)
+    part_dir = root / "bars" / "asset_class=stock"
+    part_dir.mkdir(parents=True)
+    pl.DataFrame(rows).write_parquet(part_dir / "part.parquet")
+    return str(root / "bars" / "**" / "*.parquet")
+
+
+class RollingFeatureStateTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.bars_glob = _write_bars(self.root)
+        self.state_path = self.root / "state" / "rolling_state.parquet"
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _run(self, asof, delta_min_dates=None):
+        features, state, stats = _rolling_state_features(
+            state_path=self.state_path,
+            bars_glob=self.bars_glob,
+            include_classes=["stock"],
+            changed_assets=ASSETS,
+            asof_date=asof,
+            lookback_calendar_days=420,
+            min_rows_window=200,
+            delta_min_dates=delta_min_dates,
+        )
+        write_state(self.state_path, state)
+        start = (asof - timedelta(days=420)).isoformat()
+        rebuilt = _window_features(_scan_bars(self.bars_glob, ["stock"], ASSETS, start, asof.isoformat()), asof.isoformat(), 200).collect()
+        return features, stats, rebuilt
+
+    def test_bootstrap_matches_window_rebuild(self):
+        features, stats, rebuilt = self._run(date(2026, 3, 2))
+        self.assertEqual(stats["assets_bootstrapped"], len(ASSETS))
+        self.assertEqual(features.columns, rebuilt.columns)
+        self.assertEqual(features.schema, rebuilt.schema)
+        report = compare_feature_frames(features, rebuilt, rtol=1e-12, atol=1e-12)
+        self.assertTrue(report["ok"], report)
+        self.assertGreater(report["assets_compared"], 0)
+
+    def test_resumed_days_track_window_rebuild(self):
+        self._run(date(2026, 3, 2))
+        for offset in (1, 2, 7):
+            features, stats, rebuilt = self._run(date(2026, 3, 2) + timedelta(days=offset))
+            self.assertEqual(stats["assets_bootstrapped"], 0)
+            report = compare_feature_frames(features, rebuilt, rtol=1e-3)
+            self.assertTrue(report["ok"], report)
+        # Re-running the same as-of folds nothing new and reproduces the rows.
+        again, _, _ = self._run(date(2026, 3, 9))
+        self.assertTrue(again.equals(features))
+        self.assertEqual(read_state(self.state_path, capacity=date_capacity(420)).height, len(ASSETS))
+        self.assertIsNone(read_state(self.state_path, capacity=date_capacity(300)))
+
+    def test_late_and_corrected_bars_rebootstrap_the_asset(self):
+        self._run(date(2026, 3, 2))
+        part = self.root / "bars" / "asset_class=stock" / "part.parquet"
+        bars = pl.read_parquet(part)
+        have = set(bars.filter(pl.col("asset_id") == "US:A05")["date"].to_list())
+        gap = next(
+            day
+            for day in (date(2026, 2, 20) - timedelta(days=k) for k in range(200))
+            if day.weekday() < 5 and day.isoformat() not in have
+        )
+        late = bars.filter(pl.col("asset_id") == "US:A05").tail(1).with_columns(pl.lit(gap.isoformat()).alias("date"))
+        late.write_parquet(part.with_name("late.parquet"))
+        state = read_state(self.state_path, capacity=date_capacity(420))
+        self.assertEqual(late_bar_assets(state, late.with_columns(pl.col("date").str.strptime(pl.Date))), ["US:A05"])
+        self.assertEqual(late_bar_assets(state, bars.with_columns(pl.col("date").str.strptime(pl.Date))), [])
+
+        features, stats, rebuilt = self._run(date(2026, 3, 3), delta_min_dates={"US:A05": gap})
+        self.assertEqual((stats["assets_bootstrapped"], stats["assets_rebootstrapped_late_bars"]), (1, 1))
+        report = compare_feature_frames(features, rebuilt, rtol=1e-3)
+        self.assertTrue(report["ok"], report)
+
+        # A corrected bar keeps its date, so only the delta's min date reveals it.
+        corrected = pl.read_parquet(part).with_columns(
+            pl.when((pl.col("asset_id") == "US:A07") & (pl.col("date") == "2026-02-24"))
+            .then(pl.col("close_raw") * 1.5)
+            .otherwise(pl.col("close_raw"))
+            .alias("close_raw")
+        )
+        corrected.write_parquet(part)
+        features, stats, rebuilt = self._run(date(2026, 3, 4), delta_min_dates={"US:A07": date(2026, 2, 24)})
+        self.assertEqual(stats["assets_rebootstrapped_late_bars"], 1)
+        report = compare_feature_frames(features, rebuilt, rtol=1e-3)
+        self.assertTrue(report["ok"], report)
+
+
+if __name__ == "__main__":
+    unittest.main()
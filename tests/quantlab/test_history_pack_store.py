@@ -0,0 +1,179 @@
+import gzip
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from scripts.quantlab.history_pack_store import (
+    ArrowPackHandle,
+    arrow_manifest_path,
+    arrow_manifest_sha256,
+    arrow_pack_dir,
+    arrow_store_state,
+    main as pack_store_main,
+    pack_sha256,
+    read_pack_rows,
+)
+from scripts.quantlab import export_v7_history_to_t9_parquet as exporter
+from scripts.quantlab.raw_bars_writer import RawBarsSink
+from scripts.quantlab.refresh_v7_history_from_eodhd import update_pack
+
+
+def _bar(day, close):
+    return {
+        "date": day,
+        "open": close,
+        "high": close + 1,
+        "low": close - 1,
+        "close": close,
+        "volume": 1000.0,
+        "adjusted_close": close,
+    }
+
+
+def _write_legacy_pack(path: Path, rows):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(path, "wt", encoding="utf-8") as fh:
+        for row in rows:
+            fh.write(json.dumps(row) + "\n")
+
+
+class HistoryPackStoreTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.pack = Path(self._tmp.name) / "history/US/a/pack_0001.ndjson.gz"
+        _write_legacy_pack(
+            self.pack,
+            [
+                {"canonical_id": "US:AAA", "bars": [_bar("2026-01-02", 10.0), _bar("2026-01-05", 11.0)]},
+                {"canonical_id": "US:ABC", "bars": [_bar("2026-01-02", 20.0)]},
+            ],
+        )
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_arrow_upsert_imports_legacy_then_appends_segments(self):
+        changed, _, _ = update_pack(
+            pack_path=self.pack,
+            pack_updates={"US:AAA": [_bar("2026-01-06", 12.0)]},
+            pack_store="arrow",
+        )
+        self.assertTrue(changed)
+        manifest = json.loads(arrow_manifest_path(self.pack).read_text())
+        self.assertEqual(manifest["segments"], [])
+        self.assertEqual(sorted(manifest["assets"]), ["US:AAA", "US:ABC"])
+
+        changed, changed_assets, write_stats = update_pack(
+            pack_path=self.pack,
+            pack_updates={"US:ABC": [_bar("2026-01-05", 21.0)]},
+            pack_store="arrow",
+        )
+        self.assertTrue(changed)
+        self.assertEqual(changed_assets[0]["bars_after"], 2)
+        self.assertEqual(write_stats["written_assets"], 1)
+        manifest = json.loads(arrow_manifest_path(self.pack).read_text())
+        self.assertEqual(len(manifest["segments"]), 1)
+        self.assertEqual(manifest["assets"]["US:AAA"][0], manifest["base"])
+        self.assertEqual(manifest["assets"]["US:ABC"][0], manifest["segments"][0])
+
+        rows = {row["canonical_id"]: row["bars"] for row in read_pack_rows(self.pack, "arrow")}
+        self.assertEqual([bar["date"] for bar in rows["US:AAA"]], ["2026-01-02", "2026-01-05", "2026-01-06"])
+        self.assertEqual(rows["US:ABC"][-1]["close"], 21.0)
+
+    def test_noop_upsert_writes_nothing(self):
+        changed, changed_assets, _ = update_pack(
+            pack_path=self.pack,
+            pack_updates={"US:ABC": [_bar("2026-01-02", 20.0)]},
+            pack_store="arrow",
+        )
+        self.assertFalse(changed)
+        self.assertEqual(changed_assets, [])
+        self.assertFalse(arrow_pack_dir(self.pack).exists())
+
+    def test_arrow_upsert_leaves_ndjson_pack_untouched(self):
+        before = self.pack.read_bytes()
+        update_pack(pack_path=self.pack, pack_updates={"US:AAA": [_bar("2026-01-06", 12.0)]}, pack_store="arrow")
+        update_pack(pack_path=self.pack, pack_updates={"US:ABC": [_bar("2026-01-05", 21.0)]}, pack_store="arrow")
+        self.assertEqual(self.pack.read_bytes(), before)
+        self.assertEqual(arrow_store_state(self.pack), "arrow_newer")
+
+    def test_compaction_folds_segments_and_export_makes_ndjson_current(self):
+        handle = ArrowPackHandle(self.pack, compact_after_segments=2)
+        for day, close in (("2026-01-06", 12.0), ("2026-01-07", 13.0), ("2026-01-08", 14.0)):
+            bars = handle.read_assets(["US:AAA"])["US:AAA"] + [_bar(day, close)]
+            handle.upsert({"US:AAA": bars})
+        manifest = json.loads(arrow_manifest_path(self.pack).read_text())
+        self.assertEqual(manifest["segments"], [])
+        self.assertEqual(
+            sorted(p.name for p in arrow_pack_dir(self.pack).glob("*.arrow")),
+            [manifest["base"]],
+        )
+        self.assertEqual(arrow_store_state(self.pack), "arrow_newer")
+
+        self.assertEqual(ArrowPackHandle(self.pack).export_ndjson(), 2)
+        self.assertEqual(arrow_store_state(self.pack), "in_sync")
+        self.assertEqual(ArrowPackHandle(self.pack).export_ndjson(), 0)
+        self.assertEqual(read_pack_rows(self.pack, "arrow"), read_pack_rows(self.pack, "ndjson-gz"))
+        self.assertEqual(len(read_pack_rows(self.pack, "ndjson-gz")[0]["bars"]), 5)
+
+    def test_ndjson_backend_fails_until_arrow_store_is_exported(self):
+        update_pack(pack_path=self.pack, pack_updates={"US:AAA": [_bar("2026-01-06", 12.0)]}, pack_store="arrow")
+        with self.assertRaisesRegex(RuntimeError, "ndjson_pack_stale_arrow_store_newer"):
+            read_pack_rows(self.pack, "ndjson-gz")
+        with self.assertRaisesRegex(RuntimeError, "ndjson_pack_stale_arrow_store_newer"):
+            update_pack(pack_path=self.pack, pack_updates={"US:ABC": [_bar("2026-01-05", 21.0)]}, pack_store="ndjson-gz")
+
+        self.pack.unlink()
+        self.assertEqual(arrow_store_state(self.pack), "arrow_newer")
+        self.assertEqual(ArrowPackHandle(self.pack).export_ndjson(), 2)
+        self.assertEqual(arrow_store_state(self.pack), "in_sync")
+        self.assertEqual(read_pack_rows(self.pack, "arrow"), read_pack_rows(self.pack, "ndjson-gz"))
+
+    def test_history_root_export_finds_stale_arrow_stores(self):
+        update_pack(pack_path=self.pack, pack_updates={"US:AAA": [_bar("2026-01-06", 12.0)]}, pack_store="arrow")
+        self.assertEqual(pack_store_main(["--history-root", self._tmp.name, "--export-ndjson"]), 0)
+        self.assertEqual(arrow_store_state(self.pack), "in_sync")
+        rows = {row["canonical_id"]: row["bars"] for row in read_pack_rows(self.pack, "ndjson-gz")}
+        self.assertEqual(rows["US:AAA"][-1]["date"], "2026-01-06")
+
+    def test_t9_flatten_reads_unexported_arrow_store(self):
+        update_pack(pack_path=self.pack, pack_updates={"US:AAA": [_bar("2026-01-06", 12.0)]}, pack_store="arrow")
+        meta = exporter.AssetMeta("US:AAA", "AAA", "US", "USD", "STOCK", "AAA.US", "US")
+        sink = RawBarsSink()
+        stats = exporter.flatten_rows_for_pack(self.pack, "history/US/a/pack_0001.ndjson.gz", {"US:AAA"}, {"US:AAA": meta}, sink, "arrow")
+        self.assertEqual((stats["records_matched"], stats["bars_written"]), (1, 3))
+        self.assertEqual(sink.tables()["stock"]["date"].to_pylist()[-1], "2026-01-06")
+
+    def test_ndjson_write_after_export_reimports_pack(self):
+        update_pack(pack_path=self.pack, pack_updates={"US:AAA": [_bar("2026-01-06", 12.0)]}, pack_store="arrow")
+        ArrowPackHandle(self.pack).export_ndjson()
+        update_pack(pack_path=self.pack, pack_updates={"US:ABC": [_bar("2026-01-05", 21.0)]}, pack_store="ndjson-gz")
+        self.assertEqual(arrow_store_state(self.pack), "ndjson_newer")
+        self.assertEqual(read_pack_rows(self.pack, "arrow"), read_pack_rows(self.pack, "ndjson-gz"))
+
+        update_pack(pack_path=self.pack, pack_updates={"US:AAA": [_bar("2026-01-07", 13.0)]}, pack_store="arrow")
+        manifest = json.loads(arrow_manifest_path(self.pack).read_text())
+        self.assertEqual((manifest["generation"], manifest["segments"]), (2, []))
+        self.assertEqual(arrow_store_state(self.pack), "arrow_newer")
+        rows = {row["canonical_id"]: row["bars"] for row in read_pack_rows(self.pack, "arrow")}
+        self.assertEqual(rows["US:ABC"][-1]["close"], 21.0)
+        self.assertEqual(rows["US:AAA"][-1]["date"], "2026-01-07")
+
+    def test_pack_written_on_both_sides_is_rejected(self):
+        update_pack(pack_path=self.pack, pack_updates={"US:AAA": [_bar("2026-01-06", 12.0)]}, pack_store="arrow")
+        _write_legacy_pack(self.pack, [{"canonical_id": "US:ABC", "bars": [_bar("2026-01-02", 20.0)]}])
+        self.assertEqual(arrow_store_state(self.pack), "diverged")
+        with self.assertRaisesRegex(RuntimeError, "arrow_pack_diverged_from_ndjson"):
+            read_pack_rows(self.pack, "arrow")
+
+    def test_pack_and_manifest_hashes_are_separate(self):
+        before = pack_sha256(self.pack)
+        update_pack(pack_path=self.pack, pack_updates={"US:AAA": [_bar("2026-01-06", 12.0)]}, pack_store="arrow")
+        self.assertEqual(pack_sha256(self.pack), before)
+        self.assertTrue(arrow_manifest_sha256(self.pack).startswith("sha256:"))
+        self.assertNotEqual(pack_sha256(self.pack), arrow_manifest_sha256(self.pack))
+
+
+if __name__ == "__main__":
+    unittest.main()
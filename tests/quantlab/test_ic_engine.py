@@ -0,0 +1,79 @@
+import math
+import random
+import statistics
+import unittest
+
+import polars as pl
+
+from scripts.quantlab.ic_engine import daily_ic, ic_summary, pooled_rank_ic
+
+
+def _reference_ic(df, score_col, target_col, min_rows):
+    sub = df.select([score_col, target_col]).drop_nulls()
+    if sub.height < min_rows:
+        return 0.0
+    ranked = sub.select(pl.col(score_col).rank("average"), pl.col(target_col).rank("average"))
+    rs, rt = ranked[score_col].to_list(), ranked[target_col].to_list()
+    n = len(rs)
+    m1, m2 = sum(rs) / n, sum(rt) / n
+    cov = sum((a - m1) * (b - m2) for a, b in zip(rs, rt))
+    v1 = sum((a - m1) ** 2 for a in rs)
+    v2 = sum((b - m2) ** 2 for b in rt)
+    if v1 <= 0 or v2 <= 0:
+        return 0.0
+    return cov / math.sqrt(v1 * v2)
+
+
+def _panel():
+    rng = random.Random(4)
+    rows = []
+    for day in range(12):
+        for asset in range(40 if day != 5 else 10):
+            target = rng.gauss(0, 1)
+            rows.append(
+                {
+                    "date": f"2026-01-{day + 1:02d}",
+                    "fwd": None if rng.random() < 0.05 else target,
+                    "s_signal": target + rng.gauss(0, 2) if rng.random() > 0.05 else None,
+                    "s_ties": float(rng.randint(0, 3)),
+                    "s_nan": float("nan") if rng.random() < 0.1 else rng.gauss(0, 1),
+                    "s_const": 1.0,
+                }
+            )
+    return pl.DataFrame(rows)
+
+
+class IcEngineTest(unittest.TestCase):
+    def test_pooled_rank_ic_matches_list_kernel(self):
+        df = _panel()
+        cols = ["s_signal", "s_ties", "s_nan", "s_const"]
+        got = pooled_rank_ic(df, cols, "fwd", min_rows=30)
+        for col in cols:
+            self.assertAlmostEqual(got[col], _reference_ic(df, col, "fwd", 30), places=12)
+        self.assertEqual(got["s_const"], 0.0)
+        self.assertEqual(pooled_rank_ic(df.head(20), cols, "fwd", min_rows=30)["s_signal"], 0.0)
+
+    def test_daily_ic_and_summary(self):
+        df = _panel()
+        daily = daily_ic(df, ["s_signal", "s_const"], "fwd", date_col="date", min_rows=30)
+        self.assertEqual(daily.columns, ["date", "score_col", "ic", "n"])
+        signal = daily.filter(pl.col("score_col") == "s_signal")
+        for row in signal.iter_rows(named=True):
+            day = df.filter(pl.col("date") == row["date"])
+            if row["date"] == "2026-01-06":
+                self.assertIsNone(row["ic"])
+                continue
+            self.assertAlmostEqual(row["ic"], _reference_ic(day, "s_signal", "fwd", 30), places=12)
+        self.assertEqual(daily.filter(pl.col("score_col") == "s_const")["ic"].null_count(), 12)
+
+        summary = ic_summary(daily)
+        ics = signal.drop_nulls("ic")["ic"].to_list()
+        self.assertEqual(summary["s_signal"]["ic_days"], 11)
+        self.assertAlmostEqual(summary["s_signal"]["ic_mean"], statistics.fmean(ics), places=12)
+        self.assertAlmostEqual(summary["s_signal"]["ic_ir"], statistics.fmean(ics) / statistics.stdev(ics), places=10)
+        self.assertAlmostEqual(summary["s_signal"]["ic_hit_rate"], sum(v > 0 for v in ics) / len(ics), places=12)
+        self.assertEqual(summary["s_const"], {"ic_mean": 0.0, "ic_std": 0.0, "ic_ir": 0.0, "ic_hit_rate": 0.0, "ic_days": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
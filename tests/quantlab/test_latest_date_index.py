@@ -0,0 +1,58 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from scripts.quantlab.latest_date_index import read_latest_date_cache, scan_latest_dates, table_to_latest_dates
+from scripts.quantlab.run_daily_delta_ingest_q1 import list_raw_parquet_files, load_or_build_latest_date_cache
+
+
+def _write_part(root: Path, ingest_date: str, name: str, rows: list) -> None:
+    out = root / f"ingest_date={ingest_date}" / "asset_class=stock"
+    out.mkdir(parents=True, exist_ok=True)
+    pq.write_table(
+        pa.table({"asset_id": [r[0] for r in rows], "date": [r[1] for r in rows]}, schema=pa.schema([("asset_id", pa.string()), ("date", pa.string())])),
+        out / name,
+    )
+
+
+class LatestDateIndexTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name) / "raw"
+        self.cache = Path(self._tmp.name) / "cache" / "latest.parquet"
+        _write_part(self.root, "2026-01-01", "part_a.parquet", [("A", "2025-12-30"), ("A", "2025-12-31"), ("B", "2025-12-29"), ("", "2025-12-31"), ("C", None)])
+        _write_part(self.root, "2026-01-01", "part_b.parquet", [("A", "2025-12-15"), ("C", "2025-11-01")])
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_grouped_max_skips_blank_keys(self):
+        table, stats = scan_latest_dates(list_raw_parquet_files(self.root, {"stock"}))
+        self.assertEqual(table_to_latest_dates(table), {"A": "2025-12-31", "B": "2025-12-29", "C": "2025-11-01"})
+        self.assertEqual((stats["files_scanned"], stats["rows_scanned"]), (2, 7))
+
+    def test_new_ingest_partitions_are_folded_in(self):
+        files = list_raw_parquet_files(self.root, {"stock"})
+        self.assertEqual(load_or_build_latest_date_cache(self.cache, self.root, files)[1]["status"], "rebuilt")
+        self.assertEqual(load_or_build_latest_date_cache(self.cache, self.root, files)[1]["status"], "hit")
+
+        _write_part(self.root, "2026-01-02", "part_a.parquet", [("B", "2026-01-02"), ("D", "2026-01-02"), ("A", "2025-01-01")])
+        files = list_raw_parquet_files(self.root, {"stock"})
+        latest, meta = load_or_build_latest_date_cache(self.cache, self.root, files)
+        self.assertEqual((meta["status"], meta["files_scanned"]), ("incremental", 1))
+        self.assertEqual(latest, {"A": "2025-12-31", "B": "2026-01-02", "C": "2025-11-01", "D": "2026-01-02"})
+        cached_meta, cached = read_latest_date_cache(self.cache)
+        self.assertEqual(table_to_latest_dates(cached), latest)
+        self.assertEqual(cached_meta["files_total"], 3)
+
+        (self.root / "ingest_date=2026-01-01" / "asset_class=stock" / "part_b.parquet").unlink()
+        latest, meta = load_or_build_latest_date_cache(self.cache, self.root, list_raw_parquet_files(self.root, {"stock"}))
+        self.assertEqual(meta["status"], "rebuilt")
+        self.assertNotIn("C", latest)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import gzip
+import json
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pyarrow.parquet as pq
+
+from concurrent.futures.process import BrokenProcessPool
+
+from scripts.quantlab import export_v7_history_to_t9_parquet as exporter
+from scripts.quantlab.pack_pool import iter_ordered_results
+
+_real_export_pack = exporter.export_pack
+
+
+def _slow_square(task):
+    time.sleep(0.05 * (3 - task["n"] % 3))
+    if task["n"] == 4:
+        raise ValueError("boom")
+    return {"sq": task["n"] * task["n"]}
+
+
+def _crash_on_three(task):
+    if task["n"] == 3:
+        time.sleep(0.2)
+        os._exit(1)
+    return {"n": task["n"]}
+
+
+def _crash_on_p2(task):
+    if task["rel_pack"].endswith("p2.ndjson.gz"):
+        os._exit(1)
+    return _real_export_pack(task)
+
+
+def _write_ndjson_gz(path: Path, rows: list) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(path, "wt", encoding="utf-8") as fh:
+        for row in rows:
+            fh.write(json.dumps(row) + "\n")
+
+
+def _bars(n, start_close):
+    return [{"date": f"2026-01-{d:02d}", "open": start_close + d, "high": start_close + d, "low": start_close + d, "close": start_close + d, "volume": 100 * d} for d in range(1, n + 1)]
+
+
+class PackPoolTest(unittest.TestCase):
+    def test_results_follow_task_order(self):
+        tasks = [{"n": n} for n in range(7)]
+        for workers in (1, 3):
+            out = list(iter_ordered_results(_slow_square, iter(tasks), workers, max_pending=4))
+            self.assertEqual([t["n"] for t, _, _ in out], list(range(7)))
+            self.assertEqual([r["sq"] for _, r, e in out if e is None], [0, 1, 4, 9, 25, 36])
+            self.assertIsInstance(out[4][2], ValueError)
+
+    def test_broken_pool_fails_in_flight_and_remaining_tasks_in_order(self):
+        tasks = [{"n": n} for n in range(8)]
+        out = list(iter_ordered_results(_crash_on_three, iter(tasks), 2, max_pending=2))
+        self.assertEqual([t["n"] for t, _, _ in out], list(range(8)))
+        self.assertEqual([r["n"] for _, r, e in out[:3]], [0, 1, 2])
+        # Task 4 may finish on the other worker before the crash; 5.. were never submitted.
+        self.assertIsInstance(out[3][2], BrokenProcessPool)
+        self.assertTrue(all(isinstance(e, BrokenProcessPool) for _, _, e in out[5:]))
+
+    def test_broken_pool_marks_packs_failed_in_export_state(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            repo = self._write_repo(Path(tmp))
+            target = Path(tmp) / "t"
+            target.mkdir()
+            with mock.patch.dict(os.environ, {"RV_REGISTRY_INDEX_DIR": str(Path(tmp) / "idx")}), mock.patch.object(exporter, "export_pack", _crash_on_p2):
+                rc = exporter.main([
+                    "--repo-root", str(repo), "--target-root", str(target), "--registry", "registry.ndjson.gz",
+                    "--ingest-date", "2026-01-31", "--job-name", "job", "--workers", "2",
+                ])
+            self.assertEqual(rc, 1)
+            state = json.loads((target / "jobs" / "job" / "state.json").read_text())
+            self.assertIn("history/US/p2.ndjson.gz", state["failed_packs"])
+            self.assertIn("history/US/p4.ndjson.gz", state["failed_packs"])
+            self.assertEqual(set(state["completed_packs"]) | set(state["failed_packs"]), {f"history/US/p{p}.ndjson.gz" for p in range(5)})
+            # Packs still in flight next to p2 fail with it.
+            self.assertIn(state["pool_broken"]["first_failed_pack"], state["failed_packs"])
+            self.assertFalse((target / "jobs" / "job" / "staging").exists())
+
+    def _write_repo(self, root):
+        repo = root / "repo"
+        registry_rows = []
+        for p in range(5):
+            rel_pack = f"history/US/p{p}.ndjson.gz"
+            records = []
+            for a in range(3):
+                cid = f"US:P{p}A{a}"
+                type_norm = "ETF" if a == 2 else "STOCK"
+                registry_rows.append({"canonical_id": cid, "symbol": f"P{p}A{a}", "exchange": "US", "type_norm": type_norm, "pointers": {"history_pack": rel_pack}})
+                records.append({"canonical_id": cid, "bars": _bars(3 + a, 10.0 * p)})
+            _write_ndjson_gz(repo / "mirrors/universe-v7" / rel_pack, records)
+        _write_ndjson_gz(repo / "registry.ndjson.gz", registry_rows)
+        return repo
+
+    def test_parallel_export_matches_serial(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            repo = self._write_repo(Path(tmp))
+            runs = {}
+            with mock.patch.dict(os.environ, {"RV_REGISTRY_INDEX_DIR": str(Path(tmp) / "idx")}):
+                for workers in (1, 2):
+                    target = Path(tmp) / f"t{workers}"
+                    target.mkdir()
+                    rc = exporter.main([
+                        "--repo-root", str(repo), "--target-root", str(target), "--registry", "registry.ndjson.gz",
+                        "--ingest-date", "2026-01-31", "--job-name", "job", "--workers", str(workers),
+                    ])
+                    self.assertEqual(rc, 0)
+                    job = target / "jobs" / "job"
+                    raw = target / "data/raw/provider=EODHD/ingest_date=2026-01-31"
+                    events = [json.loads(line) for line in (job / "packs_manifest.ndjson").read_text().splitlines()]
+                    files = {str(p.relative_to(raw)): pq.read_table(p) for p in sorted(raw.rglob("*.parquet"))}
+                    self.assertFalse((job / "staging").exists())
+                    runs[workers] = (
+                        [(e["rel_pack"], e["stats"], [(o["asset_class"], Path(o["path"]).relative_to(raw).as_posix(), o["rows"]) for o in e["outputs"]]) for e in events],
+                        json.loads((job / "state.json").read_text())["completed_packs"],
+                        files,
+                    )
+            serial, parallel = runs[1], runs[2]
+            self.assertEqual(serial[0], parallel[0])
+            self.assertEqual(serial[1], parallel[1])
+            self.assertEqual(sorted(serial[2]), sorted(parallel[2]))
+            self.assertEqual(len(serial[2]), 10)
+            for name, table in serial[2].items():
+                self.assertTrue(table.equals(parallel[2][name]), name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+import json
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+import polars as pl
+
+from scripts.quantlab.run_portfolio_risk_execution_q1 import (
+    _apply_family_pick_cap,
+    _blend_signal_exprs,
+    _build_books,
+    _parse_blend_variants,
+    _prepare_scoring_frame,
+    _resolve_blend_candidates,
+    _scale_positions,
+    build_blend_books,
+    main,
+)
+
+REGISTRY_REPORT = {
+    "champion_slots": {
+        "live": {"candidate_id": "tsmom_20", "state": "live"},
+        "live_alt_1": {"candidate_id": "mr_rsi", "state": "live_hold"},
+        "shadow": {"candidate_id": "quality_liq_lowvol", "state": "shadow"},
+    }
+}
+BOOK_KWARGS = {
+    "top_n_long": 15,
+    "top_n_short": 10,
+    "max_long_per_family": 0,
+    "max_short_per_family": 0,
+    "weighting_mode": "score_invvol_liq",
+    "alpha_score": 1.0,
+    "alpha_invvol": 0.35,
+    "alpha_liq": 0.2,
+}
+
+
+def _feature_rows(n=80):
+    rng = random.Random(3)
+    rows = []
+    for i in range(n):
+        rows.append({
+            "asset_id": f"A{i:03d}",
+            "asset_class": "stock",
+            "close_raw": rng.uniform(5, 50),
+            "sma_200": rng.uniform(5, 50),
+            "adv20_dollar": rng.uniform(1e6, 1e8),
+            "ret_20d": rng.gauss(0, 0.1),
+            "ret_5d": rng.gauss(0, 0.05),
+            "rsi_14": rng.uniform(10, 90),
+            "macd_hist": rng.gauss(0, 1),
+            "atr_pct_14": rng.uniform(0.01, 0.1),
+            "ewma_vol_20": rng.uniform(0.005, 0.05),
+            "boll_z_20": rng.gauss(0, 1),
+        })
+    return rows
+
+
+def _scored_frame(n=80):
+    return _prepare_scoring_frame(pl.DataFrame(_feature_rows(n)))
+
+
+class FamilyPickCapTest(unittest.TestCase):
+    def test_cap_keeps_frame_order_and_counts_skips_until_full(self):
+        df = pl.DataFrame({"asset_id": list("abcdefg"), "family": ["X", "X", "X", None, "Y", "X", ""]})
+        picked, warnings = _apply_family_pick_cap(df, max_rows=4, cap_per_family=2, side_label="LONG")
+        self.assertEqual(picked.get_column("asset_id").to_list(), ["a", "b", "d", "e"])
+        self.assertEqual(warnings, ["FAMILY_CAP_APPLIED:LONG:cap=2:skipped=1:picked=4"])
+
+        picked, warnings = _apply_family_pick_cap(df, max_rows=10, cap_per_family=1, side_label="SHORT")
+        self.assertEqual(picked.get_column("asset_id").to_list(), ["a", "d", "e"])
+        self.assertEqual(warnings, ["FAMILY_CAP_APPLIED:SHORT:cap=1:skipped=4:picked=3"])
+        self.assertEqual(picked.schema, df.schema)
+
+
+class BlendBooksTest(unittest.TestCase):
+    def test_batched_variants_match_single_construction(self):
+        scored = _scored_frame()
+        variants = {
+            "default": ("live=1.0,live_alt_1=0.75,shadow=0.35", "live=1.0,live_hold=0.85,shadow=0.35"),
+            "live_only": ("live=1.0", ""),
+            "shadow_only": ("shadow=1.0", ""),
+        }
+        books = build_blend_books(scored, REGISTRY_REPORT, variants, target_gross=1.0, max_position_weight=0.1, **BOOK_KWARGS)
+        self.assertEqual(list(books), list(variants))
+        self.assertIsNone(books["shadow_only"]["positions"])
+        self.assertIn("SLOT_BLEND_NO_LIVE_LIKE_STATE_FALLBACK_TO_SINGLE", books["shadow_only"]["warnings"])
+
+        for name in ("default", "live_only"):
+            slot_blend, multipliers = variants[name]
+            candidates, total, _ = _resolve_blend_candidates(
+                REGISTRY_REPORT,
+                slot_blend=slot_blend,
+                state_multipliers=multipliers,
+                min_effective_weight=0.01,
+                max_candidates=4,
+                require_live_like=True,
+                live_like_states={"live", "live_hold"},
+            )
+            columns, blend = _blend_signal_exprs(candidates, total)
+            single = scored.with_columns(columns).with_columns(blend.alias("signal_score")).drop_nulls(["signal_score"])
+            positions, _, n_long, n_short = _build_books(single, **BOOK_KWARGS)
+            positions = _scale_positions(positions, target_gross=1.0, max_position_weight=0.1)
+            batched = books[name]["positions"]
+            self.assertEqual((books[name]["n_long"], books[name]["n_short"]), (n_long, n_short))
+            self.assertEqual(
+                batched.select(["asset_id", "side", "target_weight_raw", "target_weight"]).to_dicts(),
+                positions.select(["asset_id", "side", "target_weight_raw", "target_weight"]).to_dicts(),
+            )
+            self.assertAlmostEqual(batched.get_column("target_weight").abs().sum(), 1.0, places=9)
+
+
+class BlendVariantsCliTest(unittest.TestCase):
+    def test_parse_variants(self):
+        variants = _parse_blend_variants(["live_only@live=1.0", "wide@live=1.0,shadow=0.5@shadow=1.0"], "live=1.0")
+        self.assertEqual(variants, {"live_only": ("live=1.0", "live=1.0"), "wide": ("live=1.0,shadow=0.5", "shadow=1.0")})
+        for bad in (["live=1.0"], ["a@x=1", "a@y=1"], ["../x@live=1.0"]):
+            with self.assertRaises(SystemExit):
+                _parse_blend_variants(bad, "")
+
+    def test_main_writes_variant_books_next_to_the_primary_book(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            quant_root = Path(tmp)
+            part_dir = quant_root / "features/store/feature_store_version=v1/asof_date=2026-03-02/asset_class=stock"
+            part_dir.mkdir(parents=True)
+            pl.DataFrame(_feature_rows()).with_columns(pl.lit("2026-03-02").alias("asof_date")).write_parquet(part_dir / "part-0.parquet")
+            registry = quant_root / "registry.json"
+            registry.write_text(json.dumps(REGISTRY_REPORT), encoding="utf-8")
+            rc = main([
+                "--quant-root", str(quant_root), "--feature-store-version", "v1", "--registry-report", str(registry),
+                "--stage-b-report", str(quant_root / "missing.json"), "--asset-classes", "stock",
+                "--top-n-long", "15", "--top-n-short", "10", "--max-position-weight", "0.1", "--failure-mode", "warn",
+                "--slot-blend-variant", "live_only@live=1.0",
+                "--slot-blend-variant", "shadow_only@shadow=1.0",
+            ])
+            self.assertEqual(rc, 0)
+            report = json.loads((quant_root / "ops/portfolio_q1/latest_report.json").read_text())
+            variants = report["blend_variants"]
+            self.assertEqual(list(variants), ["live_only", "shadow_only"])
+            self.assertEqual(variants["live_only"]["candidate_ids"], ["tsmom_20"])
+            live_only = pl.read_parquet(variants["live_only"]["positions_parquet"])
+            self.assertEqual(live_only.height, variants["live_only"]["positions_total"])
+            self.assertEqual(variants["shadow_only"]["positions_parquet"], "")
+            self.assertIn("SLOT_BLEND_NO_LIVE_LIKE_STATE_FALLBACK_TO_SINGLE", variants["shadow_only"]["warnings"])
+            # The primary book still comes from --registry-slot-blend.
+            self.assertEqual(report["candidate"]["source"], "registry_slot_blend")
+            self.assertEqual(report["candidate"]["blend_candidates_total"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+
+from scripts.quantlab.provider_response_cache import (
+    FINAL_SESSION_TTL_SEC,
+    OPEN_SESSION_TTL_SEC,
+    ProviderResponseCache,
+    response_cache_key,
+    response_has_session_bar,
+    session_ttl_sec,
+)
+
+
+def _ts(text):
+    return datetime.fromisoformat(text).replace(tzinfo=timezone.utc).timestamp()
+
+
+class _Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+EOD_URL = "https://eodhd.com/api/eod/AAPL.US?api_token={token}&fmt=json&from=2026-03-01&to=2026-03-10"
+
+
+class ProviderResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_key_ignores_secrets_and_query_order(self):
+        a, ident = response_cache_key(EOD_URL.format(token="one"))
+        b, _ = response_cache_key("https://eodhd.com/api/eod/AAPL.US?to=2026-03-10&from=2026-03-01&fmt=json&api_token=two")
+        self.assertEqual(a, b)
+        self.assertEqual((ident["endpoint"], ident["symbol"], ident["to"]), ("eodhd.com/api/eod", "AAPL.US", "2026-03-10"))
+        stooq_a, _ = response_cache_key("https://stooq.com/q/d/l/?s=aapl.us&i=d", as_of="2026-03-10")
+        stooq_b, _ = response_cache_key("https://stooq.com/q/d/l/?s=aapl.us&i=d", as_of="2026-03-11")
+        self.assertNotEqual(stooq_a, stooq_b)
+
+    def test_ttl_follows_session_state(self):
+        self.assertEqual(session_ttl_sec("2026-03-10", _ts("2026-03-10T15:00:00")), OPEN_SESSION_TTL_SEC)
+        self.assertEqual(session_ttl_sec("2026-03-10", _ts("2026-03-10T22:30:00")), FINAL_SESSION_TTL_SEC)
+        self.assertEqual(session_ttl_sec("2026-03-09", _ts("2026-03-10T01:00:00")), FINAL_SESSION_TTL_SEC)
+
+    def test_roundtrip_expiry_and_content_addressing(self):
+        clock = _Clock(_ts("2026-03-10T15:00:00"))
+        cache = ProviderResponseCache(self.root, clock=clock)
+        body = b'[{"date": "2026-03-10", "close": 1.0}]' * 20
+        cache.put(EOD_URL.format(token="x"), body)
+        cache.put(EOD_URL.format(token="x").replace("AAPL", "MSFT"), body)
+        self.assertEqual(cache.get(EOD_URL.format(token="y")), body)
+        self.assertEqual(len(list((self.root / "blobs").glob("*/*.z"))), 1)
+        self.assertLess((next((self.root / "blobs").glob("*/*.z"))).stat().st_size, len(body))
+        clock.now += OPEN_SESSION_TTL_SEC + 1
+        self.assertIsNone(cache.get(EOD_URL.format(token="x")))
+        self.assertEqual(cache.stats["hits"], 1)
+        self.assertEqual(cache.stats["expired"], 1)
+
+    def test_final_ttl_requires_the_as_of_bar(self):
+        clock = _Clock(_ts("2026-03-11T01:00:00"))
+        cache = ProviderResponseCache(self.root, clock=clock)
+        full = b'[{"date": "2026-03-09", "close": 1.0}, {"date": "2026-03-10", "close": 2.0}]'
+        short = b'[{"date": "2026-03-09", "close": 1.0}]'
+        urls = [EOD_URL.format(token="x").replace("AAPL", name) for name in ("FULL", "SHORT", "EMPTY")]
+        for url, body in zip(urls, (full, short, b"[]")):
+            cache.put(url, body)
+        clock.now += OPEN_SESSION_TTL_SEC + 1
+        self.assertEqual([cache.get(url) is not None for url in urls], [True, False, False])
+
+        self.assertTrue(response_has_session_bar(b"Date,Open,High,Low,Close,Volume\n2026-03-10,1,1,1,1,5\n", "2026-03-10"))
+        self.assertFalse(response_has_session_bar(b"Date,Open,High,Low,Close,Volume\n2026-03-09,1,1,1,1,5\n", "2026-03-10"))
+        self.assertFalse(response_has_session_bar(b'{"error": "2026-03-10"}', "2026-03-10"))
+
+    def test_lru_eviction_keeps_recently_used(self):
+        clock = _Clock(_ts("2026-03-11T01:00:00"))
+        cache = ProviderResponseCache(self.root, max_bytes=10**9, clock=clock)
+        urls = [EOD_URL.format(token="x").replace("AAPL", f"S{i}") for i in range(4)]
+        for i, url in enumerate(urls):
+            cache.put(url, os.urandom(2000))
+            entry = next((self.root / "entries").glob(f"*/{response_cache_key(url)[0]}.json"))
+            os.utime(entry, (1000 + i, 1000 + i))
+        self.assertIsNotNone(cache.get(urls[0]))
+        cache.max_bytes = 5000
+        cache.evict()
+        kept = [url for url in urls if cache.get(url) is not None]
+        self.assertEqual(kept, [urls[0], urls[3]])
+        self.assertEqual(len(list((self.root / "blobs").glob("*/*.z"))), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
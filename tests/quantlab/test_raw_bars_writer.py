@@ -0,0 +1,66 @@
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+import pyarrow.parquet as pq
+
+from scripts.quantlab.raw_bars_writer import RAW_BARS_SCHEMA, RawBarsSink
+
+
+def _meta(asset_id):
+    return SimpleNamespace(asset_id=asset_id, exchange="US", symbol=asset_id, provider_symbol=f"{asset_id}.US", currency="USD", country="US")
+
+
+def _bars(dates, close=1.0):
+    return {
+        "date": list(dates),
+        "open_raw": [close] * len(dates),
+        "high_raw": [close] * len(dates),
+        "low_raw": [close] * len(dates),
+        "close_raw": [close] * len(dates),
+        "volume_raw": [100] * len(dates),
+        "adjusted_close_raw": [None] * len(dates),
+    }
+
+
+def _feed(sink):
+    sink.add_asset("etf", _meta("E1"), "p/1", _bars([]))
+    sink.add_asset("stock", _meta("S1"), "p/1", _bars(["2026-01-02", "2026-01-05", "2026-01-06"], 2.0))
+    sink.add_asset("etf", _meta("E2"), "p/1", _bars(["2026-01-02"]))
+    sink.add_asset("stock", _meta("S2"), "p/1", _bars(["2026-01-02", "2026-01-05"], 3.0))
+
+
+class RawBarsSinkTest(unittest.TestCase):
+    def test_streamed_files_match_in_memory_tables(self):
+        memory = RawBarsSink()
+        _feed(memory)
+        tables = memory.tables()
+        self.assertEqual(list(tables), ["etf", "stock"])
+        stock = tables["stock"]
+        self.assertEqual(stock.schema, RAW_BARS_SCHEMA)
+        self.assertEqual(stock["asset_id"].to_pylist(), ["S1", "S1", "S1", "S2", "S2"])
+        self.assertEqual(stock["close_raw"].to_pylist(), [2.0, 2.0, 2.0, 3.0, 3.0])
+        self.assertEqual(set(stock["provider"].to_pylist()), {"EODHD"})
+
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            sink = RawBarsSink(lambda cls: root / f"asset_class={cls}" / "part_x.parquet", batch_rows=2)
+            _feed(sink)
+            written = sink.close()
+            self.assertEqual([(cls, rows) for cls, _, rows in written], [("etf", 1), ("stock", 5)])
+            for cls, path, _ in written:
+                self.assertTrue(pq.read_table(path).equals(tables[cls]))
+            self.assertEqual(sorted(p.name for p in root.rglob("*")), ["asset_class=etf", "asset_class=stock", "part_x.parquet", "part_x.parquet"])
+
+    def test_abort_leaves_no_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            sink = RawBarsSink(lambda cls: root / f"{cls}.parquet", batch_rows=1)
+            _feed(sink)
+            sink.abort()
+            self.assertEqual(list(root.iterdir()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+
+from scripts.quantlab.refresh_v7_history_from_eodhd import (
+    AssetMeta,
+    expected_previous_session,
+    plan_gap_fills,
+    previous_weekday,
+)
+
+
+def _meta(canonical_id, exchange):
+    return AssetMeta(
+        canonical_id=canonical_id,
+        symbol=canonical_id.split(":")[1],
+        exchange=exchange,
+        currency="USD",
+        type_norm="STOCK",
+        provider_symbol=canonical_id.split(":")[1],
+        country="US",
+        history_pack=f"history/{exchange}/pack_0001.ndjson.gz",
+    )
+
+
+class BulkGapFillPlanTest(unittest.TestCase):
+    def test_previous_weekday_skips_weekend(self):
+        self.assertEqual(previous_weekday("2026-03-09"), "2026-03-06")
+        self.assertEqual(previous_weekday("2026-03-10"), "2026-03-09")
+
+    def test_expected_session_follows_peers_across_holiday(self):
+        # Peers ended on Friday 2026-07-02 ahead of the 2026-07-03 holiday.
+        self.assertEqual(expected_previous_session(["2026-07-02"] * 5 + ["2026-06-30"], "2026-07-06"), "2026-07-02")
+        # Stale peers fall back to the calendar so a missed run still gets filled.
+        self.assertEqual(expected_previous_session(["2026-06-01"] * 5, "2026-07-06"), "2026-07-03")
+        self.assertEqual(expected_previous_session([], "2026-07-06"), "2026-07-03")
+
+    def test_only_assets_behind_more_than_one_session_are_gap_filled(self):
+        targets = [
+            (1, "US:CUR", _meta("US:CUR", "US")),
+            (2, "US:PEER", _meta("US:PEER", "US")),
+            (3, "US:LAG", _meta("US:LAG", "US")),
+            (4, "US:NEW", _meta("US:NEW", "US")),
+            (5, "US:DONE", _meta("US:DONE", "US")),
+            (6, "LSE:OFF", _meta("LSE:OFF", "LSE")),
+        ]
+        last_dates = {
+            "US:CUR": "2026-03-09",
+            "US:PEER": "2026-03-09",
+            "US:LAG": "2026-03-04",
+            "US:DONE": "2026-03-10",
+            "LSE:OFF": "2026-03-09",
+        }
+        planned, summary = plan_gap_fills(
+            targets,
+            last_dates=last_dates,
+            from_date="2026-01-01",
+            to_date="2026-03-10",
+            bulk_completed_exchanges={"US"},
+            bulk_seen_ids={"US:CUR", "US:PEER", "US:LAG"},
+        )
+        self.assertEqual(
+            [(cid, start) for _, cid, _, start in planned],
+            [("US:LAG", "2026-03-05"), ("US:NEW", "2026-01-01"), ("LSE:OFF", "2026-03-10")],
+        )
+        self.assertEqual(
+            summary["gap_fill_reasons"],
+            {"behind_exchange_session": 1, "bulk_exchange_unavailable": 1, "no_history": 1},
+        )
+        self.assertEqual(summary["expected_previous_session_by_exchange"]["US"], "2026-03-09")
+
+
+    def test_one_session_behind_asset_missing_from_bulk_is_gap_filled(self):
+        targets = [
+            (1, "US:CUR", _meta("US:CUR", "US")),
+            (2, "US:HALT", _meta("US:HALT", "US")),
+            (3, "LSE:A", _meta("LSE:A", "LSE")),
+            (4, "LSE:B", _meta("LSE:B", "LSE")),
+        ]
+        last_dates = {"US:CUR": "2026-03-09", "US:HALT": "2026-03-09", "LSE:A": "2026-03-09", "LSE:B": "2026-03-09"}
+        planned, summary = plan_gap_fills(
+            targets,
+            last_dates=last_dates,
+            from_date="2026-01-01",
+            to_date="2026-03-10",
+            bulk_completed_exchanges={"US", "LSE"},
+            # LSE returned no 2026-03-10 rows at all (holiday): nothing there is behind.
+            bulk_seen_ids={"US:CUR"},
+        )
+        self.assertEqual([(cid, start) for _, cid, _, start in planned], [("US:HALT", "2026-03-10")])
+        self.assertEqual(summary["gap_fill_reasons"], {"missing_from_bulk": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
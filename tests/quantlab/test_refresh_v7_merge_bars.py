@@ -0,0 +1,69 @@
+import unittest
+
+from scripts.quantlab.refresh_v7_history_from_eodhd import merge_bars, sanitize_row, splice_bars
+
+
+def _bar(day, close):
+    return sanitize_row({"date": day, "open": close, "high": close, "low": close, "close": close, "volume": 10})
+
+
+def _reference_merge(existing, incoming):
+    by_date = {}
+    for row in list(existing) + list(incoming):
+        clean = sanitize_row(row)
+        if clean is not None:
+            by_date[clean["date"]] = clean
+    return [by_date[key] for key in sorted(by_date)]
+
+
+class SpliceBarsTest(unittest.TestCase):
+    def setUp(self):
+        self.existing = [_bar(f"2026-01-{day:02d}", float(day)) for day in (2, 5, 6, 7, 8, 9)]
+
+    def test_matches_full_dict_merge(self):
+        cases = [
+            [{"date": "2026-01-12", "close": 12}],
+            [{"date": "2026-01-01", "close": 1}, {"date": "2026-01-06", "close": 66}],
+            [{"date": "2026-01-03", "close": 3}, {"date": "2026-01-03T00:00:00", "close": 4}],
+            [{"date": "2026-01-04", "close": None}, {"date": "", "close": 1}],
+        ]
+        for incoming in cases:
+            with self.subTest(incoming=incoming):
+                self.assertEqual(merge_bars(self.existing, incoming), _reference_merge(self.existing, incoming))
+
+    def test_unchanged_incoming_reports_no_change_without_copy(self):
+        merged, changed = splice_bars(self.existing, [{"date": "2026-01-07", "open": 7, "high": 7, "low": 7, "close": 7, "volume": 10}])
+        self.assertFalse(changed)
+        self.assertIs(merged, self.existing)
+
+    def test_append_does_not_mutate_existing(self):
+        before = list(self.existing)
+        merged, changed = splice_bars(self.existing, [{"date": "2026-01-12", "close": 12}])
+        self.assertTrue(changed)
+        self.assertEqual(self.existing, before)
+        self.assertEqual(merged[-1]["date"], "2026-01-12")
+        self.assertEqual(len(merged), len(before) + 1)
+
+    def test_unsorted_or_duplicate_existing_falls_back_to_full_merge(self):
+        cases = [
+            [_bar("2026-01-05", 5.0), _bar("2026-01-02", 2.0), _bar("2026-01-06", 6.0)],
+            [_bar("2026-01-02", 2.0), _bar("2026-01-05", 5.0), _bar("2026-01-05", 55.0)],
+            [{"date": "2026-01-02T00:00:00", "close": 2}, _bar("2026-01-05", 5.0)],
+        ]
+        for existing in cases:
+            with self.subTest(existing=existing):
+                merged, changed = splice_bars(existing, [{"date": "2026-01-05", "close": 7}])
+                self.assertTrue(changed)
+                self.assertEqual(merged, _reference_merge(existing, [{"date": "2026-01-05", "close": 7}]))
+                dates = [bar["date"] for bar in merged]
+                self.assertEqual(dates, sorted(set(dates)))
+
+    def test_unsanitized_existing_bar_with_same_values_is_unchanged(self):
+        existing = [{"date": "2026-01-02", "open": 2, "high": 2, "low": 2, "close": 2, "volume": 10}]
+        merged, changed = splice_bars(existing, [{"date": "2026-01-02", "open": 2.0, "high": 2.0, "low": 2.0, "close": 2.0, "volume": 10}])
+        self.assertFalse(changed)
+        self.assertIs(merged, existing)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from scripts.quantlab.registry_index import load_registry_index
+
+
+def _write_registry(path: Path, rows: list) -> None:
+    with gzip.open(path, "wt", encoding="utf-8") as fh:
+        for row in rows:
+            fh.write((row if isinstance(row, str) else json.dumps(row)) + "\n")
+
+
+class RegistryIndexTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.registry = self.root / "registry.ndjson.gz"
+        self.index = self.root / "idx" / "registry.arrow"
+        _write_registry(
+            self.registry,
+            [
+                {
+                    "canonical_id": " US:AAA ",
+                    "symbol": "AAA",
+                    "type_norm": "stock",
+                    "bars_count": 250,
+                    "avg_volume_30d": "12.5",
+                    "_tmp_recent_closes": [1, None, "x", 3.5],
+                    "pointers": {"history_pack": "p/a.ndjson.gz", "pack_sha256": "abc"},
+                },
+                "{not json",
+                "",
+                {"canonical_id": "US:BBB", "provider_symbol": "BBB.US", "pointers": None},
+            ],
+        )
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_columns_keep_raw_strings_and_pointers(self):
+        table, info = load_registry_index(self.registry, self.index)
+        self.assertEqual(info["status"], "compiled")
+        self.assertEqual((info["rows_total"], info["rows_invalid"], table.num_rows), (3, 1, 2))
+        rows = table.to_pylist()
+        self.assertEqual(rows[0]["canonical_id"], " US:AAA ")
+        self.assertEqual((rows[0]["history_pack"], rows[0]["pack_sha256"]), ("p/a.ndjson.gz", "abc"))
+        self.assertEqual(rows[0]["recent_closes"], [1.0, None, None, 3.5])
+        self.assertEqual((rows[0]["bars_count"], rows[0]["avg_volume_30d"]), (250, 12.5))
+        self.assertEqual((rows[1]["history_pack"], rows[1]["type_norm"], rows[1]["recent_closes"]), ("", "", None))
+
+    def test_reuses_index_until_source_content_changes(self):
+        load_registry_index(self.registry, self.index)
+        self.assertEqual(load_registry_index(self.registry, self.index)[1]["status"], "hit")
+
+        st = self.registry.stat()
+        os.utime(self.registry, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.assertEqual(load_registry_index(self.registry, self.index)[1]["status"], "hit_rehashed")
+        self.assertEqual(load_registry_index(self.registry, self.index)[1]["status"], "hit")
+
+        _write_registry(self.registry, [{"canonical_id": "US:CCC"}])
+        table, info = load_registry_index(self.registry, self.index)
+        self.assertEqual(info["status"], "compiled")
+        self.assertEqual(table.column("canonical_id").to_pylist(), ["US:CCC"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import polars as pl
+
+from scripts.quantlab.stagea_fold_cache import FoldCache, date_content_hashes, fold_cache_key
+
+
+def _panel():
+    return pl.DataFrame(
+        {
+            "_asof_s": ["2026-01-02", "2026-01-02", "2026-01-05", "2026-01-05", "2026-01-06"],
+            "asset_id": ["A", "B", "A", "B", "A"],
+            "ret_20d": [0.1, -0.2, 0.05, None, 0.3],
+        }
+    )
+
+
+class StageAFoldCacheTest(unittest.TestCase):
+    def test_key_tracks_fold_content_not_row_order(self):
+        df = _panel()
+        hashes = date_content_hashes(df, "_asof_s")
+        shuffled = date_content_hashes(df.reverse().select(["ret_20d", "asset_id", "_asof_s"]), "_asof_s")
+        self.assertEqual(hashes, shuffled)
+        key = fold_cache_key(hashes, ["2026-01-02"], ["2026-01-05"], "fs_v1")
+        self.assertEqual(key, fold_cache_key(shuffled, ["2026-01-02"], ["2026-01-05"], "fs_v1"))
+
+        edited = date_content_hashes(df.with_columns(pl.when(pl.col("asset_id") == "B").then(0.0).otherwise(pl.col("ret_20d")).alias("ret_20d")), "_asof_s")
+        self.assertEqual(edited["2026-01-06"], hashes["2026-01-06"])
+        self.assertNotEqual(key, fold_cache_key(edited, ["2026-01-02"], ["2026-01-05"], "fs_v1"))
+        self.assertNotEqual(key, fold_cache_key(hashes, ["2026-01-02"], ["2026-01-05"], "fs_v2"))
+        self.assertNotEqual(key, fold_cache_key(hashes, ["2026-01-02"], ["2026-01-05", "2026-01-06"], "fs_v1"))
+
+    def test_store_and_load_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = FoldCache(Path(tmp))
+            key = fold_cache_key(date_content_hashes(_panel(), "_asof_s"), ["2026-01-02"], ["2026-01-05"], "fs_v1")
+            self.assertIsNone(cache.load(key))
+            frame = _panel().with_columns(((pl.col("ret_20d") - 0.1) / 0.2).alias("z_ret_20d"))
+            cache.store(key, {"ret_20d": (0.1, 0.2)}, frame, train_rows=2, test_rows=2)
+            meta, loaded = cache.load(key)
+            self.assertTrue(loaded.equals(frame))
+            self.assertEqual(meta["train_stats"], {"ret_20d": (0.1, 0.2)})
+            self.assertEqual((meta["train_rows"], meta["test_rows"]), (2, 2))
+            self.assertEqual(cache.stats()["hits"], 1)
+            self.assertEqual(cache.stats()["misses"], 1)
+            self.assertEqual(list(Path(tmp).rglob("*.tmp")), [])
+
+    def test_store_evicts_least_recently_used_entries_over_budget(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            frame = _panel()
+            probe = FoldCache(Path(tmp) / "probe", max_bytes=0)
+            probe.store("p" * 64, {"ret_20d": (0.1, 0.2)}, frame)
+            entry_bytes = sum(p.stat().st_size for p in (Path(tmp) / "probe").rglob("*") if p.is_file())
+
+            cache = FoldCache(Path(tmp) / "cache", max_bytes=int(entry_bytes * 3.5))
+            keys = [f"{i:02d}" + "k" * 62 for i in range(3)]
+            for age, key in enumerate(keys):
+                cache.store(key, {"ret_20d": (0.1, 0.2)}, frame)
+                os.utime(cache._paths(key)[0], (1000 + age, 1000 + age))
+            self.assertIsNotNone(cache.load(keys[0]))
+            cache.store("03" + "k" * 62, {"ret_20d": (0.1, 0.2)}, frame)
+            self.assertEqual(cache.stats()["evicted"], 1)
+            self.assertIsNone(cache.load(keys[1]))
+            self.assertIsNotNone(cache.load(keys[0]))
+            self.assertIsNotNone(cache.load(keys[2]))
+            self.assertFalse(cache._paths(keys[1])[1].exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import math
+import random
+import unittest
+from statistics import NormalDist
+
+from scripts.quantlab.stageb_stats import seed_from_key, sharpe_stats_by_candidate
+
+_NORM = NormalDist()
+
+
+def _reference_psr(sharpes, bench=0.0):
+    n = len(sharpes)
+    if n <= 0:
+        return 0.0
+    if n == 1:
+        return 1.0 if sharpes[0] > bench else 0.0
+    m = sum(sharpes) / n
+    sd = math.sqrt(max(sum((x - m) ** 2 for x in sharpes) / (n - 1), 1e-12))
+    skew = (n / ((n - 1) * (n - 2))) * sum(((x - m) / sd) ** 3 for x in sharpes) if n >= 3 else 0.0
+    kurt = 0.0
+    if n >= 4:
+        z4 = sum(((x - m) / sd) ** 4 for x in sharpes)
+        kurt = (n * (n + 1) * z4) / ((n - 1) * (n - 2) * (n - 3)) - (3 * (n - 1) ** 2) / ((n - 2) * (n - 3))
+    denom = math.sqrt(max(1.0 - skew * m + 0.25 * (kurt + 2.0) * m**2, 1e-12))
+    return max(0.0, min(1.0, _NORM.cdf((m - bench) * math.sqrt(n - 1) / denom)))
+
+
+def _reference_bootstrap(sharpes, resamples, key):
+    rnd = random.Random(seed_from_key(key))
+    n = len(sharpes)
+    pos = 0
+    for _ in range(resamples):
+        sample = [sharpes[rnd.randrange(n)] for _ in range(n)]
+        pos += (sum(sample) / n) > 0
+    return pos / resamples
+
+
+class StageBStatsTest(unittest.TestCase):
+    def test_matches_per_candidate_formulas(self):
+        rng = random.Random(9)
+        data = {f"c{i}": [rng.gauss(0.05, 0.4) for _ in range(rng.choice([0, 1, 2, 3, 5, 7, 12]))] for i in range(60)}
+        data["flat"] = [0.2] * 5
+        out = sharpe_stats_by_candidate(data, trials_total=40, bootstrap_resamples=64, seed_key=lambda k: f"run:{k}:psr_boot")
+        for key, sharpes in data.items():
+            self.assertAlmostEqual(out[key]["psr_strict"], _reference_psr(sharpes), places=12)
+            self.assertEqual(out[key]["psr_bootstrap"], _reference_bootstrap(sharpes, 64, f"run:{key}:psr_boot") if len(sharpes) > 1 else float(bool(sharpes) and sharpes[0] > 0))
+            if len(sharpes) > 1 and key != "flat":
+                self.assertGreater(out[key]["sr_star"], 0.0)
+                self.assertAlmostEqual(out[key]["dsr_strict"], _reference_psr(sharpes, out[key]["sr_star"]), places=12)
+        self.assertEqual(out["flat"]["skew"], 0.0)
+
+    def test_bootstrap_is_deterministic_per_key_and_trials_per_key(self):
+        data = {"a": [0.3, -0.2, 0.1, 0.05], "b": [0.3, -0.2, 0.1, 0.05]}
+        first = sharpe_stats_by_candidate(data, trials_total={"a": 2, "b": 500}, bootstrap_resamples=256, seed_key=lambda k: f"run:{k}")
+        again = sharpe_stats_by_candidate({"a": data["a"]}, trials_total=2, bootstrap_resamples=256, seed_key=lambda k: f"run:{k}")
+        self.assertEqual(first["a"], again["a"])
+        self.assertGreater(first["b"]["sr_star"], first["a"]["sr_star"])
+        self.assertLess(first["b"]["dsr_strict"], first["a"]["dsr_strict"])
+        self.assertNotIn("psr_bootstrap", sharpe_stats_by_candidate(data, trials_total=2)["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
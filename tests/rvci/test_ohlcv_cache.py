@@ -0,0 +1,101 @@
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from backend.rvci.data_fetcher import fetch_ohlcv
+from backend.rvci.ohlcv_cache import FileProvider, OhlcvCache
+
+
+def _bars(start, days, seed):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(start, periods=days, name="Date")
+    close = 100 + rng.normal(0, 1, days).cumsum()
+    return pd.DataFrame(
+        {"Open": close, "High": close + 1, "Low": close - 1, "Close": close, "Adj Close": close, "Volume": rng.integers(1, 1000, days)},
+        index=index,
+    )
+
+
+class OhlcvCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.source = root / "source"
+        self.source.mkdir()
+        self.full = {"AAA": _bars("2025-01-01", 300, 1), "BBB": _bars("2025-01-01", 300, 2), "NEW": _bars("2025-09-01", 60, 3)}
+        self.cache = OhlcvCache(root / "cache")
+        self.start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _publish(self, through):
+        for symbol, frame in self.full.items():
+            frame.loc[frame.index <= pd.Timestamp(through)].to_csv(self.source / f"{symbol}.csv")
+
+    def _run(self, provider, through):
+        end = datetime.fromisoformat(through).replace(tzinfo=timezone.utc) + timedelta(days=1)
+        return fetch_ohlcv(["AAA", "BBB", "NEW", "ZZZ"], self.start, end, provider=provider, cache=OhlcvCache(self.cache.root))
+
+    def test_second_run_fetches_only_the_tail(self):
+        self._publish("2025-10-01")
+        provider = FileProvider(self.source)
+        prices, missing, errors = self._run(provider, "2025-10-01")
+        self.assertEqual((missing, errors), (["ZZZ"], []))
+        self.assertEqual(len(provider.calls), 1)
+
+        self._publish("2025-10-08")
+        provider = FileProvider(self.source)
+        prices, missing, _ = self._run(provider, "2025-10-08")
+        tail_calls = [call for call in provider.calls if "AAA" in call[0]]
+        self.assertEqual(tail_calls, [(("AAA", "BBB", "NEW"), datetime(2025, 9, 30).date(), datetime(2025, 10, 9).date())])
+        self.assertEqual([call[0] for call in provider.calls if call not in tail_calls], [("ZZZ",)])
+        self.assertEqual(missing, ["ZZZ"])
+        for symbol in ("AAA", "BBB", "NEW"):
+            expected = self.full[symbol].loc[self.full[symbol].index <= pd.Timestamp("2025-10-08")]
+            pd.testing.assert_frame_equal(prices[symbol], expected, check_freq=False)
+
+    def test_revised_last_bar_is_overwritten_and_empty_tail_falls_back(self):
+        self._publish("2025-10-01")
+        self._run(FileProvider(self.source), "2025-10-01")
+        self.full["AAA"].loc[pd.Timestamp("2025-10-01"), "Close"] = 1.0
+        self._publish("2025-10-01")
+        cache = OhlcvCache(self.cache.root)
+        end = datetime(2025, 10, 2, tzinfo=timezone.utc)
+        prices, _, _ = fetch_ohlcv(["AAA"], self.start, end, provider=FileProvider(self.source), cache=cache)
+        self.assertEqual(prices["AAA"]["Close"].iloc[-1], 1.0)
+        self.assertEqual((cache.stats["tail"], cache.stats["refetch"]), (1, 0))
+        self.assertEqual(OhlcvCache(self.cache.root).load("AAA")["Close"].iloc[-1], 1.0)
+
+        cache = OhlcvCache(self.cache.root)
+        prices, missing, _ = fetch_ohlcv(["AAA"], self.start, end, provider=FileProvider(self.source / "gone"), cache=cache)
+        self.assertEqual((missing, cache.stats["fallback"]), ([], 1))
+        self.assertEqual(prices["AAA"].index.max(), pd.Timestamp("2025-10-01"))
+
+    def test_readjusted_history_discards_cache_and_refetches_window(self):
+        self._publish("2025-10-01")
+        self._run(FileProvider(self.source), "2025-10-01")
+        for column in ("Open", "High", "Low", "Close", "Adj Close"):
+            self.full["AAA"][column] *= 0.5
+        self.full["BBB"].loc[pd.Timestamp("2025-09-30"), "Close"] *= 1 + 1e-6
+        self._publish("2025-10-08")
+
+        provider = FileProvider(self.source)
+        cache = OhlcvCache(self.cache.root)
+        prices, missing, _ = fetch_ohlcv(["AAA", "BBB"], self.start, datetime(2025, 10, 9, tzinfo=timezone.utc), provider=provider, cache=cache)
+        self.assertEqual(missing, [])
+        self.assertEqual(provider.calls[-1], (("AAA",), self.start.date(), datetime(2025, 10, 9).date()))
+        self.assertEqual((cache.stats["tail"], cache.stats["refetch"]), (1, 1))
+        for symbol in ("AAA", "BBB"):
+            expected = self.full[symbol].loc[self.full[symbol].index <= pd.Timestamp("2025-10-08")]
+            pd.testing.assert_frame_equal(prices[symbol], expected, check_freq=False, rtol=1e-5)
+        cached = OhlcvCache(self.cache.root).load("AAA")
+        pd.testing.assert_frame_equal(cached, prices["AAA"], check_freq=False)
+
+
+if __name__ == "__main__":
+    unittest.main()